@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'supermarket.middleware.CompteUtilisateurMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -134,11 +135,37 @@ SESSION_COOKIE_AGE = 86400  # 24 heures
 SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Caches : 'default' reste local au processus ; 'partage' est vu par tous les
+# workers et tous les postes (tickets ESC/POS, voir supermarket/ticket_escpos.py).
+# Table créée par la migration supermarket 0080, ou Redis si REDIS_URL est défini.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'partage': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'supermarket_cache',
+    },
+}
+if config('REDIS_URL', default=''):
+    CACHES['partage'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL'),
+    }
+
 # Configuration d'authentification
 LOGIN_URL = '/caisse/login/'
 LOGIN_REDIRECT_URL = '/caisse/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Journalisation (voir supermarket/journalisation.py)
+from supermarket.journalisation import configuration_logging
+LOGGING = configuration_logging(
+    niveau=config('LOG_LEVEL', default='WARNING'),
+    niveaux_modules=config('LOG_LEVELS', default=''),
+    echantillonnage=config('LOG_SAMPLING', default=1.0, cast=float),
+)
+
 
 
 # ==============================================================================
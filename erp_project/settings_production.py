@@ -108,6 +108,12 @@ LOGS_DIR.mkdir(exist_ok=True)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'echantillonnage': {
+            '()': 'supermarket.journalisation.EchantillonnageFilter',
+            'taux': config('LOG_SAMPLING', default=1.0, cast=float),
+        },
+    },
     'formatters': {
         'verbose': {
             'format': '{levelname} {asctime} {module} {message}',
@@ -122,9 +128,9 @@ LOGGING = {
             'formatter': 'verbose',
         },
         'console': {
-            'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
+            'filters': ['echantillonnage'],
         },
     },
     'loggers': {
@@ -135,22 +141,21 @@ LOGGING = {
         },
         'supermarket': {
             'handlers': ['file', 'console'],
-            'level': 'INFO',
+            'level': config('LOG_LEVEL', default='WARNING'),
             'propagate': False,
         },
     },
 }
+# Niveaux par module, ex. LOG_LEVELS="supermarket.views=INFO"
+from supermarket.journalisation import niveaux_par_module
+for _module, _niveau in niveaux_par_module(config('LOG_LEVELS', default='')).items():
+    LOGGING['loggers'].setdefault(_module, {})['level'] = _niveau
 
 # ============================================
 # PERFORMANCE
 # ============================================
-# Cache (optionnel - peut utiliser Redis ou Memcached)
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-#         'LOCATION': 'redis://127.0.0.1:6379/1',
-#     }
-# }
+# Cache partagé entre workers : en base par défaut (voir settings.py),
+# Redis si REDIS_URL est défini (ex. redis://127.0.0.1:6379/1)
 
 # ============================================
 # EMAIL (si vous envoyez des emails)
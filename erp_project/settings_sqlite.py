@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'supermarket.middleware.CompteUtilisateurMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,6 +77,17 @@ DATABASES = {
     }
 }
 
+# Caches - Identique à settings.py ('partage' : table créée par la migration supermarket 0080)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'partage': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'supermarket_cache',
+    },
+}
+
 # Internationalisation
 LANGUAGE_CODE = 'fr-fr'
 TIME_ZONE = 'UTC'
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'supermarket.middleware.CompteUtilisateurMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -119,6 +120,17 @@ SESSION_COOKIE_AGE = 86400  # 24 heures
 SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Caches - Identique à settings.py ('partage' vu par tous les postes du réseau)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'partage': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'supermarket_cache',
+    },
+}
+
 # Configuration CSRF pour le mode portable
 CSRF_COOKIE_SECURE = False
 CSRF_COOKIE_HTTPONLY = False
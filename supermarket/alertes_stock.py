@@ -0,0 +1,125 @@
+"""
+Ensemble des articles en stock d'alerte ou en rupture
+
+AlerteStock contient une ligne par article suivi dont le stock est <= 0
+(rupture) ou <= au stock minimum (alerte). L'ensemble est tenu à jour à
+chaque variation de stock, dans la transaction qui la fait :
+
+- stock_utils.appliquer_variations (ventes, achats, transferts, retours,
+  ajustements) appelle actualiser() pour les articles modifiés
+- la sauvegarde d'un Article (création, modification du stock ou du stock
+  minimum) passe par le signal post_save
+- reconstruire() recalcule tout en une requête (commande
+  actualiser_alertes_stock, après des modifications de masse)
+
+actualiser() lit en une requête l'état des articles et leur alerte actuelle
+et n'écrit que les changements. L'entrée dans l'ensemble, ou le passage de
+l'alerte à la rupture, crée une seule Notification (rattachée à l'alerte) :
+tant que le niveau ne change pas, aucune autre notification n'est créée.
+stock_alerte, rupture_stock et le tableau de bord lisent l'ensemble au lieu
+de parcourir les articles.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import AlerteStock, Article, Notification
+
+ALERTE = 'alerte'
+RUPTURE = 'rupture'
+
+CHAMPS_STOCK = {'stock_actuel', 'stock_minimum', 'suivi_stock'}
+
+
+def niveau(stock_actuel, stock_minimum, suivi_stock=True):
+    """'rupture', 'alerte' ou None"""
+    if not suivi_stock or stock_actuel is None:
+        return None
+    if stock_actuel <= 0:
+        return RUPTURE
+    if stock_actuel <= (stock_minimum or 0):
+        return ALERTE
+    return None
+
+
+def _notification(agence_id, reference, designation, stock_actuel, niveau_alerte):
+    if niveau_alerte == RUPTURE:
+        titre = f'Rupture de stock : {designation}'
+        message = f'L\'article {reference} - {designation} est en rupture (stock {stock_actuel}).'
+    else:
+        titre = f'Stock d\'alerte : {designation}'
+        message = f'L\'article {reference} - {designation} a atteint son stock minimum (stock {stock_actuel}).'
+    return Notification(
+        agence_id=agence_id, type_notification='stock_insuffisant', titre=titre[:200], message=message,
+    )
+
+
+def _appliquer(articles):
+    """Écrire les changements d'alerte pour des articles lus avec leur niveau actuel ; retourne le nombre de changements"""
+    a_retirer = []
+    a_creer = []
+    for article_id, agence_id, reference, designation, stock, minimum, suivi, actuel in articles:
+        nouveau = niveau(stock, minimum, suivi)
+        if nouveau == actuel:
+            continue
+        if actuel is not None:
+            a_retirer.append(article_id)
+        if nouveau is not None:
+            a_creer.append((
+                AlerteStock(article_id=article_id, agence_id=agence_id, niveau=nouveau),
+                _notification(agence_id, reference, designation, stock, nouveau),
+            ))
+    if not a_retirer and not a_creer:
+        return 0
+
+    with transaction.atomic():
+        if a_retirer:
+            AlerteStock.objects.filter(article_id__in=a_retirer).delete()
+        if a_creer:
+            notifications = Notification.objects.bulk_create([n for _, n in a_creer])
+            alertes = []
+            for (alerte, _), notification in zip(a_creer, notifications):
+                alerte.notification_id = notification.pk
+                alertes.append(alerte)
+            AlerteStock.objects.bulk_create(alertes)
+    return len(a_retirer) + len(a_creer)
+
+
+def _etats(articles):
+    return articles.values_list(
+        'id', 'agence_id', 'reference_article', 'designation', 'stock_actuel', 'stock_minimum', 'suivi_stock',
+        'alerte_stock__niveau',
+    )
+
+
+def actualiser(article_ids):
+    """Mettre l'ensemble d'alerte à jour pour ces articles (une lecture, écritures seulement si changement)"""
+    if not article_ids:
+        return 0
+    return _appliquer(_etats(Article.objects.filter(id__in=list(article_ids))))
+
+
+def reconstruire(agences=None):
+    """Recalculer l'ensemble : articles qui devraient être en alerte et alertes existantes, en une requête"""
+    articles = Article.objects.filter(
+        Q(suivi_stock=True, stock_actuel__lte=F('stock_minimum'))
+        | Q(suivi_stock=True, stock_actuel__lte=0)
+        | Q(alerte_stock__isnull=False)
+    )
+    if agences is not None:
+        articles = articles.filter(agence__in=agences)
+    return _appliquer(_etats(articles))
+
+
+def compter(articles):
+    """{'total', 'ruptures', 'alertes'} pour un queryset d'articles de l'ensemble, en une requête"""
+    totaux = articles.aggregate(
+        total=Count('pk'),
+        ruptures=Count('pk', filter=Q(alerte_stock__niveau=RUPTURE)),
+    )
+    totaux['alertes'] = totaux['total'] - totaux['ruptures']
+    return totaux
+
+
+def articles_en_alerte(agence):
+    """Articles de l'agence présents dans l'ensemble d'alerte"""
+    return Article.objects.filter(alerte_stock__agence=agence)
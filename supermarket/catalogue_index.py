@@ -0,0 +1,278 @@
+"""
+Index de recherche des articles pour la caisse (un index en mémoire par agence)
+
+La recherche ignore la casse et les accents, sur la désignation et la
+référence article :
+- moins de 3 caractères : correspondance en début de mot (table des préfixes)
+- 3 caractères et plus : sous-chaîne, candidats obtenus par intersection des
+  trigrammes puis vérifiés
+Le coût d'une recherche dépend du nombre de résultats, pas de la taille du
+catalogue. Le même index sert au scan des codes (référence exacte) : une
+seule lecture de dictionnaire donne l'article et ses prix par type de vente.
+
+L'index est construit à la première recherche de l'agence puis tenu à jour par
+les signaux de sauvegarde / suppression d'Article et de TypeVente (voir
+signals.py) : l'entrée modifiée est remplacée et insérée à sa place dans
+l'ordre alphabétique, sans retrier le catalogue. La version du catalogue de
+chaque agence est en base (VersionCatalogue), partagée par tous les workers et
+tous les postes : quand un autre processus modifie un article, les autres
+reconstruisent leur index au prochain appel. Le stock n'est pas figé dans
+l'index : il est relu pour la seule page retournée.
+"""
+import bisect
+import threading
+import unicodedata
+
+from django.db.models import F
+
+from .models import Article, TypeVente, VersionCatalogue
+
+LONGUEUR_PREFIXE = 2
+
+_index_par_agence = {}
+_verrou = threading.Lock()
+
+
+def normaliser(texte):
+    """Minuscules, sans accents, espaces simplifiés"""
+    texte = unicodedata.normalize('NFKD', str(texte or '').lower())
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return ' '.join(texte.split())
+
+
+def _trigrammes(texte):
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+
+def _version(agence_id):
+    return VersionCatalogue.objects.filter(agence_id=agence_id).values_list('version', flat=True).first() or 0
+
+
+def _incrementer_version(agence_id):
+    versions = VersionCatalogue.objects.filter(agence_id=agence_id)
+    if not versions.update(version=F('version') + 1):
+        VersionCatalogue.objects.get_or_create(agence_id=agence_id)
+        versions.update(version=F('version') + 1)
+    return versions.values_list('version', flat=True).get()
+
+
+class IndexCatalogue:
+    """Index des articles d'une agence"""
+
+    def __init__(self, agence_id, version=0):
+        self.agence_id = agence_id
+        self.version = version
+        self.entrees = {}
+        self.prefixes = {}
+        self.trigrammes = {}
+        self.par_reference = {}
+        self.ordre = []
+
+    def construire(self):
+        articles = Article.objects.filter(agence_id=self.agence_id).values(
+            'id', 'reference_article', 'designation', 'prix_achat', 'prix_vente'
+        )
+        types_vente = {}
+        for article_id, intitule, prix in TypeVente.objects.filter(
+            article__agence_id=self.agence_id
+        ).values_list('article_id', 'intitule', 'prix'):
+            types_vente.setdefault(article_id, {})[normaliser(intitule)] = float(prix)
+
+        for article in articles:
+            article['types_vente'] = types_vente.get(article['id'], {})
+            self._indexer(article)
+        self._trier()
+        return self
+
+    def _indexer(self, article):
+        designation = normaliser(article['designation'])
+        reference = normaliser(article['reference_article'])
+        entree = {
+            'id': article['id'],
+            'reference': article['reference_article'],
+            'designation': article['designation'],
+            'prix_achat': float(article['prix_achat'] or 0),
+            'prix_vente': float(article['prix_vente'] or 0),
+            'types_vente': article.get('types_vente', {}),
+            '_designation': designation,
+            '_reference': reference,
+        }
+        self.entrees[article['id']] = entree
+        self.par_reference[reference] = article['id']
+
+        for mot in designation.split() + reference.split():
+            for n in range(1, LONGUEUR_PREFIXE + 1):
+                self.prefixes.setdefault(mot[:n], set()).add(article['id'])
+        for tri in _trigrammes(designation) | _trigrammes(reference):
+            self.trigrammes.setdefault(tri, set()).add(article['id'])
+
+    def _cle_tri(self, article_id):
+        return self.entrees[article_id]['_designation'], article_id
+
+    def _desindexer(self, article_id):
+        if article_id not in self.entrees:
+            return
+        position = bisect.bisect_left(self.ordre, self._cle_tri(article_id), key=self._cle_tri)
+        if position < len(self.ordre) and self.ordre[position] == article_id:
+            del self.ordre[position]
+        entree = self.entrees.pop(article_id)
+        if self.par_reference.get(entree['_reference']) == article_id:
+            del self.par_reference[entree['_reference']]
+        for mot in entree['_designation'].split() + entree['_reference'].split():
+            for n in range(1, LONGUEUR_PREFIXE + 1):
+                self.prefixes.get(mot[:n], set()).discard(article_id)
+        for tri in _trigrammes(entree['_designation']) | _trigrammes(entree['_reference']):
+            self.trigrammes.get(tri, set()).discard(article_id)
+
+    def _trier(self):
+        self.ordre = sorted(self.entrees, key=self._cle_tri)
+
+    def mettre_a_jour(self, article, prix_types_vente=None):
+        """
+        Remplacer l'entrée d'un article (création ou modification).
+
+        Sans prix_types_vente, l'entrée garde ses prix par type de vente : ils
+        ne changent qu'avec un TypeVente, dont le signal les relit.
+        """
+        if prix_types_vente is None:
+            ancienne = self.entrees.get(article.id)
+            prix_types_vente = ancienne['types_vente'] if ancienne else {}
+        self._desindexer(article.id)
+        self._indexer({
+            'id': article.id,
+            'reference_article': article.reference_article,
+            'designation': article.designation,
+            'prix_achat': article.prix_achat,
+            'prix_vente': article.prix_vente,
+            'types_vente': prix_types_vente,
+        })
+        bisect.insort(self.ordre, article.id, key=self._cle_tri)
+
+    def retirer(self, article_id):
+        self._desindexer(article_id)
+
+    def par_code(self, code):
+        """Entrée de l'article dont la référence est exactement ce code (ou None)"""
+        article_id = self.par_reference.get(normaliser(code))
+        return self.entrees.get(article_id) if article_id is not None else None
+
+    def _candidats(self, terme):
+        if len(terme) < 3:
+            return self.prefixes.get(terme, set())
+        ensembles = sorted(
+            (self.trigrammes.get(tri, set()) for tri in _trigrammes(terme)),
+            key=len
+        )
+        candidats = set(ensembles[0])
+        for ensemble in ensembles[1:]:
+            candidats &= ensemble
+            if not candidats:
+                break
+        return {
+            i for i in candidats
+            if terme in self.entrees[i]['_designation'] or terme in self.entrees[i]['_reference']
+        }
+
+    @staticmethod
+    def _rang(entree, terme):
+        reference, designation = entree['_reference'], entree['_designation']
+        if reference == terme:
+            return 0
+        if reference.startswith(terme):
+            return 1
+        if designation.startswith(terme):
+            return 2
+        if any(mot.startswith(terme) for mot in designation.split()):
+            return 3
+        return 4
+
+    def rechercher(self, terme, page=1, par_page=50):
+        """Retourner (entrées de la page, nombre total de résultats)"""
+        terme = normaliser(terme)
+        debut = (page - 1) * par_page
+        if not terme:
+            ids = self.ordre[debut:debut + par_page]
+            return [self.entrees[i] for i in ids], len(self.ordre)
+
+        resultats = sorted(
+            (self.entrees[i] for i in self._candidats(terme)),
+            key=lambda e: (self._rang(e, terme), e['_designation'])
+        )
+        return resultats[debut:debut + par_page], len(resultats)
+
+
+def get_index(agence_id):
+    """Index à jour de l'agence (construit ou reconstruit si besoin)"""
+    version = _version(agence_id)
+    index = _index_par_agence.get(agence_id)
+    if index is not None and index.version == version:
+        return index
+    with _verrou:
+        index = _index_par_agence.get(agence_id)
+        if index is None or index.version != version:
+            index = IndexCatalogue(agence_id, version).construire()
+            _index_par_agence[agence_id] = index
+    return index
+
+
+def rechercher_articles(agence, terme, page=1, par_page=50):
+    """
+    Recherche paginée pour la caisse.
+    Retourne (articles sérialisables avec leur stock actuel, total).
+    """
+    entrees, total = get_index(agence.pk).rechercher(terme, page, par_page)
+    stocks = dict(
+        Article.objects.filter(id__in=[e['id'] for e in entrees]).values_list('id', 'stock_actuel')
+    )
+    articles = []
+    for entree in entrees:
+        if entree['id'] not in stocks:
+            continue
+        articles.append({
+            'id': entree['id'],
+            'reference': entree['reference'],
+            'designation': entree['designation'],
+            'prix_achat': entree['prix_achat'],
+            'prix_vente': entree['prix_vente'],
+            'stock': int(stocks[entree['id']] or 0),
+        })
+    return articles, total
+
+
+def prix_selon_type(entree, type_vente):
+    """Prix du type de vente demandé, à défaut le prix de vente de l'article"""
+    return entree['types_vente'].get(normaliser(type_vente), entree['prix_vente'])
+
+
+def _patcher(agence_id, operation):
+    """Appliquer une modification à l'index local et invalider celui des autres processus"""
+    nouvelle_version = _incrementer_version(agence_id)
+    with _verrou:
+        index = _index_par_agence.get(agence_id)
+        if index is None:
+            return
+        if index.version == nouvelle_version - 1:
+            operation(index)
+            index.version = nouvelle_version
+        else:
+            # Un autre processus a modifié l'agence entre-temps : reconstruction au prochain appel
+            del _index_par_agence[agence_id]
+
+
+def article_modifie(article):
+    """Appelé après la sauvegarde d'un article"""
+    _patcher(article.agence_id, lambda index: index.mettre_a_jour(article))
+
+
+def types_vente_modifies(article):
+    """Appelé après la sauvegarde ou la suppression d'un type de vente de l'article"""
+    prix = {
+        normaliser(intitule): float(prix)
+        for intitule, prix in article.types_vente.values_list('intitule', 'prix')
+    }
+    _patcher(article.agence_id, lambda index: index.mettre_a_jour(article, prix))
+
+
+def article_supprime(article):
+    """Appelé après la suppression d'un article"""
+    _patcher(article.agence_id, lambda index: index.retirer(article.id))
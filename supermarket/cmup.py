@@ -0,0 +1,240 @@
+"""
+Coût moyen unitaire pondéré (CMUP) des articles
+
+ValorisationArticle porte, par article, la quantité et la valeur courantes du
+stock. Chaque MouvementStock est valorisé à sa création (MouvementStock.save,
+ou valoriser() appelé avant un bulk_create) :
+
+- entrée (solde > stock initial) : un achat ou un transfert entre à son coût
+  unitaire (cout_unitaire, à défaut le coût transmis par la vue dans
+  cout_moyen_pondere, recopié dans cout_unitaire) ; un retour, un ajustement
+  ou un inventaire entre au CMUP courant. Le CMUP est recalculé.
+- sortie : la quantité sort au CMUP courant, qui ne change pas.
+
+Le mouvement reçoit le CMUP après lui (cout_moyen_pondere) et la valeur du
+stock (stock_permanent). Le premier mouvement d'un article ouvre sa
+valorisation : stock initial du mouvement au prix d'achat de l'article. Si le
+stock a été modifié sans mouvement, la quantité valorisée est recalée sur le
+stock initial du mouvement suivant, au CMUP courant.
+
+reconstruire(agence) recalcule l'historique d'une agence en un parcours
+ordonné des mouvements (par article, date, id), lus par pages et réécrits
+par un UPDATE paramétré exécuté en lot, sans requête par mouvement.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from .models import Article, MouvementStock, ValorisationArticle
+
+ENTREES_AU_COUT = ('entree', 'transfert')
+SORTIES = ('sortie', 'perte')
+ARTICLES_PAR_PAGE = 200
+TAILLE_LOT = 1000
+
+CENTIMES = Decimal('0.01')
+PRECISION_CMUP = Decimal('0.0001')
+
+
+def _decimal(valeur):
+    if isinstance(valeur, Decimal):
+        return valeur
+    return Decimal(str(valeur or 0))
+
+
+def _variation(mouvement):
+    """Quantité entrée (positive) ou sortie (négative) par le mouvement"""
+    variation = _decimal(mouvement.solde) - _decimal(mouvement.stock_initial)
+    if variation == 0 and mouvement.quantite:
+        if mouvement.type_mouvement in SORTIES:
+            return -_decimal(mouvement.quantite)
+        if mouvement.type_mouvement in ENTREES_AU_COUT + ('retour',):
+            return _decimal(mouvement.quantite)
+    return variation
+
+
+def _ouvrir(article_id, agence_id, stock_initial, prix_achat):
+    prix_achat = _decimal(prix_achat)
+    stock_initial = _decimal(stock_initial)
+    return ValorisationArticle(
+        article_id=article_id,
+        agence_id=agence_id,
+        quantite=stock_initial,
+        valeur=(stock_initial * prix_achat).quantize(CENTIMES),
+        cout_moyen=prix_achat,
+    )
+
+
+def _appliquer(etat, mouvement):
+    """Valoriser un mouvement à partir de l'état de l'article, puis faire avancer l'état"""
+    cmup = _decimal(etat.cout_moyen)
+    cout_vue = _decimal(mouvement.cout_moyen_pondere)
+    stock_initial = _decimal(mouvement.stock_initial)
+    if _decimal(etat.quantite) != stock_initial:
+        # Stock modifié hors mouvement : la quantité réelle est reprise au CMUP courant
+        etat.quantite = stock_initial
+        etat.valeur = stock_initial * cmup
+
+    variation = _variation(mouvement)
+    quantite = _decimal(etat.quantite) + variation
+    if variation > 0:
+        if mouvement.cout_unitaire is None and mouvement.type_mouvement in ENTREES_AU_COUT:
+            mouvement.cout_unitaire = cout_vue
+        if mouvement.cout_unitaire is not None:
+            cout = _decimal(mouvement.cout_unitaire)
+        else:
+            cout = cmup or cout_vue
+        if etat.quantite > 0 and quantite > 0:
+            valeur = _decimal(etat.valeur) + variation * cout
+            cmup = valeur / quantite
+        else:
+            # Stock nul ou négatif avant l'entrée : le coût d'entrée devient le coût moyen
+            cmup = cout
+            valeur = quantite * cmup
+    else:
+        cmup = cmup or cout_vue
+        valeur = _decimal(etat.valeur) + variation * cmup if quantite > 0 else quantite * cmup
+
+    etat.quantite = quantite
+    etat.valeur = valeur.quantize(CENTIMES)
+    etat.cout_moyen = cmup.quantize(PRECISION_CMUP)
+    mouvement.cout_moyen_pondere = cmup.quantize(CENTIMES)
+    mouvement.stock_permanent = etat.valeur
+
+
+def _etats_verrouilles(mouvements):
+    """États des articles des mouvements, verrouillés par ordre d'article (créés au premier mouvement)"""
+    premiers = {}
+    for mouvement in mouvements:
+        premiers.setdefault(mouvement.article_id, mouvement)
+    ids = sorted(premiers)
+
+    def lire(article_ids):
+        return {
+            e.article_id: e
+            for e in ValorisationArticle.objects.select_for_update().filter(
+                article_id__in=article_ids
+            ).order_by('article_id')
+        }
+
+    etats = lire(ids)
+    manquants = [article_id for article_id in ids if article_id not in etats]
+    if manquants:
+        articles = Article.objects.filter(id__in=manquants).values_list('id', 'agence_id', 'prix_achat')
+        ValorisationArticle.objects.bulk_create(
+            [
+                _ouvrir(article_id, agence_id, premiers[article_id].stock_initial, prix_achat)
+                for article_id, agence_id, prix_achat in articles
+            ],
+            ignore_conflicts=True,
+        )
+        etats.update(lire(manquants))
+    return etats
+
+
+def _ecrire_etats(etats):
+    """Réécrire les états des articles : un UPDATE paramétré exécuté en lot (lignes déjà verrouillées)"""
+    table = connection.ops.quote_name(ValorisationArticle._meta.db_table)
+    colonnes = [
+        connection.ops.quote_name(ValorisationArticle._meta.get_field(nom).column)
+        for nom in ('quantite', 'valeur', 'cout_moyen', 'article')
+    ]
+    sql = f'UPDATE {table} SET {colonnes[0]} = %s, {colonnes[1]} = %s, {colonnes[2]} = %s WHERE {colonnes[3]} = %s'
+    with connection.cursor() as curseur:
+        for debut in range(0, len(etats), TAILLE_LOT):
+            curseur.executemany(sql, [
+                (e.quantite, e.valeur, e.cout_moyen, e.article_id)
+                for e in etats[debut:debut + TAILLE_LOT]
+            ])
+
+
+def valoriser(mouvements):
+    """
+    Valoriser des MouvementStock non enregistrés, dans leur ordre, et mettre à jour les articles.
+
+    Renseigne cout_moyen_pondere, stock_permanent (et cout_unitaire des
+    entrées au coût) sur chaque mouvement ; à appeler juste avant leur
+    enregistrement, dans la même transaction.
+    """
+    if not mouvements:
+        return
+    with transaction.atomic():
+        etats = _etats_verrouilles(mouvements)
+        for mouvement in mouvements:
+            etat = etats.get(mouvement.article_id)
+            if etat is not None:
+                _appliquer(etat, mouvement)
+            mouvement._valorise = True
+        _ecrire_etats(sorted(etats.values(), key=lambda e: e.article_id))
+
+
+def cmup_courant(article_id):
+    """CMUP actuel d'un article (None tant qu'il n'a pas de mouvement valorisé)"""
+    return ValorisationArticle.objects.filter(article_id=article_id).values_list('cout_moyen', flat=True).first()
+
+
+def _ecrire_valorisations(mouvements):
+    """Réécrire la valorisation des mouvements : un UPDATE paramétré exécuté en lot (executemany)"""
+    table = connection.ops.quote_name(MouvementStock._meta.db_table)
+    colonnes = [
+        connection.ops.quote_name(MouvementStock._meta.get_field(nom).column)
+        for nom in ('cout_moyen_pondere', 'stock_permanent', 'cout_unitaire', 'id')
+    ]
+    sql = f'UPDATE {table} SET {colonnes[0]} = %s, {colonnes[1]} = %s, {colonnes[2]} = %s WHERE {colonnes[3]} = %s'
+    with connection.cursor() as curseur:
+        for debut in range(0, len(mouvements), TAILLE_LOT):
+            curseur.executemany(sql, [
+                (m.cout_moyen_pondere, m.stock_permanent, m.cout_unitaire, m.id)
+                for m in mouvements[debut:debut + TAILLE_LOT]
+            ])
+
+
+def reconstruire(agence, articles_par_page=ARTICLES_PAR_PAGE, progression=None):
+    """
+    Recalculer le CMUP de tous les mouvements de l'agence et l'état de ses articles.
+
+    Retourne le nombre de mouvements revalorisés ; progression(fait, total)
+    est appelé après chaque page d'articles.
+    """
+    champs = (
+        'id', 'article_id', 'article__prix_achat', 'type_mouvement', 'stock_initial', 'solde',
+        'quantite', 'cout_unitaire', 'cout_moyen_pondere',
+    )
+    article_ids = list(
+        MouvementStock.objects.filter(agence=agence).order_by('article_id').values_list('article_id', flat=True).distinct()
+    )
+    total = 0
+    with transaction.atomic():
+        ValorisationArticle.objects.filter(agence=agence).delete()
+        for debut in range(0, len(article_ids), articles_par_page):
+            page = article_ids[debut:debut + articles_par_page]
+            etats = []
+            a_ecrire = []
+            etat = None
+            for ligne in MouvementStock.objects.filter(agence=agence, article_id__in=page).order_by(
+                'article_id', 'date_mouvement', 'id'
+            ).values_list(*champs):
+                valeurs = dict(zip(champs, ligne))
+                if etat is None or etat.article_id != valeurs['article_id']:
+                    etat = _ouvrir(valeurs['article_id'], agence.pk, valeurs['stock_initial'],
+                                   valeurs['article__prix_achat'])
+                    etats.append(etat)
+                mouvement = MouvementStock(
+                    id=valeurs['id'],
+                    article_id=valeurs['article_id'],
+                    type_mouvement=valeurs['type_mouvement'],
+                    stock_initial=valeurs['stock_initial'],
+                    solde=valeurs['solde'],
+                    quantite=valeurs['quantite'],
+                    cout_unitaire=valeurs['cout_unitaire'],
+                    cout_moyen_pondere=valeurs['cout_moyen_pondere'],
+                )
+                _appliquer(etat, mouvement)
+                a_ecrire.append(mouvement)
+
+            _ecrire_valorisations(a_ecrire)
+            ValorisationArticle.objects.bulk_create(etats, batch_size=TAILLE_LOT)
+            total += len(a_ecrire)
+            if progression:
+                progression(min(debut + articles_par_page, len(article_ids)), len(article_ids))
+    return total
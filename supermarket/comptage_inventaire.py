@@ -0,0 +1,240 @@
+"""
+Feuilles d'inventaire et import des quantités comptées
+
+- creer_lignes() écrit les lignes d'une feuille d'inventaire par
+  bulk_create, par lots, à partir d'une seule lecture des articles
+- lire_comptage() lit un fichier de comptage CSV ou XLSX : une colonne
+  référence article et une colonne quantité comptée, une ligne par article
+- importer_comptage() rapproche tout le comptage du stock en une passe, dans
+  une seule transaction : les articles de l'agence sont lus (et verrouillés)
+  en une requête, l'inventaire et ses lignes sont écrits en lot, puis un
+  mouvement 'inventaire' par écart (valorisé au CMUP) et le stock actuel
+  ramené à la quantité comptée par un UPDATE exécuté en lot
+
+Les lignes d'un inventaire importé portent la quantité comptée
+(quantite_stock) : c'est ce que relit la reconstruction du registre
+(registre_stock.py). Un comptage complet du magasin se charge en un envoi.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .alertes_stock import actualiser as actualiser_alertes
+from .cmup import valoriser
+from .models import Article, InventaireStock, LigneInventaireStock, MouvementStock
+from .stock_journalier import invalider
+
+TAILLE_LOT = 2000
+
+COLONNES_REFERENCE = ('reference_article', 'reference', 'référence', 'ref', 'code')
+COLONNES_QUANTITE = ('quantite_comptee', 'quantité comptée', 'quantite', 'quantité', 'qte', 'comptage')
+
+
+class ComptageInvalide(ValueError):
+    """Fichier de comptage illisible ou incohérent (le message indique la ligne)"""
+
+
+def _valeur(quantite, prix):
+    return (Decimal(quantite) * Decimal(prix)).quantize(Decimal('0.01'))
+
+
+def creer_lignes(inventaire, articles, taille_lot=TAILLE_LOT, quantites=None):
+    """
+    Écrire les lignes de l'inventaire pour ces articles, par lots.
+
+    quantites {article_id: quantité} remplace le stock actuel (quantités
+    comptées). Retourne (nombre de lignes, quantité totale, valeur totale).
+    """
+    champs = ('id', 'reference_article', 'designation', 'stock_actuel', 'prix_achat', 'conditionnement')
+    nombre, total_quantite, total_valeur = 0, Decimal('0'), Decimal('0')
+    lot = []
+    for article_id, reference, designation, stock, prix, conditionnement in articles.values_list(*champs).iterator(
+        chunk_size=taille_lot
+    ):
+        quantite = stock if quantites is None else quantites[article_id]
+        valeur = _valeur(quantite, prix)
+        lot.append(LigneInventaireStock(
+            inventaire=inventaire, reference_article=reference, designation=designation,
+            quantite_stock=quantite, prix_unitaire=prix, valeur=valeur,
+            conditionnement=conditionnement, article_id=article_id,
+        ))
+        nombre += 1
+        total_quantite += quantite
+        total_valeur += valeur
+        if len(lot) >= taille_lot:
+            LigneInventaireStock.objects.bulk_create(lot)
+            lot = []
+    if lot:
+        LigneInventaireStock.objects.bulk_create(lot)
+    return nombre, total_quantite, total_valeur
+
+
+def _normaliser_entete(valeur):
+    return '_'.join(str(valeur or '').lower().replace('_', ' ').split())
+
+
+def _colonnes(entete):
+    entete = [_normaliser_entete(c) for c in entete]
+    indices = []
+    for noms in (COLONNES_REFERENCE, COLONNES_QUANTITE):
+        noms = [_normaliser_entete(n) for n in noms]
+        trouve = next((entete.index(n) for n in noms if n in entete), None)
+        if trouve is None:
+            raise ComptageInvalide(
+                f"Colonne introuvable : une de {', '.join(noms)} (en-tête lu : {', '.join(entete)})"
+            )
+        indices.append(trouve)
+    return indices
+
+
+def _lignes_csv(contenu):
+    texte = contenu.decode('utf-8-sig') if isinstance(contenu, bytes) else contenu
+    try:
+        dialecte = csv.Sniffer().sniff(texte[:4096], delimiters=';,\t')
+    except csv.Error:
+        return csv.reader(io.StringIO(texte), delimiter=';')
+    return csv.reader(io.StringIO(texte), dialecte)
+
+
+def _lignes_xlsx(contenu):
+    from openpyxl import load_workbook
+
+    classeur = load_workbook(io.BytesIO(contenu), read_only=True, data_only=True)
+    return classeur.active.iter_rows(values_only=True)
+
+
+def lire_comptage(fichier, nom=None):
+    """
+    {référence article: quantité comptée} d'un fichier CSV ou XLSX.
+
+    Une référence présente plusieurs fois voit ses quantités additionnées
+    (comptage d'un même article à plusieurs emplacements).
+    """
+    nom = (nom or getattr(fichier, 'name', '') or '').lower()
+    contenu = fichier.read() if hasattr(fichier, 'read') else fichier
+    lignes = _lignes_xlsx(contenu) if nom.endswith(('.xlsx', '.xlsm')) else _lignes_csv(contenu)
+
+    lignes = iter(lignes)
+    entete = next(lignes, None)
+    if not entete:
+        raise ComptageInvalide('Fichier de comptage vide')
+    colonne_reference, colonne_quantite = _colonnes(entete)
+
+    comptes = {}
+    for numero, ligne in enumerate(lignes, start=2):
+        if not ligne or all(c in (None, '') for c in ligne):
+            continue
+        reference = str(ligne[colonne_reference] if colonne_reference < len(ligne) else '').strip()
+        brut = ligne[colonne_quantite] if colonne_quantite < len(ligne) else None
+        if not reference:
+            raise ComptageInvalide(f'Ligne {numero} : référence article manquante')
+        try:
+            quantite = Decimal(str(brut).strip().replace(' ', '').replace(',', '.'))
+        except (InvalidOperation, AttributeError):
+            raise ComptageInvalide(f'Ligne {numero} : quantité invalide pour {reference} ({brut!r})')
+        if not quantite.is_finite() or quantite < 0:
+            raise ComptageInvalide(f'Ligne {numero} : quantité négative pour {reference}')
+        comptes[reference] = comptes.get(reference, Decimal('0')) + quantite
+    if not comptes:
+        raise ComptageInvalide('Aucune ligne de comptage')
+    return comptes
+
+
+def _fixer_stocks(stocks):
+    """stock_actuel = quantité comptée : un UPDATE paramétré exécuté en lot (lignes déjà verrouillées)"""
+    table = connection.ops.quote_name(Article._meta.db_table)
+    stock, suivi, identifiant = (
+        connection.ops.quote_name(Article._meta.get_field(nom).column)
+        for nom in ('stock_actuel', 'suivi_stock', 'id')
+    )
+    sql = f'UPDATE {table} SET {stock} = %s, {suivi} = %s WHERE {identifiant} = %s'
+    elements = sorted(stocks.items())
+    with connection.cursor() as curseur:
+        for debut in range(0, len(elements), TAILLE_LOT):
+            curseur.executemany(sql, [(q, True, article_id) for article_id, q in elements[debut:debut + TAILLE_LOT]])
+
+
+def _creer_inventaire(maintenant, **champs):
+    """
+    Inventaire numéroté INV-AAAAMMJJ-HHMMSS (suffixe -2, -3... si le numéro est pris).
+
+    Le numéro est réservé par l'insertion elle-même, dans la transaction de
+    l'import : deux imports de la même seconde ne peuvent pas recevoir le
+    même numéro, le second passe au suffixe suivant.
+    """
+    base = f"INV-{timezone.localtime(maintenant).strftime('%Y%m%d-%H%M%S')}"
+    suffixe = 1
+    while True:
+        numero = base if suffixe == 1 else f'{base}-{suffixe}'
+        try:
+            with transaction.atomic():
+                return InventaireStock.objects.create(
+                    numero_inventaire=numero, date_debut=maintenant, date_fin=maintenant, **champs
+                )
+        except IntegrityError:
+            # Numéro déjà pris (import concurrent ou même seconde)
+            suffixe += 1
+
+
+def importer_comptage(agence, comptes, responsable, commentaire=''):
+    """
+    Enregistrer un comptage {référence article: quantité comptée} de l'agence.
+
+    Retourne {'inventaire', 'lignes', 'ecarts', 'valeur_ecarts', 'inconnues'} ;
+    les références inconnues de l'agence sont ignorées et listées.
+    """
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Une lecture des articles comptés, verrouillés contre les ventes pendant l'import
+        articles = {
+            reference: (article_id, stock, prix)
+            for article_id, reference, stock, prix in Article.objects.select_for_update().filter(
+                agence=agence, reference_article__in=list(comptes)
+            ).order_by('id').values_list('id', 'reference_article', 'stock_actuel', 'prix_achat')
+        }
+        inconnues = sorted(set(comptes) - set(articles))
+        quantites = {articles[r][0]: q for r, q in comptes.items() if r in articles}
+
+        inventaire = _creer_inventaire(
+            maintenant, statut='termine', agence=agence, responsable=responsable,
+            commentaire=commentaire or f"Comptage importé le {timezone.localtime(maintenant).strftime('%d/%m/%Y à %H:%M')}",
+        )
+        numero = inventaire.numero_inventaire
+        lignes, _, _ = creer_lignes(
+            inventaire, Article.objects.filter(id__in=list(quantites)).order_by('designation'), quantites=quantites,
+        )
+
+        # Écarts calculés en une passe : un mouvement d'inventaire par article dont le compte diffère
+        mouvements = []
+        valeur_ecarts = Decimal('0')
+        for reference, (article_id, stock, prix) in sorted(articles.items(), key=lambda a: a[1][0]):
+            compte = quantites[article_id]
+            if compte == stock:
+                continue
+            valeur_ecarts += _valeur(compte - stock, prix)
+            mouvements.append(MouvementStock(
+                article_id=article_id, agence=agence, type_mouvement='inventaire', date_mouvement=maintenant,
+                numero_piece=numero, quantite_stock=compte, stock_initial=stock, solde=compte,
+                quantite=abs(compte - stock), cout_moyen_pondere=prix, stock_permanent=0,
+                inventaire=inventaire, commentaire=f'Inventaire {numero} (écart {compte - stock})',
+            ))
+        for debut in range(0, len(mouvements), TAILLE_LOT):
+            lot = mouvements[debut:debut + TAILLE_LOT]
+            valoriser(lot)
+            MouvementStock.objects.bulk_create(lot)
+
+        ecarts = {m.article_id: m.solde for m in mouvements}
+        _fixer_stocks(ecarts)
+        actualiser_alertes(ecarts)
+        invalider(mouvements)
+
+    return {
+        'inventaire': inventaire,
+        'lignes': lignes,
+        'ecarts': len(mouvements),
+        'valeur_ecarts': valeur_ecarts,
+        'inconnues': inconnues,
+    }
@@ -0,0 +1,134 @@
+"""
+Compte de résultat consolidé des agences (états de résultat et de dépenses)
+
+resultats(debut, fin) calcule pour toutes les agences, en une requête
+groupée par agence et par table source, quel que soit leur nombre :
+- chiffre d'affaires et nombre de ventes : factures de vente (net à payer)
+- coût des ventes et marge : ventes journalières (ventes_journalieres.py),
+  chiffre d'affaires des lignes moins coût au CMUP de la sortie de stock
+- dépenses : Depense (depenses() seule pour l'état des dépenses)
+
+Chaque requête agrège à la fois la période et la même période un mois plus
+tôt (periode_precedente()) par des sommes filtrées : les colonnes de
+comparaison ne coûtent aucune requête de plus.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from .models import Depense, FactureVente, VenteJournaliere
+from .resultat_journalier import debut_du_jour
+
+COURANT, PRECEDENT = 'courant', 'precedent'
+
+
+def mois_precedent(jour):
+    """Même jour du mois précédent (dernier jour du mois s'il est plus court)"""
+    fin_mois = jour.replace(day=1) - timedelta(days=1)
+    return fin_mois.replace(day=min(jour.day, fin_mois.day))
+
+
+def periode_precedente(debut, fin):
+    """
+    Période de comparaison : [debut, fin] un mois plus tôt.
+
+    Une période finissant en fin de mois est comparée jusqu'à la fin du mois
+    précédent : tout avril se compare à tout mars (jusqu'au 31), pas au 30.
+    """
+    fin_precedente = mois_precedent(fin)
+    if (fin + timedelta(days=1)).day == 1:
+        fin_precedente = fin.replace(day=1) - timedelta(days=1)
+    return mois_precedent(debut), fin_precedente
+
+
+def variation(courant, precedent):
+    """Évolution en % par rapport à la période précédente (None sans base de comparaison)"""
+    if not precedent:
+        return None
+    return float((Decimal(courant) - Decimal(precedent)) / abs(Decimal(precedent)) * 100)
+
+
+def vide():
+    """Valeurs d'une agence sans pièce sur la période"""
+    return {
+        'chiffre_affaires': Decimal('0'), 'nombre_ventes': 0, 'cout_ventes': Decimal('0'),
+        'marge': Decimal('0'), 'depenses': Decimal('0'), 'nombre_depenses': 0, 'resultat': Decimal('0'),
+    }
+
+
+def _grouper(objets, agences, plage, mesures, periodes):
+    """
+    Une requête groupée par agence : {agence_id: {période: {nom: valeur}}}.
+
+    plage(debut, fin) : filtre Q d'une période ; mesures : {nom: agrégat}.
+    """
+    condition = Q(pk__in=[])
+    annotations = {}
+    for periode, (debut, fin) in periodes.items():
+        filtre = plage(debut, fin)
+        condition |= filtre
+        for nom, agregat in mesures.items():
+            annotations[f'{periode}_{nom}'] = agregat(filtre)
+    if agences is not None:
+        objets = objets.filter(agence__in=agences)
+
+    groupes = {}
+    for ligne in objets.filter(condition).values('agence_id').annotate(**annotations).order_by():
+        groupes[ligne['agence_id']] = {
+            periode: {nom: ligne[f'{periode}_{nom}'] or 0 for nom in mesures} for periode in periodes
+        }
+    return groupes
+
+
+def _periodes(debut, fin):
+    return {COURANT: (debut, fin), PRECEDENT: periode_precedente(debut, fin)}
+
+
+def depenses(debut, fin, agences=None):
+    """{agence_id: {COURANT: {'depenses', 'nombre_depenses'}, PRECEDENT: ...}} en une requête"""
+    return _grouper(
+        Depense.objects, agences,
+        lambda d, f: Q(date__gte=debut_du_jour(d), date__lt=debut_du_jour(f + timedelta(days=1))),
+        {'depenses': lambda q: Sum('montant', filter=q), 'nombre_depenses': lambda q: Count('id', filter=q)},
+        _periodes(debut, fin),
+    )
+
+
+def resultats(debut, fin, agences=None):
+    """
+    Compte de résultat des agences (toutes par défaut) sur [debut, fin] et le mois précédent.
+
+    Retourne {agence_id: {COURANT: valeurs, PRECEDENT: valeurs}} en trois
+    requêtes ; valeurs : chiffre_affaires, nombre_ventes, cout_ventes, marge,
+    depenses, nombre_depenses, resultat (marge - dépenses). Une agence sans
+    aucune pièce sur les deux périodes est absente.
+    """
+    periodes = _periodes(debut, fin)
+    ventes = _grouper(
+        FactureVente.objects, agences, lambda d, f: Q(date__range=(d, f)),
+        {'chiffre_affaires': lambda q: Sum('nette_a_payer', filter=q), 'nombre_ventes': lambda q: Count('id', filter=q)},
+        periodes,
+    )
+    couts = _grouper(
+        VenteJournaliere.objects, agences, lambda d, f: Q(jour__range=(d, f)),
+        {'montant_lignes': lambda q: Sum('chiffre_affaires', filter=q), 'cout_ventes': lambda q: Sum('cout', filter=q)},
+        periodes,
+    )
+    charges = depenses(debut, fin, agences)
+
+    comptes = {}
+    for agence_id in set(ventes) | set(couts) | set(charges):
+        comptes[agence_id] = {}
+        for periode in periodes:
+            valeurs = vide()
+            for source in (ventes, charges):
+                for nom, valeur in source.get(agence_id, {}).get(periode, {}).items():
+                    valeurs[nom] = valeur if nom.startswith('nombre_') else Decimal(valeur)
+            cout = couts.get(agence_id, {}).get(periode)
+            if cout:
+                valeurs['cout_ventes'] = Decimal(cout['cout_ventes'])
+                valeurs['marge'] = Decimal(cout['montant_lignes']) - valeurs['cout_ventes']
+            valeurs['resultat'] = valeurs['marge'] - valeurs['depenses']
+            comptes[agence_id][periode] = valeurs
+    return comptes
@@ -0,0 +1,88 @@
+"""
+Compteurs de la session de caisse ouverte
+
+Le chiffre d'affaires, le nombre de tickets, les tickets en attente et l'heure
+de première ouverture du jour sont portés par SessionCaisse et mis à jour par
+incrément (F()) dans la transaction qui enregistre ou défacture la vente :
+le tableau de bord les lit en une requête, sans recompter les factures.
+
+- vente : comptabiliser_vente (appelé par vente_utils.enregistrer_vente)
+- défacturation : comptabiliser_vente avec un montant négatif
+- tickets en attente : signaux de FactureTemporaire (voir signals.py)
+- ouverture : initialiser_session rattache les factures du jour encore sans
+  session et calcule les compteurs de départ (signal post_save)
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import FactureTemporaire, FactureVente, SessionCaisse
+
+
+def bornes_du_jour(jour=None):
+    """[début, fin[ du jour dans le fuseau courant (filtre indexable sur date_ouverture)"""
+    jour = jour or timezone.now().date()
+    debut = datetime.combine(jour, time.min)
+    if timezone.is_naive(debut) and timezone.is_aware(timezone.now()):
+        debut = timezone.make_aware(debut, timezone.get_current_timezone())
+    return debut, debut + timedelta(days=1)
+
+
+def session_ouverte(agence, jour=None):
+    """Session de caisse ouverte du jour pour l'agence (None si la caisse n'est pas ouverte)"""
+    debut, fin = bornes_du_jour(jour)
+    return SessionCaisse.objects.filter(
+        agence=agence, statut='ouverte', date_ouverture__gte=debut, date_ouverture__lt=fin
+    ).first()
+
+
+def comptabiliser_vente(session_id, montant, tickets=1):
+    """Ajouter (ou retirer, montants négatifs) une vente aux compteurs de la session"""
+    if not session_id:
+        return
+    SessionCaisse.objects.filter(pk=session_id).update(
+        chiffre_affaires=F('chiffre_affaires') + Decimal(str(montant)),
+        nombre_tickets=Greatest(F('nombre_tickets') + tickets, 0),
+    )
+
+
+def modifier_tickets_attente(session_id, delta):
+    if not session_id:
+        return
+    SessionCaisse.objects.filter(pk=session_id).update(
+        tickets_attente=Greatest(F('tickets_attente') + delta, 0)
+    )
+
+
+def initialiser_session(session):
+    """
+    Compteurs de départ d'une session qui vient d'être ouverte.
+
+    Les factures du jour enregistrées sans session y sont rattachées ici, à
+    l'ouverture, et non plus à chaque lecture du tableau de bord.
+    """
+    jour = timezone.localtime(session.date_ouverture).date() if session.date_ouverture else timezone.now().date()
+    FactureVente.objects.filter(agence_id=session.agence_id, date=jour, session_caisse__isnull=True).update(
+        session_caisse=session
+    )
+    ventes = FactureVente.objects.filter(session_caisse=session).aggregate(
+        total=Sum('nette_a_payer'), nombre=Count('id')
+    )
+    debut, fin = bornes_du_jour(jour)
+    premiere = SessionCaisse.objects.filter(
+        agence_id=session.agence_id, date_ouverture__gte=debut, date_ouverture__lt=fin
+    ).aggregate(premiere=Min('date_ouverture'))['premiere']
+
+    session.chiffre_affaires = ventes['total'] or Decimal('0')
+    session.nombre_tickets = ventes['nombre']
+    session.tickets_attente = FactureTemporaire.objects.filter(session_caisse=session).count()
+    session.premiere_ouverture = premiere or session.date_ouverture
+    SessionCaisse.objects.filter(pk=session.pk).update(
+        chiffre_affaires=session.chiffre_affaires,
+        nombre_tickets=session.nombre_tickets,
+        tickets_attente=session.tickets_attente,
+        premiere_ouverture=session.premiere_ouverture,
+    )
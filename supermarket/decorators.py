@@ -1,39 +1,70 @@
 """
 Système de gestion des permissions basé sur le type de compte
 """
+import logging
 from functools import wraps
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.http import JsonResponse
 from .models import Compte, Livreur
 
+logger = logging.getLogger(__name__)
+
+def resoudre_compte(request):
+    """
+    Résoudre le compte actif (avec son agence) une seule fois par requête.
+
+    Une requête SQL (compte et agence joints), mémorisée sur la requête pour
+    le middleware, les décorateurs et les vues. Le compte est relu à chaque
+    requête HTTP : un compte désactivé ou supprimé perd l'accès aussitôt,
+    quel que soit le worker.
+    """
+    # Mémorisé par utilisateur : un login / logout dans la requête relance la résolution
+    memo = getattr(request, '_compte_resolu', None)
+    if memo is not None and memo[0] == request.user.pk:
+        return memo[1]
+
+    compte = None
+    if request.user.is_authenticated:
+        try:
+            compte = Compte.objects.select_related('agence').filter(user=request.user, actif=True).first()
+        except Exception as e:
+            logger.error("Erreur lors de la récupération du compte: %s", e)
+            compte = None
+
+    request._compte_resolu = (request.user.pk, compte)
+    return compte
+
 def get_user_compte(request):
     """Récupérer le compte utilisateur avec gestion des erreurs"""
     if not request.user.is_authenticated:
         return None
-    
-    try:
-        compte = Compte.objects.get(user=request.user, actif=True)
-        return compte
-    except Compte.DoesNotExist:
-        return None
-    except Exception as e:
-        print(f"[ERREUR] Erreur lors de la récupération du compte: {e}")
-        return None
+    return resoudre_compte(request)
+
+def get_compte_actif(request):
+    """Comme get_user_compte mais lève Compte.DoesNotExist si aucun compte actif"""
+    compte = get_user_compte(request)
+    if compte is None:
+        raise Compte.DoesNotExist('Aucun compte actif pour cet utilisateur')
+    return compte
 
 def get_user_livreur(request):
     """Récupérer le livreur associé au compte utilisateur"""
     compte = get_user_compte(request)
-    if not compte:
-        return None
-    try:
-        livreur = Livreur.objects.get(compte=compte, actif=True)
-        return livreur
-    except Livreur.DoesNotExist:
-        return None
-    except Exception as e:
-        print(f"[ERREUR] Erreur lors de la récupération du livreur: {e}")
-        return None
+    memo = getattr(request, '_livreur_resolu', None)
+    if memo is not None and memo[0] == (compte.pk if compte else None):
+        return memo[1]
+
+    livreur = None
+    if compte:
+        try:
+            livreur = Livreur.objects.filter(compte=compte, actif=True).first()
+        except Exception as e:
+            logger.error("Erreur lors de la récupération du livreur: %s", e)
+            livreur = None
+
+    request._livreur_resolu = (compte.pk if compte else None, livreur)
+    return livreur
 
 # Matrice des permissions par module et fonctionnalité
 PERMISSIONS = {
@@ -2,6 +2,8 @@
 Vues pour la défacturation des ventes
 """
 
+import logging
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -12,6 +14,11 @@ from django.conf import settings
 from decimal import Decimal
 from .models import FactureVente, LigneFactureVente, MouvementStock, Article
 from .views import get_user_agence
+from .compteurs_caisse import comptabiliser_vente
+from .stock_utils import appliquer_variation
+from .ventes_journalieres import retirer as retirer_ventes_jour
+
+logger = logging.getLogger(__name__)
 
 
 @login_required
@@ -34,29 +41,26 @@ def defacturer_vente(request, facture_id):
         
         # Utiliser une transaction pour s'assurer de la cohérence
         with transaction.atomic():
-            print(f"[DÉFACTURATION] Début de la défacturation de la facture {facture.numero_ticket}")
+            logger.debug("[DÉFACTURATION] Début de la défacturation de la facture %s", facture.numero_ticket)
             
-            # 1. Récupérer toutes les lignes de la facture
-            lignes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"[DÉFACTURATION] {lignes.count()} lignes à traiter")
+            # 1. Récupérer toutes les lignes de la facture (par article : ordre fixe des mises à jour de stock)
+            lignes = LigneFactureVente.objects.filter(facture_vente=facture).select_related('article').order_by(
+                'article_id', 'id'
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[DÉFACTURATION] %s lignes à traiter", lignes.count())
             
             # 2. Remettre les produits en stock et créer des mouvements inversés
             for ligne in lignes:
                 article = ligne.article
                 quantite_a_remettre = ligne.quantite
                 
-                print(f"[DÉFACTURATION] Traitement de {article.designation} - Quantité: {quantite_a_remettre}")
-                
-                # Sauvegarder l'ancien stock
-                ancien_stock = article.stock_actuel
+                logger.debug("[DÉFACTURATION] Traitement de %s - Quantité: %s", article.designation, quantite_a_remettre)
                 
-                # Remettre en stock
-                article.stock_actuel += quantite_a_remettre
-                # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                article.suivi_stock = True
-                article.save()
+                # Remettre en stock (mise à jour atomique, suivi de stock activé)
+                ancien_stock, _ = appliquer_variation(article, quantite_a_remettre)
                 
-                print(f"[DÉFACTURATION] Stock remis: {ancien_stock} → {article.stock_actuel} (+{quantite_a_remettre})")
+                logger.debug("[DÉFACTURATION] Stock remis: %s → %s (+%s)", ancien_stock, article.stock_actuel, quantite_a_remettre)
                 
                 # Créer un mouvement de stock inverse (entrée)
                 MouvementStock.objects.create(
@@ -75,7 +79,7 @@ def defacturer_vente(request, facture_id):
                     commentaire=f"Défacturation - Retour stock pour facture {facture.numero_ticket}"
                 )
                 
-                print(f"[DÉFACTURATION] Mouvement de retour créé pour {article.designation}")
+                logger.debug("[DÉFACTURATION] Mouvement de retour créé pour %s", article.designation)
             
             # 3. Marquer la facture comme annulée (au lieu de la supprimer pour l'historique)
             # Option 1: Ajouter un champ 'annulee' au modèle (recommandé)
@@ -84,14 +88,16 @@ def defacturer_vente(request, facture_id):
             # Pour l'instant, on va supprimer la facture et ses lignes
             # mais on garde les mouvements de stock pour la traçabilité
             
-            # Supprimer les lignes de facture
+            # Retirer la vente des ventes journalières puis supprimer les lignes de facture
+            retirer_ventes_jour(facture, lignes)
             lignes.delete()
-            print(f"[DÉFACTURATION] Lignes de facture supprimées")
+            logger.debug("[DÉFACTURATION] Lignes de facture supprimées")
             
-            # Supprimer la facture
+            # Supprimer la facture et la retirer des compteurs de sa session de caisse
             numero_ticket = facture.numero_ticket
+            comptabiliser_vente(facture.session_caisse_id, -facture.nette_a_payer, tickets=-1)
             facture.delete()
-            print(f"[DÉFACTURATION] Facture {numero_ticket} supprimée")
+            logger.debug("[DÉFACTURATION] Facture %s supprimée", numero_ticket)
             
             messages.success(request, f'Facture {numero_ticket} défacturée avec succès. Les produits ont été remis en stock.')
             
@@ -99,9 +105,7 @@ def defacturer_vente(request, facture_id):
         messages.error(request, 'Facture non trouvée.')
         return redirect('detail_factures')
     except Exception as e:
-        print(f"[ERREUR] Erreur lors de la défacturation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur lors de la défacturation: %s", e)
         messages.error(request, f'Erreur lors de la défacturation: {str(e)}')
         return redirect('detail_factures')
     
@@ -111,7 +115,7 @@ def defacturer_vente(request, facture_id):
 @login_required
 def defacturer_ligne_vente(request, facture_id, ligne_id):
     """Défacturer un article spécifique d'une facture de vente"""
-    print(f"[DÉFACTURATION PARTIELLE] Début - facture_id: {facture_id}, ligne_id: {ligne_id}")
+    logger.debug("[DÉFACTURATION PARTIELLE] Début - facture_id: %s, ligne_id: %s", facture_id, ligne_id)
     
     if request.method != 'POST':
         messages.error(request, 'Méthode non autorisée.')
@@ -125,14 +129,14 @@ def defacturer_ligne_vente(request, facture_id, ligne_id):
     
     try:
         facture = FactureVente.objects.get(id=facture_id, agence=agence)
-        print(f"[DÉFACTURATION PARTIELLE] Facture trouvée: {facture.numero_ticket}")
+        logger.debug("[DÉFACTURATION PARTIELLE] Facture trouvée: %s", facture.numero_ticket)
         
         ligne = LigneFactureVente.objects.get(id=ligne_id, facture_vente=facture)
-        print(f"[DÉFACTURATION PARTIELLE] Ligne trouvée: {ligne.id} - {ligne.designation} - Quantité: {ligne.quantite}")
+        logger.debug("[DÉFACTURATION PARTIELLE] Ligne trouvée: %s - %s - Quantité: %s", ligne.id, ligne.designation, ligne.quantite)
         
         # Vérifier qu'il y a bien plusieurs lignes (sinon on ne devrait pas être ici)
         total_lignes = LigneFactureVente.objects.filter(facture_vente=facture).count()
-        print(f"[DÉFACTURATION PARTIELLE] Nombre total de lignes dans la facture: {total_lignes}")
+        logger.debug("[DÉFACTURATION PARTIELLE] Nombre total de lignes dans la facture: %s", total_lignes)
         
     except FactureVente.DoesNotExist:
         messages.error(request, 'Facture non trouvée.')
@@ -148,11 +152,7 @@ def defacturer_ligne_vente(request, facture_id, ligne_id):
             ligne_designation = ligne.designation
             
             if article:
-                ancien_stock = article.stock_actuel
-                article.stock_actuel += quantite
-                # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                article.suivi_stock = True
-                article.save()
+                ancien_stock, _ = appliquer_variation(article, quantite)
                 
                 MouvementStock.objects.create(
                     article=article,
@@ -170,14 +170,17 @@ def defacturer_ligne_vente(request, facture_id, ligne_id):
                     commentaire=f"Défacturation partielle - {article.designation if article else ligne_designation}"
                 )
             
+            retirer_ventes_jour(facture, [ligne])
             ligne.delete()
-            print(f"[DÉFACTURATION PARTIELLE] Ligne {ligne_id} supprimée avec succès")
+            logger.debug("[DÉFACTURATION PARTIELLE] Ligne %s supprimée avec succès", ligne_id)
             
             lignes_restantes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"[DÉFACTURATION PARTIELLE] Lignes restantes après suppression: {lignes_restantes.count()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[DÉFACTURATION PARTIELLE] Lignes restantes après suppression: %s", lignes_restantes.count())
             
             if not lignes_restantes.exists():
                 numero_ticket = facture.numero_ticket
+                comptabiliser_vente(facture.session_caisse_id, -facture.nette_a_payer, tickets=-1)
                 facture.delete()
                 messages.success(
                     request,
@@ -188,6 +191,7 @@ def defacturer_ligne_vente(request, facture_id, ligne_id):
             total_rest = lignes_restantes.aggregate(total=Sum('prix_total'))['total'] or Decimal('0')
             remise = Decimal(str(facture.remise or 0))
             nouvelle_nette = max(Decimal('0'), total_rest - remise)
+            comptabiliser_vente(facture.session_caisse_id, nouvelle_nette - facture.nette_a_payer, tickets=0)
             facture.nette_a_payer = nouvelle_nette
             if facture.montant_regler is not None:
                 facture.rendu = max(Decimal('0'), Decimal(str(facture.montant_regler)) - nouvelle_nette)
@@ -200,7 +204,7 @@ def defacturer_ligne_vente(request, facture_id, ligne_id):
             return redirect('detail_factures')
     
     except Exception as e:
-        print(f"[ERREUR] Défacturation partielle: {e}")
+        logger.error("Défacturation partielle: %s", e)
         messages.error(request, f'Erreur lors de la défacturation de la ligne: {str(e)}')
         return redirect('defacturer_confirmation', facture_id=facture_id)
 
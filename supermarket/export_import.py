@@ -42,6 +42,7 @@ from .models import (
     MouvementStock, InventaireStock, StatistiqueVente, TypeVente,
     PlanComptable, PlanTiers, CodeJournaux, TauxTaxe, DocumentVente
 )
+from .ventes_journalieres import reconstruire as reconstruire_ventes_journalieres
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -1227,5 +1228,11 @@ def import_data(data, agence_id=None, clear_existing=False):
         stats['errors'].append(f"Erreur générale lors de l'import: {str(e)}")
         raise
     
+    # Ventes journalières des agences qui ont reçu des factures, recalculées à partir des lignes importées
+    if facture_vente_map:
+        reconstruire_ventes_journalieres(agences=set(
+            FactureVente.objects.filter(id__in=facture_vente_map.values()).values_list('agence_id', flat=True)
+        ))
+    
     return stats
 
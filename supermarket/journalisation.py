@@ -0,0 +1,86 @@
+"""
+Journalisation de l'application (remplace les print() des vues)
+
+Chaque module déclare logger = logging.getLogger(__name__) et passe les
+valeurs en arguments : logger.debug("Facture %s", numero). Le message n'est
+formaté que si le niveau est actif ; les traces dont les arguments coûtent
+quelque chose à calculer (count(), len(), ...) sont en plus protégées par
+logger.isEnabledFor(). En production (WARNING) les traces de debug des
+chemins de vente ne coûtent donc qu'un test de niveau.
+
+Réglages (variables d'environnement lues dans settings.py) :
+- LOG_LEVEL : niveau par défaut des loggers supermarket (WARNING)
+- LOG_LEVELS : niveaux par module, ex. "supermarket.views=DEBUG,supermarket.models=INFO"
+- LOG_SAMPLING : fraction des messages DEBUG / INFO conservés (1.0 = tous) ;
+  WARNING et au-delà ne sont jamais échantillonnés
+"""
+import logging
+import random
+
+
+class EchantillonnageFilter(logging.Filter):
+    """Ne laisser passer qu'une fraction des messages sous WARNING"""
+
+    def __init__(self, taux=1.0):
+        super().__init__()
+        self.taux = float(taux)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.taux >= 1:
+            return True
+        return random.random() < self.taux
+
+
+def niveaux_par_module(spec):
+    """'supermarket.views=DEBUG, supermarket.models=INFO' -> {'supermarket.views': 'DEBUG', ...}"""
+    niveaux = {}
+    for element in (spec or '').split(','):
+        if '=' not in element:
+            continue
+        module, niveau = element.split('=', 1)
+        if module.strip() and niveau.strip():
+            niveaux[module.strip()] = niveau.strip().upper()
+    return niveaux
+
+
+def configuration_logging(niveau='WARNING', niveaux_modules='', echantillonnage=1.0):
+    """Dictionnaire LOGGING : console, niveau par défaut pour supermarket, surcharges par module"""
+    loggers = {
+        'django': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+        'supermarket': {
+            'handlers': ['console'],
+            'level': niveau.upper(),
+            'propagate': False,
+        },
+    }
+    for module, niveau_module in niveaux_par_module(niveaux_modules).items():
+        # Les sous-loggers propagent vers 'supermarket' (et donc vers sa console)
+        loggers.setdefault(module, {})['level'] = niveau_module
+
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': {
+            'echantillonnage': {
+                '()': 'supermarket.journalisation.EchantillonnageFilter',
+                'taux': echantillonnage,
+            },
+        },
+        'formatters': {
+            'standard': {
+                'format': '{levelname} {asctime} {name} {message}',
+                'style': '{',
+            },
+        },
+        'handlers': {
+            'console': {
+                'class': 'logging.StreamHandler',
+                'formatter': 'standard',
+                'filters': ['echantillonnage'],
+            },
+        },
+        'loggers': loggers,
+    }
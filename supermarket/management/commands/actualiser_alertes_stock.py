@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from supermarket.alertes_stock import reconstruire
+from supermarket.models import Agence
+
+
+class Command(BaseCommand):
+    help = 'Recalculer l\'ensemble des articles en stock d\'alerte ou en rupture (après des modifications de masse)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, default=None, help='Id de l\'agence (toutes par défaut)')
+
+    def handle(self, *args, **options):
+        agences = None
+        if options['agence'] is not None:
+            agences = Agence.objects.filter(pk=options['agence'])
+            if not agences.exists():
+                raise CommandError(f"Agence {options['agence']} introuvable")
+
+        chrono = time.perf_counter()
+        changements = reconstruire(agences)
+        self.stdout.write(self.style.SUCCESS(
+            f'{changements} alertes de stock modifiées en {time.perf_counter() - chrono:.1f} s'
+        ))
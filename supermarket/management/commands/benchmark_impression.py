@@ -0,0 +1,100 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from supermarket.models import Agence, Famille, Article, Client, Caisse, FactureVente, LigneFactureVente
+from supermarket.ticket_escpos import invalider_vente, logo_raster, ticket_vente
+from supermarket.vente_utils import enregistrer_vente
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de l\'impression des tickets de caisse (tickets/seconde : HTML, ESC/POS, réimpression)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=200, help='Nombre de tickets imprimés par mode')
+        parser.add_argument('--lignes', type=int, default=15, help='Nombre de lignes par ticket')
+
+    def _html(self, facture_id, agence):
+        facture = FactureVente.objects.select_related('client').get(pk=facture_id, agence=agence)
+        lignes = list(LigneFactureVente.objects.filter(facture_vente=facture).values(
+            'designation', 'quantite', 'prix_unitaire', 'prix_total'
+        ))
+        return render_to_string('supermarket/caisse/facture_impression.html', {
+            'facture': {
+                'numero_ticket': facture.numero_ticket,
+                'date': facture.date.strftime('%d/%m/%Y'),
+                'heure': facture.heure.strftime('%H:%M'),
+                'nette_a_payer': facture.nette_a_payer,
+                'montant_regler': facture.montant_regler,
+                'rendu': facture.rendu,
+                'remise': facture.remise,
+                'nom_vendeuse': facture.nom_vendeuse,
+                'client_nom': facture.client.intitule,
+                'caisse_numero': 'CAISSE001',
+                'lignes': lignes,
+            },
+            'agence': agence,
+        })
+
+    def _mesurer(self, libelle, factures, imprimer):
+        debut = time.perf_counter()
+        for facture_id in factures:
+            imprimer(facture_id)
+        duree = time.perf_counter() - debut
+        self.stdout.write(f'{libelle:<28} {len(factures) / duree:>12.0f}')
+
+    def handle(self, *args, **options):
+        nombre = options['tickets']
+        taille = options['lignes']
+
+        agence = Agence.objects.create(nom_agence='BENCHMARK IMPRESSION', adresse='-')
+        famille = Famille.objects.create(code=f'BENCH{agence.pk}', intitule='Benchmark', unite_vente='Unité')
+        try:
+            client = Client.objects.create(
+                intitule='Client Benchmark', adresse='-', telephone='-', email='', agence=agence
+            )
+            caisse = Caisse.objects.create(
+                numero_caisse=f'BENCH{agence.pk}', nom_caisse='Caisse Benchmark', agence=agence
+            )
+            articles = Article.objects.bulk_create([
+                Article(
+                    reference_article=f'BENCH{agence.pk}-{i:05d}',
+                    designation=f'Article benchmark {i}',
+                    categorie=famille,
+                    conditionnement='Paquet',
+                    prix_achat=Decimal('100'),
+                    dernier_prix_achat=Decimal('100'),
+                    unite_vente='Unité',
+                    prix_vente=Decimal('150'),
+                    stock_actuel=Decimal('1000000'),
+                    agence=agence,
+                )
+                for i in range(taille)
+            ])
+            lignes = [
+                {'article_id': a.id, 'designation': a.designation, 'quantite': 2,
+                 'prix_unitaire': 150, 'prix_total': 300}
+                for a in articles
+            ]
+            factures = [
+                enregistrer_vente(agence, caisse, client, lignes, montant_regler=10000).pk
+                for _ in range(nombre)
+            ]
+            logo_raster()
+
+            def escpos_froid(facture_id):
+                invalider_vente(facture_id)
+                ticket_vente(facture_id, agence)
+
+            self.stdout.write(f'{"Mode":<28} {"tickets/s":>12}')
+            self._mesurer('HTML (gabarit + requêtes)', factures, lambda f: self._html(f, agence))
+            self._mesurer('ESC/POS sans cache', factures, escpos_froid)
+            self._mesurer('ESC/POS réimpression', factures, lambda f: ticket_vente(f, agence))
+            self._mesurer('ESC/POS duplicata', factures, lambda f: ticket_vente(f, agence, duplicata=True))
+        finally:
+            for facture_id in FactureVente.objects.filter(agence=agence).values_list('id', flat=True):
+                invalider_vente(facture_id)
+            agence.delete()
+            famille.delete()
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client as ClientHttp
+from django.urls import reverse
+
+from supermarket.models import Agence, Famille, Article, Client, Caisse, Compte, Employe
+
+
+class Command(BaseCommand):
+    help = 'Benchmark du coût de la journalisation sur enregistrer_facture et dashboard_kpis_api (DEBUG vs WARNING)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=50, help='Nombre de requêtes par vue et par niveau')
+        parser.add_argument('--sortie', default=os.devnull,
+                            help='Fichier recevant les traces en DEBUG (équivalent des anciens print)')
+
+    def handle(self, *args, **options):
+        nb = options['requetes']
+        logger = logging.getLogger('supermarket')
+        niveau_initial, handlers_initiaux = logger.level, list(logger.handlers)
+
+        agence = Agence.objects.create(nom_agence='BENCHMARK LOGS', adresse='-')
+        famille = Famille.objects.create(code=f'LOGS{agence.pk}', intitule='Benchmark', unite_vente='Unité')
+        user = User.objects.create_user(username=f'benchmark_logs_{agence.pk}', password='benchmark')
+        sortie = open(options['sortie'], 'a', encoding='utf-8')
+        try:
+            compte = Compte.objects.create(
+                user=user, numero_compte=f'LOGS{agence.pk}', type_compte='caissier', nom='Benchmark',
+                prenom='Logs', telephone='-', email='benchmark@example.com', actif=True, agence=agence,
+            )
+            Employe.objects.create(compte=compte, numero_employe=f'LOGS{agence.pk}', poste='caissier',
+                                   date_embauche='2024-01-01')
+            Client.objects.create(intitule='Client Général', adresse='-', telephone='-', email='', agence=agence)
+            Caisse.objects.create(numero_caisse=f'LOGS{agence.pk}', nom_caisse='Caisse Benchmark',
+                                  agence=agence, statut='active')
+            articles = Article.objects.bulk_create([
+                Article(
+                    reference_article=f'LOGS{agence.pk}-{i:03d}',
+                    designation=f'Article logs {i}',
+                    categorie=famille,
+                    conditionnement='Paquet',
+                    prix_achat=Decimal('100'),
+                    dernier_prix_achat=Decimal('100'),
+                    unite_vente='Unité',
+                    prix_vente=Decimal('150'),
+                    stock_actuel=Decimal('1000000'),
+                    agence=agence,
+                )
+                for i in range(10)
+            ])
+            facture_data = json.dumps({
+                'lignes': [
+                    {'article_id': a.id, 'designation': a.designation, 'quantite': 1,
+                     'prix_unitaire': 150, 'prix_total': 150}
+                    for a in articles
+                ],
+                'montant_regler': 1500,
+            })
+
+            http = ClientHttp()
+            http.force_login(user)
+
+            def vente():
+                http.post(reverse('enregistrer_facture'), {'facture_data': facture_data})
+
+            def kpis():
+                http.get(reverse('dashboard_kpis_api'))
+
+            def mesurer(requete):
+                requete()
+                debut = time.perf_counter()
+                for _ in range(nb):
+                    requete()
+                return (time.perf_counter() - debut) * 1000 / nb
+
+            handler = logging.StreamHandler(sortie)
+            resultats = {}
+            for niveau in ('DEBUG', 'WARNING'):
+                logger.handlers = [handler]
+                logger.setLevel(niveau)
+                resultats[niveau] = {'enregistrer_facture': mesurer(vente), 'dashboard_kpis_api': mesurer(kpis)}
+
+            self.stdout.write(f'{"Vue":<22} {"DEBUG ms":>10} {"WARNING ms":>12} {"Gain ms":>10}')
+            for vue in ('enregistrer_facture', 'dashboard_kpis_api'):
+                debug, warning = resultats['DEBUG'][vue], resultats['WARNING'][vue]
+                self.stdout.write(f'{vue:<22} {debug:>10.2f} {warning:>12.2f} {debug - warning:>10.2f}')
+        finally:
+            logger.handlers = handlers_initiaux
+            logger.setLevel(niveau_initial)
+            sortie.close()
+            user.delete()
+            agence.delete()
+            famille.delete()
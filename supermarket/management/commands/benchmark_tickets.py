@@ -0,0 +1,68 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from supermarket.models import Agence
+from supermarket.ticket_utils import allouer_numero_ticket
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de l\'attribution des numéros de ticket avec N caisses en parallèle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--caisses', type=int, default=8, help='Nombre de caisses simultanées')
+        parser.add_argument('--tickets', type=int, default=200, help='Nombre de tickets par caisse')
+
+    def handle(self, *args, **options):
+        nb_caisses = options['caisses']
+        nb_tickets = options['tickets']
+
+        agence = Agence.objects.create(nom_agence='BENCHMARK TICKETS', adresse='-')
+        try:
+            # Coût d'une attribution (hors création du compteur du jour)
+            allouer_numero_ticket(agence)
+            with CaptureQueriesContext(connection) as ctx:
+                allouer_numero_ticket(agence)
+            self.stdout.write(f'Requêtes par ticket: {len(ctx.captured_queries)}')
+
+            numeros = []
+            erreurs = []
+            verrou = threading.Lock()
+
+            def caisse():
+                obtenus = []
+                try:
+                    for _ in range(nb_tickets):
+                        obtenus.append(allouer_numero_ticket(agence))
+                except Exception as e:
+                    with verrou:
+                        erreurs.append(str(e))
+                finally:
+                    connection.close()
+                with verrou:
+                    numeros.extend(obtenus)
+
+            threads = [threading.Thread(target=caisse) for _ in range(nb_caisses)]
+            debut = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            duree = time.perf_counter() - debut
+
+            doublons = len(numeros) - len(set(numeros))
+            self.stdout.write(f'Caisses: {nb_caisses} - tickets attribués: {len(numeros)} en {duree:.2f}s')
+            self.stdout.write(f'Débit: {len(numeros) / duree:.0f} tickets/s')
+            self.stdout.write(f'Doublons: {doublons} - erreurs: {len(erreurs)}')
+            for erreur in erreurs[:5]:
+                self.stdout.write(self.style.ERROR(f'  {erreur}'))
+
+            if doublons or erreurs:
+                self.stdout.write(self.style.ERROR('Benchmark en échec'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Aucun doublon'))
+        finally:
+            agence.delete()
@@ -0,0 +1,69 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from supermarket.models import Agence, Famille, Article, Client, Caisse
+from supermarket.vente_utils import enregistrer_vente
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de l\'enregistrement d\'une vente (requêtes et ms par taille de panier)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailles', default='1,10,40,100', help='Tailles de panier séparées par des virgules')
+        parser.add_argument('--repetitions', type=int, default=20, help='Nombre de ventes par taille')
+
+    def handle(self, *args, **options):
+        tailles = [int(t) for t in options['tailles'].split(',') if t.strip()]
+        repetitions = options['repetitions']
+
+        agence = Agence.objects.create(nom_agence='BENCHMARK VENTE', adresse='-')
+        famille = Famille.objects.create(code=f'BENCH{agence.pk}', intitule='Benchmark', unite_vente='Unité')
+        try:
+            client = Client.objects.create(
+                intitule='Client Benchmark', adresse='-', telephone='-', email='', agence=agence
+            )
+            caisse = Caisse.objects.create(
+                numero_caisse=f'BENCH{agence.pk}', nom_caisse='Caisse Benchmark', agence=agence
+            )
+            articles = Article.objects.bulk_create([
+                Article(
+                    reference_article=f'BENCH{agence.pk}-{i:05d}',
+                    designation=f'Article benchmark {i}',
+                    categorie=famille,
+                    conditionnement='Paquet',
+                    prix_achat=Decimal('100'),
+                    dernier_prix_achat=Decimal('100'),
+                    unite_vente='Unité',
+                    prix_vente=Decimal('150'),
+                    stock_actuel=Decimal('1000000'),
+                    agence=agence,
+                )
+                for i in range(max(tailles))
+            ])
+
+            self.stdout.write(f'{"Panier":>8} {"Requêtes":>10} {"ms/vente":>10}')
+            for taille in tailles:
+                lignes = [
+                    {
+                        'article_id': article.id,
+                        'designation': article.designation,
+                        'quantite': 1,
+                        'prix_unitaire': 150,
+                        'prix_total': 150,
+                    }
+                    for article in articles[:taille]
+                ]
+                with CaptureQueriesContext(connection) as ctx:
+                    enregistrer_vente(agence, caisse, client, lignes)
+                debut = time.perf_counter()
+                for _ in range(repetitions):
+                    enregistrer_vente(agence, caisse, client, lignes)
+                ms = (time.perf_counter() - debut) * 1000 / repetitions
+                self.stdout.write(f'{taille:>8} {len(ctx.captured_queries):>10} {ms:>10.1f}')
+        finally:
+            agence.delete()
+            famille.delete()
@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from supermarket.models import Agence, MouvementStock
+from supermarket.stock_journalier import figer, hier
+
+
+def _date(valeur):
+    try:
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Date invalide : {valeur} (format AAAA-MM-JJ)')
+
+
+class Command(BaseCommand):
+    help = 'Figer les stocks de clôture journaliers (état d\'inventaire) des jours terminés encore manquants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, default=None, help='Id de l\'agence (toutes par défaut)')
+        parser.add_argument('--debut', default=None,
+                            help='Premier jour AAAA-MM-JJ (par défaut le jour du premier mouvement de l\'agence)')
+        parser.add_argument('--fin', default=None, help='Dernier jour AAAA-MM-JJ (par défaut hier)')
+
+    def handle(self, *args, **options):
+        agences = Agence.objects.order_by('id_agence')
+        if options['agence'] is not None:
+            agences = agences.filter(pk=options['agence'])
+            if not agences.exists():
+                raise CommandError(f"Agence {options['agence']} introuvable")
+        fin = _date(options['fin']) if options['fin'] else hier()
+
+        for agence in agences:
+            if options['debut']:
+                debut = _date(options['debut'])
+            else:
+                premier = MouvementStock.objects.filter(agence=agence).aggregate(Min('date_mouvement'))
+                if premier['date_mouvement__min'] is None:
+                    self.stdout.write(f'{agence.nom_agence} : aucun mouvement')
+                    continue
+                debut = timezone.localdate(premier['date_mouvement__min'])
+
+            chrono = time.perf_counter()
+            lignes = figer(agence, debut, fin)
+            self.stdout.write(self.style.SUCCESS(
+                f'{agence.nom_agence} : {lignes} stocks journaliers écrits du {debut} au {fin} '
+                f'en {time.perf_counter() - chrono:.1f} s'
+            ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from supermarket.models import Agence
+from supermarket.statistiques_vente import rafraichir
+
+
+class Command(BaseCommand):
+    help = 'Rafraîchir les statistiques de vente par période (jour, semaine, mois) depuis les ventes journalières'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, default=None, help='Id de l\'agence (toutes par défaut)')
+        parser.add_argument('--complet', action='store_true', help='Tout recalculer au lieu de repartir du filigrane')
+
+    def handle(self, *args, **options):
+        agences = Agence.objects.order_by('id_agence')
+        if options['agence'] is not None:
+            agences = agences.filter(pk=options['agence'])
+            if not agences.exists():
+                raise CommandError(f"Agence {options['agence']} introuvable")
+
+        for agence in agences:
+            chrono = time.perf_counter()
+            repris = rafraichir(agence, complet=options['complet'])
+            detail = 'recalcul complet' if repris is None else f'{repris} jours d\'article repris'
+            self.stdout.write(self.style.SUCCESS(
+                f'{agence.nom_agence} : {detail} en {time.perf_counter() - chrono:.1f} s'
+            ))
@@ -0,0 +1,57 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from supermarket.models import Agence
+from supermarket.rapprochement_stock import TOLERANCE, corriger, ecarts
+
+
+class Command(BaseCommand):
+    help = 'Comparer le stock actuel des articles au registre des mouvements (et corriger par ajustements)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, default=None, help='Id de l\'agence (toutes par défaut)')
+        parser.add_argument('--csv', default=None, help='Écrire le rapport des écarts dans ce fichier CSV')
+        parser.add_argument('--lignes', type=int, default=20, help='Écarts affichés par agence')
+        parser.add_argument('--corriger', action='store_true',
+                            help='Écrire un mouvement d\'ajustement par écart (le stock actuel fait foi)')
+
+    def handle(self, *args, **options):
+        agences = None
+        if options['agence'] is not None:
+            agences = Agence.objects.filter(pk=options['agence'])
+            if not agences.exists():
+                raise CommandError(f"Agence {options['agence']} introuvable")
+
+        chrono = time.perf_counter()
+        resultat = ecarts(agences)
+        duree = time.perf_counter() - chrono
+
+        par_agence = {}
+        for ligne in resultat:
+            par_agence.setdefault(ligne['agence__nom_agence'], []).append(ligne)
+        for nom_agence, lignes in par_agence.items():
+            self.stdout.write(self.style.WARNING(f'{nom_agence} : {len(lignes)} articles en écart'))
+            self.stdout.write(f'  {"Référence":<20} {"Actuel":>12} {"Registre":>12} {"Écart":>12}')
+            for ligne in lignes[:options['lignes']]:
+                self.stdout.write(
+                    f"  {ligne['reference_article']:<20} {ligne['stock_actuel']:>12} "
+                    f"{ligne['stock_attendu']:>12} {ligne['ecart']:>12}"
+                )
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as fichier:
+                ecriture = csv.writer(fichier, delimiter=';')
+                ecriture.writerow(['Agence', 'Référence', 'Désignation', 'Stock actuel', 'Stock registre',
+                                   'Écart', 'Mouvements'])
+                for ligne in resultat:
+                    ecriture.writerow([
+                        ligne['agence__nom_agence'], ligne['reference_article'], ligne['designation'],
+                        ligne['stock_actuel'], ligne['stock_attendu'], ligne['ecart'], ligne['nombre_mouvements'],
+                    ])
+            self.stdout.write(f"Rapport écrit dans {options['csv']}")
+
+        self.stdout.write(f'{len(resultat)} écarts (tolérance {TOLERANCE}) trouvés en {duree:.2f} s')
+        if options['corriger'] and resultat:
+            self.stdout.write(self.style.SUCCESS(f'{corriger(resultat)} mouvements d\'ajustement écrits'))
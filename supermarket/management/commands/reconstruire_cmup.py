@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from supermarket.cmup import ARTICLES_PAR_PAGE, reconstruire
+from supermarket.models import Agence
+
+
+class Command(BaseCommand):
+    help = 'Recalculer le coût moyen unitaire pondéré (CMUP) de tout l\'historique des mouvements de stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, default=None, help='Id de l\'agence (toutes par défaut)')
+        parser.add_argument('--articles-par-page', type=int, default=ARTICLES_PAR_PAGE,
+                            help='Articles recalculés par requête de lecture')
+
+    def handle(self, *args, **options):
+        agences = Agence.objects.order_by('id_agence')
+        if options['agence'] is not None:
+            agences = agences.filter(pk=options['agence'])
+            if not agences.exists():
+                raise CommandError(f"Agence {options['agence']} introuvable")
+
+        for agence in agences:
+            debut = time.perf_counter()
+
+            def progression(fait, total):
+                self.stdout.write(f'  {agence.nom_agence} : {fait}/{total} articles')
+
+            nombre = reconstruire(agence, options['articles_par_page'], progression)
+            self.stdout.write(self.style.SUCCESS(
+                f'{agence.nom_agence} : {nombre} mouvements revalorisés en {time.perf_counter() - debut:.1f} s'
+            ))
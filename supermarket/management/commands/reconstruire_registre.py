@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from supermarket.models import Agence
+from supermarket.registre_stock import TAILLE_LOT, premier_jour, reconstruire_registre
+
+
+def _date(valeur):
+    try:
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Date invalide : {valeur} (format AAAA-MM-JJ)')
+
+
+class Command(BaseCommand):
+    help = 'Reconstruire les mouvements de stock d\'une agence à partir des ventes, achats, transferts et inventaires'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agence', type=int, required=True, help='Id de l\'agence')
+        parser.add_argument('--debut', default=None,
+                            help='Premier jour AAAA-MM-JJ (par défaut le jour de la première vente ou du premier achat)')
+        parser.add_argument('--fin', default=None, help='Dernier jour AAAA-MM-JJ (par défaut aujourd\'hui)')
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help='Mouvements écrits par requête')
+
+    def handle(self, *args, **options):
+        try:
+            agence = Agence.objects.get(pk=options['agence'])
+        except Agence.DoesNotExist:
+            raise CommandError(f"Agence {options['agence']} introuvable")
+
+        fin = _date(options['fin']) if options['fin'] else timezone.localdate()
+        debut = _date(options['debut']) if options['debut'] else premier_jour(agence)
+        if debut is None:
+            self.stdout.write(f'{agence.nom_agence} : aucune pièce')
+            return
+        if debut > fin:
+            raise CommandError('La date de début est postérieure à la date de fin')
+
+        chrono = time.perf_counter()
+
+        def progression(ecrits):
+            self.stdout.write(f'  {ecrits} mouvements écrits ({time.perf_counter() - chrono:.1f} s)')
+
+        resultat = reconstruire_registre(agence, debut, fin, options['taille_lot'], progression)
+        self.stdout.write(self.style.SUCCESS(
+            f"{agence.nom_agence} du {debut} au {fin} : {resultat['supprimes']} mouvements remplacés par "
+            f"{resultat['crees']}, {resultat['conserves']} conservés, en {time.perf_counter() - chrono:.1f} s"
+        ))
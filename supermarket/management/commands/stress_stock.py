@@ -0,0 +1,108 @@
+import multiprocessing
+import time
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from supermarket.models import Agence, Famille, Article, Client, Caisse, FactureVente, MouvementStock
+
+
+def _vendre(parametres):
+    """Processus caisse : vendre le même article en boucle ; retourne (vendues, refusées, erreurs)"""
+    from supermarket.vente_utils import VenteInvalide, enregistrer_vente
+
+    agence_id, caisse_id, client_id, article_id, ventes, quantite = parametres
+    agence = Agence.objects.get(pk=agence_id)
+    caisse = Caisse.objects.get(pk=caisse_id)
+    client = Client.objects.get(pk=client_id)
+    lignes = [{'article_id': article_id, 'quantite': quantite,
+               'prix_unitaire': 150, 'prix_total': 150 * quantite}]
+
+    vendues = refusees = erreurs = 0
+    for _ in range(ventes):
+        for essai in range(5):
+            try:
+                enregistrer_vente(agence, caisse, client, lignes)
+                vendues += 1
+            except VenteInvalide:
+                refusees += 1
+            except OperationalError:
+                # Base verrouillée (SQLite) : la vente n'a pas été écrite, on réessaie
+                if essai < 4:
+                    time.sleep(0.05 * (essai + 1))
+                    continue
+                erreurs += 1
+            break
+    connections.close_all()
+    return vendues, refusees, erreurs
+
+
+class Command(BaseCommand):
+    help = 'Test de charge multi-processus des sorties de stock (aucune mise à jour perdue, pas de survente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processus', type=int, default=4, help='Nombre de caisses simultanées')
+        parser.add_argument('--ventes', type=int, default=50, help='Ventes par caisse')
+        parser.add_argument('--stock', type=int, default=None,
+                            help='Stock initial (par défaut 3/4 des ventes demandées, pour tester le refus de survente)')
+
+    def handle(self, *args, **options):
+        processus = options['processus']
+        ventes = options['ventes']
+        stock_initial = Decimal(options['stock'] if options['stock'] is not None else processus * ventes * 3 // 4)
+
+        agence = Agence.objects.create(nom_agence='STRESS STOCK', adresse='-')
+        famille = Famille.objects.create(code=f'STRESS{agence.pk}', intitule='Stress', unite_vente='Unité')
+        try:
+            client = Client.objects.create(
+                intitule='Client Stress', adresse='-', telephone='-', email='', agence=agence
+            )
+            caisse = Caisse.objects.create(
+                numero_caisse=f'STRESS{agence.pk}', nom_caisse='Caisse Stress', agence=agence
+            )
+            article = Article.objects.create(
+                reference_article=f'STRESS{agence.pk}',
+                designation='Article stress',
+                categorie=famille,
+                conditionnement='Paquet',
+                prix_achat=Decimal('100'),
+                dernier_prix_achat=Decimal('100'),
+                unite_vente='Unité',
+                prix_vente=Decimal('150'),
+                stock_actuel=stock_initial,
+                agence=agence,
+            )
+
+            # Les processus fils chargent Django (initializer) puis ouvrent leurs propres connexions
+            connections.close_all()
+            parametres = [(agence.pk, caisse.pk, client.pk, article.pk, ventes, 1)] * processus
+            debut = time.perf_counter()
+            with multiprocessing.get_context('spawn').Pool(processus, initializer=django.setup) as pool:
+                resultats = pool.map(_vendre, parametres)
+            duree = time.perf_counter() - debut
+
+            vendues = sum(r[0] for r in resultats)
+            refusees = sum(r[1] for r in resultats)
+            erreurs = sum(r[2] for r in resultats)
+            article.refresh_from_db()
+            factures = FactureVente.objects.filter(agence=agence).count()
+            mouvements = MouvementStock.objects.filter(article=article, type_mouvement='sortie').count()
+
+            self.stdout.write(
+                f'{processus} caisses x {ventes} ventes en {duree:.1f} s : {vendues} vendues, '
+                f'{refusees} refusées (stock épuisé), {erreurs} en erreur'
+            )
+            self.stdout.write(f'Stock : {stock_initial} -> {article.stock_actuel} (attendu {stock_initial - vendues})')
+
+            if article.stock_actuel != stock_initial - vendues:
+                raise CommandError('Mise à jour de stock perdue')
+            if article.stock_actuel < 0:
+                raise CommandError('Survente : stock négatif')
+            if factures != vendues or mouvements != vendues:
+                raise CommandError(f'{factures} factures et {mouvements} mouvements pour {vendues} ventes')
+            self.stdout.write(self.style.SUCCESS('Aucune mise à jour perdue, aucune survente'))
+        finally:
+            agence.delete()
+            famille.delete()
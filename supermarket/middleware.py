@@ -0,0 +1,23 @@
+"""
+Middlewares de l'application supermarket
+"""
+from .decorators import resoudre_compte
+
+
+class CompteUtilisateurMiddleware:
+    """
+    Résout le compte de l'utilisateur connecté (et son agence) une fois par
+    requête : request.compte et request.agence sont ensuite lus par les
+    décorateurs et les vues sans nouvelle requête SQL.
+
+    A placer après AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        compte = resoudre_compte(request)
+        request.compte = compte
+        request.agence = compte.agence if compte else None
+        return self.get_response(request)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0065_add_photo_to_suivi_commercial_action'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+            ],
+            options={
+                'verbose_name': 'Compteur de tickets',
+                'verbose_name_plural': 'Compteurs de tickets',
+                'ordering': ['-date'],
+                'unique_together': {('agence', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0066_compteurticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PanierCaisse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=100, verbose_name='Clé de session')),
+                ('type_vente', models.CharField(default='detail', max_length=50, verbose_name='Type de vente')),
+                ('remise', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Remise')),
+                ('montant_regler', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Montant réglé')),
+                ('date_modification', models.DateTimeField(auto_now=True, verbose_name='Date de modification')),
+                ('caisse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='supermarket.caisse', verbose_name='Caisse')),
+            ],
+            options={
+                'verbose_name': 'Panier de caisse',
+                'verbose_name_plural': 'Paniers de caisse',
+                'unique_together': {('session_key', 'caisse')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LignePanier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(blank=True, default='', max_length=50, verbose_name='Référence')),
+                ('designation', models.CharField(blank=True, default='', max_length=200, verbose_name='Désignation')),
+                ('quantite', models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='Quantité')),
+                ('prix_unitaire', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Prix unitaire')),
+                ('type_vente', models.CharField(default='detail', max_length=50, verbose_name='Type de vente')),
+                ('article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='supermarket.article', verbose_name='Article')),
+                ('panier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='supermarket.paniercaisse', verbose_name='Panier')),
+            ],
+            options={
+                'verbose_name': 'Ligne de panier',
+                'verbose_name_plural': 'Lignes de panier',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['panier', 'article', 'type_vente'], name='supermarket_panier__6eb9d1_idx')],
+            },
+        ),
+    ]
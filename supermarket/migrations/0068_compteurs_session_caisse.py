@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def initialiser_compteurs(apps, schema_editor):
+    """Compteurs des sessions encore ouvertes, calculés une fois à partir des factures existantes"""
+    SessionCaisse = apps.get_model('supermarket', 'SessionCaisse')
+    FactureVente = apps.get_model('supermarket', 'FactureVente')
+    FactureTemporaire = apps.get_model('supermarket', 'FactureTemporaire')
+    for session in SessionCaisse.objects.filter(statut='ouverte'):
+        ventes = FactureVente.objects.filter(session_caisse=session).aggregate(
+            total=Sum('nette_a_payer'), nombre=Count('id')
+        )
+        session.chiffre_affaires = ventes['total'] or 0
+        session.nombre_tickets = ventes['nombre']
+        session.tickets_attente = FactureTemporaire.objects.filter(session_caisse=session).count()
+        session.premiere_ouverture = session.date_ouverture
+        session.save(update_fields=['chiffre_affaires', 'nombre_tickets', 'tickets_attente', 'premiere_ouverture'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0067_paniercaisse'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessioncaisse',
+            name='chiffre_affaires',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires"),
+        ),
+        migrations.AddField(
+            model_name='sessioncaisse',
+            name='nombre_tickets',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tickets'),
+        ),
+        migrations.AddField(
+            model_name='sessioncaisse',
+            name='premiere_ouverture',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Première ouverture du jour'),
+        ),
+        migrations.AddField(
+            model_name='sessioncaisse',
+            name='tickets_attente',
+            field=models.PositiveIntegerField(default=0, verbose_name='Tickets en attente'),
+        ),
+        migrations.AddIndex(
+            model_name='sessioncaisse',
+            index=models.Index(fields=['agence', 'date_ouverture'], name='supermarket_agence__0dc7cc_idx'),
+        ),
+        migrations.RunPython(initialiser_compteurs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0068_compteurs_session_caisse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facturevente',
+            name='cle_idempotence',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name="Clé d'idempotence"),
+        ),
+        migrations.AlterUniqueTogether(
+            name='facturevente',
+            unique_together={('agence', 'cle_idempotence')},
+        ),
+    ]
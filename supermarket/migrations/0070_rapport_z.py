@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0069_cle_idempotence_facture_vente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RapportZ',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('nombre_factures', models.PositiveIntegerField(default=0, verbose_name='Nombre de factures')),
+                ('total_articles', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Total des articles')),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('total_remises', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des remises')),
+                ('total_encaisse', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total encaissé')),
+                ('total_rendu', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total rendu')),
+                ('nombre_retours', models.PositiveIntegerField(default=0, verbose_name='Nombre de retours')),
+                ('quantite_retournee', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Quantité retournée')),
+                ('premiere_vente', models.DateField(blank=True, null=True, verbose_name='Date de la première vente')),
+                ('derniere_vente', models.DateField(blank=True, null=True, verbose_name='Date de la dernière vente')),
+                ('ventes_par_heure', models.JSONField(default=dict, verbose_name='Ventes par heure')),
+                ('articles', models.JSONField(default=list, verbose_name='Quantités par article')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+                ('session_caisse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rapport_z', to='supermarket.sessioncaisse', verbose_name='Session de caisse')),
+            ],
+            options={
+                'verbose_name': 'Rapport Z',
+                'verbose_name_plural': 'Rapports Z',
+                'ordering': ['-date_creation'],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from decimal import Decimal, InvalidOperation
+
+
+def _decimal(valeur):
+    try:
+        return Decimal(str(valeur or 0))
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def remplir_resumes(apps, schema_editor):
+    """Agence et colonnes résumé des tickets déjà garés (même calcul que tickets_attente.resume_contenu)"""
+    FactureTemporaire = apps.get_model('supermarket', 'FactureTemporaire')
+    for ticket in FactureTemporaire.objects.select_related('session_caisse'):
+        contenu = ticket.contenu if isinstance(ticket.contenu, dict) else {}
+        lignes = contenu.get('lignes') or []
+        total = contenu.get('total')
+        if total in (None, '', 0):
+            total = sum((_decimal(l.get('prix_total')) for l in lignes if isinstance(l, dict)), Decimal('0')) \
+                - _decimal(contenu.get('remise'))
+        ticket.agence_id = ticket.session_caisse.agence_id if ticket.session_caisse else None
+        ticket.total = _decimal(total)
+        ticket.rendu = _decimal(contenu.get('rendu'))
+        ticket.nombre_lignes = len(lignes)
+        ticket.client = str(contenu.get('client') or '')[:200]
+        ticket.save(update_fields=['agence', 'total', 'rendu', 'nombre_lignes', 'client'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0070_rapport_z'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facturetemporaire',
+            name='agence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence'),
+        ),
+        migrations.AddField(
+            model_name='facturetemporaire',
+            name='client',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Client'),
+        ),
+        migrations.AddField(
+            model_name='facturetemporaire',
+            name='nombre_lignes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de lignes'),
+        ),
+        migrations.AddField(
+            model_name='facturetemporaire',
+            name='rendu',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Rendu'),
+        ),
+        migrations.AddField(
+            model_name='facturetemporaire',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total'),
+        ),
+        migrations.AddIndex(
+            model_name='facturetemporaire',
+            index=models.Index(fields=['agence', 'session_caisse', 'date_creation', 'id'], name='supermarket_agence__ae20ed_idx'),
+        ),
+        migrations.RunPython(remplir_resumes, migrations.RunPython.noop),
+    ]
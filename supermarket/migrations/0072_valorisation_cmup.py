@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def remplir_couts_entree(apps, schema_editor):
+    """Coût unitaire des entrées existantes : le coût que les vues enregistraient dans cout_moyen_pondere"""
+    MouvementStock = apps.get_model('supermarket', 'MouvementStock')
+    MouvementStock.objects.filter(
+        type_mouvement__in=('entree', 'transfert'), solde__gt=F('stock_initial')
+    ).update(cout_unitaire=F('cout_moyen_pondere'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0071_registre_tickets_attente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_unitaire',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name="Coût unitaire d'entrée"),
+        ),
+        migrations.CreateModel(
+            name='ValorisationArticle',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valorisation', serialize=False, to='supermarket.article', verbose_name='Article')),
+                ('quantite', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Quantité valorisée')),
+                ('valeur', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valeur du stock')),
+                ('cout_moyen', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Coût moyen pondéré')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+            ],
+            options={
+                'verbose_name': "Valorisation d'article",
+                'verbose_name_plural': "Valorisations d'articles",
+            },
+        ),
+        # Les CMUP historiques se recalculent ensuite avec : manage.py reconstruire_cmup
+        migrations.RunPython(remplir_couts_entree, migrations.RunPython.noop),
+    ]
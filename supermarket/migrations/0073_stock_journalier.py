@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0072_valorisation_cmup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(verbose_name='Jour')),
+                ('quantite', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Stock de clôture')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks_journaliers', to='supermarket.article', verbose_name='Article')),
+            ],
+            options={
+                'verbose_name': 'Stock journalier',
+                'verbose_name_plural': 'Stocks journaliers',
+                'indexes': [models.Index(fields=['agence', 'jour'], name='supermarket_agence__a7268b_idx')],
+                'unique_together': {('article', 'jour')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0073_stock_journalier'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['article', 'date_mouvement', 'id'], name='supermarket_article_7d6369_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def remplir_alertes(apps, schema_editor):
+    """Ensemble initial des articles en alerte / rupture, sans notification"""
+    Article = apps.get_model('supermarket', 'Article')
+    AlerteStock = apps.get_model('supermarket', 'AlerteStock')
+    articles = Article.objects.filter(suivi_stock=True).filter(
+        Q(stock_actuel__lte=F('stock_minimum')) | Q(stock_actuel__lte=0)
+    ).values_list('id', 'agence_id', 'stock_actuel')
+    AlerteStock.objects.bulk_create(
+        [
+            AlerteStock(article_id=article_id, agence_id=agence_id, niveau='rupture' if stock <= 0 else 'alerte')
+            for article_id, agence_id, stock in articles.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0074_index_historique_mouvements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlerteStock',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alerte_stock', serialize=False, to='supermarket.article', verbose_name='Article')),
+                ('niveau', models.CharField(choices=[('alerte', "Stock d'alerte"), ('rupture', 'Rupture')], max_length=10, verbose_name='Niveau')),
+                ('depuis', models.DateTimeField(auto_now_add=True, verbose_name='Depuis')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='supermarket.notification', verbose_name='Notification')),
+            ],
+            options={
+                'verbose_name': 'Alerte de stock',
+                'verbose_name_plural': 'Alertes de stock',
+                'indexes': [models.Index(fields=['agence', 'niveau'], name='supermarket_agence__a7ce72_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_alertes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0075_alertes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenteJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(verbose_name='Jour')),
+                ('quantite', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Quantité vendue')),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name="Chiffre d'affaires")),
+                ('cout', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Coût des ventes')),
+                ('nombre_lignes', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres', to='supermarket.article', verbose_name='Article')),
+            ],
+            options={
+                'verbose_name': 'Vente journalière',
+                'verbose_name_plural': 'Ventes journalières',
+                'indexes': [models.Index(fields=['agence', 'jour'], name='supermarket_agence__017986_idx')],
+                'unique_together': {('article', 'jour')},
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:03
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def supprimer_instantanes(apps, schema_editor):
+    """Les anciennes statistiques (instantanés sans période) ne sont pas reprises : recalculées au prochain rafraîchissement"""
+    apps.get_model('supermarket', 'StatistiqueVente').objects.all().delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0076_ventes_journalieres'),
+    ]
+
+    operations = [
+        migrations.RunPython(supprimer_instantanes, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RafraichissementStatistiques',
+            fields=[
+                ('agence', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rafraichissement_statistiques', serialize=False, to='supermarket.agence', verbose_name='Agence')),
+                ('jusqu_a', models.DateTimeField(blank=True, null=True, verbose_name="Ventes prises en compte jusqu'au")),
+            ],
+            options={
+                'verbose_name': 'Rafraîchissement des statistiques',
+                'verbose_name_plural': 'Rafraîchissements des statistiques',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='statistiquevente',
+            options={'ordering': ['-debut_periode'], 'verbose_name': 'Statistique de vente', 'verbose_name_plural': 'Statistiques de vente'},
+        ),
+        migrations.AddField(
+            model_name='statistiquevente',
+            name='debut_periode',
+            field=models.DateField(default=datetime.date(2000, 1, 1), verbose_name='Début de période'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='statistiquevente',
+            name='granularite',
+            field=models.CharField(choices=[('jour', 'Jour'), ('semaine', 'Semaine'), ('mois', 'Mois')], default='jour', max_length=10, verbose_name='Période'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='statistiquevente',
+            name='mis_a_jour',
+            field=models.DateTimeField(auto_now=True, verbose_name='Mis à jour le'),
+        ),
+        migrations.AddField(
+            model_name='statistiquevente',
+            name='nombre_lignes',
+            field=models.IntegerField(default=0, verbose_name='Nombre de lignes'),
+        ),
+        migrations.AddField(
+            model_name='ventejournaliere',
+            name='modifie_le',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Modifié le'),
+        ),
+        migrations.AlterField(
+            model_name='statistiquevente',
+            name='chiffre_affaires',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name="Chiffre d'affaires"),
+        ),
+        migrations.AlterField(
+            model_name='statistiquevente',
+            name='marge_profit',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Marge (profit)'),
+        ),
+        migrations.AlterField(
+            model_name='statistiquevente',
+            name='quantite',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Quantité'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='statistiquevente',
+            unique_together={('article', 'granularite', 'debut_periode')},
+        ),
+        migrations.AddIndex(
+            model_name='statistiquevente',
+            index=models.Index(fields=['agence', 'granularite', 'debut_periode'], name='supermarket_agence__7ab5e0_idx'),
+        ),
+        migrations.RemoveField(
+            model_name='statistiquevente',
+            name='chiffre_affaires_total',
+        ),
+        migrations.RemoveField(
+            model_name='statistiquevente',
+            name='date_creation',
+        ),
+        migrations.RemoveField(
+            model_name='statistiquevente',
+            name='designation',
+        ),
+        migrations.RemoveField(
+            model_name='statistiquevente',
+            name='pourcentage_marge',
+        ),
+        migrations.RemoveField(
+            model_name='statistiquevente',
+            name='reference_article',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0077_statistiques_vente_periodes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultatJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(verbose_name='Jour')),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name="Chiffre d'affaires")),
+                ('nombre_ventes', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('marge', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Marge')),
+                ('depenses', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Dépenses')),
+                ('nombre_depenses', models.IntegerField(default=0, verbose_name='Nombre de dépenses')),
+                ('agence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='supermarket.agence', verbose_name='Agence')),
+            ],
+            options={
+                'verbose_name': 'Résultat journalier',
+                'verbose_name_plural': 'Résultats journaliers',
+                'indexes': [models.Index(fields=['jour'], name='supermarket_jour_4d0288_idx')],
+                'unique_together': {('agence', 'jour')},
+            },
+        ),
+    ]
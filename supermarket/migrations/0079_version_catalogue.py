@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0078_resultats_journaliers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogue',
+            fields=[
+                ('agence', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version_catalogue', serialize=False, to='supermarket.agence', verbose_name='Agence')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Version du catalogue',
+                'verbose_name_plural': 'Versions du catalogue',
+            },
+        ),
+    ]
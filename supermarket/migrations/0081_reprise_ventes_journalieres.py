@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def reprendre_ventes_journalieres(apps, schema_editor):
+    """
+    Remplir les ventes journalières à partir des factures existantes (comme
+    la commande reconstruire_ventes_journalieres).
+
+    Sans cette reprise, marges et statistiques d'avant la mise à jour restaient
+    à zéro. Les filigranes des statistiques sont remis à zéro par la
+    reconstruction : elles sont recalculées en entier à la lecture suivante.
+    Rien à faire sur une base neuve ou déjà reconstruite.
+    """
+    alias = schema_editor.connection.alias
+    LigneFactureVente = apps.get_model('supermarket', 'LigneFactureVente')
+    VenteJournaliere = apps.get_model('supermarket', 'VenteJournaliere')
+    if (not LigneFactureVente.objects.using(alias).exists()
+            or VenteJournaliere.objects.using(alias).exists()):
+        return
+
+    from supermarket.ventes_journalieres import reconstruire
+    reconstruire()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0080_cache_partage'),
+    ]
+
+    operations = [
+        migrations.RunPython(reprendre_ventes_journalieres, migrations.RunPython.noop, elidable=True),
+    ]
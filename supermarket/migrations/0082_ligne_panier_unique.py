@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def fusionner_lignes_doublons(apps, schema_editor):
+    """Cumuler sur une seule ligne les lignes d'un panier de même article et type de vente"""
+    alias = schema_editor.connection.alias
+    LignePanier = apps.get_model('supermarket', 'LignePanier')
+    doublons = (
+        LignePanier.objects.using(alias).filter(article__isnull=False)
+        .values('panier_id', 'article_id', 'type_vente')
+        .annotate(nombre=Count('id'), premiere=Min('id'), quantite=Sum('quantite'))
+        .filter(nombre__gt=1)
+    )
+    for doublon in list(doublons):
+        lignes = LignePanier.objects.using(alias).filter(
+            panier_id=doublon['panier_id'], article_id=doublon['article_id'], type_vente=doublon['type_vente'],
+        )
+        lignes.filter(id=doublon['premiere']).update(quantite=doublon['quantite'])
+        lignes.exclude(id=doublon['premiere']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supermarket', '0081_reprise_ventes_journalieres'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_lignes_doublons, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='lignepanier',
+            name='supermarket_panier__6eb9d1_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='lignepanier',
+            unique_together={('panier', 'article', 'type_vente')},
+        ),
+    ]
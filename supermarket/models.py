@@ -1,4 +1,5 @@
 from django.db import models
+import logging
 import math
 from decimal import Decimal
 from django.contrib.auth.models import User
@@ -9,6 +10,8 @@ from django.dispatch import receiver
 from django.utils import timezone
 from datetime import date as date_class
 
+logger = logging.getLogger(__name__)
+
 # Create your models here.
 
 #
@@ -299,11 +302,18 @@ class SessionCaisse(models.Model):
         ('ouverte', 'Ouverte'),
         ('fermee', 'Fermée'),
     ], default='ouverte', verbose_name="Statut")
+
+    # Compteurs tenus à jour dans les transactions de vente / défacturation (voir compteurs_caisse.py)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    nombre_tickets = models.PositiveIntegerField(default=0, verbose_name="Nombre de tickets")
+    tickets_attente = models.PositiveIntegerField(default=0, verbose_name="Tickets en attente")
+    premiere_ouverture = models.DateTimeField(null=True, blank=True, verbose_name="Première ouverture du jour")
     
     class Meta:
         verbose_name = "Session de caisse"
         verbose_name_plural = "Sessions de caisse"
         ordering = ['-date_ouverture']
+        indexes = [models.Index(fields=['agence', 'date_ouverture'])]
     
     def __str__(self):
         return f"Session {self.caisse.numero_caisse} - {self.utilisateur.username}"
@@ -326,11 +336,14 @@ class FactureVente(models.Model):
     agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
     vendeur = models.ForeignKey(Employe, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Vendeur")
     session_caisse = models.ForeignKey('SessionCaisse', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Session de caisse")
+    # Clé fournie par la caisse pour les tickets resynchronisés : un renvoi ne crée pas de doublon
+    cle_idempotence = models.CharField(max_length=64, null=True, blank=True, verbose_name="Clé d'idempotence")
     
     class Meta:
         verbose_name = "Facture de vente"
         verbose_name_plural = "Factures de vente"
         ordering = ['-date', '-heure']
+        unique_together = ('agence', 'cle_idempotence')
     
     def __str__(self):
         return f"Ticket {self.numero_ticket} - {self.client.intitule}"
@@ -373,6 +386,38 @@ class DocumentVente(models.Model):
     def __str__(self):
         return f"Document {self.numero_document} - {self.date}"
 
+class RapportZ(models.Model):
+    """Rapport Z : totaux d'une session de caisse figés à sa fermeture (voir rapport_z.py)"""
+    session_caisse = models.OneToOneField(SessionCaisse, on_delete=models.CASCADE, related_name='rapport_z', verbose_name="Session de caisse")
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    nombre_factures = models.PositiveIntegerField(default=0, verbose_name="Nombre de factures")
+    total_articles = models.DecimalField(max_digits=14, decimal_places=3, default=0, verbose_name="Total des articles")
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    total_remises = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total des remises")
+    total_encaisse = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total encaissé")
+    total_rendu = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total rendu")
+    nombre_retours = models.PositiveIntegerField(default=0, verbose_name="Nombre de retours")
+    quantite_retournee = models.DecimalField(max_digits=14, decimal_places=3, default=0, verbose_name="Quantité retournée")
+    premiere_vente = models.DateField(null=True, blank=True, verbose_name="Date de la première vente")
+    derniere_vente = models.DateField(null=True, blank=True, verbose_name="Date de la dernière vente")
+    ventes_par_heure = models.JSONField(default=dict, verbose_name="Ventes par heure")
+    articles = models.JSONField(default=list, verbose_name="Quantités par article")
+
+    class Meta:
+        verbose_name = "Rapport Z"
+        verbose_name_plural = "Rapports Z"
+        ordering = ['-date_creation']
+
+    def __str__(self):
+        return f"Rapport Z - Session {self.session_caisse_id}"
+
+    def save(self, *args, **kwargs):
+        # Un rapport Z fait foi : il est écrit une fois, à la fermeture, et jamais modifié
+        if not self._state.adding:
+            raise ValueError("Un rapport Z ne peut pas être modifié après sa création.")
+        super().save(*args, **kwargs)
+
 class FactureTemporaire(models.Model):
     """Modèle pour les factures temporaires en attente"""
     session_key = models.CharField(max_length=100, verbose_name="Clé de session")
@@ -380,15 +425,81 @@ class FactureTemporaire(models.Model):
     contenu = models.JSONField(verbose_name="Contenu de la facture")
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
+
+    # Résumé pour la liste des tickets en attente (lue sans désérialiser contenu, voir tickets_attente.py)
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Agence")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total")
+    rendu = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Rendu")
+    nombre_lignes = models.PositiveIntegerField(default=0, verbose_name="Nombre de lignes")
+    client = models.CharField(max_length=200, blank=True, default='', verbose_name="Client")
     
     class Meta:
         verbose_name = "Facture temporaire"
         verbose_name_plural = "Factures temporaires"
         ordering = ['-date_creation']
+        indexes = [models.Index(fields=['agence', 'session_caisse', 'date_creation', 'id'])]
     
     def __str__(self):
         return f"Facture temporaire {self.id} - {self.date_creation}"
 
+    def save(self, *args, **kwargs):
+        from .tickets_attente import resume_contenu
+
+        for champ, valeur in resume_contenu(self.contenu).items():
+            setattr(self, champ, valeur)
+        super().save(*args, **kwargs)
+
+class CompteurTicket(models.Model):
+    """Compteur journalier des numéros de ticket, un par agence et par jour"""
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    date = models.DateField(verbose_name="Date")
+    dernier_numero = models.PositiveIntegerField(default=0, verbose_name="Dernier numéro attribué")
+
+    class Meta:
+        verbose_name = "Compteur de tickets"
+        verbose_name_plural = "Compteurs de tickets"
+        ordering = ['-date']
+        unique_together = ('agence', 'date')
+
+    def __str__(self):
+        return f"{self.agence} - {self.date} : {self.dernier_numero}"
+
+class PanierCaisse(models.Model):
+    """Ticket en cours de saisie : un panier par session navigateur et par caisse"""
+    session_key = models.CharField(max_length=100, verbose_name="Clé de session")
+    caisse = models.ForeignKey(Caisse, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Caisse")
+    type_vente = models.CharField(max_length=50, default='detail', verbose_name="Type de vente")
+    remise = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Remise")
+    montant_regler = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Montant réglé")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
+
+    class Meta:
+        verbose_name = "Panier de caisse"
+        verbose_name_plural = "Paniers de caisse"
+        unique_together = ('session_key', 'caisse')
+
+    def __str__(self):
+        return f"Panier {self.session_key} - {self.caisse}"
+
+class LignePanier(models.Model):
+    """Ligne du panier de caisse (écrite seule à chaque modification)"""
+    panier = models.ForeignKey(PanierCaisse, on_delete=models.CASCADE, related_name='lignes', verbose_name="Panier")
+    article = models.ForeignKey(Article, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Article")
+    reference = models.CharField(max_length=50, blank=True, default='', verbose_name="Référence")
+    designation = models.CharField(max_length=200, blank=True, default='', verbose_name="Désignation")
+    quantite = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name="Quantité")
+    prix_unitaire = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Prix unitaire")
+    type_vente = models.CharField(max_length=50, default='detail', verbose_name="Type de vente")
+
+    class Meta:
+        verbose_name = "Ligne de panier"
+        verbose_name_plural = "Lignes de panier"
+        ordering = ['id']
+        unique_together = ('panier', 'article', 'type_vente')
+
+    def __str__(self):
+        return f"{self.designation} x {self.quantite}"
+
 # ===== MODULE DE GESTION DE STOCK ET COMPTABILITÉ =====
 
 class FactureAchat(models.Model):
@@ -448,14 +559,15 @@ class FactureAchat(models.Model):
             # 1. C'est une nouvelle facture avec statut 'validee'
             # 2. Le statut vient de changer vers 'validee'
             if is_new or (statut_avant and statut_avant != 'validee'):
-                print(f"[INFO] Facture {self.reference_achat} validée - Mise à jour du stock...")
+                logger.debug("Facture %s validée - Mise à jour du stock...", self.reference_achat)
                 self.mettre_a_jour_stock()
     
     def mettre_a_jour_stock(self):
         """Methode pour mettre a jour le stock des articles de cette facture"""
         from django.utils import timezone
         
-        lignes = self.lignes.all()
+        # Par article : les mises à jour de stock sont faites dans un ordre fixe
+        lignes = self.lignes.select_related('article').order_by('article_id', 'id')
         for ligne in lignes:
             if ligne.article:
                 try:
@@ -473,8 +585,8 @@ class FactureAchat(models.Model):
                     ).exists()
                     
                     if mouvements_recents:
-                        print(f"[INFO] Mouvement récent détecté pour {ligne.article.designation} - Facture {self.reference_achat}")
-                        print(f"[INFO] Ignorant mettre_a_jour_stock() car une modification récente a déjà été gérée manuellement")
+                        logger.debug("Mouvement récent détecté pour %s - Facture %s", ligne.article.designation, self.reference_achat)
+                        logger.debug("Ignorant mettre_a_jour_stock() car une modification récente a déjà été gérée manuellement")
                         continue
                     
                     # Vérifier aussi s'il existe un mouvement quelconque pour cette facture et cet article
@@ -486,17 +598,15 @@ class FactureAchat(models.Model):
                     ).exists()
                     
                     if mouvement_existant:
-                        print(f"[INFO] Stock déjà mis à jour pour {ligne.article.designation} - Facture {self.reference_achat}")
-                        print(f"[INFO] Ignorant mettre_a_jour_stock() car un mouvement existe déjà (modification gérée manuellement)")
+                        logger.debug("Stock déjà mis à jour pour %s - Facture %s", ligne.article.designation, self.reference_achat)
+                        logger.debug("Ignorant mettre_a_jour_stock() car un mouvement existe déjà (modification gérée manuellement)")
                         continue
                     
-                    # Mettre a jour le stock de l'article
-                    ancien_stock = ligne.article.stock_actuel
-                    ligne.article.stock_actuel += ligne.quantite
+                    # Mettre a jour le stock de l'article (mise à jour atomique, suivi de stock activé)
+                    from .stock_utils import appliquer_variation
+                    ancien_stock, _ = appliquer_variation(ligne.article, ligne.quantite)
                     ligne.article.dernier_prix_achat = ligne.prix_unitaire
-                    # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                    ligne.article.suivi_stock = True
-                    ligne.article.save()
+                    ligne.article.save(update_fields=['dernier_prix_achat'])
                     
                     # Créer un mouvement de stock pour la traçabilité
                     MouvementStock.objects.create(
@@ -511,14 +621,15 @@ class FactureAchat(models.Model):
                         quantite=ligne.quantite,
                         cout_moyen_pondere=float(ligne.prix_unitaire),
                         stock_permanent=float(ligne.article.stock_actuel * ligne.prix_unitaire),
+                        cout_unitaire=ligne.prix_unitaire,
                         facture_achat=self,
                         fournisseur=self.fournisseur,
                         commentaire=f"Achat automatique - {self.reference_achat}"
                     )
-                    print(f"[AUTO] Stock mis a jour automatiquement: {ligne.article.designation} - {ancien_stock} -> {ligne.article.stock_actuel}")
+                    logger.debug("[AUTO] Stock mis a jour automatiquement: %s - %s -> %s", ligne.article.designation, ancien_stock, ligne.article.stock_actuel)
                     
                 except Exception as e:
-                    print(f"[ERREUR] Erreur mise a jour stock automatique pour {ligne.article.designation}: {e}")
+                    logger.error("Erreur mise a jour stock automatique pour %s: %s", ligne.article.designation, e)
                     import traceback
                     traceback.print_exc()
     
@@ -534,15 +645,13 @@ class FactureAchat(models.Model):
         """Méthode pour annuler une facture et remettre le stock à jour"""
         if self.statut in ['validee', 'payee']:
             # Restaurer le stock
-            lignes = self.lignes.all()
+            from .stock_utils import appliquer_variation
+            lignes = self.lignes.select_related('article').order_by('article_id', 'id')
             for ligne in lignes:
                 if ligne.article:
-                    ligne.article.stock_actuel -= ligne.quantite
-                    if ligne.article.stock_actuel < 0:
-                        ligne.article.stock_actuel = 0
-                    ligne.article.save()
+                    appliquer_variation(ligne.article, -ligne.quantite, plancher_zero=True)
                     
-                    print(f"[ANNULATION] Stock restauré: {ligne.article.designation} - {ligne.article.stock_actuel}")
+                    logger.debug("[ANNULATION] Stock restauré: %s - %s", ligne.article.designation, ligne.article.stock_actuel)
             
             self.statut = 'annulee'
             self.save()
@@ -801,28 +910,59 @@ class LigneInventaireStock(models.Model):
         return f"{self.inventaire.numero_inventaire} - {self.designation}"
 
 class StatistiqueVente(models.Model):
-    """Modèle pour les statistiques de vente"""
-    reference_article = models.CharField(max_length=50, verbose_name="Référence article")
-    designation = models.CharField(max_length=200, verbose_name="Désignation")
-    quantite = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Quantité")
-    marge_profit = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Marge (profit)")
-    chiffre_affaires = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Chiffre d'affaires")
-    pourcentage_marge = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Pourcentage de marge")
-    chiffre_affaires_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Chiffre d'affaires total")
+    """Ventes d'un article cumulées par jour, semaine ou mois, rafraîchies depuis les ventes journalières (voir statistiques_vente.py)"""
+    GRANULARITE_CHOICES = [
+        ('jour', 'Jour'),
+        ('semaine', 'Semaine'),
+        ('mois', 'Mois'),
+    ]
+
+    granularite = models.CharField(max_length=10, choices=GRANULARITE_CHOICES, verbose_name="Période")
+    debut_periode = models.DateField(verbose_name="Début de période")
+    quantite = models.DecimalField(max_digits=14, decimal_places=3, default=0, verbose_name="Quantité")
+    chiffre_affaires = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    marge_profit = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Marge (profit)")
+    nombre_lignes = models.IntegerField(default=0, verbose_name="Nombre de lignes")
     
     # Relations
     article = models.ForeignKey(Article, on_delete=models.CASCADE, verbose_name="Article")
     agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
     
-    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    mis_a_jour = models.DateTimeField(auto_now=True, verbose_name="Mis à jour le")
     
     class Meta:
         verbose_name = "Statistique de vente"
         verbose_name_plural = "Statistiques de vente"
-        ordering = ['-date_creation']
+        ordering = ['-debut_periode']
+        unique_together = ('article', 'granularite', 'debut_periode')
+        indexes = [models.Index(fields=['agence', 'granularite', 'debut_periode'])]
     
     def __str__(self):
-        return f"Statistiques {self.reference_article} - {self.designation}"
+        return f"Statistiques {self.article_id} - {self.granularite} du {self.debut_periode}"
+
+class RafraichissementStatistiques(models.Model):
+    """Filigrane du rafraîchissement des statistiques de vente d'une agence (voir statistiques_vente.py)"""
+    agence = models.OneToOneField(Agence, on_delete=models.CASCADE, primary_key=True, related_name='rafraichissement_statistiques', verbose_name="Agence")
+    jusqu_a = models.DateTimeField(null=True, blank=True, verbose_name="Ventes prises en compte jusqu'au")
+
+    class Meta:
+        verbose_name = "Rafraîchissement des statistiques"
+        verbose_name_plural = "Rafraîchissements des statistiques"
+
+    def __str__(self):
+        return f"Statistiques de l'agence {self.agence_id} jusqu'au {self.jusqu_a}"
+
+class VersionCatalogue(models.Model):
+    """Version du catalogue d'une agence, incrémentée à chaque modification d'article (voir catalogue_index.py)"""
+    agence = models.OneToOneField(Agence, on_delete=models.CASCADE, primary_key=True, related_name='version_catalogue', verbose_name="Agence")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Version")
+
+    class Meta:
+        verbose_name = "Version du catalogue"
+        verbose_name_plural = "Versions du catalogue"
+
+    def __str__(self):
+        return f"Catalogue de l'agence {self.agence_id} - version {self.version}"
 
 class MouvementStock(models.Model):
     """Modèle pour les mouvements de stock"""
@@ -845,6 +985,8 @@ class MouvementStock(models.Model):
     quantite = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Quantité")
     cout_moyen_pondere = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Coût moyen pondéré")
     stock_permanent = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Stock permanent")
+    # Coût unitaire d'une entrée (achat, transfert) ; le CMUP est calculé par cmup.py
+    cout_unitaire = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Coût unitaire d'entrée")
     commentaire = models.TextField(blank=True, verbose_name="Commentaire")
     
     # Relations
@@ -863,10 +1005,100 @@ class MouvementStock(models.Model):
         verbose_name = "Mouvement de stock"
         verbose_name_plural = "Mouvements de stock"
         ordering = ['-date_mouvement']
+        # Historique d'un article dans l'ordre chronologique (premier / dernier mouvement)
+        indexes = [models.Index(fields=['article', 'date_mouvement', 'id'])]
     
     def __str__(self):
         return f"{self.get_type_mouvement_display()} - {self.article.designation} ({self.quantite})"
 
+    def save(self, *args, **kwargs):
+        from .stock_journalier import invalider
+        # Valorisation au CMUP à la création (les créations groupées appellent cmup.valoriser elles-mêmes)
+        if self._state.adding and not getattr(self, '_valorise', False):
+            from django.db import transaction
+            from .cmup import valoriser
+            with transaction.atomic():
+                valoriser([self])
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+        # Un mouvement antidaté rend faux les stocks journaliers déjà figés
+        invalider([self])
+
+
+class ValorisationArticle(models.Model):
+    """Quantité et valeur courantes d'un article pour le coût moyen unitaire pondéré (voir cmup.py)"""
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='valorisation', verbose_name="Article")
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    quantite = models.DecimalField(max_digits=14, decimal_places=3, default=0, verbose_name="Quantité valorisée")
+    valeur = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Valeur du stock")
+    cout_moyen = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name="Coût moyen pondéré")
+
+    class Meta:
+        verbose_name = "Valorisation d'article"
+        verbose_name_plural = "Valorisations d'articles"
+
+    def __str__(self):
+        return f"CMUP {self.article_id} : {self.cout_moyen}"
+
+
+class StockJournalier(models.Model):
+    """Stock de clôture d'un article pour un jour terminé (voir stock_journalier.py)"""
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='stocks_journaliers', verbose_name="Article")
+    jour = models.DateField(verbose_name="Jour")
+    quantite = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Stock de clôture")
+
+    class Meta:
+        verbose_name = "Stock journalier"
+        verbose_name_plural = "Stocks journaliers"
+        unique_together = ('article', 'jour')
+        indexes = [models.Index(fields=['agence', 'jour'])]
+
+    def __str__(self):
+        return f"{self.article_id} au {self.jour} : {self.quantite}"
+
+
+class VenteJournaliere(models.Model):
+    """Ventes d'un article pour un jour (table de faits tenue à jour à la vente, voir ventes_journalieres.py)"""
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='ventes_journalieres', verbose_name="Article")
+    jour = models.DateField(verbose_name="Jour")
+    quantite = models.DecimalField(max_digits=14, decimal_places=3, default=0, verbose_name="Quantité vendue")
+    chiffre_affaires = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    cout = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Coût des ventes")
+    nombre_lignes = models.IntegerField(default=0, verbose_name="Nombre de lignes")
+    modifie_le = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Modifié le")
+
+    class Meta:
+        verbose_name = "Vente journalière"
+        verbose_name_plural = "Ventes journalières"
+        unique_together = ('article', 'jour')
+        indexes = [models.Index(fields=['agence', 'jour'])]
+
+    def __str__(self):
+        return f"{self.article_id} le {self.jour} : {self.quantite}"
+
+
+class ResultatJournalier(models.Model):
+    """Chiffre d'affaires, marge et dépenses d'une agence pour un jour terminé (voir resultat_journalier.py)"""
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    jour = models.DateField(verbose_name="Jour")
+    chiffre_affaires = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    nombre_ventes = models.IntegerField(default=0, verbose_name="Nombre de ventes")
+    marge = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Marge")
+    depenses = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Dépenses")
+    nombre_depenses = models.IntegerField(default=0, verbose_name="Nombre de dépenses")
+
+    class Meta:
+        verbose_name = "Résultat journalier"
+        verbose_name_plural = "Résultats journaliers"
+        unique_together = ('agence', 'jour')
+        indexes = [models.Index(fields=['jour'])]
+
+    def __str__(self):
+        return f"Agence {self.agence_id} le {self.jour} : {self.chiffre_affaires}"
+
 
 class Commande(models.Model):
     """Modèle pour les commandes"""
@@ -1158,6 +1390,28 @@ class Notification(models.Model):
     def __str__(self):
         return f"{self.titre} - {self.get_type_notification_display()}"
 
+
+class AlerteStock(models.Model):
+    """Article suivi en stock d'alerte ou en rupture, tenu à jour à chaque variation de stock (voir alertes_stock.py)"""
+    NIVEAU_CHOICES = [
+        ('alerte', "Stock d'alerte"),
+        ('rupture', 'Rupture'),
+    ]
+
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='alerte_stock', verbose_name="Article")
+    agence = models.ForeignKey(Agence, on_delete=models.CASCADE, verbose_name="Agence")
+    niveau = models.CharField(max_length=10, choices=NIVEAU_CHOICES, verbose_name="Niveau")
+    depuis = models.DateTimeField(auto_now_add=True, verbose_name="Depuis")
+    notification = models.ForeignKey(Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Notification")
+
+    class Meta:
+        verbose_name = "Alerte de stock"
+        verbose_name_plural = "Alertes de stock"
+        indexes = [models.Index(fields=['agence', 'niveau'])]
+
+    def __str__(self):
+        return f"{self.get_niveau_display()} - article {self.article_id}"
+
 # ----------------gestion comptable-------------------------
 
 # --- AJOUTEZ CECI AVANT LA CLASSE DEPENSE ---
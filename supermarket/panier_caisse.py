@@ -0,0 +1,291 @@
+"""
+Panier de la caisse (ticket en cours de saisie)
+
+Le panier d'un poste est identifié par (clé de session, caisse) et n'est plus
+rangé dans request.session : chaque ajout ou modification y réécrivait la
+ligne django_session entière, panier complet sérialisé.
+
+La base de données est la seule source, quel que soit le worker ou le poste
+qui a modifié le panier en dernier : PanierCaisse (en-tête) et LignePanier,
+une ligne par (panier, article, type de vente), clé unique. Une opération ne
+lit et n'écrit que la ligne concernée, trouvée par cette clé (ajout) ou par sa
+position dans le ticket (modification, retrait), puis date l'en-tête
+(date_modification) : son coût ne dépend pas du nombre de lignes. Seuls
+l'affichage du ticket (en_dict) et le changement de type de vente de tout le
+panier lisent toutes les lignes.
+
+Les paniers d'une caisse restés plus d'un jour sans modification sont
+supprimés à la création d'un nouveau panier sur cette caisse.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Caisse, PanierCaisse, LignePanier
+
+DUREE_ABANDON = timedelta(days=1)  # comme SESSION_COOKIE_AGE
+CLE_SESSION_CAISSE = 'caisse_panier'
+
+
+def _float(valeur):
+    try:
+        return float(valeur or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _decimal(valeur):
+    return Decimal(str(_float(valeur)))
+
+
+class Panier:
+    """Panier d'un poste de caisse"""
+
+    def __init__(self, session_key, caisse_id=None):
+        self.session_key = session_key
+        self.caisse_id = caisse_id
+        self._panier = None
+        self._charge = False
+
+    # ---- en-tête -----------------------------------------------------
+
+    def _entete(self):
+        """En-tête en base (None tant que le panier est vide), lu une fois par instance"""
+        if not self._charge:
+            self._panier = PanierCaisse.objects.filter(session_key=self.session_key, caisse_id=self.caisse_id).first()
+            self._charge = True
+        return self._panier
+
+    def _panier_id(self):
+        """Identifiant de l'en-tête en base (créé à la première ligne)"""
+        if self._entete() is None:
+            # Nettoyer au passage les paniers abandonnés de cette caisse
+            PanierCaisse.objects.filter(
+                caisse_id=self.caisse_id, date_modification__lt=timezone.now() - DUREE_ABANDON
+            ).exclude(session_key=self.session_key).delete()
+            self._panier, _ = PanierCaisse.objects.get_or_create(session_key=self.session_key, caisse_id=self.caisse_id)
+        return self._panier.id
+
+    def _toucher(self, **champs):
+        """Dater l'en-tête (et écrire les champs donnés) : un panier en cours n'est jamais pris pour abandonné"""
+        if self._panier is None:
+            return
+        champs['date_modification'] = timezone.now()
+        PanierCaisse.objects.filter(id=self._panier.id).update(**champs)
+        for nom, valeur in champs.items():
+            setattr(self._panier, nom, valeur)
+
+    # ---- lignes ------------------------------------------------------
+
+    def _lignes(self):
+        panier = self._entete()
+        return LignePanier.objects.filter(panier=panier) if panier else LignePanier.objects.none()
+
+    @staticmethod
+    def _donnees_ligne(ligne):
+        quantite = _float(ligne.quantite)
+        prix_unitaire = _float(ligne.prix_unitaire)
+        return {
+            'ligne_id': ligne.id,
+            'article_id': ligne.article_id,
+            'reference': ligne.reference,
+            'designation': ligne.designation,
+            'quantite': quantite,
+            'prix_unitaire': prix_unitaire,
+            'prix_total': quantite * prix_unitaire,
+            'type_vente': ligne.type_vente,
+        }
+
+    @staticmethod
+    def _calculer(donnees):
+        donnees['prix_total'] = donnees['quantite'] * donnees['prix_unitaire']
+        return donnees
+
+    def lignes(self):
+        """Lignes du panier dans l'ordre de saisie"""
+        return [self._donnees_ligne(ligne) for ligne in self._lignes().order_by('id')]
+
+    def ligne(self, position):
+        """Ligne à la position donnée (index affiché par la caisse) ou None ; lit cette seule ligne"""
+        if position < 0:
+            return None
+        ligne = next(iter(self._lignes().order_by('id')[position:position + 1]), None)
+        return self._donnees_ligne(ligne) if ligne else None
+
+    def __len__(self):
+        return self._lignes().count()
+
+    def ajouter(self, article_id, reference, designation, quantite, prix_unitaire, type_vente='detail'):
+        """Ajouter un article ; cumule la quantité si l'article est déjà sur le ticket avec ce type de vente"""
+        cle = {'panier_id': self._panier_id(), 'article_id': article_id, 'type_vente': type_vente}
+        quantite = _decimal(quantite)
+        ligne = LignePanier.objects.filter(**cle).first()
+        if ligne is None:
+            try:
+                with transaction.atomic():
+                    ligne = LignePanier.objects.create(
+                        reference=(reference or '')[:50], designation=(designation or '')[:200],
+                        quantite=quantite, prix_unitaire=_decimal(prix_unitaire), **cle,
+                    )
+                self._toucher()
+                return self._donnees_ligne(ligne)
+            except IntegrityError:
+                # Même article ajouté au même instant par une autre requête du poste
+                ligne = LignePanier.objects.get(**cle)
+
+        LignePanier.objects.filter(id=ligne.id).update(quantite=F('quantite') + quantite)
+        ligne.quantite += quantite
+        self._toucher()
+        return self._donnees_ligne(ligne)
+
+    def modifier_quantite(self, position, quantite):
+        donnees = self.ligne(position)
+        if donnees is None:
+            return None
+        donnees['quantite'] = _float(quantite)
+        LignePanier.objects.filter(id=donnees['ligne_id']).update(quantite=_decimal(donnees['quantite']))
+        self._toucher()
+        return self._calculer(donnees)
+
+    def modifier_type_vente(self, position, type_vente, prix_unitaire):
+        """Changer le type de vente d'une ligne ; fusionnée avec la ligne du même article déjà à ce type"""
+        donnees = self.ligne(position)
+        if donnees is None:
+            return None
+        donnees['type_vente'] = type_vente
+        donnees['prix_unitaire'] = _float(prix_unitaire)
+        jumelle = None
+        if donnees['article_id'] is not None:
+            jumelle = LignePanier.objects.filter(
+                panier_id=self._panier.id, article_id=donnees['article_id'], type_vente=type_vente,
+            ).exclude(id=donnees['ligne_id']).first()
+        if jumelle is not None:
+            LignePanier.objects.filter(id=donnees['ligne_id']).delete()
+            donnees['ligne_id'] = jumelle.id
+            donnees['quantite'] += _float(jumelle.quantite)
+        LignePanier.objects.filter(id=donnees['ligne_id']).update(
+            type_vente=type_vente, prix_unitaire=_decimal(donnees['prix_unitaire']),
+            quantite=_decimal(donnees['quantite']),
+        )
+        self._toucher()
+        return self._calculer(donnees)
+
+    def retirer(self, position):
+        donnees = self.ligne(position)
+        if donnees is None:
+            return None
+        LignePanier.objects.filter(id=donnees['ligne_id']).delete()
+        self._toucher()
+        return donnees
+
+    def appliquer_type_vente(self, type_vente, prix_selon_article):
+        """
+        Passer toutes les lignes au type de vente donné (prix_selon_article(article_id) -> prix).
+
+        Les lignes d'un même article (types de vente différents) sont fusionnées.
+        """
+        lignes = self.lignes()
+        # Prix calculés avant toute écriture : une erreur laisse le panier intact
+        prix = [_float(prix_selon_article(donnees['article_id'])) for donnees in lignes]
+        gardees, fusionnees, par_article = [], [], {}
+        for donnees, prix_unitaire in zip(lignes, prix):
+            premiere = par_article.get(donnees['article_id'])
+            if premiere is not None:
+                premiere['quantite'] += donnees['quantite']
+                fusionnees.append(donnees['ligne_id'])
+                continue
+            donnees['type_vente'] = type_vente
+            donnees['prix_unitaire'] = prix_unitaire
+            gardees.append(donnees)
+            if donnees['article_id'] is not None:
+                par_article[donnees['article_id']] = donnees
+        with transaction.atomic():
+            if fusionnees:
+                LignePanier.objects.filter(id__in=fusionnees).delete()
+            LignePanier.objects.bulk_update([
+                LignePanier(
+                    id=donnees['ligne_id'], type_vente=type_vente,
+                    prix_unitaire=_decimal(donnees['prix_unitaire']), quantite=_decimal(donnees['quantite']),
+                )
+                for donnees in gardees
+            ], ['type_vente', 'prix_unitaire', 'quantite'])
+            self._toucher(type_vente=type_vente)
+        return [self._calculer(donnees) for donnees in gardees]
+
+    def vider(self):
+        PanierCaisse.objects.filter(session_key=self.session_key, caisse_id=self.caisse_id).delete()
+        self._panier = None
+        self._charge = True
+
+    def remplacer(self, contenu):
+        """Remplacer tout le panier (ex. contenu d'un ticket en attente) ; lignes identiques cumulées"""
+        self.vider()
+        self._panier = PanierCaisse.objects.create(
+            session_key=self.session_key, caisse_id=self.caisse_id,
+            type_vente=contenu.get('type_vente') or 'detail',
+            remise=_decimal(contenu.get('remise')),
+            montant_regler=_decimal(contenu.get('montant_regler')),
+        )
+        lignes, par_cle = [], {}
+        for ligne in contenu.get('lignes', []):
+            article_id = ligne.get('article_id') or None
+            type_vente = ligne.get('type_vente') or 'detail'
+            quantite = _decimal(ligne.get('quantite'))
+            existante = par_cle.get((article_id, type_vente)) if article_id else None
+            if existante is not None:
+                existante.quantite += quantite
+                continue
+            nouvelle = LignePanier(
+                panier=self._panier,
+                article_id=article_id,
+                reference=str(ligne.get('reference') or '')[:50],
+                designation=str(ligne.get('designation') or '')[:200],
+                quantite=quantite,
+                prix_unitaire=_decimal(ligne.get('prix_unitaire')),
+                type_vente=type_vente,
+            )
+            lignes.append(nouvelle)
+            if article_id:
+                par_cle[(article_id, type_vente)] = nouvelle
+        LignePanier.objects.bulk_create(lignes)
+
+    def en_dict(self):
+        """Forme historique de request.session['facture_temporaire']"""
+        lignes = self.lignes()
+        panier = self._entete()
+        type_vente = panier.type_vente if panier else 'detail'
+        remise = _float(panier.remise) if panier else 0.0
+        montant_regler = _float(panier.montant_regler) if panier else 0.0
+        nette_a_payer = sum(l['prix_total'] for l in lignes) - remise
+        return {
+            'lignes': lignes,
+            'type_vente': type_vente,
+            'remise': remise,
+            'montant_regler': montant_regler,
+            'nette_a_payer': nette_a_payer,
+            'rendu': montant_regler - nette_a_payer if montant_regler else 0,
+        }
+
+
+def panier_courant(request, agence, caisse=None):
+    """
+    Panier du poste : la caisse est mémorisée en session par l'écran de
+    facturation (à défaut, première caisse active de l'agence).
+    """
+    if not request.session.session_key:
+        request.session.save()
+
+    if caisse is not None:
+        caisse_id = caisse.pk
+        if request.session.get(CLE_SESSION_CAISSE) != caisse_id:
+            request.session[CLE_SESSION_CAISSE] = caisse_id
+    else:
+        caisse_id = request.session.get(CLE_SESSION_CAISSE)
+        if caisse_id is None and agence is not None:
+            caisse_id = Caisse.objects.filter(agence=agence, statut='active').values_list('id', flat=True).first()
+            if caisse_id is not None:
+                request.session[CLE_SESSION_CAISSE] = caisse_id
+    return Panier(request.session.session_key, caisse_id)
@@ -0,0 +1,177 @@
+"""
+Rapport Z (fermeture de caisse)
+
+À la fermeture, les totaux de la session sont calculés par des agrégats
+groupés en base (factures, heures, articles, retours) au lieu d'un parcours
+des factures en Python, puis figés dans un RapportZ rattaché à la session.
+rapport_caisse et les réimpressions lisent ce rapport sans rien recalculer ;
+seule la session encore ouverte est calculée à la demande.
+
+Les factures orphelines sont rattachées à l'ouverture de la session
+(compteurs_caisse.initialiser_session), plus à la fermeture. La fermeture
+fige aussi les stocks de clôture des jours terminés (stock_journalier.py).
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .models import (
+    Caisse, DocumentVente, FactureVente, LigneFactureVente, MouvementStock, RapportZ, SessionCaisse,
+)
+from .stock_journalier import rafraichir
+
+
+def calculer_rapport_z(session):
+    """RapportZ non enregistré de la session (sert aussi pour la session encore ouverte)"""
+    factures = FactureVente.objects.filter(session_caisse=session)
+
+    totaux = factures.aggregate(
+        nombre=Count('id'),
+        chiffre_affaires=Sum('nette_a_payer'),
+        remises=Sum('remise'),
+        encaisse=Sum('montant_regler'),
+        rendu=Sum('rendu'),
+        premiere=Min('date'),
+        derniere=Max('date'),
+    )
+
+    ventes_par_heure = {
+        str(ligne['h']): {'nombre': ligne['nombre'], 'montant': float(ligne['montant'] or 0)}
+        for ligne in factures.annotate(h=ExtractHour('heure')).values('h').annotate(
+            nombre=Count('id'), montant=Sum('nette_a_payer')
+        ).order_by('h')
+    }
+
+    articles = [
+        {
+            'article_id': ligne['article_id'],
+            'reference': ligne['article__reference_article'] or '',
+            'designation': ligne['designation'],
+            'quantite': float(ligne['quantite'] or 0),
+            'montant': float(ligne['montant'] or 0),
+        }
+        for ligne in LigneFactureVente.objects.filter(facture_vente__session_caisse=session).values(
+            'article_id', 'article__reference_article', 'designation'
+        ).annotate(quantite=Sum('quantite'), montant=Sum('prix_total')).order_by('-quantite')
+    ]
+
+    retours = MouvementStock.objects.filter(
+        agence_id=session.agence_id,
+        type_mouvement='retour',
+        date_mouvement__gte=session.date_ouverture,
+        **({'date_mouvement__lte': session.date_fermeture} if session.date_fermeture else {}),
+    ).aggregate(nombre=Count('id'), quantite=Sum('quantite'))
+
+    return RapportZ(
+        session_caisse=session,
+        agence_id=session.agence_id,
+        nombre_factures=totaux['nombre'],
+        total_articles=sum((Decimal(str(a['quantite'])) for a in articles), Decimal('0')),
+        chiffre_affaires=totaux['chiffre_affaires'] or Decimal('0'),
+        total_remises=totaux['remises'] or Decimal('0'),
+        total_encaisse=totaux['encaisse'] or Decimal('0'),
+        total_rendu=totaux['rendu'] or Decimal('0'),
+        nombre_retours=retours['nombre'],
+        quantite_retournee=retours['quantite'] or Decimal('0'),
+        premiere_vente=totaux['premiere'],
+        derniere_vente=totaux['derniere'],
+        ventes_par_heure=ventes_par_heure,
+        articles=articles,
+    )
+
+
+def rapport_de_session(session):
+    """Rapport figé si la session est fermée, calculé sinon"""
+    try:
+        return session.rapport_z
+    except RapportZ.DoesNotExist:
+        return calculer_rapport_z(session)
+
+
+def _factures_document(session):
+    """factures_data du DocumentVente, lu en deux requêtes sans instancier les modèles"""
+    lignes_par_facture = {}
+    for ligne in LigneFactureVente.objects.filter(facture_vente__session_caisse=session).values(
+        'facture_vente_id', 'designation', 'article__reference_article', 'quantite', 'prix_unitaire', 'prix_total'
+    ).order_by('facture_vente_id', 'id'):
+        lignes_par_facture.setdefault(ligne['facture_vente_id'], []).append({
+            'designation': ligne['designation'],
+            'reference': ligne['article__reference_article'] or '',
+            'quantite': int(ligne['quantite']),
+            'prix_unitaire': float(ligne['prix_unitaire'] or 0),
+            'total': float(ligne['prix_total'] or 0),
+        })
+
+    factures = FactureVente.objects.filter(session_caisse=session).order_by('-date', '-heure').values(
+        'id', 'numero_ticket', 'date', 'heure', 'client__intitule', 'nette_a_payer'
+    )
+    return [
+        {
+            'numero_ticket': f['numero_ticket'],
+            'date': f['date'].strftime('%Y-%m-%d'),
+            'heure': f['heure'].strftime('%H:%M') if f['heure'] else '',
+            'client': f['client__intitule'] or 'Client anonyme',
+            'nette_a_payer': float(f['nette_a_payer'] or 0),
+            'articles': lignes_par_facture.get(f['id'], []),
+        }
+        for f in factures
+    ]
+
+
+def cloturer_session(session, vendeuse_nom):
+    """
+    Fermer la session : rapport Z figé, document de vente journalier, session et caisse fermées.
+
+    Retourne (document, rapport, cree) ; si la session avait déjà été fermée
+    par un autre poste, le document existant est retourné avec cree=False.
+    """
+    with transaction.atomic():
+        session = SessionCaisse.objects.select_for_update().get(pk=session.pk)
+        document = DocumentVente.objects.filter(session_caisse=session).first()
+        if document:
+            return document, rapport_de_session(session), False
+
+        rapport = calculer_rapport_z(session)
+
+        # Date du document : celle de la facture la plus récente (date saisie à la facturation)
+        derniere = FactureVente.objects.filter(session_caisse=session).order_by('-date', '-heure').values(
+            'date', 'heure'
+        ).first()
+        date_document = derniere['date'] if derniere else timezone.now().date()
+        heure_fermeture = derniere['heure'] if derniere and derniere['heure'] else timezone.now().time()
+        fermeture = datetime.combine(date_document, heure_fermeture)
+        if timezone.is_naive(fermeture):
+            fermeture = timezone.make_aware(fermeture, timezone.get_current_timezone())
+
+        base_numero = f"DOC{date_document.strftime('%Y%m%d')}{session.id:03d}"
+        numero_document = base_numero
+        compteur = 1
+        while DocumentVente.objects.filter(numero_document=numero_document).exists():
+            numero_document = f"{base_numero}-{compteur:02d}"
+            compteur += 1
+
+        document = DocumentVente.objects.create(
+            numero_document=numero_document,
+            date=date_document,
+            heure_fermeture=fermeture,
+            session_caisse=session,
+            vendeuse_nom=vendeuse_nom,
+            nombre_factures=rapport.nombre_factures,
+            total_articles=int(sum(int(a['quantite']) for a in rapport.articles)),
+            chiffre_affaires=rapport.chiffre_affaires,
+            factures_data=_factures_document(session),
+            agence_id=session.agence_id,
+        )
+        rapport.save()
+
+        SessionCaisse.objects.filter(pk=session.pk).update(statut='fermee', date_fermeture=fermeture)
+        Caisse.objects.filter(pk=session.caisse_id).update(statut='fermee', date_fermeture=fermeture)
+
+        # Stocks de clôture des jours terminés (état d'inventaire)
+        transaction.on_commit(lambda: rafraichir(session.agence), robust=True)
+
+    return document, rapport, True
@@ -0,0 +1,87 @@
+"""
+Rapprochement du stock des articles avec le registre des mouvements
+
+Le stock attendu d'un article est le stock initial de son premier mouvement
+plus la somme des variations (solde - stock initial) de tous ses mouvements.
+Une seule requête groupée le calcule pour tous les articles de toutes les
+agences et la comparaison avec stock_actuel est faite en base : seuls les
+articles en écart sont renvoyés. Les articles sans mouvement ne sont pas
+contrôlés.
+
+corriger(ecarts) aligne le registre sur le stock actuel par des mouvements
+d'ajustement écrits en lot (valorisés au CMUP) ; stock_actuel n'est pas modifié.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cmup import valoriser
+from .models import Article, MouvementStock
+
+TOLERANCE = Decimal('0.001')
+TAILLE_LOT = 1000
+
+_QUANTITE = DecimalField(max_digits=14, decimal_places=3)
+
+
+def ecarts(agences=None, tolerance=TOLERANCE):
+    """Articles dont le stock actuel diffère du registre, triés par agence puis écart décroissant"""
+    premier = MouvementStock.objects.filter(article=OuterRef('pk')).order_by('date_mouvement', 'id')
+    articles = Article.objects.all() if agences is None else Article.objects.filter(agence__in=agences)
+    lignes = articles.annotate(
+        nombre_mouvements=Count('mouvementstock'),
+        variation=Coalesce(
+            Sum(F('mouvementstock__solde') - F('mouvementstock__stock_initial'), output_field=_QUANTITE),
+            Value(Decimal('0')), output_field=_QUANTITE,
+        ),
+        ouverture=Subquery(premier.values('stock_initial')[:1], output_field=_QUANTITE),
+    ).filter(nombre_mouvements__gt=0).annotate(
+        stock_attendu=ExpressionWrapper(F('ouverture') + F('variation'), output_field=_QUANTITE),
+        ecart=ExpressionWrapper(F('stock_actuel') - F('ouverture') - F('variation'), output_field=_QUANTITE),
+    ).exclude(ecart__range=(-tolerance, tolerance)).values(
+        'id', 'agence_id', 'agence__nom_agence', 'reference_article', 'designation',
+        'stock_actuel', 'stock_attendu', 'ecart', 'nombre_mouvements',
+    )
+    resultat = [
+        dict(ligne, stock_attendu=Decimal(ligne['stock_attendu']).quantize(TOLERANCE),
+             ecart=Decimal(ligne['ecart']).quantize(TOLERANCE))
+        for ligne in lignes
+    ]
+    resultat.sort(key=lambda l: (l['agence__nom_agence'], -abs(l['ecart'])))
+    return resultat
+
+
+def corriger(ecarts_a_corriger):
+    """Écrire un mouvement d'ajustement par écart (registre ramené au stock actuel) ; retourne le nombre écrit"""
+    maintenant = timezone.now()
+    numero_piece = f"RAPPROCHEMENT-{timezone.localtime(maintenant).strftime('%Y%m%d-%H%M')}"
+    prix_achat = dict(Article.objects.filter(
+        id__in=[e['id'] for e in ecarts_a_corriger]
+    ).values_list('id', 'prix_achat'))
+
+    mouvements = [
+        MouvementStock(
+            article_id=e['id'],
+            agence_id=e['agence_id'],
+            type_mouvement='ajustement',
+            date_mouvement=maintenant,
+            numero_piece=numero_piece,
+            quantite_stock=e['stock_actuel'],
+            stock_initial=e['stock_attendu'],
+            solde=e['stock_actuel'],
+            quantite=abs(e['ecart']),
+            cout_moyen_pondere=prix_achat.get(e['id'], 0),
+            stock_permanent=0,
+            commentaire=f"Rapprochement registre / stock actuel (écart {e['ecart']})",
+        )
+        for e in sorted(ecarts_a_corriger, key=lambda e: e['id'])
+    ]
+    with transaction.atomic():
+        for debut in range(0, len(mouvements), TAILLE_LOT):
+            lot = mouvements[debut:debut + TAILLE_LOT]
+            valoriser(lot)
+            MouvementStock.objects.bulk_create(lot)
+    return len(mouvements)
@@ -0,0 +1,309 @@
+"""
+Reconstruction du registre des mouvements de stock d'une agence
+
+reconstruire_registre(agence, debut, fin) remplace les mouvements issus des
+pièces de la période (lignes de ventes, d'achats, de transferts et
+d'inventaires terminés) par des mouvements recalculés :
+
+- chaque source est lue par une seule requête triée chronologiquement et les
+  flux sont fusionnés (heapq.merge) sans tout charger en mémoire
+- le solde de chaque article avance en mémoire : stock initial, solde et
+  quantité en stock sont calculés en un seul passage
+- les mouvements recalculés sont écrits par bulk_create, par lots ; les
+  mouvements sans pièce de la période (ajustements, pertes, retours de
+  factures supprimées) sont conservés et seuls leurs soldes sont réécrits
+- un inventaire terminé ramène le solde à la quantité comptée (mouvement
+  'inventaire' seulement s'il y a un écart)
+
+Solde d'ouverture d'un article : solde du dernier mouvement avant la période.
+Sans mouvement antérieur, il est déduit du stock actuel moins les variations
+de la période et des mouvements postérieurs (agrégats groupés par article).
+
+Le stock des articles (stock_actuel) n'est pas modifié. Le CMUP de l'agence
+est ensuite recalculé (cmup.reconstruire) et les stocks journaliers figés à
+partir du début de la période sont effacés.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .cmup import reconstruire as reconstruire_cmup
+from .models import (
+    Article, FactureAchat, FactureTransfert, FactureVente, LigneFactureAchat, LigneFactureTransfert, LigneFactureVente,
+    LigneInventaireStock, MouvementStock, StockJournalier,
+)
+from .transfert_stock import correspondances as correspondances_transfert, signe as signe_transfert
+
+TAILLE_LOT = 2000
+
+# Ordre des sources à moment égal : entrées, puis sorties, puis comptage
+ACHAT, TRANSFERT, VENTE, CONSERVE, INVENTAIRE = range(5)
+
+
+def _moment(jour, heure=None):
+    moment = datetime.combine(jour, heure or time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_current_timezone())
+    return moment
+
+
+def _achats(agence, debut, fin):
+    lignes = LigneFactureAchat.objects.filter(
+        facture_achat__agence=agence, facture_achat__date_achat__range=(debut, fin), article__isnull=False,
+    ).exclude(facture_achat__statut='annulee').order_by(
+        'facture_achat__date_achat', 'facture_achat__heure', 'id'
+    ).values_list(
+        'id', 'article_id', 'quantite', 'prix_unitaire', 'facture_achat_id', 'facture_achat__reference_achat',
+        'facture_achat__fournisseur_id', 'facture_achat__date_achat', 'facture_achat__heure',
+    )
+    for id_ligne, article_id, quantite, prix, facture_id, reference, fournisseur_id, jour, heure in lignes.iterator(
+        chunk_size=TAILLE_LOT
+    ):
+        yield _moment(jour, heure), ACHAT, id_ligne, {
+            'article_id': article_id, 'type_mouvement': 'entree', 'variation': quantite, 'cout_unitaire': prix,
+            'numero_piece': reference, 'facture_achat_id': facture_id, 'fournisseur_id': fournisseur_id,
+            'commentaire': f'Achat - {reference}',
+        }
+
+
+def _transferts(agence, debut, fin):
+    """
+    Transferts de la période, triés en mémoire (l'heure vient de la date de création de la pièce).
+
+    Côté agence destination d'un transfert entre deux agences, l'article est
+    celui de même désignation dans l'agence (voir transfert_stock.py). La
+    sortie d'un transfert entre deux agences est rejouée sans plancher à 0 :
+    l'entrée de l'autre agence est rejouée en entier, les deux registres
+    portent donc la même quantité. Seul un transfert saisi dans une seule
+    agence garde le plancher.
+    """
+    lignes = LigneFactureTransfert.objects.filter(
+        Q(facture_transfert__agence_source=agence) | Q(facture_transfert__agence_destination=agence),
+        facture_transfert__date_transfert__range=(debut, fin),
+    ).exclude(facture_transfert__statut='annule').values_list(
+        'id', 'article_id', 'article__reference_article', 'article__designation', 'quantite', 'prix_unitaire', 'facture_transfert_id',
+        'facture_transfert__reference_transfert', 'facture_transfert__etat',
+        'facture_transfert__agence_source_id', 'facture_transfert__agence_destination_id',
+        'facture_transfert__date_transfert', 'facture_transfert__date_creation',
+    )
+    lignes = list(lignes)
+    recus = {l[1]: (l[2], l[3]) for l in lignes if l[9] != agence.pk}
+    recus = correspondances_transfert(agence.pk, recus)[0] if recus else {}
+
+    evenements = []
+    for (id_ligne, article_id, _, _, quantite, prix, facture_id, reference, etat,
+         source_id, destination_id, jour, creation) in lignes:
+        sens = signe_transfert(agence.pk, source_id, destination_id, etat)
+        if source_id != agence.pk:
+            article_id = recus.get(article_id, (None,))[0]
+        if not sens or article_id is None:
+            continue
+        entree = sens > 0
+        quantite = Decimal(quantite)
+        heure = timezone.localtime(creation).time() if creation else None
+        evenements.append((_moment(jour, heure), TRANSFERT, id_ligne, {
+            'article_id': article_id, 'type_mouvement': 'entree' if entree else 'sortie',
+            'variation': quantite if entree else -quantite,
+            'plancher_zero': not entree and source_id == destination_id,
+            'cout_unitaire': prix if entree else None, 'numero_piece': reference,
+            'facture_transfert_id': facture_id, 'commentaire': f'Transfert ({etat}) - Facture {reference}',
+        }))
+    evenements.sort(key=lambda e: e[:3])
+    return evenements
+
+
+def _ventes(agence, debut, fin):
+    lignes = LigneFactureVente.objects.filter(
+        facture_vente__agence=agence, facture_vente__date__range=(debut, fin),
+    ).order_by('facture_vente__date', 'facture_vente__heure', 'id').values_list(
+        'id', 'article_id', 'quantite', 'facture_vente_id', 'facture_vente__numero_ticket',
+        'facture_vente__date', 'facture_vente__heure',
+    )
+    for id_ligne, article_id, quantite, facture_id, numero, jour, heure in lignes.iterator(chunk_size=TAILLE_LOT):
+        yield _moment(jour, heure), VENTE, id_ligne, {
+            'article_id': article_id, 'type_mouvement': 'sortie', 'variation': -quantite,
+            'numero_piece': numero, 'facture_vente_id': facture_id, 'commentaire': f'Vente - Facture {numero}',
+        }
+
+
+def _inventaires(agence, debut_periode, fin_periode):
+    lignes = LigneInventaireStock.objects.filter(
+        inventaire__agence=agence, inventaire__statut='termine', article__isnull=False,
+        inventaire__date_fin__gte=debut_periode, inventaire__date_fin__lt=fin_periode,
+    ).order_by('inventaire__date_fin', 'id').values_list(
+        'id', 'article_id', 'quantite_stock', 'inventaire_id', 'inventaire__numero_inventaire', 'inventaire__date_fin',
+    )
+    for id_ligne, article_id, quantite, inventaire_id, numero, date_fin in lignes.iterator(chunk_size=TAILLE_LOT):
+        yield date_fin, INVENTAIRE, id_ligne, {
+            'article_id': article_id, 'type_mouvement': 'inventaire', 'compte': quantite,
+            'numero_piece': numero, 'inventaire_id': inventaire_id, 'commentaire': f'Inventaire {numero}',
+        }
+
+
+def _mouvements_des_pieces(agence, debut, fin, debut_periode, fin_periode):
+    """Mouvements de la période rattachés aux pièces de la période (remplacés par la reconstruction)"""
+    references = FactureTransfert.objects.filter(
+        Q(agence_source=agence) | Q(agence_destination=agence), date_transfert__range=(debut, fin)
+    ).values('reference_transfert')
+    return MouvementStock.objects.filter(
+        agence=agence, date_mouvement__gte=debut_periode, date_mouvement__lt=fin_periode,
+    ).filter(
+        Q(facture_vente__date__range=(debut, fin))
+        | Q(facture_achat__date_achat__range=(debut, fin))
+        | Q(facture_transfert__date_transfert__range=(debut, fin))
+        | Q(numero_piece__in=references)
+        | Q(inventaire__date_fin__gte=debut_periode, inventaire__date_fin__lt=fin_periode)
+    )
+
+
+def _soldes_ouverture(agence, debut_periode, fin_periode, debut, fin, conserves):
+    """{article_id: solde} au début de la période"""
+    dernier = MouvementStock.objects.filter(
+        article=OuterRef('pk'), agence=agence, date_mouvement__lt=debut_periode
+    ).order_by('-date_mouvement', '-id')
+    articles = Article.objects.filter(agence=agence).annotate(
+        solde_ouverture=Subquery(dernier.values('solde')[:1])
+    ).values_list('id', 'stock_actuel', 'solde_ouverture')
+
+    soldes = {}
+    sans_historique = {}
+    for article_id, actuel, solde in articles:
+        if solde is None:
+            sans_historique[article_id] = Decimal(actuel or 0)
+        else:
+            soldes[article_id] = solde
+    if not sans_historique:
+        return soldes
+
+    # Stock actuel moins les variations de la période et celles des mouvements postérieurs
+    variations = defaultdict(Decimal)
+    sources = (
+        (LigneFactureAchat.objects.filter(
+            facture_achat__agence=agence, facture_achat__date_achat__range=(debut, fin)
+        ).exclude(facture_achat__statut='annulee'), Sum('quantite')),
+        (LigneFactureVente.objects.filter(
+            facture_vente__agence=agence, facture_vente__date__range=(debut, fin)
+        ), -Sum('quantite')),
+        (MouvementStock.objects.filter(agence=agence, date_mouvement__gte=fin_periode),
+         Sum(F('solde') - F('stock_initial'))),
+    )
+    for lignes, somme in sources:
+        for article_id, variation in lignes.filter(article_id__in=sans_historique).values('article_id').annotate(
+            variation=somme
+        ).values_list('article_id', 'variation'):
+            variations[article_id] += Decimal(variation or 0)
+    # Transferts : les deux côtés (agence source et destination), lus comme pour la reconstruction
+    for _, _, _, evenement in _transferts(agence, debut, fin):
+        if evenement['article_id'] in sans_historique:
+            variations[evenement['article_id']] += evenement['variation']
+    for mouvement in conserves:
+        if mouvement.article_id in sans_historique:
+            variations[mouvement.article_id] += mouvement.solde - mouvement.stock_initial
+
+    for article_id, actuel in sans_historique.items():
+        soldes[article_id] = actuel - variations[article_id]
+    return soldes
+
+
+def premier_jour(agence):
+    """Jour de la première vente ou du premier achat de l'agence (None sans pièce)"""
+    jours = [
+        FactureVente.objects.filter(agence=agence).aggregate(jour=Min('date'))['jour'],
+        FactureAchat.objects.filter(agence=agence).aggregate(jour=Min('date_achat'))['jour'],
+    ]
+    jours = [jour for jour in jours if jour]
+    return min(jours) if jours else None
+
+
+def reconstruire_registre(agence, debut, fin, taille_lot=TAILLE_LOT, progression=None):
+    """
+    Reconstruire les mouvements de l'agence du jour `debut` au jour `fin` inclus.
+
+    Retourne {'supprimes', 'crees', 'conserves'} ; progression(mouvements écrits)
+    est appelé après chaque lot.
+    """
+    debut_periode = _moment(debut)
+    fin_periode = _moment(fin + timedelta(days=1))
+    resultat = {'supprimes': 0, 'crees': 0, 'conserves': 0}
+
+    with transaction.atomic():
+        resultat['supprimes'], _ = _mouvements_des_pieces(agence, debut, fin, debut_periode, fin_periode).delete()
+
+        # Mouvements conservés : peu nombreux, lus en entier avant les écritures
+        conserves = list(MouvementStock.objects.filter(
+            agence=agence, date_mouvement__gte=debut_periode, date_mouvement__lt=fin_periode,
+        ).order_by('date_mouvement', 'id').only('id', 'article_id', 'date_mouvement', 'stock_initial', 'solde'))
+        soldes = _soldes_ouverture(agence, debut_periode, fin_periode, debut, fin, conserves)
+        prix_achat = dict(Article.objects.filter(agence=agence).values_list('id', 'prix_achat'))
+
+        flux = heapq.merge(
+            _achats(agence, debut, fin),
+            iter(_transferts(agence, debut, fin)),
+            _ventes(agence, debut, fin),
+            ((m.date_mouvement, CONSERVE, m.id, m) for m in conserves),
+            _inventaires(agence, debut_periode, fin_periode),
+            key=lambda e: e[:3],
+        )
+
+        a_creer = []
+        a_mettre_a_jour = []
+
+        def ecrire(final=False):
+            ecrit = False
+            if a_creer and (final or len(a_creer) >= taille_lot):
+                MouvementStock.objects.bulk_create(a_creer, batch_size=taille_lot)
+                resultat['crees'] += len(a_creer)
+                a_creer.clear()
+                ecrit = True
+            if a_mettre_a_jour and (final or len(a_mettre_a_jour) >= taille_lot):
+                MouvementStock.objects.bulk_update(
+                    a_mettre_a_jour, ['stock_initial', 'solde', 'quantite_stock'], batch_size=taille_lot
+                )
+                resultat['conserves'] += len(a_mettre_a_jour)
+                a_mettre_a_jour.clear()
+                ecrit = True
+            if ecrit and progression:
+                progression(resultat['crees'] + resultat['conserves'])
+
+        for moment, source, _, evenement in flux:
+            if source == CONSERVE:
+                article_id = evenement.article_id
+            else:
+                article_id = evenement['article_id']
+            if article_id not in soldes:
+                continue
+            ancien = Decimal(soldes[article_id])
+
+            if source == CONSERVE:
+                nouveau = ancien + evenement.solde - evenement.stock_initial
+                evenement.stock_initial, evenement.solde, evenement.quantite_stock = ancien, nouveau, nouveau
+                a_mettre_a_jour.append(evenement)
+            else:
+                if source == INVENTAIRE:
+                    nouveau = Decimal(evenement.pop('compte'))
+                    if nouveau == ancien:
+                        continue
+                else:
+                    nouveau = ancien + Decimal(evenement.pop('variation'))
+                    if evenement.pop('plancher_zero', False):
+                        nouveau = max(nouveau, Decimal('0'))
+                cout = evenement.get('cout_unitaire') or prix_achat[article_id]
+                mouvement = MouvementStock(
+                    agence=agence, date_mouvement=moment, quantite=abs(nouveau - ancien),
+                    stock_initial=ancien, solde=nouveau, quantite_stock=nouveau,
+                    cout_moyen_pondere=cout, stock_permanent=nouveau * cout, **evenement,
+                )
+                mouvement._valorise = True
+                a_creer.append(mouvement)
+            soldes[article_id] = nouveau
+            ecrire()
+        ecrire(final=True)
+
+        StockJournalier.objects.filter(agence=agence, jour__gte=debut).delete()
+        reconstruire_cmup(agence)
+    return resultat
@@ -0,0 +1,145 @@
+"""
+Résultats journaliers des agences (séries du tableau de bord financier)
+
+ResultatJournalier garde, pour chaque agence et chaque jour terminé : le
+chiffre d'affaires et le nombre des factures de vente, la marge (ventes
+journalières : chiffre d'affaires moins coût des ventes) et le montant et le
+nombre des dépenses. Un jour terminé est calculé une fois, puis relu :
+
+- par_jour(debut, fin) lit les jours figés de la période en une requête,
+  fige d'abord les jours terminés qui manquent (trois requêtes groupées
+  pour toute la période, quel que soit le nombre d'agences) et calcule le
+  jour en cours à part, sans le figer
+- invalider(cles) efface les jours figés qu'une pièce tardive rend faux
+  (facture de vente antidatée ou défacturée, dépense saisie ou modifiée
+  après coup) ; ils sont recalculés à la prochaine lecture. Les factures et
+  les dépenses l'appellent par leurs signaux, l'écriture groupée des ventes
+  (vente_utils) directement.
+
+Recharger le tableau de bord ne relit donc que le jour en cours, quelle que
+soit la longueur de l'historique.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Agence, Depense, FactureVente, ResultatJournalier, VenteJournaliere
+
+CHAMPS = ('chiffre_affaires', 'nombre_ventes', 'marge', 'depenses', 'nombre_depenses')
+
+
+def _vide():
+    return {
+        'chiffre_affaires': Decimal('0'), 'nombre_ventes': 0, 'marge': Decimal('0'),
+        'depenses': Decimal('0'), 'nombre_depenses': 0,
+    }
+
+
+def debut_du_jour(jour):
+    """Minuit (local) du jour, date-heure comparable à Depense.date"""
+    debut = datetime.combine(jour, time.min)
+    return timezone.make_aware(debut) if timezone.is_naive(debut) and timezone.is_aware(timezone.now()) else debut
+
+
+def jour_de(valeur):
+    """Jour local d'une date ou d'une date-heure (None si vide)"""
+    if valeur is None:
+        return None
+    if isinstance(valeur, str):
+        valeur = datetime.fromisoformat(valeur)
+    if isinstance(valeur, datetime):
+        return timezone.localdate(valeur) if timezone.is_aware(valeur) else valeur.date()
+    return valeur
+
+
+def calculer(agence_ids, debut, fin):
+    """{(agence_id, jour): valeurs} de la période, calculées en trois requêtes groupées"""
+    resultats = defaultdict(_vide)
+    for agence_id, jour, total, nombre in FactureVente.objects.filter(
+        agence_id__in=agence_ids, date__range=(debut, fin)
+    ).values('agence_id', 'date').annotate(total=Sum('nette_a_payer'), nombre=Count('id')).order_by().values_list(
+        'agence_id', 'date', 'total', 'nombre'
+    ):
+        resultats[(agence_id, jour)]['chiffre_affaires'] = Decimal(total or 0)
+        resultats[(agence_id, jour)]['nombre_ventes'] = nombre
+
+    for agence_id, jour, chiffre_affaires, cout in VenteJournaliere.objects.filter(
+        agence_id__in=agence_ids, jour__range=(debut, fin)
+    ).values('agence_id', 'jour').annotate(
+        total_chiffre_affaires=Sum('chiffre_affaires'), total_cout=Sum('cout'),
+    ).order_by().values_list('agence_id', 'jour', 'total_chiffre_affaires', 'total_cout'):
+        resultats[(agence_id, jour)]['marge'] = Decimal(chiffre_affaires or 0) - Decimal(cout or 0)
+
+    for agence_id, jour, total, nombre in Depense.objects.filter(
+        agence_id__in=agence_ids, date__gte=debut_du_jour(debut), date__lt=debut_du_jour(fin + timedelta(days=1)),
+    ).annotate(jour=TruncDate('date')).values('agence_id', 'jour').annotate(
+        total=Sum('montant'), nombre=Count('id'),
+    ).order_by().values_list('agence_id', 'jour', 'total', 'nombre'):
+        resultats[(agence_id, jour)]['depenses'] = Decimal(total or 0)
+        resultats[(agence_id, jour)]['nombre_depenses'] = nombre
+    return resultats
+
+
+def _figer(manquants):
+    """Calculer et écrire les (agence_id, jour) terminés manquants ; retourne leurs valeurs"""
+    agence_ids = {agence_id for agence_id, _ in manquants}
+    jours = [jour for _, jour in manquants]
+    calcules = calculer(agence_ids, min(jours), max(jours))
+    valeurs = {cle: calcules.get(cle) or _vide() for cle in manquants}
+    ResultatJournalier.objects.bulk_create(
+        [ResultatJournalier(agence_id=agence_id, jour=jour, **valeurs[(agence_id, jour)])
+         for agence_id, jour in sorted(manquants)],
+        batch_size=2000, ignore_conflicts=True,
+    )
+    return valeurs
+
+
+def par_jour(debut, fin, agences=None):
+    """
+    {jour: valeurs} de la période, cumulées sur les agences (toutes par défaut).
+
+    Jours terminés : lus dans ResultatJournalier (figés au besoin) ; jour en
+    cours : calculé à chaque appel.
+    """
+    aujourd_hui = timezone.localdate()
+    agence_ids = set((agences if agences is not None else Agence.objects.all()).values_list('pk', flat=True))
+    totaux = defaultdict(_vide)
+
+    fin_figee = min(fin, aujourd_hui - timedelta(days=1))
+    if debut <= fin_figee:
+        figes = {}
+        for ligne in ResultatJournalier.objects.filter(
+            agence_id__in=agence_ids, jour__range=(debut, fin_figee)
+        ).values('agence_id', 'jour', *CHAMPS):
+            figes[(ligne['agence_id'], ligne['jour'])] = ligne
+        manquants = {
+            (agence_id, debut + timedelta(days=n))
+            for agence_id in agence_ids for n in range((fin_figee - debut).days + 1)
+        } - set(figes)
+        if manquants:
+            figes.update(_figer(manquants))
+        for (_, jour), valeurs in figes.items():
+            for champ in CHAMPS:
+                totaux[jour][champ] += valeurs[champ]
+
+    if debut <= aujourd_hui <= fin:
+        for (_, jour), valeurs in calculer(agence_ids, aujourd_hui, aujourd_hui).items():
+            for champ in CHAMPS:
+                totaux[jour][champ] += valeurs[champ]
+    return totaux
+
+
+def invalider(cles):
+    """Effacer les jours terminés figés de ces (agence_id, jour ou date-heure)"""
+    aujourd_hui = timezone.localdate()
+    passes = defaultdict(set)
+    for agence_id, valeur in cles:
+        jour = jour_de(valeur)
+        if agence_id is not None and jour is not None and jour < aujourd_hui:
+            passes[agence_id].add(jour)
+    for agence_id, jours in passes.items():
+        ResultatJournalier.objects.filter(agence_id=agence_id, jour__in=jours).delete()
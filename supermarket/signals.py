@@ -0,0 +1,101 @@
+"""
+Signaux de l'application supermarket (branchés dans SupermarketConfig.ready)
+"""
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Article, Commande, Depense, FactureCommande, FactureTemporaire, FactureVente, LigneFactureVente, SessionCaisse,
+    TypeVente,
+)
+from . import alertes_stock, catalogue_index, resultat_journalier, ticket_escpos
+from .compteurs_caisse import initialiser_session, modifier_tickets_attente
+
+
+@receiver(post_save, sender=Article)
+def article_enregistre(sender, instance, created=False, update_fields=None, **kwargs):
+    """Tenir à jour l'index de recherche de la caisse, les articles en alerte et les tickets de commande"""
+    catalogue_index.article_modifie(instance)
+    if update_fields is None or alertes_stock.CHAMPS_STOCK.intersection(update_fields):
+        alertes_stock.actualiser([instance.pk])
+    if not created and (update_fields is None or ticket_escpos.CHAMPS_ARTICLE.intersection(update_fields)):
+        ticket_escpos.invalider_article(instance)
+
+
+@receiver(post_delete, sender=Article)
+def article_supprime(sender, instance, **kwargs):
+    catalogue_index.article_supprime(instance)
+
+
+@receiver(post_save, sender=TypeVente)
+@receiver(post_delete, sender=TypeVente)
+def type_vente_modifie(sender, instance, **kwargs):
+    """Les prix par type de vente font partie de l'entrée de l'article dans l'index"""
+    try:
+        article = Article.objects.get(pk=instance.article_id)
+    except Article.DoesNotExist:
+        return
+    catalogue_index.types_vente_modifies(article)
+
+
+@receiver(post_save, sender=SessionCaisse)
+def session_caisse_ouverte(sender, instance, created, **kwargs):
+    """Compteurs de départ de la session (factures du jour sans session, première ouverture)"""
+    if created:
+        initialiser_session(instance)
+
+
+@receiver(post_save, sender=FactureTemporaire)
+def ticket_mis_en_attente(sender, instance, created, **kwargs):
+    if created:
+        modifier_tickets_attente(instance.session_caisse_id, 1)
+
+
+@receiver(post_delete, sender=FactureTemporaire)
+def ticket_attente_supprime(sender, instance, **kwargs):
+    modifier_tickets_attente(instance.session_caisse_id, -1)
+
+
+@receiver(post_save, sender=FactureVente)
+@receiver(post_delete, sender=FactureVente)
+def facture_vente_modifiee(sender, instance, **kwargs):
+    """Le ticket ESC/POS en cache ne doit plus être servi ; un jour terminé touché est recalculé"""
+    ticket_escpos.invalider_vente(instance.pk)
+    resultat_journalier.invalider([(instance.agence_id, instance.date)])
+
+
+@receiver(pre_save, sender=Depense)
+def depense_modifiee(sender, instance, **kwargs):
+    """Une dépense déplacée quitte aussi son ancien jour"""
+    if instance.pk:
+        resultat_journalier.invalider(Depense.objects.filter(pk=instance.pk).values_list('agence_id', 'date'))
+
+
+@receiver(post_save, sender=Depense)
+@receiver(post_delete, sender=Depense)
+def depense_enregistree(sender, instance, **kwargs):
+    """Jour terminé des résultats journaliers à recalculer (dépense saisie après coup)"""
+    resultat_journalier.invalider([(instance.agence_id, instance.date)])
+
+
+@receiver(post_save, sender=LigneFactureVente)
+@receiver(post_delete, sender=LigneFactureVente)
+def ligne_facture_vente_modifiee(sender, instance, **kwargs):
+    ticket_escpos.invalider_vente(instance.facture_vente_id)
+
+
+@receiver(post_save, sender=FactureCommande)
+@receiver(post_delete, sender=FactureCommande)
+def facture_commande_modifiee(sender, instance, **kwargs):
+    ticket_escpos.invalider_commandes([instance.pk])
+
+
+@receiver(post_save, sender=Commande)
+@receiver(post_delete, sender=Commande)
+def commande_modifiee(sender, instance, **kwargs):
+    """Les lignes d'une facture de commande sont relues dans les commandes du client"""
+    ticket_escpos.invalider_commandes(
+        FactureCommande.objects.filter(
+            commande__client_id=instance.client_id, agence_id=instance.agence_id
+        ).values_list('id', flat=True)
+    )
@@ -0,0 +1,18 @@
+"""
+Possibilités SQL de la base connectée, partagées par les écritures atomiques
+(compteurs de tickets dans ticket_utils.py, stock dans stock_utils.py)
+"""
+from django.db import connection
+
+
+def update_returning_disponible():
+    """
+    UPDATE ... RETURNING est supporté par PostgreSQL et SQLite >= 3.35.
+
+    Pour SQLite, la version est celle de la bibliothèque utilisée par la
+    connexion (fonctionnalités déclarées par le backend Django). MySQL et
+    MariaDB n'ont pas de RETURNING sur UPDATE.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
@@ -0,0 +1,243 @@
+"""
+Statistiques de vente par article et par période
+
+StatistiqueVente cumule les ventes de chaque article par jour, par semaine
+(à partir du lundi) et par mois : quantité, chiffre d'affaires, marge et
+nombre de lignes de facture. Elle est calculée à partir des ventes
+journalières (ventes_journalieres.py), jamais des lignes de facture :
+
+- rafraichir(agence) reprend les ventes journalières modifiées depuis le
+  filigrane de l'agence (RafraichissementStatistiques.jusqu_a). Les périodes
+  qu'elles touchent sont recalculées pour leurs articles, une requête
+  groupée par granularité, puis le filigrane avance. Sans filigrane
+  (premier passage, ventes journalières reconstruites) toute l'agence est
+  recalculée. La reprise commence un peu avant le filigrane (MARGE) : une
+  vente validée pendant le rafraîchissement précédent n'est pas perdue, et
+  recalculer deux fois une période ne change rien.
+- statistiques_articles() et totaux_periode() lisent une période quelconque
+  en une requête : mois entiers, puis semaines entières, puis jours restants.
+
+Les pages de statistiques rafraîchissent l'agence avant de lire ; les exports
+relisent la table d'après les critères gardés en session.
+
+Marge : chiffre d'affaires moins le coût des ventes (quantité × CMUP de la
+sortie de stock de la facture).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import RafraichissementStatistiques, StatistiqueVente, VenteJournaliere
+
+JOUR, SEMAINE, MOIS = 'jour', 'semaine', 'mois'
+GRANULARITES = (JOUR, SEMAINE, MOIS)
+_TRONCATURES = {SEMAINE: 'week', MOIS: 'month'}
+
+MARGE = timedelta(minutes=5)
+TAILLE_LOT = 2000
+
+
+def debut_periode(jour, granularite):
+    """Premier jour de la période (jour, semaine commençant le lundi, mois) qui contient `jour`"""
+    if granularite == SEMAINE:
+        return jour - timedelta(days=jour.weekday())
+    if granularite == MOIS:
+        return jour.replace(day=1)
+    return jour
+
+
+def fin_periode(debut, granularite):
+    """Dernier jour de la période qui commence à `debut`"""
+    if granularite == SEMAINE:
+        return debut + timedelta(days=6)
+    if granularite == MOIS:
+        return (debut.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return debut
+
+
+def couverture(date_debut, date_fin):
+    """Filtre des périodes qui couvrent exactement [date_debut, date_fin] : les plus longues possibles"""
+    segments = []
+    jour = date_debut
+    while jour <= date_fin:
+        granularite = next(
+            g for g in (MOIS, SEMAINE, JOUR)
+            if debut_periode(jour, g) == jour and fin_periode(jour, g) <= date_fin
+        )
+        if segments and segments[-1][0] == granularite:
+            segments[-1][2] = jour
+        else:
+            segments.append([granularite, jour, jour])
+        jour = fin_periode(jour, granularite) + timedelta(days=1)
+
+    condition = Q(pk__in=[])
+    for granularite, premier, dernier in segments:
+        condition |= Q(granularite=granularite, debut_periode__range=(premier, dernier))
+    return condition
+
+
+def _recalculer(agence, granularite, article_ids=None, premier=None, dernier=None):
+    """Réécrire les périodes [premier, dernier] de la granularité pour ces articles (tout par défaut)"""
+    anciennes = StatistiqueVente.objects.filter(agence=agence, granularite=granularite)
+    ventes = VenteJournaliere.objects.filter(agence=agence, nombre_lignes__gt=0)
+    if article_ids is not None:
+        anciennes = anciennes.filter(article_id__in=article_ids)
+        ventes = ventes.filter(article_id__in=article_ids)
+    if premier is not None:
+        anciennes = anciennes.filter(debut_periode__range=(premier, dernier))
+        ventes = ventes.filter(jour__range=(premier, fin_periode(dernier, granularite)))
+
+    if granularite == JOUR:
+        periode = F('jour')
+    else:
+        periode = Trunc('jour', _TRONCATURES[granularite], output_field=DateField())
+    groupes = ventes.annotate(periode=periode).values('article_id', 'periode').annotate(
+        total_quantite=Sum('quantite'),
+        total_chiffre_affaires=Sum('chiffre_affaires'),
+        total_cout=Sum('cout'),
+        total_lignes=Sum('nombre_lignes'),
+    ).order_by()
+
+    anciennes.delete()
+    lot = []
+    for groupe in groupes.iterator(chunk_size=TAILLE_LOT):
+        chiffre_affaires = Decimal(groupe['total_chiffre_affaires'] or 0)
+        lot.append(StatistiqueVente(
+            agence=agence, article_id=groupe['article_id'], granularite=granularite,
+            debut_periode=groupe['periode'], quantite=groupe['total_quantite'] or 0,
+            chiffre_affaires=chiffre_affaires,
+            marge_profit=chiffre_affaires - Decimal(groupe['total_cout'] or 0),
+            nombre_lignes=groupe['total_lignes'] or 0,
+        ))
+        if len(lot) >= TAILLE_LOT:
+            StatistiqueVente.objects.bulk_create(lot)
+            lot = []
+    if lot:
+        StatistiqueVente.objects.bulk_create(lot)
+
+
+def rafraichir(agence, complet=False):
+    """
+    Mettre à jour les statistiques de l'agence depuis son filigrane.
+
+    Retourne le nombre de (article, jour) repris, None pour un recalcul complet.
+    """
+    with transaction.atomic():
+        filigrane, _ = RafraichissementStatistiques.objects.select_for_update().get_or_create(agence=agence)
+        maintenant = timezone.now()
+
+        if complet or filigrane.jusqu_a is None:
+            for granularite in GRANULARITES:
+                _recalculer(agence, granularite)
+            repris = None
+        else:
+            modifies = set(VenteJournaliere.objects.filter(
+                agence=agence, modifie_le__gte=filigrane.jusqu_a - MARGE
+            ).values_list('article_id', 'jour'))
+            if modifies:
+                article_ids = {article_id for article_id, _ in modifies}
+                for granularite in GRANULARITES:
+                    periodes = {debut_periode(jour, granularite) for _, jour in modifies}
+                    _recalculer(agence, granularite, article_ids, min(periodes), max(periodes))
+            repris = len(modifies)
+
+        filigrane.jusqu_a = maintenant
+        filigrane.save(update_fields=['jusqu_a'])
+    return repris
+
+
+def _pourcentage(marge, chiffre_affaires):
+    return float(marge / chiffre_affaires * 100) if chiffre_affaires else 0.0
+
+
+def _periode(agence, date_debut, date_fin, famille_id=None, article_ids=None):
+    statistiques = StatistiqueVente.objects.filter(couverture(date_debut, date_fin), agence=agence)
+    if famille_id:
+        statistiques = statistiques.filter(article__categorie_id=famille_id)
+    if article_ids:
+        statistiques = statistiques.filter(article_id__in=article_ids)
+    return statistiques
+
+
+def statistiques_articles(agence, date_debut, date_fin, famille_id=None, article_ids=None):
+    """
+    (lignes, totaux) des articles vendus sur la période, triés par désignation, en une requête.
+
+    lignes : dicts reference_article, designation, quantite_vendue,
+    chiffre_affaires, marge_profit, pourcentage_marge (floats) ;
+    totaux : quantite_totale_vendue, chiffre_affaires_total, marge_totale,
+    pourcentage_marge_global.
+    """
+    groupes = _periode(agence, date_debut, date_fin, famille_id, article_ids).values(
+        'article_id', 'article__reference_article', 'article__designation',
+    ).annotate(
+        quantite_vendue=Sum('quantite'),
+        total_chiffre_affaires=Sum('chiffre_affaires'),
+        total_marge=Sum('marge_profit'),
+    ).filter(quantite_vendue__gt=0).order_by('article__designation', 'article_id')
+
+    lignes = []
+    quantite_totale = chiffre_affaires_total = marge_totale = Decimal('0')
+    for groupe in groupes:
+        quantite = Decimal(groupe['quantite_vendue'] or 0)
+        chiffre_affaires = Decimal(groupe['total_chiffre_affaires'] or 0)
+        marge = Decimal(groupe['total_marge'] or 0)
+        lignes.append({
+            'reference_article': groupe['article__reference_article'],
+            'designation': groupe['article__designation'],
+            'quantite_vendue': float(quantite),
+            'chiffre_affaires': float(chiffre_affaires),
+            'marge_profit': float(marge),
+            'pourcentage_marge': _pourcentage(marge, chiffre_affaires),
+        })
+        quantite_totale += quantite
+        chiffre_affaires_total += chiffre_affaires
+        marge_totale += marge
+
+    totaux = {
+        'quantite_totale_vendue': float(quantite_totale),
+        'chiffre_affaires_total': float(chiffre_affaires_total),
+        'marge_totale': float(marge_totale),
+        'pourcentage_marge_global': _pourcentage(marge_totale, chiffre_affaires_total),
+    }
+    return lignes, totaux
+
+
+def totaux_periode(agence, date_debut, date_fin):
+    """Chiffre d'affaires et marge de l'agence sur la période, en une requête"""
+    totaux = _periode(agence, date_debut, date_fin).aggregate(
+        total_chiffre_affaires=Sum('chiffre_affaires'), total_marge=Sum('marge_profit'),
+    )
+    chiffre_affaires = Decimal(totaux['total_chiffre_affaires'] or 0)
+    marge = Decimal(totaux['total_marge'] or 0)
+    return {
+        'chiffre_affaires_total': float(chiffre_affaires),
+        'marge_totale': float(marge),
+        'pourcentage_marge_global': _pourcentage(marge, chiffre_affaires),
+    }
+
+
+def rapport(agence, criteres):
+    """
+    Statistiques des critères gardés en session par generer_statistiques_vente (None sans critères).
+
+    Retourne date_debut, date_fin, statistiques_articles et les totaux,
+    relus dans StatistiqueVente après rafraîchissement de l'agence.
+    """
+    if not criteres:
+        return None
+    if 'statistiques_articles' in criteres:
+        # Session enregistrée avant que les critères seuls n'y soient gardés
+        return criteres
+    rafraichir(agence)
+    lignes, totaux = statistiques_articles(
+        agence, date.fromisoformat(criteres['date_debut']), date.fromisoformat(criteres['date_fin']),
+        famille_id=criteres.get('famille'), article_ids=criteres.get('articles'),
+    )
+    totaux['quantite_totale_vendue'] = int(totaux['quantite_totale_vendue'])
+    return {'date_debut': criteres['date_debut'], 'date_fin': criteres['date_fin'],
+            'statistiques_articles': lignes, **totaux}
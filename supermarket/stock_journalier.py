@@ -0,0 +1,152 @@
+"""
+Stock de clôture journalier des articles (état d'inventaire)
+
+StockJournalier garde, pour chaque article et chaque jour terminé, le stock
+après le dernier mouvement du jour (quantite_stock, à défaut solde). Un
+article sans mouvement jusque-là prend son stock actuel, comme l'état
+d'inventaire le calculait.
+
+- figer(agence, debut, fin) calcule les jours manquants de la période en un
+  seul parcours : stock d'ouverture de chaque article (une requête), puis
+  mouvements de la période par ordre chronologique ; les lignes sont écrites
+  par bulk_create, par lots
+- rafraichir(agence) complète les jours terminés depuis le dernier jour figé
+  (fermeture de caisse)
+- invalider(mouvements) efface les jours figés qu'un mouvement antidaté
+  (caisse hors ligne resynchronisée, pièce saisie en retard) rend faux ; ils
+  sont recalculés à la prochaine demande
+- lire_periode(agences, debut, fin) : une seule lecture par plage de jours
+
+Aujourd'hui n'est jamais figé : les jours à partir d'aujourd'hui se lisent
+sur le stock actuel.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Article, MouvementStock, StockJournalier
+
+TAILLE_LOT = 2000
+
+
+def hier():
+    return timezone.localdate() - timedelta(days=1)
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def _jours(debut, fin):
+    jour = debut
+    while jour <= fin:
+        yield jour
+        jour += timedelta(days=1)
+
+
+def _quantite(quantite_stock, solde):
+    return quantite_stock or solde or 0
+
+
+def jours_manquants(agence, debut, fin):
+    """Jours terminés de la période qui ne sont pas encore figés"""
+    fin = min(fin, hier())
+    if debut > fin:
+        return []
+    figes = set(
+        StockJournalier.objects.filter(agence=agence, jour__range=(debut, fin))
+        .order_by('jour').values_list('jour', flat=True).distinct()
+    )
+    return [jour for jour in _jours(debut, fin) if jour not in figes]
+
+
+def _stocks_ouverture(agence, ouverture):
+    """{article_id: stock} avant `ouverture` : dernier mouvement antérieur, sinon stock actuel"""
+    dernier = MouvementStock.objects.filter(
+        article=OuterRef('pk'), agence=agence, date_mouvement__lt=ouverture
+    ).order_by('-date_mouvement', '-id')
+    articles = Article.objects.filter(agence=agence).annotate(
+        dernier_stock=Subquery(dernier.values('quantite_stock')[:1]),
+        dernier_solde=Subquery(dernier.values('solde')[:1]),
+    ).values_list('id', 'stock_actuel', 'dernier_stock', 'dernier_solde')
+    return {
+        article_id: actuel if stock is None else _quantite(stock, solde)
+        for article_id, actuel, stock, solde in articles
+    }
+
+
+def figer(agence, debut, fin):
+    """Figer les jours terminés manquants de [debut, fin] ; retourne le nombre de lignes écrites"""
+    manquants = jours_manquants(agence, debut, fin)
+    if not manquants:
+        return 0
+    premier, dernier = manquants[0], manquants[-1]
+    a_figer = set(manquants)
+
+    ecrites = 0
+    with transaction.atomic():
+        stocks = _stocks_ouverture(agence, _debut_du_jour(premier))
+        mouvements = MouvementStock.objects.filter(
+            agence=agence,
+            date_mouvement__gte=_debut_du_jour(premier),
+            date_mouvement__lt=_debut_du_jour(dernier + timedelta(days=1)),
+        ).order_by('date_mouvement', 'id').values_list('article_id', 'date_mouvement', 'quantite_stock', 'solde')
+        flux = mouvements.iterator(chunk_size=TAILLE_LOT)
+        suivant = next(flux, None)
+        lot = []
+        for jour in _jours(premier, dernier):
+            fin_jour = _debut_du_jour(jour + timedelta(days=1))
+            while suivant is not None and suivant[1] < fin_jour:
+                if suivant[0] in stocks:
+                    stocks[suivant[0]] = _quantite(suivant[2], suivant[3])
+                suivant = next(flux, None)
+            if jour not in a_figer:
+                continue
+            lot.extend(
+                StockJournalier(agence=agence, article_id=article_id, jour=jour, quantite=quantite)
+                for article_id, quantite in stocks.items()
+            )
+            if len(lot) >= TAILLE_LOT:
+                StockJournalier.objects.bulk_create(lot, batch_size=TAILLE_LOT, ignore_conflicts=True)
+                ecrites += len(lot)
+                lot = []
+        StockJournalier.objects.bulk_create(lot, batch_size=TAILLE_LOT, ignore_conflicts=True)
+        ecrites += len(lot)
+    return ecrites
+
+
+def rafraichir(agence):
+    """Figer les jours terminés depuis le dernier jour figé (au plus hier si rien n'est encore figé)"""
+    dernier = StockJournalier.objects.filter(agence=agence).aggregate(Max('jour'))['jour__max']
+    return figer(agence, dernier + timedelta(days=1) if dernier else hier(), hier())
+
+
+def invalider(mouvements):
+    """Effacer, par agence, les jours figés à partir du plus ancien jour passé touché par les mouvements"""
+    aujourd_hui = timezone.localdate()
+    plus_anciens = {}
+    for mouvement in mouvements:
+        date_mouvement = mouvement.date_mouvement
+        if date_mouvement is None:
+            continue
+        if timezone.is_naive(date_mouvement):
+            date_mouvement = timezone.make_aware(date_mouvement)
+        jour = timezone.localdate(date_mouvement)
+        if jour < aujourd_hui and jour < plus_anciens.get(mouvement.agence_id, aujourd_hui):
+            plus_anciens[mouvement.agence_id] = jour
+    for agence_id, jour in plus_anciens.items():
+        StockJournalier.objects.filter(agence_id=agence_id, jour__gte=jour).delete()
+
+
+def lire_periode(agences, debut, fin):
+    """{(agence_id, jour): {article_id: stock}} des jours figés de la période"""
+    stocks = defaultdict(dict)
+    lignes = StockJournalier.objects.filter(agence__in=agences, jour__range=(debut, fin)).values_list(
+        'agence_id', 'jour', 'article_id', 'quantite'
+    )
+    for agence_id, jour, article_id, quantite in lignes.iterator(chunk_size=TAILLE_LOT):
+        stocks[(agence_id, jour)][article_id] = quantite
+    return stocks
@@ -0,0 +1,140 @@
+"""
+Variations du stock des articles (stock_actuel)
+
+Toute modification relative du stock passe par appliquer_variations : chaque
+article est modifié par un UPDATE conditionnel unique
+(stock_actuel = stock_actuel + variation ... RETURNING stock_actuel) au lieu
+d'une lecture suivie d'un article.save(). Deux caisses qui vendent le même
+article au même moment ne perdent donc plus de mise à jour.
+
+- les articles sont modifiés par ordre d'id croissant : deux transactions qui
+  touchent les mêmes articles prennent les verrous dans le même ordre et ne
+  s'interbloquent pas
+- interdire_negatif : la sortie n'est appliquée que si le stock reste >= 0,
+  sinon StockInsuffisant est levée et aucune variation de l'appel n'est
+  conservée (survente entre caisses)
+- plancher_zero : le stock est ramené à 0 au lieu de devenir négatif (retours
+  d'achat et annulations, comme auparavant)
+
+Sans UPDATE ... RETURNING (MySQL), le stock est relu après la mise à jour,
+sous le verrou de ligne posé par l'UPDATE. L'ensemble des articles en
+alerte est actualisé dans la même transaction (alertes_stock.py).
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from .alertes_stock import actualiser as actualiser_alertes
+from .models import Article
+from .sql_utils import update_returning_disponible
+
+DEUX_DECIMALES = Decimal('0.01')
+
+
+class StockInsuffisant(Exception):
+    """Sortie refusée : le stock de l'article deviendrait négatif"""
+
+    def __init__(self, article_id, quantite):
+        super().__init__(f"Stock insuffisant pour l'article {article_id} (sortie de {quantite})")
+        self.article_id = article_id
+        self.quantite = quantite
+
+
+def _decimal(valeur):
+    if isinstance(valeur, Decimal):
+        return valeur
+    return Decimal(str(valeur or 0))
+
+
+def _lire_decimal(valeur):
+    return Decimal(str(valeur)).quantize(DEUX_DECIMALES)
+
+
+def _executer(sql, parametres, returning):
+    with connection.cursor() as curseur:
+        curseur.execute(sql + (' RETURNING stock_actuel' if returning else ''), parametres)
+        if returning:
+            ligne = curseur.fetchone()
+            return None if ligne is None else _lire_decimal(ligne[0])
+        return curseur.rowcount or None
+
+
+def _relire(article_id):
+    return Article.objects.filter(pk=article_id).values_list('stock_actuel', flat=True).first()
+
+
+def _ajouter(table, article_id, variation, garde, returning):
+    """Nouveau stock, ou None si l'article n'existe pas ou si la garde a refusé la sortie"""
+    sql = f'UPDATE {table} SET stock_actuel = stock_actuel + %s, suivi_stock = %s WHERE id = %s'
+    parametres = [variation, True, article_id]
+    if garde:
+        sql += ' AND stock_actuel + %s >= 0'
+        parametres.append(variation)
+    resultat = _executer(sql, parametres, returning)
+    if resultat is None or returning:
+        return resultat
+    return _relire(article_id)
+
+
+def _ajouter_avec_plancher(table, article_id, variation, returning):
+    """
+    Appliquer la variation sans descendre sous 0 ; retourne (ancien, nouveau) ou None si l'article n'existe pas.
+
+    Comparer-échanger : le stock lu n'est remplacé que s'il n'a pas changé entre-temps.
+    """
+    while True:
+        ancien = _relire(article_id)
+        if ancien is None:
+            return None
+        nouveau = max(ancien + variation, Decimal('0'))
+        if _executer(
+            f'UPDATE {table} SET stock_actuel = %s, suivi_stock = %s WHERE id = %s AND stock_actuel = %s',
+            [nouveau, True, article_id, ancien], returning,
+        ) is not None:
+            return ancien, nouveau
+
+
+def appliquer_variations(variations, interdire_negatif=False, plancher_zero=False):
+    """
+    Appliquer des variations de stock {article_id: quantité (négative = sortie)}.
+
+    Retourne {article_id: (ancien_stock, nouveau_stock)} ; les articles
+    inexistants sont ignorés. Lève StockInsuffisant (rien n'est appliqué) si
+    interdire_negatif et qu'une sortie dépasse le stock.
+    """
+    table = connection.ops.quote_name(Article._meta.db_table)
+    returning = update_returning_disponible()
+    resultats = {}
+    with transaction.atomic():
+        for article_id in sorted(variations):
+            variation = _decimal(variations[article_id])
+            garde = variation < 0 and (interdire_negatif or plancher_zero)
+            nouveau = _ajouter(table, article_id, variation, garde, returning)
+            if nouveau is not None:
+                resultats[article_id] = (nouveau - variation, nouveau)
+                continue
+            if not garde or _relire(article_id) is None:
+                continue
+            if interdire_negatif:
+                raise StockInsuffisant(article_id, -variation)
+            stocks = _ajouter_avec_plancher(table, article_id, variation, returning)
+            if stocks is not None:
+                resultats[article_id] = stocks
+        # Ensemble des articles en alerte / rupture (alertes_stock.py)
+        actualiser_alertes(resultats)
+    return resultats
+
+
+def appliquer_variation(article, variation, interdire_negatif=False, plancher_zero=False):
+    """
+    Variation de stock d'un seul article ; retourne (ancien_stock, nouveau_stock).
+
+    L'instance passée est mise à jour (stock_actuel, suivi_stock) pour les
+    lectures qui suivent dans la vue.
+    """
+    ancien, nouveau = appliquer_variations(
+        {article.pk: variation}, interdire_negatif=interdire_negatif, plancher_zero=plancher_zero
+    ).get(article.pk, (article.stock_actuel, article.stock_actuel))
+    article.stock_actuel = nouveau
+    article.suivi_stock = True
+    return ancien, nouveau
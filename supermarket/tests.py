@@ -1,16 +1,21 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db.models import F
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 
 from .models import (
+    AlerteStock,
     Agence,
     Compte,
     Famille,
     Article,
     MouvementStock,
+    Notification,
+    TypeVente,
+    VersionCatalogue,
 )
 
 
@@ -126,3 +131,1012 @@ class ConsulterMouvementsStockTests(TestCase):
                 self.assertNotIsInstance(obj, Decimal)
 
         assert_no_decimal(mouvements_stock)
+
+
+class AttributionNumeroTicketTests(TestCase):
+    def setUp(self):
+        self.agence = Agence.objects.create(nom_agence='Agence A', adresse='Adresse A')
+        self.autre_agence = Agence.objects.create(nom_agence='Agence B', adresse='Adresse B')
+
+    def test_numeros_sequentiels_par_agence(self):
+        from .ticket_utils import allouer_numero_ticket, apercu_numero_ticket
+
+        jour = timezone.now().date()
+        apercu = apercu_numero_ticket(self.agence, jour)
+        premier = allouer_numero_ticket(self.agence, jour)
+        second = allouer_numero_ticket(self.agence, jour)
+        autre = allouer_numero_ticket(self.autre_agence, jour)
+
+        self.assertEqual(apercu, premier)
+        self.assertTrue(premier.endswith('-001'))
+        self.assertTrue(second.endswith('-002'))
+        self.assertTrue(autre.endswith('-001'))
+        self.assertNotEqual(premier, autre)
+        self.assertEqual(apercu_numero_ticket(self.agence, jour)[-3:], '003')
+
+
+class AgenceVenteTestCase(TestCase):
+    """Agence avec une caisse, un client et trois articles en stock (données communes)"""
+
+    def setUp(self):
+        from .models import Client, Caisse
+
+        self.agence = Agence.objects.create(nom_agence='Agence Vente', adresse='Adresse')
+        self.famille = Famille.objects.create(code='BOIS', intitule='Boissons', unite_vente='Bouteille')
+        self.client_vente = Client.objects.create(
+            intitule='Client Général', adresse='-', telephone='-', email='', agence=self.agence
+        )
+        self.caisse = Caisse.objects.create(numero_caisse='C01', nom_caisse='Caisse 1', agence=self.agence)
+        self.articles = [
+            Article.objects.create(
+                reference_article=f'BOI{i}',
+                designation=f'Boisson {i}',
+                categorie=self.famille,
+                conditionnement='Bouteille',
+                prix_achat=Decimal('400.00'),
+                dernier_prix_achat=Decimal('400.00'),
+                unite_vente='Bouteille',
+                prix_vente=Decimal('500.00'),
+                stock_actuel=Decimal('5.00'),
+                agence=self.agence,
+            )
+            for i in range(3)
+        ]
+
+    def _lignes(self, quantite):
+        return [
+            {'article_id': a.id, 'designation': a.designation, 'quantite': quantite,
+             'prix_unitaire': 500, 'prix_total': 500 * quantite}
+            for a in self.articles
+        ]
+
+
+class EnregistrementVenteTests(AgenceVenteTestCase):
+    def test_vente_groupee(self):
+        from .models import FactureVente
+        from .vente_utils import enregistrer_vente
+
+        facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2), remise=100)
+
+        self.assertEqual(facture.lignes.count(), 3)
+        self.assertEqual(facture.nette_a_payer, Decimal('2900'))
+        self.assertEqual(MouvementStock.objects.filter(facture_vente=facture).count(), 3)
+        for article in self.articles:
+            article.refresh_from_db()
+            self.assertEqual(article.stock_actuel, Decimal('3.00'))
+        self.assertEqual(FactureVente.objects.count(), 1)
+
+    def test_stock_insuffisant_rien_ecrit(self):
+        from .models import FactureVente
+        from .vente_utils import enregistrer_vente, VenteInvalide
+
+        with self.assertRaises(VenteInvalide):
+            enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(6))
+
+        self.assertEqual(FactureVente.objects.count(), 0)
+        self.assertEqual(MouvementStock.objects.count(), 0)
+        self.articles[0].refresh_from_db()
+        self.assertEqual(self.articles[0].stock_actuel, Decimal('5.00'))
+
+    def test_lot_rejoue_sans_doublon(self):
+        from .models import FactureVente
+        from .vente_utils import enregistrer_ventes_lot
+
+        tickets = [
+            {'cle': 'T1', 'lignes': self._lignes(1), 'montant_regler': 1500, 'date': '2024-03-01', 'heure': '10:00'},
+            {'cle': 'T2', 'lignes': self._lignes(1), 'montant_regler': 1500, 'date': '2024-03-01', 'heure': '10:05'},
+            {'cle': 'T3', 'lignes': self._lignes(4)},
+            {'cle': 'T1', 'lignes': self._lignes(1)},
+        ]
+        resultats = enregistrer_ventes_lot(self.agence, self.caisse, self.client_vente, tickets, taille_lot=2)
+        self.assertEqual([r['statut'] for r in resultats], ['enregistre', 'enregistre', 'erreur', 'deja_enregistre'])
+        self.assertEqual(resultats[3]['numero_ticket'], resultats[0]['numero_ticket'])
+
+        # Renvoi du même lot (réponse perdue) : rien n'est réécrit
+        rejeu = enregistrer_ventes_lot(self.agence, self.caisse, self.client_vente, tickets)
+        self.assertEqual([r['statut'] for r in rejeu][:2], ['deja_enregistre', 'deja_enregistre'])
+        self.assertEqual(FactureVente.objects.count(), 2)
+        self.assertEqual(MouvementStock.objects.count(), 6)
+        self.articles[0].refresh_from_db()
+        self.assertEqual(self.articles[0].stock_actuel, Decimal('3.00'))
+
+    def test_lot_lignes_invalides_refusees_par_ticket(self):
+        from .models import FactureVente
+        from .vente_utils import enregistrer_ventes_lot
+
+        ligne = self._lignes(1)[0]
+        invalides = [
+            ['x'],
+            [dict(ligne, quantite='abc')],
+            [dict(ligne, quantite=-2)],
+            [dict(ligne, quantite=0)],
+            [dict(ligne, prix_unitaire='NaN')],
+            [dict(ligne, prix_total=-500)],
+            [dict(ligne, article_id='abc')],
+            [dict(ligne, article_id=1.5)],
+        ]
+        tickets = [{'cle': f'X{i}', 'lignes': lignes} for i, lignes in enumerate(invalides)]
+        tickets.append({'cle': 'OK', 'lignes': [ligne]})
+        resultats = enregistrer_ventes_lot(self.agence, self.caisse, self.client_vente, tickets)
+        self.assertEqual([r['statut'] for r in resultats], ['erreur'] * len(invalides) + ['enregistre'])
+        self.assertEqual(resultats[2]['message'], 'Ligne 1 du ticket invalide')
+        self.assertEqual(resultats[3]['message'], 'Ligne 1 du ticket : quantité nulle')
+        self.assertEqual(FactureVente.objects.count(), 1)
+        self.articles[0].refresh_from_db()
+        self.assertEqual(self.articles[0].stock_actuel, Decimal('4.00'))
+
+
+class VariationsStockTests(AgenceVenteTestCase):
+    def test_variations_stock_atomiques(self):
+        from .stock_utils import StockInsuffisant, appliquer_variations
+        from .vente_utils import VenteInvalide, enregistrer_vente
+
+        a, b, c = self.articles
+        # Instance périmée (autre caisse) : la sortie part du stock en base, pas de l'instance
+        Article.objects.filter(pk=a.pk).update(stock_actuel=Decimal('2.00'))
+        with self.assertRaises(VenteInvalide):
+            enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(3)[:1])
+
+        stocks = appliquer_variations({c.id: Decimal('-1'), a.id: Decimal('-2')}, interdire_negatif=True)
+        self.assertEqual(stocks, {a.id: (Decimal('2.00'), Decimal('0.00')), c.id: (Decimal('5.00'), Decimal('4.00'))})
+
+        # Refus : aucune variation de l'appel n'est conservée
+        with self.assertRaises(StockInsuffisant):
+            appliquer_variations({b.id: Decimal('-1'), c.id: Decimal('-9')}, interdire_negatif=True)
+        b.refresh_from_db()
+        self.assertEqual(b.stock_actuel, Decimal('5.00'))
+
+        self.assertEqual(appliquer_variations({c.id: Decimal('-9')}, plancher_zero=True)[c.id],
+                         (Decimal('4.00'), Decimal('0')))
+        self.assertEqual(appliquer_variations({c.id: Decimal('-1')})[c.id], (Decimal('0.00'), Decimal('-1.00')))
+
+
+class CmupTests(AgenceVenteTestCase):
+    def test_cmup_incremental_et_reconstruction(self):
+        from .cmup import reconstruire
+        from .models import ValorisationArticle
+        from .stock_utils import appliquer_variation
+        from .vente_utils import enregistrer_vente
+
+        a = self.articles[0]
+
+        def entrer(quantite, cout):
+            ancien, nouveau = appliquer_variation(a, Decimal(quantite))
+            MouvementStock.objects.create(
+                article=a, agence=self.agence, type_mouvement='entree',
+                date_mouvement=timezone.now() - timezone.timedelta(hours=1), numero_piece='ACH',
+                quantite_stock=nouveau, stock_initial=ancien, solde=nouveau, quantite=quantite,
+                cout_moyen_pondere=cout, stock_permanent=0,
+            )
+
+        # Stock d'ouverture 5 x 400, puis 10 x 100 et 10 x 300
+        entrer(10, 100)
+        self.assertEqual(a.valorisation.cout_moyen, Decimal('200'))
+        entrer(10, 300)
+        a.valorisation.refresh_from_db()
+        self.assertEqual((a.valorisation.quantite, a.valorisation.cout_moyen), (Decimal('25'), Decimal('240')))
+
+        # La sortie est valorisée au CMUP, qui ne change pas
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(5)[:1])
+        vente = MouvementStock.objects.get(article=a, type_mouvement='sortie')
+        self.assertEqual((vente.cout_moyen_pondere, vente.stock_permanent), (Decimal('240.00'), Decimal('4800.00')))
+
+        valeurs = list(MouvementStock.objects.filter(article=a).order_by('id').values_list(
+            'cout_moyen_pondere', 'stock_permanent'))
+        MouvementStock.objects.filter(article=a).update(cout_moyen_pondere=0, stock_permanent=0)
+        ValorisationArticle.objects.all().delete()
+        reconstruire(self.agence)
+        self.assertEqual(list(MouvementStock.objects.filter(article=a).order_by('id').values_list(
+            'cout_moyen_pondere', 'stock_permanent')), valeurs)
+        self.assertEqual(ValorisationArticle.objects.get(article=a).cout_moyen, Decimal('240'))
+
+
+class StockJournalierTests(AgenceVenteTestCase):
+    def test_stock_journalier_fige_et_invalide(self):
+        from .models import StockJournalier
+        from .stock_journalier import figer, lire_periode
+
+        a = self.articles[0]
+        aujourd_hui = timezone.localdate()
+
+        def mouvement(jours, ancien, nouveau):
+            MouvementStock.objects.create(
+                article=a, agence=self.agence, type_mouvement='entree' if nouveau > ancien else 'sortie',
+                date_mouvement=timezone.now() - timezone.timedelta(days=jours), numero_piece='P',
+                quantite_stock=Decimal(nouveau), stock_initial=Decimal(ancien), solde=Decimal(nouveau),
+                quantite=abs(nouveau - ancien), cout_moyen_pondere=400, stock_permanent=0,
+            )
+
+        mouvement(3, 5, 15)
+        mouvement(1, 15, 12)
+        debut = aujourd_hui - timezone.timedelta(days=4)
+
+        # Aujourd'hui n'est pas figé ; un second passage n'écrit rien
+        self.assertEqual(figer(self.agence, debut, aujourd_hui), 4 * 3)
+        self.assertEqual(figer(self.agence, debut, aujourd_hui), 0)
+        stocks = lire_periode([self.agence], debut, aujourd_hui)
+        self.assertEqual([stocks[(self.agence.pk, debut + timezone.timedelta(days=i))][a.id] for i in range(1, 4)],
+                         [Decimal('15'), Decimal('15'), Decimal('12')])
+        self.assertNotIn((self.agence.pk, aujourd_hui), stocks)
+
+        # Mouvement antidaté : seuls les jours touchés sont recalculés
+        mouvement(2, 15, 14)
+        self.assertFalse(StockJournalier.objects.filter(jour__gte=aujourd_hui - timezone.timedelta(days=2)).exists())
+        self.assertEqual(figer(self.agence, debut, aujourd_hui), 2 * 3)
+        self.assertEqual(lire_periode([self.agence], debut, aujourd_hui)[
+            (self.agence.pk, aujourd_hui - timezone.timedelta(days=2))][a.id], Decimal('14'))
+
+
+class RegistreStockTests(AgenceVenteTestCase):
+    def test_reconstruction_registre(self):
+        from .registre_stock import reconstruire_registre
+        from .vente_utils import enregistrer_vente
+
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2))
+        MouvementStock.objects.all().delete()
+        jour = timezone.localdate()
+
+        # Sans historique, le solde d'ouverture est déduit du stock actuel ; deux passages donnent le même registre
+        for _ in range(2):
+            resultat = reconstruire_registre(self.agence, jour, jour)
+            self.assertEqual(resultat['crees'], 3)
+            self.assertEqual(
+                sorted(MouvementStock.objects.values_list('type_mouvement', 'stock_initial', 'solde')),
+                [('sortie', Decimal('5'), Decimal('3'))] * 3,
+            )
+        self.assertEqual(resultat['supprimes'], 3)
+
+
+class RapprochementStockTests(AgenceVenteTestCase):
+    def test_rapprochement_stock_registre(self):
+        from .rapprochement_stock import corriger, ecarts
+        from .vente_utils import enregistrer_vente
+
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2))
+        self.assertEqual(ecarts(), [])
+
+        # Stock modifié sans mouvement : l'écart est détecté puis corrigé par un ajustement
+        a = self.articles[0]
+        Article.objects.filter(pk=a.pk).update(stock_actuel=Decimal('7.00'))
+        with self.assertNumQueries(1):
+            resultat = ecarts([self.agence])
+        self.assertEqual([(e['id'], e['stock_attendu'], e['ecart']) for e in resultat],
+                         [(a.id, Decimal('3.000'), Decimal('4.000'))])
+        self.assertEqual(corriger(resultat), 1)
+        self.assertEqual(ecarts(), [])
+        self.assertTrue(MouvementStock.objects.filter(article=a, type_mouvement='ajustement', solde=7).exists())
+
+
+class AlertesStockTests(AgenceVenteTestCase):
+    def test_ensemble_alertes_stock(self):
+        from .stock_utils import appliquer_variations
+        from .vente_utils import enregistrer_vente
+
+        a = self.articles[0]
+        Article.objects.filter(pk=a.pk).update(stock_minimum=Decimal('3.00'))
+
+        # Passage sous le stock minimum : une alerte et une seule notification, même après une autre vente
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2)[:1])
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1])
+        self.assertEqual(AlerteStock.objects.get(article=a).niveau, 'alerte')
+        self.assertEqual(Notification.objects.filter(type_notification='stock_insuffisant').count(), 1)
+
+        # Rupture : changement de niveau notifié ; réapprovisionnement : l'article sort de l'ensemble
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2)[:1])
+        self.assertEqual(AlerteStock.objects.get(article=a).niveau, 'rupture')
+        self.assertEqual(Notification.objects.filter(type_notification='stock_insuffisant').count(), 2)
+        appliquer_variations({a.pk: Decimal('10')})
+        self.assertFalse(AlerteStock.objects.filter(article=a).exists())
+
+
+class ComptageInventaireTests(AgenceVenteTestCase):
+    def test_import_comptage_inventaire(self):
+        from .comptage_inventaire import ComptageInvalide, importer_comptage, lire_comptage
+        from .models import Employe
+
+        user = get_user_model().objects.create_user(username='compteur', password='pw')
+        compte = Compte.objects.create(
+            user=user, numero_compte='CPT-INV', type_compte='comptable', nom='Compteur', prenom='C',
+            telephone='1', email='c@example.com', agence=self.agence,
+        )
+        employe = Employe.objects.create(compte=compte, numero_employe='E-INV', poste='magasinier', date_embauche='2024-01-01')
+
+        comptes = lire_comptage(b'reference_article;quantite_comptee\nBOI0;7\nBOI1;5\nBOI2;2,5\nBOI0;1\nXXX;4\n', 'comptage.csv')
+        self.assertEqual(comptes, {'BOI0': Decimal('8'), 'BOI1': Decimal('5'), 'BOI2': Decimal('2.5'), 'XXX': Decimal('4')})
+        with self.assertRaises(ComptageInvalide):
+            lire_comptage(b'reference_article;quantite_comptee\nBOI0;beaucoup\n', 'comptage.csv')
+
+        resultat = importer_comptage(self.agence, comptes, employe)
+        self.assertEqual((resultat['lignes'], resultat['ecarts'], resultat['inconnues']), (3, 2, ['XXX']))
+        self.assertEqual(resultat['valeur_ecarts'], Decimal('200.00'))
+        self.assertEqual(
+            sorted(Article.objects.filter(agence=self.agence).values_list('reference_article', 'stock_actuel')),
+            [('BOI0', Decimal('8')), ('BOI1', Decimal('5')), ('BOI2', Decimal('2.5'))],
+        )
+        self.assertEqual(
+            sorted(MouvementStock.objects.filter(inventaire=resultat['inventaire']).values_list('stock_initial', 'solde')),
+            [(Decimal('5'), Decimal('2.5')), (Decimal('5'), Decimal('8'))],
+        )
+
+        # Deux imports dans la même seconde : le numéro pris est détecté à l'insertion
+        from django.db import transaction
+        from .comptage_inventaire import _creer_inventaire
+
+        numero = resultat['inventaire'].numero_inventaire
+        with transaction.atomic():
+            doublon = _creer_inventaire(resultat['inventaire'].date_debut, statut='termine', agence=self.agence,
+                                        responsable=employe)
+            self.assertEqual(doublon.numero_inventaire, f'{numero}-2')
+
+
+class TransfertStockTests(AgenceVenteTestCase):
+    def test_transfert_entre_agences(self):
+        from .models import Employe, FactureTransfert, LigneFactureTransfert
+        from .registre_stock import reconstruire_registre
+        from .stock_utils import StockInsuffisant
+        from .transfert_stock import creer_transfert, modifier_transfert, supprimer_transfert
+
+        user = get_user_model().objects.create_user(username='magasinier', password='pw')
+        compte = Compte.objects.create(
+            user=user, numero_compte='CPT-TR', type_compte='comptable', nom='M', prenom='M',
+            telephone='1', email='m@example.com', agence=self.agence,
+        )
+        employe = Employe.objects.create(compte=compte, numero_employe='E-TR', poste='magasinier', date_embauche='2024-01-01')
+        destination = Agence.objects.create(nom_agence='Agence Destination', adresse='Adresse')
+        recus = {
+            a.reference_article: Article.objects.create(
+                reference_article=f'{a.reference_article}_DES', designation=a.designation, categorie=self.famille,
+                conditionnement='Bouteille', prix_achat=Decimal('400.00'), dernier_prix_achat=Decimal('400.00'),
+                unite_vente='Bouteille', prix_vente=Decimal('500.00'), stock_actuel=Decimal('1.00'), agence=destination,
+            )
+            for a in self.articles[:2]
+        }
+        facture = FactureTransfert.objects.create(
+            numero_compte='T', date_transfert=timezone.localdate(), reference_transfert='TR-1', lieu_depart='A',
+            lieu_arrivee='B', quantite=3, agence_source=self.agence, agence_destination=destination,
+            employe_expediteur=employe, etat='sortir',
+        )
+        a, b = self.articles[:2]
+
+        def stocks():
+            return [Article.objects.get(pk=x.pk).stock_actuel for x in (a, b, recus['BOI0'], recus['BOI1'])]
+
+        # Articles des deux côtés lus en deux requêtes, puis écritures en lot
+        with self.assertNumQueries(21):
+            creer_transfert(facture, {a.pk: (Decimal('2'), Decimal('450')), b.pk: (Decimal('1'), Decimal('450'))})
+        self.assertEqual(stocks(), [Decimal('3'), Decimal('4'), Decimal('3'), Decimal('2')])
+        self.assertEqual(MouvementStock.objects.filter(facture_transfert=facture).count(), 4)
+
+        # Modification : seule la différence (a : 2 -> 3, b retiré) est appliquée et tracée
+        modifier_transfert(facture, {a.pk: (Decimal('3'), Decimal('450'))}, 'sortir')
+        self.assertEqual(stocks(), [Decimal('2'), Decimal('5'), Decimal('4'), Decimal('1')])
+        self.assertEqual(MouvementStock.objects.filter(facture_transfert=facture).count(), 8)
+
+        # Entre deux agences, une sortie au-delà du stock est refusée : rien n'entre de l'autre côté
+        trop = FactureTransfert.objects.create(
+            numero_compte='T', date_transfert=timezone.localdate(), reference_transfert='TR-2', lieu_depart='A',
+            lieu_arrivee='B', quantite=5, agence_source=self.agence, agence_destination=destination,
+            employe_expediteur=employe, etat='sortir',
+        )
+        with self.assertRaises(StockInsuffisant):
+            creer_transfert(trop, {a.pk: (Decimal('5'), Decimal('450'))})
+        self.assertEqual(stocks(), [Decimal('2'), Decimal('5'), Decimal('4'), Decimal('1')])
+        self.assertFalse(trop.lignes.exists())
+
+        # Registre reconstruit (pièce historique au-delà d'un solde d'ouverture nul) :
+        # autant reçu d'un côté que sorti de l'autre
+        LigneFactureTransfert.objects.create(
+            facture_transfert=trop, article=a, quantite=5, prix_unitaire=Decimal('450'), valeur_totale=Decimal('2250'),
+        )
+        MouvementStock.objects.create(
+            article=a, agence=self.agence, type_mouvement='ajustement',
+            date_mouvement=timezone.now() - timezone.timedelta(days=1), numero_piece='OUV', quantite=0, stock_initial=0, solde=0, quantite_stock=0,
+            cout_moyen_pondere=Decimal('400'), stock_permanent=0,
+        )
+        for agence in (self.agence, destination):
+            reconstruire_registre(agence, timezone.localdate(), timezone.localdate())
+        self.assertEqual(
+            sorted(MouvementStock.objects.filter(facture_transfert=trop).values_list('type_mouvement', 'quantite')),
+            [('entree', Decimal('5')), ('sortie', Decimal('5'))],
+        )
+
+        supprimer_transfert(facture)
+        self.assertEqual(stocks(), [Decimal('5'), Decimal('5'), Decimal('1'), Decimal('1')])
+        self.assertEqual(MouvementStock.objects.filter(numero_piece='SUPP-TR-1', type_mouvement='ajustement').count(), 2)
+
+
+class StatistiquesVenteTests(AgenceVenteTestCase):
+    def test_statistiques_vente_groupees(self):
+        from .statistiques_vente import rafraichir, statistiques_articles
+        from .vente_utils import enregistrer_vente
+
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2))
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1])
+        autre = Famille.objects.create(code='EPI', intitule='Epicerie', unite_vente='Piece')
+        Article.objects.filter(pk=self.articles[2].pk).update(categorie=autre)
+        jour = timezone.localdate()
+        rafraichir(self.agence)
+
+        # Tous les articles en une requête groupée, quel que soit leur nombre
+        with self.assertNumQueries(1):
+            lignes, totaux = statistiques_articles(self.agence, jour, jour)
+        self.assertEqual([l['quantite_vendue'] for l in lignes], [3.0, 2.0, 2.0])
+        self.assertEqual(lignes[0]['chiffre_affaires'], 1500.0)
+        self.assertEqual(lignes[0]['marge_profit'], 300.0)
+        self.assertEqual(lignes[0]['pourcentage_marge'], 20.0)
+        self.assertEqual(totaux['quantite_totale_vendue'], 7.0)
+        self.assertEqual(totaux['marge_totale'], 700.0)
+
+        lignes, totaux = statistiques_articles(self.agence, jour, jour, famille_id=self.famille.pk)
+        self.assertEqual([l['designation'] for l in lignes], ['Boisson 0', 'Boisson 1'])
+        lignes, _ = statistiques_articles(self.agence, jour - timezone.timedelta(days=5), jour - timezone.timedelta(days=1))
+        self.assertEqual(lignes, [])
+
+    def test_statistiques_par_periode(self):
+        from datetime import date
+        from .models import StatistiqueVente, VenteJournaliere
+        from .statistiques_vente import couverture, rafraichir, statistiques_articles
+        from .vente_utils import enregistrer_vente
+        from .ventes_journalieres import retirer
+
+        # Un mois entier, puis une semaine (lundi-dimanche), puis les jours restants
+        self.assertEqual(
+            [dict(q.children) for q in couverture(date(2026, 3, 1), date(2026, 4, 14)).children[1:]],
+            [{'granularite': 'mois', 'debut_periode__range': (date(2026, 3, 1), date(2026, 3, 1))},
+             {'granularite': 'jour', 'debut_periode__range': (date(2026, 4, 1), date(2026, 4, 5))},
+             {'granularite': 'semaine', 'debut_periode__range': (date(2026, 4, 6), date(2026, 4, 6))},
+             {'granularite': 'jour', 'debut_periode__range': (date(2026, 4, 13), date(2026, 4, 14))}],
+        )
+
+        jour = timezone.localdate()
+        hier = jour - timezone.timedelta(days=1)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2), date_facture=hier)
+        self.assertIsNone(rafraichir(self.agence))
+        self.assertEqual(StatistiqueVente.objects.filter(granularite='jour').count(), 3)
+
+        # Rafraîchissement incrémental : seules les ventes journalières modifiées depuis le filigrane
+        anciennes = VenteJournaliere.objects.all()
+        anciennes.update(modifie_le=timezone.now() - timezone.timedelta(hours=1))
+        facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1])
+        self.assertEqual(rafraichir(self.agence), 1)
+        anciennes.update(modifie_le=timezone.now() - timezone.timedelta(hours=1))
+        retirer(facture, facture.lignes.all())
+        facture.delete()
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[1:2])
+        self.assertEqual(rafraichir(self.agence), 2)
+        self.assertFalse(StatistiqueVente.objects.filter(article=self.articles[0], debut_periode=jour).exists())
+
+        lignes, totaux = statistiques_articles(self.agence, hier, jour)
+        self.assertEqual([l['quantite_vendue'] for l in lignes], [2.0, 3.0, 2.0])
+        self.assertEqual((totaux['chiffre_affaires_total'], totaux['marge_totale']), (3500.0, 700.0))
+        mois = StatistiqueVente.objects.get(article=self.articles[1], granularite='mois', debut_periode=jour.replace(day=1))
+        self.assertEqual(mois.quantite, Decimal('3') if hier.month == jour.month else Decimal('1'))
+
+
+class VentesJournalieresTests(AgenceVenteTestCase):
+    def test_ventes_journalieres(self):
+        from .models import VenteJournaliere
+        from .vente_utils import enregistrer_vente
+        from .ventes_journalieres import reconstruire, retirer, totaux_par_agence
+
+        def table():
+            return sorted(VenteJournaliere.objects.values_list(
+                'article_id', 'jour', 'quantite', 'chiffre_affaires', 'cout', 'nombre_lignes'
+            ))
+
+        hier = timezone.localdate() - timezone.timedelta(days=1)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2), date_facture=hier)
+        facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1))
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1])
+        self.assertEqual(VenteJournaliere.objects.count(), 6)
+        ligne = VenteJournaliere.objects.get(article=self.articles[0], jour=timezone.localdate())
+        self.assertEqual((ligne.quantite, ligne.chiffre_affaires, ligne.cout, ligne.nombre_lignes),
+                         (Decimal('2'), Decimal('1000'), Decimal('800'), 2))
+
+        # Défacturation d'une ligne : retirée au coût de sa sortie ; la ligne du jour reste, à zéro
+        retirer(facture, facture.lignes.filter(article=self.articles[1]))
+        vide = VenteJournaliere.objects.get(article=self.articles[1], jour=timezone.localdate())
+        self.assertEqual((vide.quantite, vide.cout, vide.nombre_lignes), (Decimal('0'), Decimal('0'), 0))
+        facture.lignes.filter(article=self.articles[1]).delete()
+
+        # Tenue à la vente et recalcul depuis les factures donnent la même table
+        tenue = [t for t in table() if t[-1]]
+        self.assertEqual(reconstruire([self.agence]), 5)
+        self.assertEqual(table(), tenue)
+        totaux = totaux_par_agence(hier, timezone.localdate(), [self.agence])[self.agence.pk]
+        self.assertEqual((totaux['quantite'], totaux['chiffre_affaires'], totaux['marge']),
+                         (Decimal('9'), Decimal('4500'), Decimal('900')))
+
+        # Mise à jour d'une base existante : la migration remplit la table vide depuis les factures
+        from importlib import import_module
+        from django.apps import apps
+        from django.db import connection
+
+        migration = import_module('supermarket.migrations.0081_reprise_ventes_journalieres')
+        VenteJournaliere.objects.all().delete()
+        migration.reprendre_ventes_journalieres(apps, connection.schema_editor())
+        self.assertEqual(table(), tenue)
+
+
+class ResultatJournalierTests(AgenceVenteTestCase):
+    def test_resultats_journaliers(self):
+        from .models import Depense, ResultatJournalier
+        from .resultat_journalier import par_jour
+        from .vente_utils import enregistrer_vente
+
+        jour = timezone.localdate()
+        hier = jour - timezone.timedelta(days=1)
+        agences = Agence.objects.filter(pk=self.agence.pk)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2), date_facture=hier)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1))
+        depense = Depense.objects.create(agence=self.agence, date=timezone.now() - timezone.timedelta(days=1),
+                                         montant=Decimal('200'), libelle='Transport')
+
+        jours = par_jour(hier, jour, agences)
+        self.assertEqual((jours[hier]['chiffre_affaires'], jours[hier]['marge'], jours[hier]['depenses']),
+                         (Decimal('3000'), Decimal('600'), Decimal('200')))
+        self.assertEqual((jours[jour]['chiffre_affaires'], jours[jour]['nombre_ventes']), (Decimal('1500'), 1))
+        self.assertEqual(list(ResultatJournalier.objects.values_list('jour', flat=True)), [hier])
+
+        # Rechargement : le jour terminé est relu, seul le jour en cours est recalculé
+        with self.assertNumQueries(5):
+            self.assertEqual(par_jour(hier, jour, agences)[hier]['nombre_depenses'], 1)
+
+        # Pièces tardives : le jour figé est recalculé à la lecture suivante
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1], date_facture=hier)
+        self.assertFalse(ResultatJournalier.objects.exists())
+        self.assertEqual(par_jour(hier, hier, agences)[hier]['chiffre_affaires'], Decimal('3500'))
+        depense.date = timezone.now()
+        depense.save()
+        self.assertEqual(par_jour(hier, hier, agences)[hier]['depenses'], Decimal('0'))
+
+
+class CompteResultatTests(AgenceVenteTestCase):
+    def test_compte_resultat_consolide(self):
+        from .compte_resultat import COURANT, PRECEDENT, mois_precedent, periode_precedente, resultats
+        from .models import Depense
+        from .vente_utils import enregistrer_vente
+        from datetime import date
+
+        self.assertEqual(periode_precedente(date(2026, 3, 1), date(2026, 3, 31)), (date(2026, 2, 1), date(2026, 2, 28)))
+        self.assertEqual(periode_precedente(date(2026, 4, 1), date(2026, 4, 30)), (date(2026, 3, 1), date(2026, 3, 31)))
+        self.assertEqual(periode_precedente(date(2026, 4, 10), date(2026, 4, 20)), (date(2026, 3, 10), date(2026, 3, 20)))
+        self.assertEqual(mois_precedent(date(2026, 1, 15)), date(2025, 12, 15))
+
+        jour = timezone.localdate()
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(2))
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1],
+                          date_facture=mois_precedent(jour))
+        autre = Agence.objects.create(nom_agence='Autre', adresse='-')
+        Depense.objects.create(agence=autre, date=timezone.now(), montant=Decimal('250'), libelle='Loyer')
+
+        # Toutes les agences, période et mois précédent : une requête par table source
+        with self.assertNumQueries(3):
+            comptes = resultats(jour, jour)
+        courant = comptes[self.agence.pk][COURANT]
+        self.assertEqual((courant['chiffre_affaires'], courant['cout_ventes'], courant['marge']),
+                         (Decimal('3000'), Decimal('2400'), Decimal('600')))
+        self.assertEqual(comptes[self.agence.pk][PRECEDENT]['marge'], Decimal('100'))
+        self.assertEqual(comptes[autre.pk][COURANT]['resultat'], Decimal('-250'))
+        self.assertEqual(comptes[autre.pk][PRECEDENT]['depenses'], Decimal('0'))
+
+        # État des dépenses : le total précédent compte aussi l'agence sans dépense sur la période
+        Depense.objects.create(agence=self.agence, montant=Decimal('300'), libelle='Transport',
+                               date=timezone.now() - (jour - mois_precedent(jour)))
+        user = get_user_model().objects.create_user(username='analyste', password='password123')
+        Compte.objects.create(
+            user=user, numero_compte='CPT901', type_compte='admin', nom='Analyse', prenom='Une',
+            telephone='0100000001', email='analyste@example.com', actif=True, agence=self.agence,
+        )
+        self.client.login(username='analyste', password='password123')
+        reponse = self.client.post(reverse('generer_etat_depense'), {'date_debut': jour, 'date_fin': jour}).json()
+        self.assertEqual((reponse['total_general'], reponse['total_precedent_general']), (250.0, 300.0))
+
+
+class TicketEscposTests(AgenceVenteTestCase):
+    def test_ticket_escpos_en_cache(self):
+        from . import ticket_escpos
+        from .vente_utils import enregistrer_vente
+
+        ticket_escpos.cache_tickets().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1),
+                                        montant_regler=2000)
+
+        # Ticket calculé à la validation : le premier tirage et les duplicatas ne relisent
+        # ni la facture ni ses lignes (une lecture du cache partagé, en base ici)
+        with self.assertNumQueries(2):
+            ticket = ticket_escpos.ticket_vente(facture.pk, self.agence)
+            duplicata = ticket_escpos.ticket_vente(facture.pk, self.agence, duplicata=True)
+        self.assertTrue(ticket.startswith(ticket_escpos.INIT))
+        self.assertIn(b'Boisson 2', ticket)
+        self.assertNotIn(b'DUPLICATA', ticket)
+        self.assertIn(b'DUPLICATA', duplicata)
+        autre = Agence.objects.create(nom_agence='Autre', adresse='-')
+        self.assertIsNone(ticket_escpos.ticket_vente(facture.pk, autre))
+
+        # Défacturation partielle : le ticket est recalculé
+        facture.lignes.filter(article=self.articles[2]).delete()
+        ticket = ticket_escpos.ticket_vente(facture.pk, self.agence)
+        self.assertNotIn(b'Boisson 2', ticket)
+        self.assertIn(b'Boisson 1', ticket)
+
+        # Ticket de commande : lignes au prix de vente de l'article, recalculé quand il change
+        from datetime import time
+        from .models import Commande, FactureCommande
+
+        article = self.articles[0]
+        commande = Commande.objects.create(
+            date=timezone.localdate(), heure=time(10), quantite=2, prix_total=1000,
+            client=self.client_vente, article=article, agence=self.agence,
+        )
+        facture_commande = FactureCommande.objects.create(
+            numero_facture='FC-1', prix_total=1000, net_a_payer=1000, commande=commande, agence=self.agence,
+        )
+
+        def donnees():
+            article.refresh_from_db()
+            return {
+                'numero_facture': 'FC-1', 'date_display': '', 'heure_display': '', 'client_nom': 'Client',
+                'prix_total': 1000, 'net_a_payer': 1000,
+                'lignes': [{'designation': article.designation, 'quantite': 2,
+                            'prix_unitaire': article.prix_vente, 'prix_total': 1000}],
+            }
+
+        self.assertIn(b'2 x 500', ticket_escpos.ticket_commande(facture_commande.pk, self.agence, donnees))
+        article.prix_vente = Decimal('550.00')
+        article.save(update_fields=['prix_vente'])
+        self.assertIn(b'2 x 550', ticket_escpos.ticket_commande(facture_commande.pk, self.agence, donnees))
+
+
+    def test_ticket_selon_settings_sqlite_et_sans_cache_partage(self):
+        from django.test import override_settings
+        from erp_project import settings_sqlite
+        from . import ticket_escpos
+        from .vente_utils import enregistrer_vente
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        for caches in (settings_sqlite.CACHES, locmem):
+            with self.subTest(caches=list(caches)), override_settings(CACHES=caches):
+                with self.captureOnCommitCallbacks(execute=True):
+                    facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, self._lignes(1)[:1])
+                self.assertIn(b'Boisson 0', ticket_escpos.ticket_vente(facture.pk, self.agence))
+                facture.lignes.all().delete()
+                self.assertIn(b'Aucun article', ticket_escpos.ticket_vente(facture.pk, self.agence))
+
+
+class IndexCatalogueTests(TestCase):
+    def setUp(self):
+        from . import catalogue_index
+
+        catalogue_index._index_par_agence.clear()
+        self.agence = Agence.objects.create(nom_agence='Agence Index', adresse='Adresse')
+        self.famille = Famille.objects.create(code='EPI', intitule='Epicerie', unite_vente='Unité')
+
+    def _article(self, reference, designation):
+        return Article.objects.create(
+            reference_article=reference,
+            designation=designation,
+            categorie=self.famille,
+            conditionnement='Paquet',
+            prix_achat=Decimal('100.00'),
+            dernier_prix_achat=Decimal('100.00'),
+            unite_vente='Unité',
+            prix_vente=Decimal('150.00'),
+            stock_actuel=Decimal('4.00'),
+            agence=self.agence,
+        )
+
+    def test_recherche_sans_accents_et_mise_a_jour(self):
+        from .catalogue_index import get_index, prix_selon_type, rechercher_articles
+
+        cafe = self._article('CAF01', 'Café moulu')
+        self._article('THE01', 'Thé vert')
+
+        articles, total = rechercher_articles(self.agence, 'cafe')
+        self.assertEqual(total, 1)
+        self.assertEqual(articles[0]['id'], cafe.id)
+        self.assertEqual(articles[0]['stock'], 4)
+
+        articles, _ = rechercher_articles(self.agence, 'the')
+        self.assertEqual(articles[0]['reference'], 'THE01')
+
+        cafe.designation = 'Chocolat en poudre'
+        cafe.save()
+        self.assertEqual(rechercher_articles(self.agence, 'cafe')[1], 0)
+        self.assertEqual(rechercher_articles(self.agence, 'poudre')[1], 1)
+
+        # Insertion à sa place dans l'ordre alphabétique, prix par type de vente conservés
+        TypeVente.objects.create(article=cafe, intitule='Gros', prix=Decimal('120.00'))
+        index = get_index(self.agence.pk)
+        self.assertEqual(index.entrees[cafe.id]['types_vente'], {'gros': 120.0})
+        self._article('ABC01', 'Abricots secs')
+        cafe.prix_vente = Decimal('160.00')
+        cafe.save()
+        self.assertEqual([e['designation'] for e in rechercher_articles(self.agence, '')[0]],
+                         ['Abricots secs', 'Chocolat en poudre', 'Thé vert'])
+        self.assertEqual(prix_selon_type(index.entrees[cafe.id], 'gros'), 120.0)
+        self.assertIs(get_index(self.agence.pk), index)
+
+        # Modification par un autre worker : la version en base change, l'index est reconstruit
+        VersionCatalogue.objects.filter(agence=self.agence).update(version=F('version') + 1)
+        Article.objects.filter(pk=cafe.pk).update(designation='Cacao')
+        self.assertIsNot(get_index(self.agence.pk), index)
+        self.assertEqual(rechercher_articles(self.agence, 'cacao')[1], 1)
+
+        cafe.delete()
+        self.assertEqual(rechercher_articles(self.agence, '')[1], 2)
+
+
+class ScannerArticleTests(TestCase):
+    def setUp(self):
+        from . import catalogue_index
+        from .models import Caisse
+
+        catalogue_index._index_par_agence.clear()
+        self.agence = Agence.objects.create(nom_agence='Agence Scan', adresse='Adresse')
+        self.autre = Agence.objects.create(nom_agence='Agence Voisine', adresse='Adresse')
+        Caisse.objects.create(numero_caisse='S01', nom_caisse='Caisse scan', agence=self.agence, statut='active')
+        famille = Famille.objects.create(code='SCN', intitule='Scan', unite_vente='Unité')
+        self.articles = {
+            reference: Article.objects.create(
+                reference_article=reference, designation=designation, categorie=famille, conditionnement='Paquet',
+                prix_achat=Decimal('100.00'), dernier_prix_achat=Decimal('100.00'), unite_vente='Unité',
+                prix_vente=Decimal('150.00'), stock_actuel=Decimal('8.00'), agence=agence,
+            )
+            for reference, designation, agence in (
+                ('SUC01', 'Sucre', self.agence),
+                ('6111234567890', 'Lait en poudre', self.agence),
+                ('HUI01', 'Huile', self.autre),
+            )
+        }
+        user = get_user_model().objects.create_user(username='scanneur', password='password123')
+        Compte.objects.create(
+            user=user, numero_compte='CPT902', type_compte='caissier', nom='Scan', prenom='Un',
+            telephone='0100000002', email='scan@example.com', actif=True, agence=self.agence,
+        )
+        self.client.login(username='scanneur', password='password123')
+
+    def _scanner(self, code):
+        return self.client.post(reverse('scanner_article_api'), {'reference': code, 'quantite': 1})
+
+    def test_scan_reference_code_barre_et_agence(self):
+        # Référence saisie au clavier : casse et espaces ignorés
+        reponse = self._scanner(' suc01 ')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['article']['id'], self.articles['SUC01'].id)
+
+        # Code-barres (référence EAN) envoyé par la douchette avec son retour chariot ; index
+        # déjà chargé, aucune lecture du catalogue : session, utilisateur, compte, version du
+        # catalogue, stock, en-tête du panier, ligne de l'article (clé unique), ligne insérée
+        # (3), en-tête daté, nombre de lignes, session (3)
+        with self.assertNumQueries(15):
+            reponse = self._scanner('6111234567890\r\n')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['article']['designation'], 'Lait en poudre')
+        self.assertEqual(reponse.json()['nombre_lignes'], 2)
+
+        self.assertEqual(self._scanner('INCONNU').status_code, 404)
+        # Article d'une autre agence : jamais retourné
+        self.assertEqual(self._scanner('HUI01').status_code, 404)
+
+
+class ContexteCompteTests(TestCase):
+    def setUp(self):
+        self.agence = Agence.objects.create(nom_agence='Agence Compte', adresse='Adresse')
+        self.user = get_user_model().objects.create_user(username='caissier', password='password123')
+        self.compte = Compte.objects.create(
+            user=self.user, numero_compte='CPT900', type_compte='caissier', nom='Caisse',
+            prenom='Un', telephone='0100000000', email='caissier@example.com',
+            actif=True, agence=self.agence,
+        )
+
+    def _requete(self):
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = {}
+        return request
+
+    def test_compte_resolu_une_fois_par_requete(self):
+        from .decorators import resoudre_compte, get_user_compte
+
+        request = self._requete()
+        with self.assertNumQueries(1):
+            self.assertEqual(resoudre_compte(request), self.compte)
+            self.assertEqual(get_user_compte(request).agence, self.agence)
+        self.assertEqual(request.session, {})
+
+        # Compte désactivé : la requête suivante ne le retrouve plus
+        self.compte.actif = False
+        self.compte.save()
+        self.assertIsNone(resoudre_compte(self._requete()))
+
+
+class JournalisationTests(TestCase):
+    def test_niveaux_et_echantillonnage(self):
+        import logging
+        from .journalisation import EchantillonnageFilter, configuration_logging
+
+        config = configuration_logging('warning', 'supermarket.views=DEBUG, mauvais', 0.5)
+        self.assertEqual(config['loggers']['supermarket']['level'], 'WARNING')
+        self.assertEqual(config['loggers']['supermarket.views'], {'level': 'DEBUG'})
+
+        filtre = EchantillonnageFilter(0)
+        record = logging.LogRecord('supermarket.views', logging.DEBUG, __file__, 1, 'trace', None, None)
+        self.assertFalse(filtre.filter(record))
+        record.levelno = logging.ERROR
+        self.assertTrue(filtre.filter(record))
+
+
+class PanierCaisseTests(TestCase):
+    def setUp(self):
+        from .models import Caisse
+
+        self.agence = Agence.objects.create(nom_agence='Agence Panier', adresse='Adresse')
+        self.famille = Famille.objects.create(code='PAN', intitule='Panier', unite_vente='Unité')
+        self.caisse = Caisse.objects.create(numero_caisse='P01', nom_caisse='Caisse P', agence=self.agence)
+        self.articles = [
+            Article.objects.create(
+                reference_article=f'PAN{i}', designation=f'Article {i}', categorie=self.famille,
+                conditionnement='Paquet', prix_achat=Decimal('10'), dernier_prix_achat=Decimal('10'),
+                unite_vente='Unité', prix_vente=Decimal('15'), stock_actuel=Decimal('50'), agence=self.agence,
+            )
+            for i in range(30)
+        ]
+
+    def test_operations_par_ligne_et_relecture_base(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import PanierCaisse
+        from .panier_caisse import Panier
+
+        panier = Panier('session-test', self.caisse.id)
+        for article in self.articles:
+            panier.ajouter(article.id, article.reference_article, article.designation, 1, 15)
+
+        # Cumul sur une ligne existante et modification : lecture et écriture de cette seule ligne
+        # (clé unique ou position), puis date de l'en-tête, quelle que soit la taille du panier
+        PanierCaisse.objects.update(date_modification=timezone.now() - timezone.timedelta(days=2))
+        with CaptureQueriesContext(connection) as ctx:
+            panier.ajouter(self.articles[3].id, 'PAN3', 'Article 3', 2, 15)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertIn('LIMIT 1', ctx.captured_queries[0]['sql'])
+        with CaptureQueriesContext(connection) as ctx:
+            panier.modifier_quantite(0, 4)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertIn('LIMIT 1', ctx.captured_queries[0]['sql'])
+        # Panier en cours : pas pris pour abandonné par une autre session de la caisse
+        Panier('autre-session', self.caisse.id).ajouter(self.articles[0].id, 'PAN0', 'Article 0', 1, 15)
+        self.assertTrue(PanierCaisse.objects.filter(session_key='session-test').exists())
+
+        # Une autre requête (autre worker, autre poste) relit la base : aucune copie locale périmée
+        Panier('session-test', self.caisse.id).modifier_type_vente(1, 'gros', 12)
+        Panier('session-test', self.caisse.id).retirer(2)
+        contenu = Panier('session-test', self.caisse.id).en_dict()
+        self.assertEqual(len(contenu['lignes']), 29)
+        self.assertEqual(contenu['lignes'][0]['quantite'], 4)
+        self.assertEqual(contenu['lignes'][1]['prix_total'], 12)
+        self.assertEqual(contenu['lignes'][2]['quantite'], 3)
+        self.assertEqual(contenu['nette_a_payer'], 4 * 15 + 12 + 3 * 15 + 26 * 15)
+
+        # Même article passé au type de vente d'une autre de ses lignes : une seule ligne cumulée
+        panier = Panier('session-test', self.caisse.id)
+        panier.ajouter(self.articles[4].id, 'PAN4', 'Article 4', 2, 12, type_vente='gros')
+        self.assertEqual(len(panier), 30)
+        ligne = panier.modifier_type_vente(3, 'gros', 12)
+        self.assertEqual((ligne['quantite'], ligne['prix_total']), (3, 36))
+        self.assertEqual(len(panier), 29)
+        self.assertEqual(panier.appliquer_type_vente('gros', lambda article_id: 12)[0]['type_vente'], 'gros')
+
+        Panier('session-test', self.caisse.id).vider()
+        self.assertEqual(Panier('session-test', self.caisse.id).en_dict()['lignes'], [])
+
+
+class SessionCaisseTestCase(TestCase):
+    """Caisse avec une session ouverte, un client et un article en stock (données communes)"""
+
+    def setUp(self):
+        from .models import Client, Caisse, SessionCaisse
+
+        self.agence = Agence.objects.create(nom_agence='Agence KPI', adresse='Adresse')
+        self.famille = Famille.objects.create(code='KPI', intitule='KPI', unite_vente='Unité')
+        self.client_vente = Client.objects.create(
+            intitule='Client Général', adresse='-', telephone='-', email='', agence=self.agence
+        )
+        self.caisse = Caisse.objects.create(numero_caisse='K01', nom_caisse='Caisse K', agence=self.agence)
+        self.session = SessionCaisse.objects.create(
+            caisse=self.caisse, agence=self.agence, solde_ouverture=0, statut='ouverte'
+        )
+        self.article = Article.objects.create(
+            reference_article='KPI1', designation='Article KPI', categorie=self.famille,
+            conditionnement='Paquet', prix_achat=Decimal('10'), dernier_prix_achat=Decimal('10'),
+            unite_vente='Unité', prix_vente=Decimal('15'), stock_actuel=Decimal('50'), agence=self.agence,
+        )
+
+
+class CompteursSessionCaisseTests(SessionCaisseTestCase):
+    def test_compteurs_vente_attente_defacturation(self):
+        from .models import FactureTemporaire
+        from .compteurs_caisse import comptabiliser_vente
+        from .vente_utils import enregistrer_vente
+
+        lignes = [{'article_id': self.article.id, 'quantite': 2, 'prix_unitaire': 15, 'prix_total': 30}]
+        facture = enregistrer_vente(self.agence, self.caisse, self.client_vente, lignes, session_caisse=self.session)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, lignes, session_caisse=self.session)
+        ticket = FactureTemporaire.objects.create(session_key='k', contenu={}, session_caisse=self.session)
+        comptabiliser_vente(self.session.pk, -facture.nette_a_payer, tickets=-1)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.chiffre_affaires, Decimal('30'))
+        self.assertEqual(self.session.nombre_tickets, 1)
+        self.assertEqual(self.session.tickets_attente, 1)
+        self.assertIsNotNone(self.session.premiere_ouverture)
+
+        ticket.delete()
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_attente, 0)
+
+
+class RapportZTests(SessionCaisseTestCase):
+    def test_rapport_z_fige_a_la_fermeture(self):
+        from .models import RapportZ, SessionCaisse
+        from .rapport_z import cloturer_session, rapport_de_session
+        from .vente_utils import enregistrer_vente
+
+        lignes = [{'article_id': self.article.id, 'quantite': 2, 'prix_unitaire': 15, 'prix_total': 30}]
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, lignes, session_caisse=self.session,
+                          remise=5, montant_regler=30)
+        enregistrer_vente(self.agence, self.caisse, self.client_vente, lignes, session_caisse=self.session,
+                          montant_regler=50)
+
+        document, rapport, cree = cloturer_session(self.session, 'Vendeuse')
+        self.assertTrue(cree)
+        self.assertEqual(document.nombre_factures, 2)
+        self.assertEqual(len(document.factures_data), 2)
+        self.assertEqual(rapport.chiffre_affaires, Decimal('55'))
+        self.assertEqual(rapport.total_remises, Decimal('5'))
+        self.assertEqual(rapport.total_encaisse, Decimal('80'))
+        self.assertEqual(rapport.articles[0]['quantite'], 4)
+        self.assertEqual(SessionCaisse.objects.get(pk=self.session.pk).statut, 'fermee')
+
+        # Relecture sans recalcul, deuxième fermeture sans effet, rapport non modifiable
+        session = SessionCaisse.objects.select_related('rapport_z').get(pk=self.session.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(rapport_de_session(session).chiffre_affaires, Decimal('55'))
+        self.assertFalse(cloturer_session(self.session, 'Vendeuse')[2])
+        with self.assertRaises(ValueError):
+            RapportZ.objects.get(pk=rapport.pk).save()
+
+
+class TicketsAttenteTests(SessionCaisseTestCase):
+    def test_registre_tickets_attente(self):
+        from datetime import timedelta
+        from .models import FactureTemporaire
+        from .tickets_attente import garer_ticket, page_resumes, tickets_en_attente
+
+        autre = Agence.objects.create(nom_agence='Autre agence', adresse='-')
+        garer_ticket(autre, None, 'k', {'lignes': [{'prix_total': 5}]})
+        for i in range(5):
+            garer_ticket(self.agence, self.session, 'k', {
+                'lignes': [{'prix_total': 10}, {'prix_total': 5 * i}], 'client': f'Client {i}',
+            })
+
+        tickets = tickets_en_attente(self.agence, self.session)
+        page, curseur = page_resumes(tickets, par_page=3)
+        self.assertEqual([t['client'] for t in page], ['Client 4', 'Client 3', 'Client 2'])
+        self.assertEqual((page[0]['total'], page[0]['nombre_articles']), (30.0, 2))
+        suite, fin = page_resumes(tickets, curseur, par_page=3)
+        self.assertEqual([t['client'] for t in suite], ['Client 1', 'Client 0'])
+        self.assertIsNone(fin)
+
+        # Tickets périmés purgés à la mise en attente suivante dans l'agence
+        FactureTemporaire.objects.filter(agence=self.agence).update(
+            date_creation=timezone.now() - timedelta(days=2)
+        )
+        garer_ticket(self.agence, self.session, 'k', {'lignes': []})
+        self.assertEqual(tickets.count(), 1)
+        self.assertEqual(FactureTemporaire.objects.filter(agence=autre).count(), 1)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_attente, 1)
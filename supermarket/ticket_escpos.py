@@ -0,0 +1,263 @@
+"""
+Tickets de caisse au format ESC/POS (imprimantes thermiques 80 mm)
+
+Le ticket est produit directement en octets ESC/POS, sans gabarit HTML :
+- le logo (image/Image1.png) est tramé une seule fois par processus
+  (commande raster GS v 0) ;
+- le corps du ticket d'une facture est mis en cache par facture : la
+  réimpression et les duplicatas ne relisent ni la facture ni ses lignes ;
+- le ticket d'une vente est calculé dès la validation de la transaction à
+  partir des lignes écrites (precalculer_ticket_vente), le premier tirage
+  est donc déjà servi par le cache.
+
+Les tickets sont gardés dans le cache 'partage' (en base ou Redis, voir
+CACHES dans les settings) : une invalidation faite par un worker vaut pour
+tous les workers et tous les postes. Le cache est invalidé par les signaux de
+FactureVente / LigneFactureVente (défacturation partielle), de
+FactureCommande / Commande et d'Article (désignation et prix de vente des
+lignes d'une facture de commande), voir signals.py.
+Sans Pillow, les tickets sont imprimés sans logo.
+"""
+import logging
+import os
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+from .models import Commande, FactureCommande, FactureVente, LigneFactureVente
+
+logger = logging.getLogger(__name__)
+
+LARGEUR = 48            # colonnes en police A sur 80 mm
+LARGEUR_LOGO = 384      # points
+ENCODAGE = 'cp858'      # page de code PC858 (accents + €)
+DUREE_CACHE = 24 * 3600  # réimpressions du jour ; au-delà le ticket est recalculé
+CHAMPS_ARTICLE = {'designation', 'prix_vente'}  # lus par les tickets de commande
+
+ALIAS_CACHE = 'partage'
+
+
+def cache_tickets():
+    """Cache 'partage' ; le cache par défaut pour des settings qui ne le déclarent pas"""
+    return caches[ALIAS_CACHE if ALIAS_CACHE in settings.CACHES else DEFAULT_CACHE_ALIAS]
+
+INIT = b'\x1b@' + b'\x1bt\x13'
+GAUCHE, CENTRE = b'\x1ba\x00', b'\x1ba\x01'
+GRAS, NORMAL = b'\x1bE\x01', b'\x1bE\x00'
+DOUBLE, SIMPLE = b'\x1d!\x11', b'\x1d!\x00'
+COUPE = b'\n\n\n\x1dVB\x03'
+
+ENTETE = (
+    'GROS - DEMI GROS - DETAIL',
+    'BP 11190 YAOUNDE - {agence}',
+    'TEL: (237) 670930091',
+    'NUI: P029418061497G',
+)
+
+
+@lru_cache(maxsize=1)
+def logo_raster():
+    """Logo converti en commande raster ESC/POS (calculé une fois par processus)"""
+    chemin = os.path.join(settings.BASE_DIR, 'image', 'Image1.png')
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return b''
+    try:
+        with Image.open(chemin) as source:
+            image = source.convert('RGBA')
+    except OSError:
+        logger.warning("Logo introuvable pour les tickets ESC/POS: %s", chemin)
+        return b''
+
+    fond = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    image = Image.alpha_composite(fond, image).convert('L')
+    if image.width > LARGEUR_LOGO:
+        image = image.resize((LARGEUR_LOGO, round(image.height * LARGEUR_LOGO / image.width)))
+    # Point noir = bit à 1 en ESC/POS
+    image = ImageOps.invert(image).point(lambda p: 255 if p > 127 else 0).convert('1')
+
+    octets_ligne = (image.width + 7) // 8
+    return (
+        CENTRE
+        + b'\x1dv0\x00'
+        + bytes((octets_ligne % 256, octets_ligne // 256, image.height % 256, image.height // 256))
+        + image.tobytes()
+        + b'\n'
+    )
+
+
+def _texte(texte):
+    return texte.encode(ENCODAGE, errors='replace') + b'\n'
+
+
+def _colonnes(gauche, droite, largeur=LARGEUR):
+    gauche = gauche[:max(largeur - len(droite) - 1, 0)]
+    return gauche + ' ' * (largeur - len(gauche) - len(droite)) + droite
+
+
+def _montant(valeur, decimales=2):
+    return f"{Decimal(str(valeur or 0)):.{decimales}f}"
+
+
+def rendre_corps(donnees, decimales=2):
+    """
+    Corps du ticket (tout sauf l'initialisation, le logo et la mention duplicata).
+
+    donnees : agence, titre, infos [(libellé, valeur)], lignes [{designation,
+    quantite, prix_unitaire, prix_total}], totaux [(libellé, montant)], total.
+    """
+    sortie = [CENTRE, GRAS, DOUBLE, _texte('SUPER MARKET'), SIMPLE, NORMAL]
+    sortie += [_texte(ligne.format(agence=donnees['agence'])) for ligne in ENTETE]
+    sortie += [GAUCHE, _texte('*' * LARGEUR)]
+    for libelle, valeur in donnees['infos']:
+        sortie.append(_texte(_colonnes(libelle, str(valeur))))
+    sortie += [_texte('-' * LARGEUR), GRAS, _texte(_colonnes('ARTICLE', 'QTE x PU      TOTAL')), NORMAL]
+
+    for ligne in donnees['lignes']:
+        sortie.append(_texte(str(ligne['designation'] or 'Article')[:LARGEUR]))
+        quantite = Decimal(str(ligne['quantite'] or 0)).normalize()
+        detail = f"  {quantite:f} x {_montant(ligne['prix_unitaire'], decimales)}"
+        sortie.append(_texte(_colonnes(detail, f"{_montant(ligne['prix_total'], decimales)} F")))
+    if not donnees['lignes']:
+        sortie.append(_texte('Aucun article'))
+
+    sortie.append(_texte('-' * LARGEUR))
+    for libelle, montant in donnees['totaux']:
+        sortie.append(_texte(_colonnes(libelle, f"{_montant(montant, decimales)} FCFA")))
+    sortie += [
+        CENTRE, GRAS, DOUBLE, _texte(f"TOTAL: {_montant(donnees['total'], decimales)} FCFA"), SIMPLE, NORMAL,
+        _texte('-' * LARGEUR), _texte('MERCI DE VOTRE VISITE'), _texte('A TRES BIENTOT'), COUPE,
+    ]
+    return b''.join(sortie)
+
+
+def assembler(corps, duplicata=False):
+    """Ticket complet : initialisation, logo tramé, mention duplicata éventuelle, corps"""
+    mention = CENTRE + GRAS + _texte('*** DUPLICATA ***') + NORMAL if duplicata else b''
+    return INIT + logo_raster() + mention + corps
+
+
+# Factures de vente (caisse)
+
+def cle_vente(facture_id):
+    return f'ticket_escpos:vente:{facture_id}'
+
+
+def donnees_facture_vente(facture, lignes):
+    """Données du ticket à partir de la facture et de ses lignes (dicts designation, quantite, prix...)"""
+    totaux = []
+    if facture.remise and facture.remise > 0:
+        totaux += [('SOUS-TOTAL', facture.nette_a_payer + facture.remise), ('REMISE', facture.remise)]
+    totaux += [
+        ('NET A PAYER', facture.nette_a_payer),
+        ('MONTANT RECU', facture.montant_regler),
+        ('RENDU', facture.rendu),
+    ]
+    return {
+        'agence': facture.agence.nom_agence,
+        'infos': [
+            ('TICKET N°', facture.numero_ticket),
+            ('DATE', facture.date.strftime('%d/%m/%Y') if facture.date else '--/--/----'),
+            ('HEURE', facture.heure.strftime('%H:%M') if facture.heure else '--:--'),
+            ('VENDEUR', facture.nom_vendeuse or 'Vendeur'),
+            ('CLIENT', facture.client.intitule if facture.client_id else 'Client'),
+        ],
+        'lignes': list(lignes),
+        'totaux': totaux,
+        'total': facture.nette_a_payer,
+    }
+
+
+def precalculer_ticket_vente(facture, lignes):
+    """Mettre en cache le ticket d'une vente qui vient d'être écrite (sans relire la base)"""
+    try:
+        corps = rendre_corps(donnees_facture_vente(facture, lignes))
+        cache_tickets().set(cle_vente(facture.pk), (facture.agence_id, corps), DUREE_CACHE)
+    except Exception:
+        # Le ticket sera simplement calculé au premier tirage
+        logger.exception("Précalcul du ticket ESC/POS impossible pour la facture %s", facture.pk)
+
+
+def ticket_vente(facture_id, agence, duplicata=False):
+    """Octets ESC/POS du ticket d'une facture de vente de l'agence (None si introuvable)"""
+    en_cache = cache_tickets().get(cle_vente(facture_id))
+    if en_cache is None:
+        facture = FactureVente.objects.select_related('agence', 'client').filter(pk=facture_id).first()
+        if facture is None:
+            return None
+        lignes = LigneFactureVente.objects.filter(facture_vente_id=facture_id).order_by('id').values(
+            'designation', 'quantite', 'prix_unitaire', 'prix_total'
+        )
+        en_cache = (facture.agence_id, rendre_corps(donnees_facture_vente(facture, lignes)))
+        cache_tickets().set(cle_vente(facture_id), en_cache, DUREE_CACHE)
+
+    agence_id, corps = en_cache
+    if agence_id != agence.pk:
+        return None
+    return assembler(corps, duplicata)
+
+
+def invalider_vente(facture_id):
+    cache_tickets().delete(cle_vente(facture_id))
+
+
+# Factures de commande (XPrinter)
+
+def cle_commande(facture_id):
+    return f'ticket_escpos:commande:{facture_id}'
+
+
+def ticket_commande(facture_id, agence, donnees_facture, duplicata=False):
+    """
+    Octets ESC/POS d'une facture de commande de l'agence (None si introuvable).
+
+    donnees_facture() n'est appelée qu'en l'absence de cache ; elle retourne le
+    dict utilisé par le gabarit XPrinter, ou None si la facture n'existe pas.
+    """
+    en_cache = cache_tickets().get(cle_commande(facture_id))
+    if en_cache is None:
+        facture = donnees_facture()
+        if facture is None:
+            return None
+        totaux = [('TOTAL', facture['prix_total'])]
+        if facture['net_a_payer'] and facture['net_a_payer'] != facture['prix_total']:
+            totaux.append(('NET A PAYER', facture['net_a_payer']))
+        infos = [
+            ('FACTURE N°', facture['numero_facture']),
+            ('DATE', facture['date_display']),
+            ('HEURE', facture['heure_display']),
+            ('CLIENT', facture['client_nom']),
+        ]
+        if facture.get('client_telephone'):
+            infos.append(('TEL', facture['client_telephone']))
+        corps = rendre_corps({
+            'agence': agence.nom_agence,
+            'infos': infos,
+            'lignes': facture['lignes'],
+            'totaux': totaux,
+            'total': facture['prix_total'],
+        }, decimales=0)
+        en_cache = (agence.pk, corps)
+        cache_tickets().set(cle_commande(facture_id), en_cache, DUREE_CACHE)
+
+    agence_id, corps = en_cache
+    if agence_id != agence.pk:
+        return None
+    return assembler(corps, duplicata)
+
+
+def invalider_commandes(facture_ids):
+    cache_tickets().delete_many([cle_commande(i) for i in facture_ids])
+
+
+def invalider_article(article):
+    """Tickets des factures de commande dont les lignes reprennent l'article (commandes du client)"""
+    invalider_commandes(
+        FactureCommande.objects.filter(
+            agence_id=article.agence_id,
+            commande__client_id__in=Commande.objects.filter(article_id=article.pk).values('client_id'),
+        ).values_list('id', flat=True)
+    )
@@ -0,0 +1,80 @@
+"""
+Attribution des numéros de ticket de caisse
+
+Chaque agence dispose d'un compteur par jour (table CompteurTicket). Un numéro
+est obtenu par un incrément atomique de ce compteur : pas de Max() sur les
+factures du jour, pas de boucle de vérification, et deux caisses de la même
+agence ne peuvent jamais recevoir le même numéro.
+"""
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CompteurTicket
+from .sql_utils import update_returning_disponible
+
+
+def formater_numero_ticket(agence_id, jour, numero):
+    """Format : TKT + AAAAMMJJ + '-' + id agence + '-' + séquence (3 chiffres minimum)"""
+    return f"TKT{jour.strftime('%Y%m%d')}-{agence_id}-{numero:03d}"
+
+
+def _incrementer_compteur(agence_id, jour, pas=1):
+    """
+    Incrémenter le compteur (agence, jour) de `pas` et retourner la nouvelle valeur.
+    Retourne None si le compteur n'existe pas encore.
+    """
+    if update_returning_disponible():
+        table = connection.ops.quote_name(CompteurTicket._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET dernier_numero = dernier_numero + %s "
+                f"WHERE agence_id = %s AND date = %s RETURNING dernier_numero",
+                [pas, agence_id, connection.ops.adapt_datefield_value(jour)]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    # Autres bases : UPDATE puis relecture dans la même transaction (la ligne reste verrouillée)
+    with transaction.atomic():
+        compteur = CompteurTicket.objects.filter(agence_id=agence_id, date=jour)
+        if not compteur.update(dernier_numero=F('dernier_numero') + pas):
+            return None
+        return compteur.values_list('dernier_numero', flat=True).get()
+
+
+def allouer_numeros_ticket(agence, nombre, jour=None):
+    """
+    Réserver `nombre` numéros consécutifs de l'agence pour le jour donné.
+
+    Un seul aller-retour en régime normal quel que soit le nombre ; la
+    création du compteur n'a lieu qu'au premier ticket de la journée.
+    """
+    jour = jour or timezone.now().date()
+    agence_id = agence.pk
+
+    dernier = _incrementer_compteur(agence_id, jour, nombre)
+    if dernier is None:
+        try:
+            with transaction.atomic():
+                CompteurTicket.objects.create(agence_id=agence_id, date=jour, dernier_numero=nombre)
+            dernier = nombre
+        except IntegrityError:
+            # Une autre caisse vient de créer le compteur du jour
+            dernier = _incrementer_compteur(agence_id, jour, nombre)
+
+    return [formater_numero_ticket(agence_id, jour, n) for n in range(dernier - nombre + 1, dernier + 1)]
+
+
+def allouer_numero_ticket(agence, jour=None):
+    """Réserver le prochain numéro de ticket de l'agence pour le jour donné"""
+    return allouer_numeros_ticket(agence, 1, jour)[0]
+
+
+def apercu_numero_ticket(agence, jour=None):
+    """Numéro qui sera probablement attribué au prochain ticket (affichage seulement, ne réserve rien)"""
+    jour = jour or timezone.now().date()
+    dernier = CompteurTicket.objects.filter(
+        agence_id=agence.pk, date=jour
+    ).values_list('dernier_numero', flat=True).first() or 0
+    return formater_numero_ticket(agence.pk, jour, dernier + 1)
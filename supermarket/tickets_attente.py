@@ -0,0 +1,126 @@
+"""
+Registre des tickets en attente (FactureTemporaire)
+
+Les tickets garés sont rattachés à l'agence et à la session de caisse ; toutes
+les lectures passent par ce périmètre et par l'index
+(agence, session_caisse, date_creation, id) au lieu de parcourir toutes les
+factures temporaires de toutes les agences.
+
+- liste : projection résumé (id, date, client, total, rendu, nombre de
+  lignes) recopiée du contenu à l'enregistrement, sans désérialiser le JSON
+- pagination par curseur (date_creation, id) : le coût d'une page ne dépend
+  pas du nombre de tickets garés avant elle
+- purge : les tickets plus anciens que TICKETS_ATTENTE_CONSERVATION_HEURES
+  (24 h par défaut) sont supprimés à chaque mise en attente dans l'agence
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FactureTemporaire
+
+PAR_PAGE = 20
+
+
+def _decimal(valeur):
+    try:
+        return Decimal(str(valeur or 0))
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def resume_contenu(contenu):
+    """Colonnes résumé d'un ticket garé, calculées une fois à l'enregistrement"""
+    contenu = contenu if isinstance(contenu, dict) else {}
+    lignes = contenu.get('lignes') or []
+    total = contenu.get('total')
+    if total in (None, '', 0):
+        total = sum((_decimal(l.get('prix_total')) for l in lignes if isinstance(l, dict)), Decimal('0')) \
+            - _decimal(contenu.get('remise'))
+    return {
+        'total': _decimal(total),
+        'rendu': _decimal(contenu.get('rendu')),
+        'nombre_lignes': len(lignes),
+        'client': str(contenu.get('client') or '')[:200],
+    }
+
+
+def tickets_en_attente(agence, session_caisse):
+    """Tickets garés de l'agence pour la session (ou hors session si aucune n'est ouverte)"""
+    tickets = FactureTemporaire.objects.filter(agence=agence)
+    if session_caisse:
+        return tickets.filter(session_caisse=session_caisse)
+    return tickets.filter(session_caisse__isnull=True)
+
+
+def _lire_curseur(curseur):
+    try:
+        date_txt, identifiant = curseur.rsplit('_', 1)
+        return datetime.fromisoformat(date_txt), int(identifiant)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _heure_locale(moment):
+    return timezone.localtime(moment) if timezone.is_aware(moment) else moment
+
+
+def page_resumes(tickets, curseur=None, par_page=PAR_PAGE):
+    """
+    Une page de résumés, du plus récent au plus ancien.
+
+    Retourne (resumes, curseur_suivant) ; curseur_suivant vaut None sur la
+    dernière page.
+    """
+    position = _lire_curseur(curseur) if curseur else None
+    if position:
+        date_creation, identifiant = position
+        tickets = tickets.filter(
+            Q(date_creation__lt=date_creation) | Q(date_creation=date_creation, id__lt=identifiant)
+        )
+    lignes = list(
+        tickets.order_by('-date_creation', '-id').values(
+            'id', 'date_creation', 'client', 'nombre_lignes', 'total', 'rendu'
+        )[:par_page + 1]
+    )
+
+    suivant = None
+    if len(lignes) > par_page:
+        lignes = lignes[:par_page]
+        suivant = f"{lignes[-1]['date_creation'].isoformat()}_{lignes[-1]['id']}"
+
+    resumes = [
+        {
+            'id': l['id'],
+            'date_creation': _heure_locale(l['date_creation']).strftime('%d/%m/%Y %H:%M'),
+            'nombre_articles': l['nombre_lignes'],
+            'total': float(l['total']),
+            'rendu': float(l['rendu']),
+            'client': l['client'],
+        }
+        for l in lignes
+    ]
+    return resumes, suivant
+
+
+def purger_tickets_perimes(agence=None):
+    """Supprimer les tickets garés depuis plus que la durée de conservation ; retourne leur nombre"""
+    heures = getattr(settings, 'TICKETS_ATTENTE_CONSERVATION_HEURES', 24)
+    tickets = FactureTemporaire.objects.filter(date_creation__lt=timezone.now() - timedelta(hours=heures))
+    if agence is not None:
+        tickets = tickets.filter(agence=agence)
+    return tickets.delete()[0]
+
+
+def garer_ticket(agence, session_caisse, session_key, contenu):
+    """Mettre un ticket en attente (et purger les tickets périmés de l'agence)"""
+    purger_tickets_perimes(agence)
+    return FactureTemporaire.objects.create(
+        agence=agence,
+        session_caisse=session_caisse,
+        session_key=session_key,
+        contenu=contenu,
+    )
@@ -0,0 +1,316 @@
+"""
+Moteur des transferts de stock (FactureTransfert)
+
+Un transfert touche une ou deux agences :
+- agence source = agence destination (saisie dans une seule agence) : le
+  stock entre ou sort selon l'état de la facture ('entrer' / 'sortir')
+- agences différentes : le stock sort de l'agence source et entre dans
+  l'agence destination, sur l'article de même désignation (les références
+  sont uniques : une copie d'article dans une autre agence porte la
+  référence <référence>_<suffixe agence>, qui départage les homonymes)
+
+Les articles des deux côtés sont résolus en deux requêtes (articles source
+par id, articles destination par désignation). Les variations des deux côtés
+sont appliquées par un seul appel à stock_utils.appliquer_variations (UPDATE
+conditionnels, verrous pris par id d'article croissant, comme les ventes),
+les lignes et les mouvements (valorisés au CMUP, rattachés à la facture)
+sont écrits par bulk_create, le tout dans une transaction.
+
+La modification d'un transfert n'annule pas puis ne rejoue pas la facture :
+l'effet de l'ancienne version et celui de la nouvelle sont calculés par
+article et seule la différence est appliquée et tracée. La suppression
+applique l'effet inverse (mouvements d'ajustement SUPP-<référence>).
+
+Entre deux agences, ce qui entre d'un côté doit sortir de l'autre : une
+sortie qui dépasse le stock lève StockInsuffisant (rien n'est écrit) au lieu
+d'être ramenée à 0, à la création comme à la suppression. Un transfert saisi
+dans une seule agence garde le plancher à 0.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cmup import valoriser
+from .models import Article, FactureTransfert, LigneFactureTransfert, MouvementStock
+from .stock_journalier import invalider
+from .stock_utils import appliquer_variations
+
+
+class TransfertInvalide(ValueError):
+    """Lignes de transfert incohérentes (article inconnu dans l'agence source ou destination)"""
+
+
+def entree(etat):
+    """True si l'état de la facture fait entrer le stock ('entrer')"""
+    return str(etat or '').strip().lower() == 'entrer'
+
+
+def signe(agence_id, agence_source_id, agence_destination_id, etat):
+    """+1 / -1 : sens du transfert pour cette agence (0 si elle n'est pas concernée)"""
+    if agence_source_id == agence_destination_id:
+        if agence_id != agence_source_id:
+            return 0
+        return 1 if entree(etat) else -1
+    if agence_id == agence_source_id:
+        return -1
+    if agence_id == agence_destination_id:
+        return 1
+    return 0
+
+
+def lire_lignes(articles_payload):
+    """{article_id: (quantité, prix unitaire)} des articles envoyés par le formulaire (quantités > 0 cumulées)"""
+    lignes = {}
+    for article_data in articles_payload:
+        article_id = int(article_data.get('id') or 0)
+        quantite = Decimal(str(article_data.get('quantite') or 0))
+        if not article_id or quantite <= 0:
+            continue
+        prix = Decimal(str(article_data.get('prix_achat') or 0))
+        ancienne = lignes.get(article_id, (Decimal('0'), prix))[0]
+        lignes[article_id] = (ancienne + quantite, prix)
+    return lignes
+
+
+def _lignes_enregistrees(facture):
+    lignes = {}
+    for article_id, quantite, prix in facture.lignes.values_list('article_id', 'quantite', 'prix_unitaire'):
+        ancienne = lignes.get(article_id, (Decimal('0'), prix))[0]
+        lignes[article_id] = (ancienne + Decimal(quantite), prix)
+    return lignes
+
+
+def correspondances(agence_id, sources):
+    """
+    Articles de l'agence qui reçoivent {id source: (référence, désignation)}, en une requête.
+
+    Retourne ({id source: (id, prix_achat)}, [références sans correspondance]).
+    """
+    candidats = {}
+    for article_id, reference, designation, prix_achat in Article.objects.filter(
+        agence_id=agence_id, designation__in={d for _, d in sources.values()}
+    ).order_by('id').values_list('id', 'reference_article', 'designation', 'prix_achat'):
+        candidats.setdefault(designation, []).append((article_id, reference, prix_achat))
+
+    trouves, manquants = {}, []
+    for source_id, (reference, designation) in sources.items():
+        possibles = candidats.get(designation, [])
+        if len(possibles) > 1:
+            possibles = [c for c in possibles if c[1].startswith(f'{reference}_')]
+        if len(possibles) == 1:
+            trouves[source_id] = (possibles[0][0], possibles[0][2])
+        else:
+            manquants.append(reference)
+    return trouves, sorted(manquants)
+
+
+def _resoudre(facture, article_ids):
+    """
+    Articles touchés par les lignes : {id source: {agence_id: (id, prix_achat)}}
+    en deux requêtes.
+    """
+    source_id, destination_id = facture.agence_source_id, facture.agence_destination_id
+    sources = {
+        article_id: (reference, designation, prix_achat)
+        for article_id, reference, designation, prix_achat in Article.objects.filter(
+            id__in=list(article_ids), agence_id=source_id
+        ).values_list('id', 'reference_article', 'designation', 'prix_achat')
+    }
+    inconnus = sorted(set(article_ids) - set(sources))
+    if inconnus:
+        raise TransfertInvalide(f"Articles introuvables dans l'agence source : {', '.join(map(str, inconnus))}")
+
+    cotes = {article_id: {source_id: (article_id, prix)} for article_id, (_, _, prix) in sources.items()}
+    if source_id != destination_id:
+        recus, manquants = correspondances(
+            destination_id, {article_id: (r, d) for article_id, (r, d, _) in sources.items()}
+        )
+        if manquants:
+            raise TransfertInvalide(
+                "Articles sans correspondance unique (même désignation) dans l'agence destination : "
+                + ', '.join(manquants)
+            )
+        for article_id, article in recus.items():
+            cotes[article_id][destination_id] = article
+    return cotes
+
+
+def _effets(facture, etat, lignes, cotes):
+    """
+    {article_id: (agence_id, variation, coût d'entrée)} : effet sur le stock
+    des lignes pour chaque côté ; le côté qui reçoit entre au prix du transfert.
+    """
+    effets = {}
+    for article_id, (quantite, prix) in lignes.items():
+        for agence_id, (cible, _) in cotes[article_id].items():
+            sens = signe(agence_id, facture.agence_source_id, facture.agence_destination_id, etat)
+            if sens:
+                effets[cible] = (agence_id, sens * quantite, prix if sens > 0 else None)
+    return effets
+
+
+def deux_cotes(facture):
+    """True si le transfert sort d'une agence pour entrer dans une autre"""
+    return facture.agence_source_id != facture.agence_destination_id
+
+
+def _ecrire_lignes(facture, lignes):
+    LigneFactureTransfert.objects.bulk_create([
+        LigneFactureTransfert(
+            facture_transfert=facture, article_id=article_id, quantite=int(quantite),
+            prix_unitaire=prix, valeur_totale=quantite * prix,
+        )
+        for article_id, (quantite, prix) in sorted(lignes.items())
+    ])
+
+
+def _fixer_derniers_prix(prix):
+    """dernier_prix_achat des articles qui reçoivent le transfert : un UPDATE exécuté en lot"""
+    if not prix:
+        return
+    table = connection.ops.quote_name(Article._meta.db_table)
+    colonne, identifiant = (
+        connection.ops.quote_name(Article._meta.get_field(nom).column) for nom in ('dernier_prix_achat', 'id')
+    )
+    with connection.cursor() as curseur:
+        curseur.executemany(
+            f'UPDATE {table} SET {colonne} = %s WHERE {identifiant} = %s',
+            [(p, article_id) for article_id, p in sorted(prix.items())],
+        )
+
+
+def _appliquer(facture, variations, prix_achat, commentaire, numero_piece=None, type_mouvement=None,
+               interdire_negatif=False):
+    """
+    Appliquer {article_id: (agence_id, variation, coût d'entrée)} en un appel et écrire les mouvements en lot.
+
+    Retourne le nombre de mouvements écrits.
+    """
+    variations = {article_id: v for article_id, v in variations.items() if v[1]}
+    if not variations:
+        return 0
+    stocks = appliquer_variations(
+        {article_id: variation for article_id, (_, variation, _) in variations.items()},
+        interdire_negatif=interdire_negatif, plancher_zero=not interdire_negatif,
+    )
+    maintenant = timezone.now()
+    mouvements = []
+    for article_id in sorted(stocks):
+        ancien, nouveau = stocks[article_id]
+        agence_id, variation, cout = variations[article_id]
+        if nouveau == ancien:
+            continue
+        type_ligne = type_mouvement or ('entree' if variation > 0 else 'sortie')
+        mouvements.append(MouvementStock(
+            article_id=article_id,
+            agence_id=agence_id,
+            type_mouvement=type_ligne,
+            date_mouvement=maintenant,
+            numero_piece=numero_piece or facture.reference_transfert,
+            quantite_stock=nouveau,
+            stock_initial=ancien,
+            solde=nouveau,
+            quantite=abs(nouveau - ancien),
+            cout_unitaire=cout if type_ligne == 'entree' else None,
+            cout_moyen_pondere=prix_achat[article_id],
+            stock_permanent=0,
+            facture_transfert=facture,
+            commentaire=commentaire,
+        ))
+    valoriser(mouvements)
+    MouvementStock.objects.bulk_create(mouvements)
+    invalider(mouvements)
+    return len(mouvements)
+
+
+def _prix_achat(cotes):
+    return {cible: prix for par_agence in cotes.values() for cible, prix in par_agence.values()}
+
+
+def _derniers_prix(facture, lignes, cotes):
+    """Prix du transfert reporté sur le dernier prix d'achat des articles qui le reçoivent"""
+    if facture.agence_source_id == facture.agence_destination_id:
+        # Saisie dans une seule agence : le prix du transfert est repris quel que soit le sens
+        agence_id = facture.agence_source_id
+    else:
+        agence_id = facture.agence_destination_id
+    return {cotes[article_id][agence_id][0]: prix for article_id, (_, prix) in lignes.items()}
+
+
+def creer_transfert(facture, lignes):
+    """
+    Écrire les lignes {article_id: (quantité, prix)} d'une facture enregistrée et appliquer le transfert.
+
+    Lève StockInsuffisant (rien n'est écrit) si l'agence source n'a pas le
+    stock d'un transfert entre deux agences.
+    """
+    with transaction.atomic():
+        cotes = _resoudre(facture, lignes)
+        _ecrire_lignes(facture, lignes)
+        ecrits = _appliquer(
+            facture, _effets(facture, facture.etat, lignes, cotes), _prix_achat(cotes),
+            f"Transfert ({facture.etat}) - Facture {facture.reference_transfert}",
+            interdire_negatif=deux_cotes(facture),
+        )
+        _fixer_derniers_prix(_derniers_prix(facture, lignes, cotes))
+    return ecrits
+
+
+def modifier_transfert(facture, lignes, etat):
+    """
+    Remplacer les lignes et l'état d'une facture en n'appliquant que la différence d'effet sur le stock.
+
+    Lève StockInsuffisant (rien n'est modifié) si la différence ferait passer
+    un stock sous zéro. La facture est enregistrée par l'appelant.
+    """
+    with transaction.atomic():
+        FactureTransfert.objects.select_for_update().filter(pk=facture.pk).first()
+        anciennes = _lignes_enregistrees(facture)
+        cotes = _resoudre(facture, set(anciennes) | set(lignes))
+        avant = _effets(facture, facture.etat, anciennes, cotes)
+        apres = _effets(facture, etat, lignes, cotes)
+
+        differences = {}
+        for cible in set(avant) | set(apres):
+            agence_id, ancienne, prix = avant.get(cible, (None, Decimal('0'), None))
+            nouvelle = Decimal('0')
+            if cible in apres:
+                agence_id, nouvelle, prix = apres[cible]
+            differences[cible] = (agence_id, nouvelle - ancienne, prix)
+
+        facture.lignes.all().delete()
+        _ecrire_lignes(facture, lignes)
+        ecrits = _appliquer(
+            facture, differences, _prix_achat(cotes),
+            f"Transfert ({etat}) - Facture {facture.reference_transfert} (modification)",
+            interdire_negatif=True,
+        )
+        _fixer_derniers_prix(_derniers_prix(facture, lignes, cotes))
+        facture.etat = etat
+    return ecrits
+
+
+def supprimer_transfert(facture):
+    """
+    Annuler l'effet du transfert par des mouvements d'ajustement, puis supprimer la facture.
+
+    Lève StockInsuffisant (rien n'est modifié) si l'agence destination n'a
+    plus le stock reçu d'un transfert entre deux agences.
+    """
+    with transaction.atomic():
+        FactureTransfert.objects.select_for_update().filter(pk=facture.pk).first()
+        anciennes = _lignes_enregistrees(facture)
+        cotes = _resoudre(facture, anciennes)
+        inverses = {
+            cible: (agence_id, -variation, prix)
+            for cible, (agence_id, variation, prix) in _effets(facture, facture.etat, anciennes, cotes).items()
+        }
+        ecrits = _appliquer(
+            facture, inverses, _prix_achat(cotes),
+            f"Correction - Suppression facture transfert {facture.reference_transfert}",
+            numero_piece=f"SUPP-{facture.reference_transfert}", type_mouvement='ajustement',
+            interdire_negatif=deux_cotes(facture),
+        )
+        facture.delete()
+    return ecrits
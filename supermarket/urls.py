@@ -28,6 +28,7 @@ urlpatterns = [
        path('commandes/imprimer-facture/<int:facture_id>/', views.imprimer_facture_commande, name='imprimer_facture_commande'),
        path('commandes/imprimer-facture/', views.imprimer_facture_commande, name='imprimer_facture_commande_session'),
        path('commandes/imprimer-facture-xprinter/<int:facture_id>/', views.imprimer_facture_commande_xprinter, name='imprimer_facture_commande_xprinter'),
+       path('commandes/ticket-escpos/<int:facture_id>/', views.ticket_escpos_commande, name='ticket_escpos_commande'),
     path('commandes/sauvegarder/', views.sauvegarder_commande, name='sauvegarder_commande'),
     path('commandes/generer-facture/', views.generer_facture_commande, name='generer_facture_commande'),
     path('commandes/enregistrer-client/', views.enregistrer_client, name='enregistrer_client_commandes'),
@@ -88,6 +89,7 @@ urlpatterns = [
     path('caisse/ouvrir/', views.ouvrir_caisse, name='ouvrir_caisse'),
     path('caisse/fermer/', views.fermer_caisse, name='fermer_caisse'),
     path('caisse/enregistrer-facture/', views.enregistrer_facture, name='enregistrer_facture'),
+    path('caisse/enregistrer-factures-lot/', views.enregistrer_factures_lot, name='enregistrer_factures_lot'),
     path('caisse/ajouter-article/', views.ajouter_article_facture, name='ajouter_article_facture'),
     path('caisse/finaliser-facture/<int:facture_id>/', views.finaliser_facture, name='finaliser_facture'),
     path('caisse/mettre-en-attente/', views.mettre_en_attente, name='mettre_en_attente'),
@@ -97,8 +99,10 @@ urlpatterns = [
     path('caisse/supprimer-vente/', views.supprimer_vente, name='supprimer_vente'),
     path('caisse/imprimer-facture/<int:facture_id>/', views.imprimer_facture, name='imprimer_facture'),
     path('caisse/imprimer-facture/', views.imprimer_facture, name='imprimer_facture_session'),
+    path('caisse/ticket-escpos/<int:facture_id>/', views.ticket_escpos_vente, name='ticket_escpos_vente'),
     path('caisse/search-window/', views.search_window, name='search_window'),
     path('caisse/search-articles/', views.search_articles_api, name='search_articles_api'),
+    path('caisse/scanner-article/', views.scanner_article_api, name='scanner_article_api'),
     path('caisse/get-prix-by-type/', views.get_prix_by_type, name='get_prix_by_type'),
     path('caisse/get-article-types/', views.get_article_types, name='get_article_types'),
     path('caisse/init-test-data/', views.init_test_data, name='init_test_data'),
@@ -191,6 +195,7 @@ urlpatterns = [
     # Inventaire de Stock
     path('stock/inventaire/', views.inventaire_stock, name='inventaire_stock'),
     path('stock/generer-inventaire/', views.generer_inventaire, name='generer_inventaire'),
+    path('stock/importer-comptage-inventaire/', views.importer_comptage_inventaire, name='importer_comptage_inventaire'),
     path('stock/export-inventaire-excel/', views.export_inventaire_excel, name='export_inventaire_excel'),
     path('stock/export-inventaire-pdf/', views.export_inventaire_pdf, name='export_inventaire_pdf'),
     path('stock/export-inventaire-csv/', views.export_inventaire_csv, name='export_inventaire_csv'),
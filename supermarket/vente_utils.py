@@ -0,0 +1,429 @@
+"""
+Enregistrement d'une vente de caisse en une seule transaction
+
+Le panier est validé en entier avant toute écriture, les articles sont chargés
+en une requête, puis la facture, ses lignes, la sortie de stock et les
+mouvements sont écrits en quelques requêtes groupées ; le stock est décrémenté
+par stock_utils.appliquer_variations, qui refuse la sortie si une autre caisse
+a vendu le stock entre la validation et l'écriture.
+
+Les tickets saisis hors connexion sont renvoyés par lots (enregistrer_ventes_lot) :
+chaque ticket porte une clé d'idempotence fournie par la caisse, les tickets
+déjà reçus sont reconnus et non réécrits, et chaque tranche de tickets est
+écrite dans une transaction avec une seule mise à jour par article.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cmup import valoriser
+from .compteurs_caisse import comptabiliser_vente
+from .models import Article, Employe, FactureVente, LigneFactureVente, MouvementStock
+from .resultat_journalier import invalider as invalider_resultats
+from .stock_journalier import invalider
+from .stock_utils import StockInsuffisant, appliquer_variations
+from .ticket_escpos import precalculer_ticket_vente
+from .ticket_utils import allouer_numero_ticket, allouer_numeros_ticket
+from .ventes_journalieres import comptabiliser as comptabiliser_ventes_jour, element
+
+
+class VenteInvalide(Exception):
+    """Panier refusé : rien n'a été écrit en base"""
+
+    def __init__(self, message, article=None):
+        super().__init__(message)
+        self.message = message
+        self.article = article
+
+
+def _decimal(valeur):
+    if isinstance(valeur, Decimal):
+        return valeur
+    return Decimal(str(valeur or 0))
+
+
+def _ids_articles(lignes):
+    ids = set()
+    for ligne in lignes:
+        try:
+            ids.add(int(ligne.get('article_id')))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _normaliser_lignes(lignes, articles):
+    """Lignes du panier avec leur article ; retourne (lignes_valides, quantités par article)"""
+    lignes_valides = []
+    quantites = {}
+    for ligne in lignes:
+        try:
+            article = articles.get(int(ligne.get('article_id')))
+        except (TypeError, ValueError):
+            article = None
+        if article is None:
+            continue
+
+        quantite = _decimal(ligne.get('quantite', 0))
+        lignes_valides.append({
+            'article': article,
+            'designation': ligne.get('designation') or article.designation,
+            'quantite': quantite,
+            'prix_unitaire': _decimal(ligne.get('prix_unitaire', 0)),
+            'prix_total': _decimal(ligne.get('prix_total', 0)),
+        })
+        quantites[article.id] = quantites.get(article.id, Decimal('0')) + quantite
+    return lignes_valides, quantites
+
+
+def _verifier_stock(quantites, stock, articles):
+    for article_id, quantite in quantites.items():
+        if stock[article_id] <= 0:
+            raise VenteInvalide('Pas de stock', articles[article_id])
+        if quantite > stock[article_id]:
+            raise VenteInvalide('Stock insuffisant', articles[article_id])
+
+
+def valider_panier(lignes):
+    """
+    Normaliser les lignes du panier et charger leurs articles en une requête.
+
+    Les lignes sans article valide sont ignorées (comme auparavant).
+    Retourne (lignes_valides, articles_par_id) ; lève VenteInvalide si le stock
+    d'un article est nul ou insuffisant pour la quantité totale demandée.
+    """
+    articles = Article.objects.in_bulk(_ids_articles(lignes))
+    lignes_valides, quantites = _normaliser_lignes(lignes, articles)
+    _verifier_stock(quantites, {a.id: a.stock_actuel for a in articles.values()}, articles)
+    return lignes_valides, articles
+
+
+def _date_mouvement(date_facture, heure):
+    date_mouvement = datetime.combine(date_facture, heure)
+    if timezone.is_naive(date_mouvement):
+        date_mouvement = timezone.make_aware(date_mouvement, timezone.get_current_timezone())
+    return date_mouvement
+
+
+def _ecrire_ventes(agence, caisse, employe, nom_vendeuse, ventes):
+    """
+    Écrire des ventes déjà validées et numérotées (à appeler dans une transaction).
+
+    Chaque vente est un dict : numero_ticket, client, lignes, remise,
+    montant_regler, nette_a_payer, date, heure, session_caisse, cle.
+    Quel que soit le nombre de ventes : un INSERT des factures, un des lignes,
+    un UPDATE par article vendu et un INSERT des mouvements. Lève VenteInvalide
+    si une autre caisse a vendu le stock entre-temps.
+    """
+    vendeur = employe if isinstance(employe, Employe) else None
+    factures = FactureVente.objects.bulk_create([
+        FactureVente(
+            numero_ticket=v['numero_ticket'],
+            client=v['client'],
+            agence=agence,
+            caisse=caisse,
+            vendeur=vendeur,
+            session_caisse=v['session_caisse'],
+            date=v['date'],
+            heure=v['heure'],
+            nette_a_payer=v['nette_a_payer'],
+            remise=v['remise'],
+            montant_regler=v['montant_regler'],
+            rendu=v['montant_regler'] - v['nette_a_payer'],
+            en_attente=False,
+            nom_vendeuse=nom_vendeuse,
+            cle_idempotence=v.get('cle'),
+        )
+        for v in ventes
+    ])
+
+    LigneFactureVente.objects.bulk_create([
+        LigneFactureVente(
+            facture_vente=facture,
+            article=l['article'],
+            designation=l['designation'],
+            quantite=l['quantite'],
+            prix_unitaire=l['prix_unitaire'],
+            prix_total=l['prix_total'],
+        )
+        for facture, v in zip(factures, ventes)
+        for l in v['lignes']
+    ])
+
+    # Sortie de stock : une mise à jour conditionnelle par article, refusée si le stock ne suffit plus
+    quantites = {}
+    articles = {}
+    for v in ventes:
+        for l in v['lignes']:
+            quantites[l['article'].id] = quantites.get(l['article'].id, Decimal('0')) + l['quantite']
+            articles[l['article'].id] = l['article']
+    try:
+        stocks = appliquer_variations({article_id: -q for article_id, q in quantites.items()},
+                                      interdire_negatif=True)
+    except StockInsuffisant as e:
+        raise VenteInvalide('Stock insuffisant', articles[e.article_id])
+
+    mouvements = []
+    stock_courant = {article_id: stocks[article_id][0] for article_id in quantites}
+    for facture, v in zip(factures, ventes):
+        date_mouvement = _date_mouvement(v['date'], v['heure'])
+        for l in v['lignes']:
+            article = l['article']
+            ancien_stock = stock_courant[article.id]
+            nouveau_stock = ancien_stock - l['quantite']
+            stock_courant[article.id] = nouveau_stock
+            mouvements.append(MouvementStock(
+                article=article,
+                agence=agence,
+                type_mouvement='sortie',
+                date_mouvement=date_mouvement,
+                numero_piece=v['numero_ticket'],
+                quantite_stock=nouveau_stock,
+                stock_initial=ancien_stock,
+                solde=nouveau_stock,
+                quantite=l['quantite'],
+                cout_moyen_pondere=article.prix_achat,
+                stock_permanent=nouveau_stock * article.prix_achat,
+                facture_vente=facture,
+                commentaire=f"Vente - Facture {v['numero_ticket']}",
+            ))
+    # bulk_create n'appelle pas save() : valorisation au CMUP ici
+    valoriser(mouvements)
+    MouvementStock.objects.bulk_create(mouvements)
+    invalider(mouvements)
+
+    # Ventes journalières (agence × article × jour) : une ligne de facture par mouvement, coût au CMUP de sortie
+    comptabiliser_ventes_jour([
+        element(agence.pk, m.article_id, v['date'], l['quantite'], l['prix_unitaire'], m.cout_moyen_pondere)
+        for (v, l), m in zip(((v, l) for v in ventes for l in v['lignes']), mouvements)
+    ])
+    # Tickets antidatés (caisse resynchronisée) : les jours terminés des résultats journaliers sont recalculés
+    invalider_resultats({(agence.pk, v['date']) for v in ventes})
+
+    # Compteurs de la session de caisse (tableau de bord), une mise à jour par session
+    par_session = {}
+    for v in ventes:
+        if v['session_caisse']:
+            montant, nombre = par_session.get(v['session_caisse'].pk, (Decimal('0'), 0))
+            par_session[v['session_caisse'].pk] = (montant + v['nette_a_payer'], nombre + 1)
+    for session_id, (montant, nombre) in par_session.items():
+        comptabiliser_vente(session_id, montant, tickets=nombre)
+
+    return factures
+
+
+def enregistrer_vente(agence, caisse, client, lignes, employe=None, session_caisse=None,
+                      remise=0, montant_regler=0, date_facture=None, heure=None,
+                      nom_vendeuse='Vendeur'):
+    """
+    Valider le panier puis écrire la vente de façon atomique.
+
+    Retourne la FactureVente créée. Lève VenteInvalide sans rien écrire si le
+    panier est vide ou si le stock ne suffit pas.
+    """
+    lignes_valides, articles = valider_panier(lignes)
+    if not lignes_valides:
+        raise VenteInvalide('Aucun article dans la facture. Veuillez ajouter des articles.')
+
+    remise = _decimal(remise)
+    vente = {
+        'client': client,
+        'lignes': lignes_valides,
+        'remise': remise,
+        'montant_regler': _decimal(montant_regler),
+        'nette_a_payer': sum((l['prix_total'] for l in lignes_valides), Decimal('0')) - remise,
+        'date': date_facture or timezone.now().date(),
+        'heure': heure or timezone.now().time(),
+        'session_caisse': session_caisse,
+    }
+
+    # Numéro attribué hors transaction : le compteur n'est pas verrouillé pendant l'écriture de la vente
+    vente['numero_ticket'] = allouer_numero_ticket(agence)
+
+    with transaction.atomic():
+        facture, = _ecrire_ventes(agence, caisse, employe, nom_vendeuse, [vente])
+        # Ticket prêt pour le premier tirage, une fois la vente validée
+        transaction.on_commit(lambda: precalculer_ticket_vente(facture, lignes_valides))
+
+    return facture
+
+
+# Resynchronisation des tickets saisis hors connexion
+
+TAILLE_LOT = 50
+ENREGISTRE, DEJA_ENREGISTRE, ERREUR = 'enregistre', 'deja_enregistre', 'erreur'
+
+
+def _positif(valeur):
+    """Montant ou quantité fini et non négatif ; lève ValueError sinon"""
+    valeur = _decimal(valeur)
+    if not valeur.is_finite() or valeur < 0:
+        raise ValueError(valeur)
+    return valeur
+
+
+def _lire_ligne(numero, ligne):
+    """Ligne d'un ticket renvoyé : article_id entier, quantité > 0, prix finis et positifs"""
+    try:
+        if not isinstance(ligne, dict) or isinstance(ligne.get('article_id'), (bool, float)):
+            raise TypeError(ligne)
+        lue = dict(
+            ligne,
+            article_id=int(ligne.get('article_id')),
+            quantite=_positif(ligne.get('quantite', 0)),
+            prix_unitaire=_positif(ligne.get('prix_unitaire', 0)),
+            prix_total=_positif(ligne.get('prix_total', 0)),
+        )
+    except (TypeError, ValueError, InvalidOperation):
+        raise VenteInvalide(f'Ligne {numero} du ticket invalide')
+    if lue['quantite'] == 0:
+        raise VenteInvalide(f'Ligne {numero} du ticket : quantité nulle')
+    return lue
+
+
+def _lire_ticket(ticket):
+    """
+    Clé, date, heure, montants et lignes d'un ticket renvoyé par la caisse.
+
+    Lève VenteInvalide si le ticket ou l'une de ses lignes est illisible : seul
+    ce ticket est alors refusé.
+    """
+    cle = str(ticket.get('cle') or '').strip()
+    if not cle or len(cle) > 64:
+        raise VenteInvalide("Clé d'idempotence manquante ou invalide")
+    if not isinstance(ticket.get('lignes'), list):
+        raise VenteInvalide('Lignes du ticket manquantes')
+    try:
+        jour = date.fromisoformat(ticket['date']) if ticket.get('date') else timezone.now().date()
+        heure = time.fromisoformat(ticket['heure']) if ticket.get('heure') else timezone.now().time()
+        remise = _positif(ticket.get('remise', 0))
+        montant_regler = _positif(ticket.get('montant_regler', 0))
+    except (TypeError, ValueError, InvalidOperation):
+        raise VenteInvalide('Date, heure ou montant du ticket invalide')
+    lignes = [_lire_ligne(numero, ligne) for numero, ligne in enumerate(ticket['lignes'], 1)]
+    return cle, jour, heure, remise, montant_regler, lignes
+
+
+def _resultat(cle, statut, numero_ticket=None, message=''):
+    return {'cle': cle, 'statut': statut, 'numero_ticket': numero_ticket, 'message': message}
+
+
+def _enregistrer_tranche(agence, caisse, client, employe, session_caisse, nom_vendeuse, tickets, resultats):
+    """
+    Écrire une tranche de tickets lus (index, cle, jour, heure, remise, montant, lignes) en une transaction.
+
+    Retourne False si un renvoi concurrent a écrit l'une des clés, ou vendu le
+    stock, entre la lecture et l'écriture : rien n'a alors été écrit.
+    """
+    existants = dict(FactureVente.objects.filter(
+        agence=agence, cle_idempotence__in=[t[1] for t in tickets]
+    ).values_list('cle_idempotence', 'numero_ticket'))
+
+    ids = set()
+    for t in tickets:
+        ids |= _ids_articles(t[6])
+    jour_session = timezone.localtime(session_caisse.date_ouverture).date() if session_caisse else None
+
+    try:
+        with transaction.atomic():
+            # Lignes verrouillées dans un ordre fixe : deux tranches concurrentes ne s'interbloquent pas
+            articles = {a.id: a for a in Article.objects.select_for_update().filter(id__in=ids).order_by('id')}
+            stock = {a.id: a.stock_actuel for a in articles.values()}
+
+            ventes = []
+            for index, cle, jour, heure, remise, montant_regler, lignes in tickets:
+                if cle in existants:
+                    resultats[index] = _resultat(cle, DEJA_ENREGISTRE, existants[cle])
+                    continue
+                lignes_valides, quantites = _normaliser_lignes(lignes, articles)
+                if not lignes_valides:
+                    resultats[index] = _resultat(cle, ERREUR, message='Aucun article dans la facture')
+                    continue
+                try:
+                    _verifier_stock(quantites, stock, articles)
+                except VenteInvalide as e:
+                    resultats[index] = _resultat(cle, ERREUR, message=f"{e.message} : {e.article.designation}")
+                    continue
+                for article_id, quantite in quantites.items():
+                    stock[article_id] -= quantite
+                ventes.append({
+                    'index': index,
+                    'cle': cle,
+                    'client': client,
+                    'lignes': lignes_valides,
+                    'remise': remise,
+                    'montant_regler': montant_regler,
+                    'nette_a_payer': sum((l['prix_total'] for l in lignes_valides), Decimal('0')) - remise,
+                    'date': jour,
+                    'heure': heure,
+                    'session_caisse': session_caisse if jour == jour_session else None,
+                })
+            if not ventes:
+                return True
+
+            # Numéros réservés dans la transaction : une tranche annulée ne laisse pas de trou
+            par_jour = {}
+            for v in ventes:
+                par_jour.setdefault(v['date'], []).append(v)
+            for jour, ventes_jour in par_jour.items():
+                for v, numero in zip(ventes_jour, allouer_numeros_ticket(agence, len(ventes_jour), jour)):
+                    v['numero_ticket'] = numero
+
+            _ecrire_ventes(agence, caisse, employe, nom_vendeuse, ventes)
+    except (IntegrityError, VenteInvalide):
+        for t in tickets:
+            resultats[t[0]] = None
+        return False
+
+    for v in ventes:
+        resultats[v['index']] = _resultat(v['cle'], ENREGISTRE, v['numero_ticket'])
+    return True
+
+
+def enregistrer_ventes_lot(agence, caisse, client, tickets, employe=None, session_caisse=None,
+                           nom_vendeuse='Vendeur', taille_lot=TAILLE_LOT):
+    """
+    Enregistrer un lot de tickets renvoyés par une caisse après une coupure.
+
+    Chaque ticket : {'cle', 'lignes', 'remise', 'montant_regler', 'date', 'heure'}.
+    Retourne un résultat par ticket, dans l'ordre : {'cle', 'statut',
+    'numero_ticket', 'message'} avec statut 'enregistre', 'deja_enregistre'
+    (clé déjà reçue : rien n'est réécrit) ou 'erreur' (ticket refusé, les
+    autres sont enregistrés).
+    """
+    resultats = [None] * len(tickets)
+    premiers = {}
+    lus = []
+    for index, ticket in enumerate(tickets):
+        try:
+            cle, jour, heure, remise, montant_regler, lignes = _lire_ticket(ticket)
+        except (VenteInvalide, AttributeError) as e:
+            resultats[index] = _resultat(
+                ticket.get('cle') if isinstance(ticket, dict) else None, ERREUR,
+                message=getattr(e, 'message', 'Ticket invalide'),
+            )
+            continue
+        if cle in premiers:
+            # Même clé deux fois dans le lot : résolue d'après le premier ticket
+            continue
+        premiers[cle] = index
+        lus.append((index, cle, jour, heure, remise, montant_regler, lignes))
+
+    for debut in range(0, len(lus), taille_lot):
+        tranche = lus[debut:debut + taille_lot]
+        for _ in range(3):
+            if _enregistrer_tranche(agence, caisse, client, employe, session_caisse, nom_vendeuse,
+                                    tranche, resultats):
+                break
+        else:
+            for t in tranche:
+                resultats[t[0]] = _resultat(t[1], ERREUR, message='Conflit avec un envoi simultané, renvoyer le ticket')
+
+    for index, ticket in enumerate(tickets):
+        if resultats[index] is None:
+            premier = resultats[premiers[str(ticket['cle']).strip()]]
+            statut = ERREUR if premier['statut'] == ERREUR else DEJA_ENREGISTRE
+            resultats[index] = _resultat(premier['cle'], statut, premier['numero_ticket'], premier['message'])
+    return resultats
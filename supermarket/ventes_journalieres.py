@@ -0,0 +1,229 @@
+"""
+Ventes journalières par article (table de faits)
+
+VenteJournaliere cumule, par agence, article et jour de vente (date de la
+facture) : quantité vendue, chiffre d'affaires (quantité × prix unitaire,
+comme les états), coût des ventes (quantité × CMUP du mouvement de sortie
+de la facture) et nombre de lignes de facture. La table est tenue à jour
+dans la transaction qui écrit ou annule la vente :
+
+- vente : vente_utils._ecrire_ventes appelle comptabiliser() pour les
+  lignes écrites
+- défacturation (facture entière ou ligne) : retirer() pour les lignes
+  supprimées, au coût de la sortie qu'elles avaient faite
+
+Les cumuls sont écrits par un INSERT ... ON CONFLICT DO UPDATE exécuté en
+lot : un aller-retour quel que soit le nombre de lignes. Chaque écriture
+date la ligne (modifie_le) : c'est ce que suit le rafraîchissement des
+statistiques de vente (statistiques_vente.py). Une ligne ramenée à zéro
+ligne de facture est donc conservée, à zéro.
+
+reconstruire() recalcule la table à partir des factures en une requête
+groupée par (agence, article, jour) : reprise de l'historique (commande
+reconstruire_ventes_journalieres), après un import de données ; les
+statistiques des agences concernées sont alors recalculées en entier au
+prochain rafraîchissement, et les résultats journaliers figés de la
+période à la prochaine lecture. Les états lisent la table au lieu des lignes de
+facture : un an de ventes d'une agence tient en quelques milliers de lignes.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    LigneFactureVente, MouvementStock, RafraichissementStatistiques, ResultatJournalier, VenteJournaliere,
+)
+
+TAILLE_LOT = 2000
+
+CENTIMES = Decimal('0.01')
+_MONTANT = DecimalField(max_digits=20, decimal_places=5)
+
+_CHAMPS = ('quantite', 'chiffre_affaires', 'cout', 'nombre_lignes')
+
+
+def element(agence_id, article_id, jour, quantite, prix_unitaire, cout_unitaire):
+    """Une ligne de facture vue par la table : (agence, article, jour, quantité, CA, coût)"""
+    quantite = Decimal(quantite)
+    return (
+        agence_id, article_id, jour, quantite,
+        quantite * Decimal(prix_unitaire), quantite * Decimal(cout_unitaire or 0),
+    )
+
+
+def _cumuler(elements, sens):
+    """{(article_id, jour): [agence_id, quantité, CA, coût, lignes]} ; sens -1 pour retirer"""
+    cumuls = {}
+    for agence_id, article_id, jour, quantite, montant, cout in elements:
+        cumul = cumuls.setdefault((article_id, jour), [agence_id, Decimal('0'), Decimal('0'), Decimal('0'), 0])
+        cumul[1] += sens * quantite
+        cumul[2] += sens * montant
+        cumul[3] += sens * cout
+        cumul[4] += sens
+    return cumuls
+
+
+def _upsert_disponible():
+    """INSERT ... ON CONFLICT DO UPDATE : PostgreSQL et SQLite >= 3.24"""
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.supports_update_conflicts_with_target
+    )
+
+
+def _ecrire(cumuls):
+    table = connection.ops.quote_name(VenteJournaliere._meta.db_table)
+    colonnes = {
+        nom: connection.ops.quote_name(VenteJournaliere._meta.get_field(nom).column)
+        for nom in ('agence', 'article', 'jour') + _CHAMPS + ('modifie_le',)
+    }
+    sql = (
+        f"INSERT INTO {table} ({', '.join(colonnes.values())}) VALUES ({', '.join(['%s'] * len(colonnes))}) "
+        f"ON CONFLICT ({colonnes['article']}, {colonnes['jour']}) DO UPDATE SET "
+        + ', '.join(f'{colonnes[nom]} = {table}.{colonnes[nom]} + EXCLUDED.{colonnes[nom]}' for nom in _CHAMPS)
+        + f", {colonnes['modifie_le']} = EXCLUDED.{colonnes['modifie_le']}"
+    )
+    maintenant = connection.ops.adapt_datetimefield_value(timezone.now())
+    elements = [
+        (agence_id, article_id, connection.ops.adapt_datefield_value(jour),
+         quantite, montant.quantize(CENTIMES), cout.quantize(CENTIMES), lignes, maintenant)
+        for (article_id, jour), (agence_id, quantite, montant, cout, lignes) in sorted(cumuls.items())
+    ]
+    with connection.cursor() as curseur:
+        for debut in range(0, len(elements), TAILLE_LOT):
+            curseur.executemany(sql, elements[debut:debut + TAILLE_LOT])
+
+
+def _ecrire_sans_upsert(cumuls):
+    """Autres bases : incrément (F()) puis création des lignes absentes"""
+    for (article_id, jour), (agence_id, quantite, montant, cout, lignes) in sorted(cumuls.items()):
+        montant, cout = montant.quantize(CENTIMES), cout.quantize(CENTIMES)
+        if not VenteJournaliere.objects.filter(article_id=article_id, jour=jour).update(
+            quantite=F('quantite') + quantite, chiffre_affaires=F('chiffre_affaires') + montant,
+            cout=F('cout') + cout, nombre_lignes=F('nombre_lignes') + lignes, modifie_le=timezone.now(),
+        ):
+            VenteJournaliere.objects.create(
+                agence_id=agence_id, article_id=article_id, jour=jour, quantite=quantite,
+                chiffre_affaires=montant, cout=cout, nombre_lignes=lignes,
+            )
+
+
+def _appliquer(elements, sens):
+    cumuls = _cumuler(elements, sens)
+    if not cumuls:
+        return
+    if _upsert_disponible():
+        _ecrire(cumuls)
+    else:
+        with transaction.atomic():
+            _ecrire_sans_upsert(cumuls)
+
+
+def comptabiliser(elements):
+    """Ajouter des lignes vendues (voir element()) aux ventes journalières"""
+    _appliquer(elements, 1)
+
+
+def retirer(facture, lignes):
+    """Retirer des lignes de la facture (défacturation), au coût de sortie de la vente"""
+    lignes = list(lignes)
+    if not lignes:
+        return
+    couts = {}
+    for article_id, cout in MouvementStock.objects.filter(
+        facture_vente=facture, type_mouvement='sortie'
+    ).order_by('-id').values_list('article_id', 'cout_moyen_pondere'):
+        couts[article_id] = cout
+    _appliquer([
+        element(
+            facture.agence_id, ligne.article_id, facture.date, ligne.quantite, ligne.prix_unitaire,
+            couts.get(ligne.article_id, ligne.article.prix_achat),
+        )
+        for ligne in lignes
+    ], -1)
+
+
+def reconstruire(agences=None, debut=None, fin=None):
+    """
+    Recalculer la table à partir des lignes de facture (agences et jours donnés, tout par défaut).
+
+    Une requête groupée par (agence, article, jour) ; le coût d'une ligne est
+    celui de la sortie de stock de sa facture, à défaut le prix d'achat de
+    l'article. Retourne le nombre de lignes écrites.
+    """
+    lignes = LigneFactureVente.objects.all()
+    existantes = VenteJournaliere.objects.all()
+    filigranes = RafraichissementStatistiques.objects.all()
+    resultats = ResultatJournalier.objects.all()
+    if agences is not None:
+        lignes = lignes.filter(facture_vente__agence__in=agences)
+        existantes = existantes.filter(agence__in=agences)
+        filigranes = filigranes.filter(agence__in=agences)
+        resultats = resultats.filter(agence__in=agences)
+    if debut is not None:
+        lignes = lignes.filter(facture_vente__date__gte=debut)
+        existantes = existantes.filter(jour__gte=debut)
+        resultats = resultats.filter(jour__gte=debut)
+    if fin is not None:
+        lignes = lignes.filter(facture_vente__date__lte=fin)
+        existantes = existantes.filter(jour__lte=fin)
+        resultats = resultats.filter(jour__lte=fin)
+
+    cout_sortie = MouvementStock.objects.filter(
+        facture_vente=OuterRef('facture_vente'), article=OuterRef('article'), type_mouvement='sortie',
+    ).order_by('-id').values('cout_moyen_pondere')[:1]
+    groupes = lignes.values(
+        'article_id', agence_vente=F('facture_vente__agence_id'), jour=F('facture_vente__date'),
+    ).annotate(
+        total_quantite=Sum('quantite'),
+        total_chiffre_affaires=Sum(ExpressionWrapper(F('quantite') * F('prix_unitaire'), output_field=_MONTANT)),
+        total_cout=Sum(ExpressionWrapper(
+            F('quantite') * Coalesce(Subquery(cout_sortie), F('article__prix_achat')), output_field=_MONTANT,
+        )),
+        total_lignes=Count('id'),
+    ).order_by()
+
+    ecrites = 0
+    with transaction.atomic():
+        existantes.delete()
+        # Jours supprimés sans trace : statistiques de vente recalculées en entier au prochain rafraîchissement
+        filigranes.update(jusqu_a=None)
+        # Marges figées des résultats journaliers (tableau de bord financier) recalculées à la prochaine lecture
+        resultats.delete()
+        lot = []
+        for groupe in groupes.iterator(chunk_size=TAILLE_LOT):
+            lot.append(VenteJournaliere(
+                agence_id=groupe['agence_vente'], article_id=groupe['article_id'], jour=groupe['jour'],
+                quantite=groupe['total_quantite'] or 0,
+                chiffre_affaires=Decimal(groupe['total_chiffre_affaires'] or 0).quantize(CENTIMES),
+                cout=Decimal(groupe['total_cout'] or 0).quantize(CENTIMES),
+                nombre_lignes=groupe['total_lignes'],
+            ))
+            if len(lot) >= TAILLE_LOT:
+                VenteJournaliere.objects.bulk_create(lot)
+                ecrites += len(lot)
+                lot = []
+        if lot:
+            VenteJournaliere.objects.bulk_create(lot)
+            ecrites += len(lot)
+    return ecrites
+
+
+def totaux_par_agence(debut, fin, agences=None):
+    """{agence_id: {'quantite', 'chiffre_affaires', 'cout', 'marge'}} sur la période, en une requête"""
+    ventes = VenteJournaliere.objects.filter(jour__range=(debut, fin), nombre_lignes__gt=0)
+    if agences is not None:
+        ventes = ventes.filter(agence__in=agences)
+    totaux = {}
+    for agence_id, quantite, montant, cout in ventes.values('agence_id').annotate(
+        total_quantite=Sum('quantite'), total_chiffre_affaires=Sum('chiffre_affaires'), total_cout=Sum('cout'),
+    ).order_by().values_list('agence_id', 'total_quantite', 'total_chiffre_affaires', 'total_cout'):
+        montant, cout = Decimal(montant or 0), Decimal(cout or 0)
+        totaux[agence_id] = {
+            'quantite': Decimal(quantite or 0), 'chiffre_affaires': montant, 'cout': cout, 'marge': montant - cout,
+        }
+    return totaux
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
@@ -11,6 +11,7 @@ from django.utils import timezone
 from django.conf import settings
 from datetime import datetime, time, timedelta
 import json
+import logging
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill
 from decimal import Decimal
@@ -28,20 +29,32 @@ from .decorators import (
     require_commandes_feature, require_module_access, require_compte_type,
     require_caisse_access, require_stock_access, require_comptes_access,
     get_user_compte, get_user_livreur, require_comptable_access,
+    get_compte_actif,
 )
 from .permissions_utils import (
     filter_commandes_by_user, filter_suivi_client_by_user, filter_livraisons_by_user
 )
+from .ticket_utils import allouer_numero_ticket, apercu_numero_ticket
+from .vente_utils import (
+    enregistrer_vente, enregistrer_ventes_lot, VenteInvalide, ENREGISTRE, DEJA_ENREGISTRE, ERREUR,
+)
+from .catalogue_index import rechercher_articles, get_index, prix_selon_type
+from .panier_caisse import panier_courant
+from .compteurs_caisse import bornes_du_jour, session_ouverte
+from .rapport_z import cloturer_session, rapport_de_session
+from .tickets_attente import garer_ticket, page_resumes, purger_tickets_perimes, tickets_en_attente
+from .ticket_escpos import ticket_commande, ticket_vente
+from .stock_utils import StockInsuffisant, appliquer_variation
+
+logger = logging.getLogger(__name__)
 
 def get_user_agence(request):
-    """Récupérer l'agence de l'utilisateur connecté"""
-    try:
-        compte = Compte.objects.get(user=request.user, actif=True)
-        print(f"[ALERTE] get_user_agence: {request.user.username} -> {compte.agence.nom_agence}")
-        return compte.agence
-    except Compte.DoesNotExist:
-        print(f"[ALERTE] get_user_agence: {request.user.username} -> AUCUN COMPTE")
+    """Récupérer l'agence de l'utilisateur connecté (compte résolu une fois par requête)"""
+    compte = get_user_compte(request)
+    if compte is None:
+        logger.debug("[ALERTE] get_user_agence: %s -> AUCUN COMPTE", request.user.username)
         return None
+    return compte.agence
 
 def login_caisse(request):
     """Page de connexion pour la gestion de caisse"""
@@ -311,7 +324,7 @@ def dashboard_caisse(request):
     
     # Récupérer le compte de l'utilisateur
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
     except Compte.DoesNotExist:
         messages.error(request, 'Compte non trouvé.')
         return redirect('logout_caisse')
@@ -392,11 +405,12 @@ def dashboard_caisse(request):
 @login_required
 @require_caisse_access
 def dashboard_kpis_api(request):
-    print(f"[ALERTE] DASHBOARD_KPIS_API: {request.user.username}")
+    """KPIs de la caisse : compteurs de la session ouverte, lus avec les sessions du jour en une requête"""
+    logger.debug("[ALERTE] DASHBOARD_KPIS_API: %s", request.user.username)
     
     agence = get_user_agence(request)
     if not agence:
-        print(f"[ALERTE] DASHBOARD_KPIS_API: Aucune agence pour {request.user.username}")
+        logger.debug("[ALERTE] DASHBOARD_KPIS_API: Aucune agence pour %s", request.user.username)
 
         return JsonResponse({
 
@@ -414,157 +428,67 @@ def dashboard_kpis_api(request):
 
         })
     
-    print(f"[ALERTE] DASHBOARD_KPIS_API: Agence {agence.nom_agence}")
-    
-    
-    
-    aujourd_hui = timezone.now().date()
-
-    
-    
-    # Calculer les KPIs de manière simple d'abord
-
-    chiffre_affaires = 0
-
-    nombre_ventes = 0
-
-    tickets_attente = 0
     
-    caisse_ouverte = False
-
     
+    # Sessions du jour (index agence + date d'ouverture) ; les compteurs sont
+    # maintenus par les transactions de vente, rien n'est recompté ici
+    debut, fin = bornes_du_jour()
+    sessions_caisse = list(SessionCaisse.objects.filter(
 
-    try:
+        agence=agence,
 
-        # Récupérer la session de caisse active
-        session_ouverte = SessionCaisse.objects.filter(
-            agence=agence, 
-            date_ouverture__date=aujourd_hui, 
-            statut='ouverte'
-        ).first()
-        
-        if session_ouverte:
-            print(f"[ALERTE] DASHBOARD_KPIS_API: Session trouvée {session_ouverte.id}")
-            # Récupérer toutes les factures de la session active (toutes dates confondues)
-            ventes_jour = FactureVente.objects.filter(
-                agence=agence, 
-                session_caisse=session_ouverte
-            )
-            print(f"[ALERTE] DASHBOARD_KPIS_API: {ventes_jour.count()} factures trouvées")
-            
-            # Si aucune facture liée à la session, récupérer toutes les factures du jour et les lier
-            if ventes_jour.count() == 0:
-                print(f"[ALERTE] DASHBOARD_KPIS_API: Aucune facture liée à la session, recherche des factures orphelines")
-                factures_orphelines = FactureVente.objects.filter(
-                    agence=agence,
-                    date=aujourd_hui,
-                    session_caisse__isnull=True
-                )
-                
-                if factures_orphelines.count() > 0:
-                    print(f"[ALERTE] DASHBOARD_KPIS_API: {factures_orphelines.count()} factures orphelines trouvées, liaison à la session")
-                    # Lier ces factures à la session actuelle
-                    factures_orphelines.update(session_caisse=session_ouverte)
-                    
-                    # Récupérer maintenant toutes les factures de la session
-                    ventes_jour = FactureVente.objects.filter(
-                        agence=agence, 
-                        session_caisse=session_ouverte
-                    )
-                    print(f"[ALERTE] DASHBOARD_KPIS_API: {ventes_jour.count()} factures après liaison")
-        else:
-            print(f"[ALERTE] DASHBOARD_KPIS_API: Aucune session active")
-            # Aucune session active, donc pas de ventes
-            ventes_jour = FactureVente.objects.none()
-        
-        
-        chiffre_affaires = ventes_jour.aggregate(total=Sum('nette_a_payer'))['total'] or 0
+        date_ouverture__gte=debut,
 
-        nombre_ventes = ventes_jour.count()
+        date_ouverture__lt=fin
 
-        # Compter les factures temporaires en attente UNIQUEMENT pour la session courante
-        if session_ouverte:
-            tickets_attente = FactureTemporaire.objects.filter(session_caisse=session_ouverte).count()
-        else:
-            tickets_attente = 0
-        
-        
-    except Exception as e:
-    
+    ).select_related('employe__compte').order_by('date_ouverture'))
 
-        pass
+    session_ouverte = next((s for s in reversed(sessions_caisse) if s.statut == 'ouverte'), None)
     
-
-    # Vérifier le statut de la caisse (session_ouverte déjà récupérée plus haut)
-    try:
-
-        caisse_ouverte = session_ouverte is not None
-        
-        # Récupérer toutes les sessions pour l'affichage
-        sessions_caisse = SessionCaisse.objects.filter(
-
-            agence=agence, 
-
-            date_ouverture__date=aujourd_hui
-
-        ).order_by('date_ouverture')
-        
-        
-        
-    except Exception as e:
-
-        pass
     
     
     # Préparer les informations des sessions
 
     sessions_info = []
 
-    try:
-
-        for i, session in enumerate(sessions_caisse[:2]):  # Max 2 sessions
-
+    for i, session in enumerate(sessions_caisse[:2]):  # Max 2 sessions
 
-            session_data = {
+        compte = session.employe.compte if session.employe else None
 
-                'numero': i + 1,
+        sessions_info.append({
 
-                'ouverture': session.date_ouverture.strftime('%H:%M') if session.date_ouverture else '',
+            'numero': i + 1,
 
-                'fermeture': session.date_fermeture.strftime('%H:%M') if session.date_fermeture else '',
+            'ouverture': session.date_ouverture.strftime('%H:%M') if session.date_ouverture else '',
 
-                'ouverte_par': session.employe.compte.nom_complet if session.employe and hasattr(session.employe, 'compte') else 'Non spécifié',
+            'fermeture': session.date_fermeture.strftime('%H:%M') if session.date_fermeture else '',
 
-                'fermee_par': session.employe.compte.nom_complet if session.employe and session.date_fermeture and hasattr(session.employe, 'compte') else '',
+            'ouverte_par': compte.nom_complet if compte else 'Non spécifié',
 
+            'fermee_par': compte.nom_complet if compte and session.date_fermeture else '',
 
-                'statut': 'Ouverte' if session.statut == 'ouverte' else 'Fermée'
+            'statut': 'Ouverte' if session.statut == 'ouverte' else 'Fermée'
 
-            }
-
-            sessions_info.append(session_data)
-
-    except Exception as e:
-
-        print(f"DEBUG: Erreur sessions_info: {str(e)}")
+        })
     
-
     
     
     result = {
 
-        'chiffre_affaires': float(chiffre_affaires),
+        'chiffre_affaires': float(session_ouverte.chiffre_affaires) if session_ouverte else 0.0,
 
-        'nombre_ventes': nombre_ventes,
+        'nombre_ventes': session_ouverte.nombre_tickets if session_ouverte else 0,
 
-        'tickets_attente': tickets_attente,
+        'tickets_attente': session_ouverte.tickets_attente if session_ouverte else 0,
 
-        'caisse_ouverte': caisse_ouverte,
+        'caisse_ouverte': session_ouverte is not None,
 
         'sessions_info': sessions_info,
 
-
-        'premiere_ouverture': None,
+        'premiere_ouverture': (
+            timezone.localtime(session_ouverte.premiere_ouverture).strftime('%H:%M')
+            if session_ouverte and session_ouverte.premiere_ouverture else None
+        ),
 
         'nombre_sessions': len(sessions_info)
 
@@ -572,7 +496,7 @@ def dashboard_kpis_api(request):
 
     
     
-    print(f"DEBUG: Résultat final: {result}")
+    logger.debug("Résultat final: %s", result)
 
     
     
@@ -582,82 +506,15 @@ def dashboard_kpis_api(request):
 
 def generate_ticket_number(agence):
 
-    """Générer un numéro de ticket auto-incrémenté"""
-
-    try:
-
-        # Obtenir la date actuelle
-
-        aujourd_hui = timezone.now().date()
-
-        
-        
-        # Chercher le dernier numéro de ticket pour aujourd'hui
-
-        dernier_ticket = FactureVente.objects.filter(
-
-            agence=agence,
-
-            date=aujourd_hui
-
-        ).aggregate(
-
-            max_numero=Max('numero_ticket')
-
-        )['max_numero']
-
-        
-        
-        if dernier_ticket:
-
-            # Extraire le numéro du dernier ticket (format: TKT20250923001)
-
-            try:
-
-                # Le format est TKT + YYYYMMDD + 3 chiffres
-
-                numero_sequence = int(dernier_ticket[-3:])
-
-                nouveau_numero = numero_sequence + 1
-
-            except (ValueError, IndexError):
-
-                nouveau_numero = 1
-
-        else:
-
-            nouveau_numero = 1
-        
-        
-        
-        # Formater le nouveau numéro de ticket
-
-        date_str = aujourd_hui.strftime('%Y%m%d')
-
-        numero_ticket = f"TKT{date_str}{nouveau_numero:03d}"
-
-        # Vérifier que le numéro n'existe pas déjà
-        while FactureVente.objects.filter(numero_ticket=numero_ticket).exists():
-            nouveau_numero += 1
-            numero_ticket = f"TKT{date_str}{nouveau_numero:03d}"
-
-        print(f"[ALERTE] NUMÉRO TICKET GÉNÉRÉ: {numero_ticket}")
-        
-        return numero_ticket
-        
-        
-        
-    except Exception as e:
+    """Attribuer le prochain numéro de ticket de l'agence (compteur journalier atomique)"""
 
-        print(f"Erreur lors de la génération du numéro de ticket: {e}")
+    numero_ticket = allouer_numero_ticket(agence)
 
-        # En cas d'erreur, utiliser un format simple avec timestamp
+    logger.debug("[ALERTE] NUMÉRO TICKET GÉNÉRÉ: %s", numero_ticket)
 
-        timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    return numero_ticket
 
-        return f"TKT{timestamp}"
 
-    
 
 @login_required
 @require_caisse_access
@@ -752,55 +609,18 @@ def facturation_vente(request, facture_id=None):
         except:
             pass
     
-    # Générer le numéro de ticket auto-incrémenté
-
-    numero_ticket = generate_ticket_number(agence)
-
-    
-    
-    # Récupérer la facture temporaire de la session
-
-    facture_temp = request.session.get('facture_temporaire', {
-
-        'lignes': [], 'type_vente': 'detail', 'remise': 0, 'montant_regler': 0, 'nette_a_payer': 0, 'rendu': 0
-
-    })
-
-    
-    
-    print(f"DEBUG facturation_vente: facture_temp récupérée = {facture_temp}")
+    # Numéro du prochain ticket (affichage seulement, attribué à l'enregistrement)
 
-    print(f"DEBUG facturation_vente: type de facture_temp = {type(facture_temp)}")
-
-    print(f"DEBUG facturation_vente: lignes = {facture_temp.get('lignes', [])}")
-
-    print(f"DEBUG facturation_vente: nombre de lignes = {len(facture_temp.get('lignes', []))}")
+    numero_ticket = apercu_numero_ticket(agence)
 
     
     
-    # Si la session est vide, essayer de récupérer depuis les cookies ou créer une nouvelle
-
-    if not facture_temp or not facture_temp.get('lignes'):
-
-        print("DEBUG: Session vide, création d'une nouvelle facture temporaire")
-
-        facture_temp = {
-
-            'lignes': [], 
-
-            'type_vente': 'detail', 
-
-            'remise': 0, 
+    # Récupérer le panier du poste (la caisse est mémorisée pour les appels AJAX suivants)
 
-            'montant_regler': 0, 
+    facture_temp = panier_courant(request, agence, caisse_actuelle).en_dict()
 
-            'nette_a_payer': 0, 
-
-            'rendu': 0
-
-        }
-
-        request.session['facture_temporaire'] = facture_temp
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("DEBUG facturation_vente: nombre de lignes = %s", len(facture_temp['lignes']))
 
     
     
@@ -812,7 +632,7 @@ def facturation_vente(request, facture_id=None):
     
     # Récupérer l'employé de l'utilisateur connecté
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         employe = Employe.objects.filter(compte=compte).first()
         
         # Si pas d'employé, créer les infos à partir du compte
@@ -915,8 +735,9 @@ def ouvrir_caisse(request):
         )
 
         
-        # Vider les factures temporaires en attente pour la nouvelle session
-        FactureTemporaire.objects.all().delete()
+        # Vider les factures temporaires en attente de l'agence pour la nouvelle session
+        FactureTemporaire.objects.filter(agence=agence).delete()
+        purger_tickets_perimes()
         
         
         messages.success(request, f'Caisse ouverte avec succès. Solde: {caisse.solde_actuel} FCFA')
@@ -968,45 +789,80 @@ def search_window(request):
 @require_caisse_access
 def search_articles_api(request):
 
+    """Recherche paginée des articles de la caisse (index en mémoire par agence)"""
+
     search_term = request.GET.get('q', '')
 
     agence = get_user_agence(request)
     if not agence:
         return JsonResponse({'articles': []})
-    
-    
-    
-    articles = []
 
-    if search_term:
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        par_page = min(max(int(request.GET.get('par_page', 50)), 1), 200)
+    except ValueError:
+        page, par_page = 1, 50
 
-        articles = Article.objects.filter(agence=agence, designation__icontains=search_term).order_by('designation')
+    results, total = rechercher_articles(agence, search_term, page, par_page)
 
+    return JsonResponse({
+        'articles': results,
+        'page': page,
+        'par_page': par_page,
+        'total': total,
+        'has_next': page * par_page < total,
+    })
 
-    else:
+@login_required
+@require_caisse_access
+def scanner_article_api(request):
 
+    """Scan / saisie d'une référence article : résolution exacte et ajout au ticket en un seul appel"""
 
-        articles = Article.objects.filter(agence=agence).order_by('designation')
-    
-    
-    
-    results = []
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
 
-    for article in articles:
+    agence = get_user_agence(request)
+    if not agence:
+        return JsonResponse({'success': False, 'error': 'Aucune agence trouvée.'})
 
-        results.append({
+    code = request.POST.get('reference', '').strip()
+    type_vente = request.POST.get('type_vente', 'detail')
+    try:
+        quantite = float(request.POST.get('quantite', 1))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Quantité invalide'})
 
-            'id': article.id, 'reference': article.reference_article, 'designation': article.designation,
+    entree = get_index(agence.pk).par_code(code) if code else None
+    if entree is None:
+        return JsonResponse({'success': False, 'error': f'Aucun article pour la référence "{code}"'}, status=404)
 
-            'prix_achat': float(article.prix_achat or 0), 'prix_vente': float(article.prix_vente or 0),
+    stock = Article.objects.filter(id=entree['id']).values_list('stock_actuel', flat=True).first()
+    if stock is None:
+        return JsonResponse({'success': False, 'error': f'Aucun article pour la référence "{code}"'}, status=404)
+
+    prix_unitaire = prix_selon_type(entree, type_vente)
+
+    panier = panier_courant(request, agence)
+    ligne = panier.ajouter(
+        entree['id'], entree['reference'], entree['designation'], quantite, prix_unitaire, type_vente
+    )
+
+    return JsonResponse({
+        'success': True,
+        'article': {
+            'id': entree['id'],
+            'designation': entree['designation'],
+            'reference': entree['reference'],
+            'prix_vente': entree['prix_vente'],
+            'prix_unitaire': ligne['prix_unitaire'],
+            'stock': float(stock),
+        },
+        'ligne': ligne,
+        'nombre_lignes': len(panier),
+    })
 
-            'stock': int(article.stock_actuel or 0)
 
-        })
-    
-    
-    
-    return JsonResponse({'articles': results})
 
 @login_required
 @require_caisse_access
@@ -1065,72 +921,24 @@ def ajouter_article_facture(request):
 
             
             
-            print(f"DEBUG: Article ID reçu: {article_id}")
+            logger.debug("Article ID reçu: %s", article_id)
 
-            print(f"DEBUG: Quantité reçue: {quantite}")
+            logger.debug("Quantité reçue: %s", quantite)
 
             
             
             article = Article.objects.get(id=article_id, agence=agence)
 
-            print(f"DEBUG: Article trouvé: {article.designation}")
-
-            
-            
-            facture_temp = request.session.get('facture_temporaire', {
-
-                'lignes': [], 'type_vente': 'detail', 'remise': 0, 'montant_regler': 0, 'nette_a_payer': 0, 'rendu': 0
-
-            })
-
-            
-            
-            print(f"DEBUG: Facture temp avant: {facture_temp}")
-
-            
-            
-            article_existe = False
-
-            for ligne in facture_temp['lignes']:
-
-                # Comparer les IDs en tant que strings pour éviter les problèmes de type
-
-                if str(ligne['article_id']) == str(article_id):
-
-                    ligne['quantite'] += quantite
-
-                    ligne['prix_total'] = ligne['quantite'] * ligne['prix_unitaire']
+            logger.debug("Article trouvé: %s", article.designation)
 
-                    article_existe = True
-
-                    print(f"DEBUG: Article existant mis à jour")
-
-                    break
             
             
-            
-            if not article_existe:
-
-                prix_unitaire = float(article.prix_vente or 0)
-
-                prix_total = quantite * prix_unitaire
-
-                
-                
-                nouvelle_ligne = {
-
-                    'article_id': article_id, 'reference': article.reference_article, 'designation': article.designation,
-
-                    'quantite': quantite, 'prix_unitaire': prix_unitaire, 'prix_total': prix_total, 'type_vente': 'detail'
-
-                }
-
-                facture_temp['lignes'].append(nouvelle_ligne)
+            # Ajout (ou cumul si l'article est déjà sur le ticket) : une seule ligne écrite
 
-            
-            
-            
-            request.session['facture_temporaire'] = facture_temp
+            panier_courant(request, agence).ajouter(
+                article.id, article.reference_article, article.designation,
+                quantite, float(article.prix_vente or 0), 'detail'
+            )
 
             
             
@@ -1155,7 +963,7 @@ def ajouter_article_facture(request):
             
         except Exception as e:
 
-            print(f"DEBUG: Erreur: {str(e)}")
+            logger.error("Erreur: %s", str(e))
 
             return JsonResponse({'success': False, 'error': str(e)})
 
@@ -1170,30 +978,27 @@ def ajouter_article_facture(request):
 @require_caisse_access
 def enregistrer_facture(request):
     try:
-        print("=" * 80)
-        print("*** NOUVEAU CODE VERSION 2.0 CHARGE AVEC SUCCES ***")
-        print("=" * 80)
-        print("[ALERTE] ENREGISTRER_FACTURE APPELÉE")
+        logger.debug("[ALERTE] ENREGISTRER_FACTURE APPELÉE")
         
         if request.method == 'POST':
-            print("[ALERTE] MÉTHODE POST DÉTECTÉE")
+            logger.debug("[ALERTE] MÉTHODE POST DÉTECTÉE")
         
         # Vérifier spécifiquement le champ facture_data
         facture_data = request.POST.get('facture_data', '')
-        print(f"[ALERTE] facture_data: {facture_data[:100] if facture_data else 'VIDE'}")
+        logger.debug("[ALERTE] facture_data: %s", (facture_data[:100] if facture_data else 'VIDE'))
 
         
         
         # Récupérer l'agence de l'utilisateur connecté
         agence = get_user_agence(request)
         if not agence:
-            print(f"🔴 DEBUG: [ERREUR] Aucune agence trouvée pour l'utilisateur")
+            logger.warning("Aucune agence trouvée pour l'utilisateur")
             return JsonResponse({
                 'success': False,
                 'error': 'Votre compte n\'est pas configuré correctement.'
             })
         
-        print(f"🔴 DEBUG: [OK] Agence de l'utilisateur: {agence.nom_agence} (ID: {agence.id_agence})")
+        logger.debug("Agence de l'utilisateur: %s (ID: %s)", agence.nom_agence, agence.id_agence)
 
         # S'assurer qu'il y a une caisse active pour cette agence
         caisse_actuelle = Caisse.objects.filter(agence=agence, statut='active').first()
@@ -1204,7 +1009,7 @@ def enregistrer_facture(request):
                 caisse_inactive.statut = 'active'
                 caisse_inactive.save()
                 caisse_actuelle = caisse_inactive
-                print(f"🔴 DEBUG: [OK] Caisse activée: {caisse_actuelle.numero_caisse}")
+                logger.debug("Caisse activée: %s", caisse_actuelle.numero_caisse)
             else:
                 # Créer une caisse par défaut si aucune n'existe
                 caisse_actuelle, created = Caisse.objects.get_or_create(
@@ -1217,7 +1022,7 @@ def enregistrer_facture(request):
                         'statut': 'active'
                     }
                 )
-                print(f"🔴 DEBUG: [OK] Caisse créée: {caisse_actuelle.numero_caisse}")
+                logger.debug("Caisse créée: %s", caisse_actuelle.numero_caisse)
 
         # S'assurer qu'il y a une session ouverte
         session_ouverte = SessionCaisse.objects.filter(agence=agence, statut='ouverte').first()
@@ -1240,19 +1045,21 @@ def enregistrer_facture(request):
                             solde_ouverture=0,
                             statut='ouverte'
                         )
-                        print(f"🔴 DEBUG: [OK] Session créée: {session_ouverte.id}")
+                        logger.debug("Session créée: %s", session_ouverte.id)
             except Exception as e:
-                print(f"🔴 DEBUG: [ERREUR] Erreur création session: {e}")
+                logger.error("Erreur création session: %s", e)
 
         try:
 
             # Logs détaillés pour debug
-            print("=" * 80)
-            print("DEBUG ENREGISTRER_FACTURE: Début de la fonction")
-            print(f"DEBUG: Méthode de requête: {request.method}")
-            print(f"DEBUG: POST data: {dict(request.POST)}")
-            print(f"DEBUG: Session key: {request.session.session_key}")
-            print(f"DEBUG: Session data: {dict(request.session)}")
+            logger.debug("=" * 80)
+            logger.debug("DEBUG ENREGISTRER_FACTURE: Début de la fonction")
+            logger.debug("Méthode de requête: %s", request.method)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("POST data: %s", dict(request.POST))
+            logger.debug("Session key: %s", request.session.session_key)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Session data: %s", dict(request.session))
             
             # NOUVELLE LOGIQUE: Récupérer les articles du POST en priorité
             facture_temp = {'lignes': [], 'remise': 0, 'montant_regler': 0, 'rendu': 0}
@@ -1266,17 +1073,18 @@ def enregistrer_facture(request):
                     facture_data_parsed = json.loads(facture_data_str)
                     lignes = facture_data_parsed.get('lignes', [])
                     if lignes:
-                        print(f"🔴 DEBUG: {len(lignes)} articles récupérés depuis facture_data JSON")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("%s articles récupérés depuis facture_data JSON", len(lignes))
                         facture_temp['lignes'] = lignes
                         facture_temp['remise'] = facture_data_parsed.get('remise', 0)
                         facture_temp['montant_regler'] = facture_data_parsed.get('montant_regler', 0)
                         facture_temp['rendu'] = facture_data_parsed.get('rendu', 0)
                 except json.JSONDecodeError as e:
-                    print(f"🔴 DEBUG: Erreur parsing JSON facture_data: {e}")
+                    logger.error("Erreur parsing JSON facture_data: %s", e)
             
             # Méthode 2: Si pas de facture_data, chercher les champs article_X_id dans POST
             if not facture_temp.get('lignes'):
-                print("🔴 DEBUG: Tentative de récupération des articles depuis les champs POST")
+                logger.debug("Tentative de récupération des articles depuis les champs POST")
                 for key, value in request.POST.items():
                     if key.startswith('article_') and key.endswith('_id') and value:
                         article_id = value
@@ -1287,32 +1095,31 @@ def enregistrer_facture(request):
                         designation = request.POST.get(f'{prefix}_designation', '')
                         reference = request.POST.get(f'{prefix}_reference', '')
                         
+                        # Les articles sont chargés en une seule requête lors de la validation du panier
                         try:
-                            article = Article.objects.get(id=article_id)
                             articles_from_post.append({
                                 'article_id': int(article_id),
-                                'designation': designation or article.designation,
+                                'designation': designation,
                                 'quantite': float(quantite),
                                 'prix_unitaire': float(prix_unitaire),
                                 'prix_total': float(prix_total),
-                                'reference': reference or article.reference_article
+                                'reference': reference
                             })
-                            print(f"🔴 DEBUG: Article récupéré depuis POST: {designation} (ID: {article_id})")
-                        except Article.DoesNotExist:
-                            print(f"🔴 DEBUG: Article avec ID {article_id} non trouvé")
-                        except Exception as e:
-                            print(f"🔴 DEBUG: Erreur récupération article {article_id}: {e}")
+                        except (TypeError, ValueError) as e:
+                            logger.debug("Ligne POST invalide pour l'article %s: %s", article_id, e)
                 
                 if articles_from_post:
                     facture_temp['lignes'] = articles_from_post
-                    print(f"🔴 DEBUG: {len(articles_from_post)} articles récupérés depuis les champs POST")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("%s articles récupérés depuis les champs POST", len(articles_from_post))
             
             # Méthode 3: Si toujours pas d'articles, chercher dans la session
             if not facture_temp.get('lignes'):
-                facture_temp_session = request.session.get('facture_temporaire', {'lignes': []})
+                facture_temp_session = panier_courant(request, agence).en_dict()
                 if facture_temp_session.get('lignes'):
                     facture_temp = facture_temp_session
-                    print(f"🔴 DEBUG: {len(facture_temp['lignes'])} articles récupérés depuis la session")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("%s articles récupérés depuis la session", len(facture_temp['lignes']))
             
             # Méthode 4: Si toujours pas d'articles, chercher dans FactureTemporaire (DB)
             if not facture_temp.get('lignes'):
@@ -1323,29 +1130,27 @@ def enregistrer_facture(request):
                         if facture_temp_db and facture_temp_db.contenu:
                             import json
                             facture_temp = json.loads(facture_temp_db.contenu)
-                            print(f"🔴 DEBUG: {len(facture_temp.get('lignes', []))} articles récupérés depuis FactureTemporaire DB")
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("%s articles récupérés depuis FactureTemporaire DB", len(facture_temp.get('lignes', [])))
                 except Exception as e:
-                    print(f"🔴 DEBUG: Erreur récupération depuis DB: {e}")
+                    logger.error("Erreur récupération depuis DB: %s", e)
             
-            print(f"🔴 DEBUG: [FINAL] Nombre total d'articles: {len(facture_temp.get('lignes', []))}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Nombre total d'articles: %s", len(facture_temp.get('lignes', [])))
             
             # Si toujours aucun article, retourner une erreur
             if not facture_temp.get('lignes'):
-                print("🔴 DEBUG: [ERREUR FINALE] Aucun article trouvé après toutes les tentatives")
+                logger.error("Aucun article trouvé après toutes les tentatives")
                 return JsonResponse({
                     'success': False,
                     'error': 'Aucun article dans la facture. Veuillez ajouter des articles.'
                 })
             
-            print(f"🔴 DEBUG: [LIST] Articles à enregistrer:")
-            for i, ligne in enumerate(facture_temp.get('lignes', [])):
-                print(f"🔴 DEBUG: Ligne {i}: article_id={ligne.get('article_id', 'VIDE')}, designation={ligne.get('designation', 'VIDE')}, qté={ligne.get('quantite', 0)}")
-
             # Passer au traitement (la suite du code reste inchangée)
             # Utiliser la caisse actuelle (déjà vérifiée/créée plus haut)
             caisse = caisse_actuelle
 
-            print(f"🔴 DEBUG: [OK] Caisse utilisée: {caisse.numero_caisse} (ID: {caisse.id})")
+            logger.debug("Caisse utilisée: %s (ID: %s)", caisse.numero_caisse, caisse.id)
 
             
             
@@ -1355,7 +1160,7 @@ def enregistrer_facture(request):
 
             client_name = request.POST.get('client_name')
 
-            print(f"DEBUG: Client ID: {client_id}, Client Name: {client_name}")
+            logger.debug("Client ID: %s, Client Name: %s", client_id, client_name)
 
             client = None
             
@@ -1363,15 +1168,15 @@ def enregistrer_facture(request):
                 try:
                     # Essayer de récupérer le client par ID (sans filtrer par agence)
                     client = Client.objects.get(id=client_id)
-                    print(f"DEBUG: Client existant trouvé: {client}")
+                    logger.debug("Client existant trouvé: %s", client)
                     
                     # Vérifier si le client appartient à une autre agence
                     if client.agence != agence:
-                        print(f"DEBUG: ATTENTION - Client de l'agence {client.agence.nom_agence}, utilisateur de l'agence {agence.nom_agence}")
+                        logger.warning("ATTENTION - Client de l'agence %s, utilisateur de l'agence %s", client.agence.nom_agence, agence.nom_agence)
                         # On peut soit utiliser ce client, soit utiliser le client par défaut de l'agence
                         # Pour l'instant, on utilise le client trouvé (vente inter-agence possible)
                 except Client.DoesNotExist:
-                    print(f"DEBUG: Client avec ID {client_id} non trouvé, utilisation du client par défaut")
+                    logger.debug("Client avec ID %s non trouvé, utilisation du client par défaut", client_id)
                     client = None
 
             elif client_name:
@@ -1392,7 +1197,7 @@ def enregistrer_facture(request):
 
                 )
 
-                print(f"DEBUG: Nouveau client créé: {client}")
+                logger.debug("Nouveau client créé: %s", client)
 
             else:
                 # Utiliser un client par défaut
@@ -1406,321 +1211,81 @@ def enregistrer_facture(request):
                     email='',
                     agence=agence
                 )
-                print(f"DEBUG: Client par défaut créé: {client}")
+                logger.debug("Client par défaut créé: %s", client)
             else:
-                print(f"DEBUG: Client par défaut existant: {client}")
+                logger.debug("Client par défaut existant: %s", client)
                 
-            # Générer un nouveau numéro de ticket
-            numero_ticket = generate_ticket_number(agence)
-
-            print(f"DEBUG: Numéro de ticket généré: {numero_ticket}")
-
-            
-            
-            # Calculer les totaux
-
-            total_ht = sum(ligne['prix_total'] for ligne in facture_temp['lignes'])
-
-            remise = facture_temp.get('remise', 0)
-
-            nette_a_payer = total_ht - remise
-
-            montant_regler = facture_temp.get('montant_regler', 0)
-
-            rendu = montant_regler - nette_a_payer
-
-            
-            
-            print(f"DEBUG: Totaux - Total HT: {total_ht}, Remise: {remise}, Nette: {nette_a_payer}")
-
-            print(f"DEBUG: Montant réglé: {montant_regler}, Rendu: {rendu}")
-
-            
-            
             # Récupérer l'employé de l'utilisateur connecté
-            try:
-                compte = Compte.objects.get(user=request.user, actif=True)
-                employe = Employe.objects.filter(compte=compte).first()
-                
-                # Si pas d'employé, utiliser les infos du compte
-                if not employe:
-                    employe = type('obj', (object,), {
-                        'compte': compte
-                    })()
-                
-                print(f"DEBUG: Employé vendeur: {employe.compte.nom_complet if employe and hasattr(employe, 'compte') else 'Aucun'}")
-            except Compte.DoesNotExist:
-                employe = None
-                print(f"DEBUG: Aucun compte trouvé pour l'utilisateur: {request.user.username}")
-            
-            
-
-            # Récupérer la session de caisse active
-            session_caisse = None
-            try:
-                aujourd_hui = timezone.now().date()
+            compte = getattr(request, 'compte', None) or get_user_compte(request)
+            employe = Employe.objects.filter(compte=compte).first() if compte else None
+            nom_vendeuse = compte.nom_complet if compte else 'Vendeur'
 
-                # Rechercher la session active (même critères que l'API KPIs)
-                session_caisse = SessionCaisse.objects.filter(
-                    agence=agence,
-                    date_ouverture__date=aujourd_hui,
-                    statut='ouverte'
-                ).first()
-                
-                print(f"DEBUG: Session trouvée: {session_caisse}")
-                
-                print(f"DEBUG: Session de caisse active: {session_caisse}")
-            except Exception as e:
-                print(f"DEBUG: Erreur lors de la récupération de la session: {e}")
+            # Récupérer la session de caisse active (même critères que l'API KPIs)
+            session_caisse = SessionCaisse.objects.filter(
+                agence=agence,
+                date_ouverture__date=timezone.now().date(),
+                statut='ouverte'
+            ).first()
 
             # Déterminer la date de la facture (priorité à la date saisie)
             sale_date_str = request.POST.get('sale_date')
             date_facture = timezone.now().date()
             if sale_date_str:
                 try:
-                    from datetime import datetime
                     date_facture = datetime.strptime(sale_date_str, '%Y-%m-%d').date()
-                    print(f"DEBUG: Date de vente saisie utilisée: {date_facture}")
                 except ValueError:
-                    print(f"DEBUG: Date de vente invalide '{sale_date_str}', utilisation de la date du jour")
-            heure_actuelle = timezone.now().time()
+                    logger.debug("Date de vente invalide '%s', utilisation de la date du jour", sale_date_str)
 
-            
-            
-            print("DEBUG: Création de la facture...")
-            
-            # Vérifier si le numéro de ticket existe déjà
-            if FactureVente.objects.filter(numero_ticket=numero_ticket).exists():
-                print(f"DEBUG: Numéro de ticket déjà existant, génération d'un nouveau...")
-                numero_ticket = generate_ticket_number(agence)
-                print(f"DEBUG: Nouveau numéro de ticket: {numero_ticket}")
-            
+            # Validation du panier complet puis écriture en une transaction
+            # (lignes, sortie de stock et mouvements en requêtes groupées)
             try:
-                facture = FactureVente.objects.create(
-
-                    numero_ticket=numero_ticket, 
-
-                    client=client, 
-
-                    agence=agence, 
-
-                    caisse=caisse,
-
-                    vendeur=employe, 
-
-                    session_caisse=session_caisse,
-                    date=date_facture, 
-
-                    heure=heure_actuelle,
-
-                    nette_a_payer=nette_a_payer, 
-
-                    remise=remise, 
-
-                    montant_regler=montant_regler,
-
-                    rendu=rendu, 
-
-                    en_attente=False,
-
-                    nom_vendeuse=employe.compte.nom_complet if employe else 'Vendeur'
-
-                )
-                print(f"DEBUG: Facture créée avec ID: {facture.id}")
-            except IntegrityError as e:
-                # Si l'erreur persiste, générer un nouveau numéro et réessayer
-                print(f"DEBUG: Erreur d'intégrité, génération d'un nouveau numéro...")
-                numero_ticket = generate_ticket_number(agence)
-                facture = FactureVente.objects.create(
-
-                    numero_ticket=numero_ticket, 
-
-                    client=client, 
-
-                    agence=agence, 
-
+                facture = enregistrer_vente(
+                    agence=agence,
                     caisse=caisse,
-
-                    vendeur=employe, 
-
+                    client=client,
+                    lignes=facture_temp['lignes'],
+                    employe=employe,
                     session_caisse=session_caisse,
-                    date=date_facture, 
-
-                    heure=heure_actuelle,
-
-                    nette_a_payer=nette_a_payer, 
-
-                    remise=remise, 
-
-                    montant_regler=montant_regler,
-
-                    rendu=rendu, 
-
-                    en_attente=False,
-
-                    nom_vendeuse=employe.compte.nom_complet if employe else 'Vendeur'
-
+                    remise=facture_temp.get('remise', 0),
+                    montant_regler=facture_temp.get('montant_regler', 0),
+                    date_facture=date_facture,
+                    heure=timezone.now().time(),
+                    nom_vendeuse=nom_vendeuse,
                 )
-                print(f"DEBUG: Facture créée avec ID: {facture.id} (nouveau numéro: {numero_ticket})")
-
-            
-            
-            # Créer les lignes de facture
-
-            print(f"DEBUG: Création de {len(facture_temp['lignes'])} lignes de facture...")
-
-            for i, ligne_temp in enumerate(facture_temp['lignes']):
-
-                print(f"DEBUG: Ligne {i+1}: {ligne_temp}")
-
-                
-                # Vérifier que l'article_id est valide
-                article_id = ligne_temp.get('article_id')
-                if not article_id:
-                    print(f"DEBUG: ERREUR - article_id manquant pour la ligne {i+1}: {ligne_temp}")
-                    continue
-                
-                try:
-                    article = Article.objects.get(id=article_id)
-                    print(f"DEBUG: Article trouvé: {article} (ID: {article.id})")
-                except Article.DoesNotExist:
-                    print(f"DEBUG: ERREUR - Article avec ID {article_id} non trouvé")
-                    continue
-                
-                
-                # S'assurer que les valeurs sont converties correctement
-                # Convertir en float pour les valeurs numériques
-                quantite_value = ligne_temp.get('quantite', 0)
-                prix_unitaire_value = ligne_temp.get('prix_unitaire', 0)
-                prix_total_value = ligne_temp.get('prix_total', 0)
-                
-                # Si les valeurs sont des Decimal, les convertir
-                if isinstance(quantite_value, Decimal):
-                    quantite_value = float(quantite_value)
-                elif not isinstance(quantite_value, (int, float)):
-                    quantite_value = float(quantite_value)
-                
-                if isinstance(prix_unitaire_value, Decimal):
-                    prix_unitaire_value = float(prix_unitaire_value)
-                elif not isinstance(prix_unitaire_value, (int, float)):
-                    prix_unitaire_value = float(prix_unitaire_value)
-                
-                if isinstance(prix_total_value, Decimal):
-                    prix_total_value = float(prix_total_value)
-                elif not isinstance(prix_total_value, (int, float)):
-                    prix_total_value = float(prix_total_value)
-                
-                # Contrôles de stock AVANT création de la ligne
-                quantite_vendue = Decimal(str(ligne_temp['quantite']))
-                if article.stock_actuel <= 0:
-                    print(f"[ERREUR] STOCK NUL/NEGATIF - Article: {article.designation} (stock={article.stock_actuel})")
-                    # Nettoyer toute création partielle et retourner une erreur claire
-                    try:
-                        LigneFactureVente.objects.filter(facture_vente=facture).delete()
-                        facture.delete()
-                    except Exception:
-                        pass
-                    return JsonResponse({
-                        'success': False,
-                        'message': 'Pas de stock',
-                        'message_type': 'error'
-                    }, status=400)
-                if quantite_vendue > Decimal(str(article.stock_actuel)):
-                    print(f"[ERREUR] STOCK INSUFFISANT - Article: {article.designation} | demandé={quantite_vendue} > stock={article.stock_actuel}")
-                    try:
-                        LigneFactureVente.objects.filter(facture_vente=facture).delete()
-                        facture.delete()
-                    except Exception:
-                        pass
-                    return JsonResponse({
-                        'success': False,
-                        'message': 'Stock insuffisant',
-                        'message_type': 'error'
-                    }, status=400)
-
-                # Création de la ligne après validations
-                ligne_facture = LigneFactureVente.objects.create(
-
-                    facture_vente=facture, 
-
-                    article=article, 
-
-                    designation=ligne_temp['designation'],
-
-                    quantite=quantite_value, 
-
-                    prix_unitaire=prix_unitaire_value,
+            except VenteInvalide as e:
+                if e.article is not None:
+                    logger.error("%s - Article: %s (stock=%s)", e.message.upper(), e.article.designation, e.article.stock_actuel)
+                return JsonResponse({
+                    'success': False,
+                    'message': e.message,
+                    'error': e.message,
+                    'message_type': 'error'
+                }, status=400)
 
-                    prix_total=prix_total_value
-                )
-            
-                print(f"DEBUG: Ligne de facture créée: {ligne_facture.id}")
-                
-                # [HOT] GESTION AUTOMATIQUE DU STOCK - RÉDUCTION LORS DE LA VENTE
-                ancien_stock = article.stock_actuel
-                
-                # Réduire le stock (sécurisé par validations plus haut)
-                article.stock_actuel -= quantite_vendue
-                # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                article.suivi_stock = True
-                article.save()
-                print(f"🛒 STOCK VENTE - Article: {article.designation}")
-                print(f"🛒 STOCK VENTE - Quantité vendue: {quantite_vendue}")
-                print(f"🛒 STOCK VENTE - Stock mis à jour: {ancien_stock} → {article.stock_actuel}")
-                
-                # Créer un mouvement de stock pour traçabilité
-                try:
-                    mouvement_datetime = datetime.combine(
-                        facture.date or timezone.now().date(),
-                        facture.heure or heure_actuelle or timezone.now().time()
-                    )
-                    if timezone.is_naive(mouvement_datetime):
-                        mouvement_datetime = timezone.make_aware(
-                            mouvement_datetime,
-                            timezone.get_current_timezone()
-                        )
-                    
-                    MouvementStock.objects.create(
-                        article=article,
-                        agence=agence,
-                        type_mouvement='sortie',
-                        date_mouvement=mouvement_datetime,
-                        numero_piece=facture.numero_ticket,
-                        quantite_stock=article.stock_actuel,
-                        stock_initial=ancien_stock,
-                        solde=article.stock_actuel,
-                        quantite=quantite_vendue,
-                        cout_moyen_pondere=float(article.prix_achat),
-                        stock_permanent=float(article.stock_actuel * article.prix_achat),
-                        facture_vente=facture,
-                        commentaire=f"Vente - Facture {facture.numero_ticket}"
-                    )
-                    print(f"[NOTE] MOUVEMENT STOCK - Sortie enregistrée pour {article.designation}")
-                except Exception as e:
-                    print(f"[WARNING] ERREUR MOUVEMENT STOCK: {e}")
+            numero_ticket = facture.numero_ticket
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Facture %s enregistrée (%s lignes)", numero_ticket, len(facture_temp['lignes']))
             
             
             
             # Vider la facture temporaire de la session ET de la base de données
             
-            # 1. Vider la session
-            request.session['facture_temporaire'] = {
-                'lignes': [], 'type_vente': 'detail', 'remise': 0, 'montant_regler': 0, 'nette_a_payer': 0, 'rendu': 0
-            }
+            # 1. Vider le panier du poste
+            panier_courant(request, agence).vider()
             
             # 2. Supprimer la facture temporaire de la base de données
             session_key = request.session.session_key
             if session_key:
                 factures_temp_supprimees = FactureTemporaire.objects.filter(session_key=session_key).delete()
-                print(f"DEBUG: {factures_temp_supprimees[0]} facture(s) temporaire(s) supprimée(s) de la base de données")
+                logger.debug("%s facture(s) temporaire(s) supprimée(s) de la base de données", factures_temp_supprimees[0])
             
-            print("DEBUG: Facture temporaire vidée de la session ET de la base de données")
+            logger.debug("Facture temporaire vidée de la session ET de la base de données")
 
             
             
             # Retourner une réponse JSON pour AJAX
 
-            print(f"DEBUG: Envoi de la réponse de succès pour la facture {numero_ticket}")
+            logger.debug("Envoi de la réponse de succès pour la facture %s", numero_ticket)
 
             return JsonResponse({
                 'success': True,
@@ -1732,11 +1297,9 @@ def enregistrer_facture(request):
             
         except Exception as e:
 
-            print(f"DEBUG: Erreur lors de l'enregistrement: {str(e)}")
+            logger.exception("Erreur lors de l'enregistrement: %s", str(e))
 
             import traceback
-
-            print(f"DEBUG: Traceback: {traceback.format_exc()}")
             
             # Sauvegarder l'erreur dans un fichier pour debug
             try:
@@ -1745,7 +1308,7 @@ def enregistrer_facture(request):
                     f.write(f"=" * 50 + "\n\n")
                     f.write(f"Erreur: {str(e)}\n\n")
                     f.write(f"Traceback:\n{traceback.format_exc()}\n")
-                print("📄 Erreur sauvegardée dans ERREUR_500_SERVEUR.txt")
+                logger.error("📄 Erreur sauvegardée dans ERREUR_500_SERVEUR.txt")
             except:
                 pass
 
@@ -1756,11 +1319,10 @@ def enregistrer_facture(request):
     
     except Exception as global_error:
         # Capturer TOUTES les erreurs non gérées
-        print(f"❌❌❌ ERREUR GLOBALE 500: {str(global_error)}")
+        logger.error("❌❌❌ ERREUR GLOBALE 500: %s", str(global_error))
         import traceback
         error_trace = traceback.format_exc()
-        print(f"❌❌❌ TRACEBACK:")
-        print(error_trace)
+        logger.error("❌❌❌ TRACEBACK:\n%s", error_trace)
         
         # Sauvegarder dans un fichier
         try:
@@ -1769,7 +1331,7 @@ def enregistrer_facture(request):
                 f.write(f"=" * 50 + "\n\n")
                 f.write(f"Erreur: {str(global_error)}\n\n")
                 f.write(f"Traceback complet:\n{error_trace}\n")
-            print("📄 Erreur sauvegardée dans ERREUR_500_SERVEUR.txt")
+            logger.error("📄 Erreur sauvegardée dans ERREUR_500_SERVEUR.txt")
         except:
             pass
         
@@ -1777,152 +1339,151 @@ def enregistrer_facture(request):
             'success': False,
             'error': f'Erreur serveur 500: {str(global_error)}'
         }, status=500)
-@login_required
-@require_caisse_access
-def rapport_caisse(request):
-
-    """Afficher le rapport de caisse avec les données de la journée"""
-
-    agence = get_user_agence(request)
-    if not agence:
-
-        messages.error(request, 'Aucune agence trouvée.')
-
-        return redirect('dashboard_caisse')
-    
-    
-    
-    # Récupérer la date d'aujourd'hui
-
-    aujourd_hui = timezone.now().date()
-
-    
-    
-    # Vérifier le statut de la caisse
-
-    caisse_ouverte = False
-
-    try:
-
-        session_caisse = SessionCaisse.objects.filter(
-
-            agence=agence, 
-
-            date_ouverture__date=aujourd_hui, 
-
-            statut='ouverte'
-
-        ).first()
-
-        caisse_ouverte = session_caisse is not None
 
-    except:
-
-        pass
-    
-    
-    
-    # Récupérer toutes les sessions de la journée
-
-    sessions_jour = SessionCaisse.objects.filter(
-
-        agence=agence, 
 
-        date_ouverture__date=aujourd_hui
+MAX_TICKETS_LOT = 1000
 
-    ).order_by('date_ouverture').select_related('employe__compte')
 
-    
-    
-    # Calculer les KPIs de la journée
+@csrf_exempt
+@login_required
+@require_caisse_access
+def enregistrer_factures_lot(request):
 
-    chiffre_affaires = 0
+    """
+    Resynchronisation d'une caisse après une coupure : lot de tickets complets.
 
-    nombre_ventes = 0
+    Corps JSON : {"tickets": [{"cle", "lignes", "remise", "montant_regler", "date", "heure"}, ...]}.
+    La clé d'idempotence de chaque ticket est fournie par la caisse : un lot
+    renvoyé après un délai dépassé ne crée aucun doublon. Réponse : un
+    résultat par ticket, dans l'ordre de l'envoi.
+    """
 
-    tickets_attente = 0
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
 
-    
+    agence = get_user_agence(request)
+    if not agence:
+        return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
 
     try:
+        donnees = json.loads(request.body or b'{}') if request.content_type == 'application/json' \
+            else json.loads(request.POST.get('tickets') or '{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'error': 'JSON invalide'}, status=400)
+    tickets = donnees.get('tickets') if isinstance(donnees, dict) else donnees
+    if not isinstance(tickets, list) or not tickets:
+        return JsonResponse({'success': False, 'error': 'Aucun ticket à enregistrer'}, status=400)
+    if len(tickets) > MAX_TICKETS_LOT:
+        return JsonResponse({
+            'success': False, 'error': f'Lot trop volumineux (maximum {MAX_TICKETS_LOT} tickets)'
+        }, status=400)
+
+    caisse = Caisse.objects.filter(agence=agence, statut='active').first()
+    if not caisse:
+        return JsonResponse({'success': False, 'error': 'Aucune caisse active pour cette agence'}, status=400)
+    client = (Client.objects.filter(agence=agence, intitule='Client Général').first()
+              or Client.objects.filter(agence=agence).first())
+    if not client:
+        client = Client.objects.create(
+            intitule='Client Général',
+            adresse='Adresse non spécifiée',
+            telephone='Non spécifié',
+            email='',
+            agence=agence
+        )
 
-        # Récupérer les ventes du jour liées aux sessions de caisse
-        ventes_jour = FactureVente.objects.filter(
-            agence=agence, 
-            date=aujourd_hui,
-            session_caisse__isnull=False
-        ).select_related('session_caisse')
-        
-        chiffre_affaires = ventes_jour.aggregate(total=Sum('nette_a_payer'))['total'] or 0
-
-        nombre_ventes = ventes_jour.count()
-
-        # Compter les factures temporaires UNIQUEMENT pour la session courante ouverte
-        if session_caisse:
-            tickets_attente = FactureTemporaire.objects.filter(session_caisse=session_caisse).count()
-        else:
-            tickets_attente = 0
-
-        
-        print(f"DEBUG: Chiffre d'affaires calculé: {chiffre_affaires}")
-        print(f"DEBUG: Nombre de ventes: {nombre_ventes}")
-        print(f"DEBUG: Tickets en attente: {tickets_attente}")
-    except Exception as e:
-        print(f"DEBUG: Erreur lors du calcul des KPIs: {e}")
-        pass
-
-    
-
-    # Récupérer les détails des ventes pour le rapport
-
-    factures_jour = FactureVente.objects.filter(
-
-        agence=agence, 
+    compte = getattr(request, 'compte', None) or get_user_compte(request)
+    employe = Employe.objects.filter(compte=compte).first() if compte else None
+    session_caisse = SessionCaisse.objects.filter(
+        agence=agence,
+        date_ouverture__date=timezone.now().date(),
+        statut='ouverte'
+    ).first()
+
+    resultats = enregistrer_ventes_lot(
+        agence, caisse, client, tickets,
+        employe=employe,
+        session_caisse=session_caisse,
+        nom_vendeuse=compte.nom_complet if compte else 'Vendeur',
+    )
 
-        date=aujourd_hui,
-        session_caisse__isnull=False
-    ).select_related('client', 'vendeur__compte', 'session_caisse').prefetch_related('lignes__article').order_by('-heure')
-    
-    
-    # Calculer les statistiques par heure
+    statuts = [r['statut'] for r in resultats]
+    logger.info("Lot de %s tickets pour l'agence %s : %s enregistrés, %s déjà reçus, %s en erreur",
+                len(resultats), agence.pk, statuts.count(ENREGISTRE), statuts.count(DEJA_ENREGISTRE),
+                statuts.count(ERREUR))
 
-    ventes_par_heure = {}
+    return JsonResponse({
+        'success': True,
+        'resultats': resultats,
+        'enregistres': statuts.count(ENREGISTRE),
+        'deja_enregistres': statuts.count(DEJA_ENREGISTRE),
+        'erreurs': statuts.count(ERREUR),
+    })
 
-    for facture in factures_jour:
 
-        heure = facture.heure.hour
+@login_required
+@require_caisse_access
+def rapport_caisse(request):
 
-        if heure not in ventes_par_heure:
+    """Afficher le rapport de caisse avec les données de la journée"""
 
-            ventes_par_heure[heure] = {'nombre': 0, 'montant': 0}
+    agence = get_user_agence(request)
+    if not agence:
 
-        ventes_par_heure[heure]['nombre'] += 1
+        messages.error(request, 'Aucune agence trouvée.')
 
-        ventes_par_heure[heure]['montant'] += float(facture.nette_a_payer or 0)
+        return redirect('dashboard_caisse')
     
     
     
-    # Récupérer les articles les plus vendus
-
-    articles_vendus = LigneFactureVente.objects.filter(
-
-        facture_vente__agence=agence,
-
-        facture_vente__date=aujourd_hui
+    # Réimpression du rapport Z d'une session donnée, sinon rapport de la journée
+    session_id = request.GET.get('session')
+    sessions_jour = SessionCaisse.objects.filter(agence=agence).select_related('employe__compte', 'rapport_z')
+    if session_id:
+        sessions_jour = sessions_jour.filter(pk=session_id)
+        session_demandee = sessions_jour.first()
+        if not session_demandee:
+            messages.error(request, 'Session de caisse introuvable.')
+            return redirect('dashboard_caisse')
+        aujourd_hui = timezone.localtime(session_demandee.date_ouverture).date()
+    else:
+        aujourd_hui = timezone.now().date()
+        debut, fin = bornes_du_jour(aujourd_hui)
+        sessions_jour = sessions_jour.filter(date_ouverture__gte=debut, date_ouverture__lt=fin)
+    sessions_jour = list(sessions_jour.order_by('date_ouverture'))
 
-    ).values('article__designation').annotate(
+    session_caisse = next((s for s in sessions_jour if s.statut == 'ouverte'), None)
+    caisse_ouverte = session_caisse is not None
 
-        total_quantite=Sum('quantite'),
+    # Sessions fermées : rapport Z figé ; session ouverte : calculé à la demande
+    rapports = [rapport_de_session(s) for s in sessions_jour]
 
-        total_montant=Sum('prix_total')
+    chiffre_affaires = sum((r.chiffre_affaires for r in rapports), Decimal('0'))
+    nombre_ventes = sum(r.nombre_factures for r in rapports)
+    tickets_attente = session_caisse.tickets_attente if session_caisse else 0
+    total_remises = sum((r.total_remises for r in rapports), Decimal('0'))
+    total_encaisse = sum((r.total_encaisse for r in rapports), Decimal('0'))
+    total_rendu = sum((r.total_rendu for r in rapports), Decimal('0'))
+    nombre_retours = sum(r.nombre_retours for r in rapports)
 
-    ).order_by('-total_quantite')[:10]
+    ventes_par_heure = {}
+    articles = {}
+    for rapport in rapports:
+        for heure, valeurs in rapport.ventes_par_heure.items():
+            cumul = ventes_par_heure.setdefault(int(heure), {'nombre': 0, 'montant': 0})
+            cumul['nombre'] += valeurs['nombre']
+            cumul['montant'] += valeurs['montant']
+        for article in rapport.articles:
+            cumul = articles.setdefault(article['designation'], {
+                'article__designation': article['designation'], 'total_quantite': 0, 'total_montant': 0,
+            })
+            cumul['total_quantite'] += article['quantite']
+            cumul['total_montant'] += article['montant']
+    articles_vendus = sorted(articles.values(), key=lambda a: a['total_quantite'], reverse=True)[:10]
 
-    
-    
     # Récupérer le nom du compte connecté pour l'affichage
     try:
-        compte_connecte = Compte.objects.get(user=request.user, actif=True)
+        compte_connecte = get_compte_actif(request)
         vendeuse_nom = compte_connecte.nom_complet
     except Compte.DoesNotExist:
         vendeuse_nom = "-"
@@ -1943,9 +1504,15 @@ def rapport_caisse(request):
 
         'tickets_attente': tickets_attente,
 
-        'factures_jour': factures_jour,
+        'total_remises': total_remises,
+
+        'total_encaisse': total_encaisse,
+
+        'total_rendu': total_rendu,
 
-        'ventes_par_heure': ventes_par_heure,
+        'nombre_retours': nombre_retours,
+
+        'ventes_par_heure': dict(sorted(ventes_par_heure.items())),
         
         'vendeuse_nom': vendeuse_nom,
 
@@ -1962,13 +1529,13 @@ def rapport_caisse(request):
 @login_required
 @require_caisse_access
 def detail_factures(request):
-    print("DEBUG: Début de detail_factures")
+    logger.debug("Début de detail_factures")
     agence = get_user_agence(request)
     if not agence:
         messages.error(request, 'Votre compte n\'est pas configuré correctement.')
         return redirect('logout_caisse')
     
-    print(f"DEBUG: Agence de l'utilisateur: {agence}")
+    logger.debug("Agence de l'utilisateur: %s", agence)
     
     
     
@@ -1983,7 +1550,8 @@ def detail_factures(request):
 
     # Récupérer toutes les factures de l'agence liées aux sessions de caisse
     factures = FactureVente.objects.filter(agence=agence).select_related('client', 'vendeur__compte', 'session_caisse').prefetch_related('lignes__article').order_by('-date', '-heure')
-    print(f"DEBUG: Nombre de factures trouvées: {factures.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Nombre de factures trouvées: %s", factures.count())
     
     
     # Appliquer les filtres
@@ -2060,8 +1628,8 @@ def detail_factures(request):
 
     
 
-    print(f"DEBUG: Statistiques - Total factures: {total_factures}, CA total: {chiffre_affaires_total}")
-    print(f"DEBUG: Aujourd'hui - Factures: {factures_aujourd_hui}, CA: {ca_aujourd_hui}")
+    logger.debug("Statistiques - Total factures: %s, CA total: %s", total_factures, chiffre_affaires_total)
+    logger.debug("Aujourd'hui - Factures: %s, CA: %s", factures_aujourd_hui, ca_aujourd_hui)
     
     context = {
 
@@ -2088,7 +1656,7 @@ def detail_factures(request):
     
     
 
-    print("DEBUG: Rendu du template detail_factures.html")
+    logger.debug("Rendu du template detail_factures.html")
     return render(request, 'supermarket/caisse/detail_factures.html', context)
 
 
@@ -2104,21 +1672,21 @@ def liste_utilisateurs_huitieme(request):
         
         comptes = Compte.objects.filter(agence=agence, actif=True).select_related('user').order_by('user__username')
         
-        print(f"\n{'='*60}")
-        print(f"AGENCE: {agence.nom_agence}")
-        print(f"Nombre d'utilisateurs actifs: {comptes.count()}")
-        print(f"{'-'*60}")
-        print("LISTE DES UTILISATEURS:")
-        print(f"{'-'*60}")
+        logger.debug('\n%s', '='*60)
+        logger.debug("AGENCE: %s", agence.nom_agence)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Nombre d'utilisateurs actifs: %s", comptes.count())
+        logger.debug('-' * 60)
+        logger.debug("LISTE DES UTILISATEURS:")
+        logger.debug('-' * 60)
         
         for compte in comptes:
-            print(f"Username: {compte.user.username}")
-            print(f"  Nom complet: {compte.nom_complet}")
-            print(f"  Type: {compte.type_compte}")
-            print(f"  Email: {compte.email}")
-            print()
+            logger.debug("Username: %s", compte.user.username)
+            logger.debug("  Nom complet: %s", compte.nom_complet)
+            logger.debug("  Type: %s", compte.type_compte)
+            logger.debug("  Email: %s", compte.email)
         
-        print(f"{'='*60}\n")
+        logger.debug('%s\n', '='*60)
         
         context = {
             'agence': agence,
@@ -2131,7 +1699,7 @@ def liste_utilisateurs_huitieme(request):
         return redirect('detail_factures')
         
     except Exception as e:
-        print(f"[ERREUR] Erreur lors de la liste: {e}")
+        logger.error("Erreur lors de la liste: %s", e)
         messages.error(request, f'Erreur: {str(e)}')
         return redirect('detail_factures')
 
@@ -2141,15 +1709,15 @@ def liste_utilisateurs_huitieme(request):
 @require_caisse_access
 def mouvement_vente(request):
     """Afficher les mouvements de vente du jour - même logique que le document HTML"""
-    print(f"[ALERTE] MOUVEMENT_VENTE: {request.user.username}")
+    logger.debug("[ALERTE] MOUVEMENT_VENTE: %s", request.user.username)
     
     agence = get_user_agence(request)
     if not agence:
-        print(f"[ALERTE] MOUVEMENT_VENTE: Aucune agence pour {request.user.username}")
+        logger.debug("[ALERTE] MOUVEMENT_VENTE: Aucune agence pour %s", request.user.username)
         messages.error(request, 'Votre compte n\'est pas configuré correctement.')
         return redirect('logout_caisse')
     
-    print(f"[ALERTE] MOUVEMENT_VENTE: Agence {agence.nom_agence}")
+    logger.debug("[ALERTE] MOUVEMENT_VENTE: Agence %s", agence.nom_agence)
     
     # Date affichée (par défaut aujourd'hui, remplacée par la date des factures si disponible)
     date_reference = timezone.now().date()
@@ -2160,7 +1728,7 @@ def mouvement_vente(request):
     
     # Récupérer le nom du compte connecté
     try:
-        compte_connecte = Compte.objects.get(user=request.user, actif=True)
+        compte_connecte = get_compte_actif(request)
         vendeuse_nom = compte_connecte.nom_complet
     except Compte.DoesNotExist:
         vendeuse_nom = "-"
@@ -2177,23 +1745,25 @@ def mouvement_vente(request):
     # Récupérer toutes les factures de la session active (toutes dates confondues)
     # Les factures utilisent maintenant la date saisie par l'utilisateur lors de la facturation
     if session_caisse:
-        print(f"[ALERTE] MOUVEMENT_VENTE: Session trouvée {session_caisse.id}")
+        logger.debug("[ALERTE] MOUVEMENT_VENTE: Session trouvée %s", session_caisse.id)
         factures_jour = FactureVente.objects.filter(
             agence=agence, 
             session_caisse=session_caisse
         ).select_related('client', 'vendeur__compte', 'session_caisse').prefetch_related('lignes__article').order_by('-date', '-heure')
-        print(f"[ALERTE] MOUVEMENT_VENTE: {factures_jour.count()} factures trouvées")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[ALERTE] MOUVEMENT_VENTE: %s factures trouvées", factures_jour.count())
         
         # Si aucune facture liée à la session, récupérer toutes les factures orphelines (toutes dates confondues) et les lier
         if factures_jour.count() == 0:
-            print(f"[ALERTE] MOUVEMENT_VENTE: Aucune facture liée à la session, recherche des factures orphelines")
+            logger.debug("[ALERTE] MOUVEMENT_VENTE: Aucune facture liée à la session, recherche des factures orphelines")
             factures_orphelines = FactureVente.objects.filter(
                 agence=agence,
                 session_caisse__isnull=True
             ).select_related('client', 'vendeur__compte').prefetch_related('lignes__article')
             
             if factures_orphelines.count() > 0:
-                print(f"[ALERTE] MOUVEMENT_VENTE: {factures_orphelines.count()} factures orphelines trouvées, liaison à la session")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[ALERTE] MOUVEMENT_VENTE: %s factures orphelines trouvées, liaison à la session", factures_orphelines.count())
                 # Lier ces factures à la session actuelle
                 factures_orphelines.update(session_caisse=session_caisse)
                 
@@ -2202,9 +1772,10 @@ def mouvement_vente(request):
                     agence=agence, 
                     session_caisse=session_caisse
                 ).select_related('client', 'vendeur__compte', 'session_caisse').prefetch_related('lignes__article').order_by('-date', '-heure')
-                print(f"[ALERTE] MOUVEMENT_VENTE: {factures_jour.count()} factures après liaison")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[ALERTE] MOUVEMENT_VENTE: %s factures après liaison", factures_jour.count())
     else:
-        print(f"[ALERTE] MOUVEMENT_VENTE: Aucune session active")
+        logger.debug("[ALERTE] MOUVEMENT_VENTE: Aucune session active")
         # Aucune session active, donc pas de factures à afficher
         factures_jour = FactureVente.objects.none()
     
@@ -2355,14 +1926,14 @@ def document_vente_details(request, document_id):
 @login_required
 def facture_details(request, facture_id):
 
-    print(f"DEBUG: facture_details appelée pour ID: {facture_id}")
+    logger.debug("facture_details appelée pour ID: %s", facture_id)
     
     agence = get_user_agence(request)
     if not agence:
         messages.error(request, 'Votre compte n\'est pas configuré correctement.')
         return redirect('logout_caisse')
     
-    print(f"DEBUG: Agence de l'utilisateur: {agence}")
+    logger.debug("Agence de l'utilisateur: %s", agence)
     
     
     
@@ -2372,12 +1943,12 @@ def facture_details(request, facture_id):
 
         facture = FactureVente.objects.filter(id=facture_id, agence=agence).select_related('client', 'vendeur__compte').prefetch_related('lignes__article').first()
 
-        print(f"DEBUG: Facture trouvée: {facture}")
+        logger.debug("Facture trouvée: %s", facture)
         
         
         if not facture:
 
-            print(f"DEBUG: Facture ID {facture_id} non trouvée")
+            logger.debug("Facture ID %s non trouvée", facture_id)
             return JsonResponse({'success': False, 'error': 'Facture non trouvée.'})
         
         
@@ -2441,14 +2012,15 @@ def facture_details(request, facture_id):
         
         
 
-        print(f"DEBUG: Données de la facture préparées: {len(facture_data['lignes'])} lignes")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Données de la facture préparées: %s lignes", len(facture_data['lignes']))
         return JsonResponse({'success': True, 'facture': facture_data})
         
         
         
     except Exception as e:
 
-        print(f"DEBUG: Erreur lors de la récupération des détails de la facture: {str(e)}")
+        logger.error("Erreur lors de la récupération des détails de la facture: %s", str(e))
 
         return JsonResponse({'success': False, 'error': str(e)})
 @login_required
@@ -2476,7 +2048,7 @@ def fermer_caisse(request):
         
         # Récupérer le nom du compte connecté
         try:
-            compte_connecte = Compte.objects.get(user=request.user, actif=True)
+            compte_connecte = get_compte_actif(request)
             vendeuse_nom = compte_connecte.nom_complet
         except Compte.DoesNotExist:
             vendeuse_nom = session_caisse.employe.compte.nom_complet if session_caisse.employe else 'Vendeur'
@@ -2513,163 +2085,38 @@ def fermer_caisse(request):
             return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
         
         # Récupérer la session de caisse ouverte (peu importe la date d'ouverture)
-        aujourd_hui = timezone.now().date()
         session_caisse = SessionCaisse.objects.filter(
             agence=agence,
             statut='ouverte'
-        ).order_by('-date_ouverture').first()
+        ).select_related('employe__compte').order_by('-date_ouverture').first()
         
         if not session_caisse:
             return JsonResponse({'success': False, 'error': 'Aucune session de caisse ouverte trouvée'})
         
-        # Récupérer toutes les factures de la session de caisse ouverte (toutes dates confondues)
-        # Les factures utilisent maintenant la date saisie par l'utilisateur lors de la facturation
-        factures_jour = FactureVente.objects.filter(
-            agence=agence,
-            session_caisse=session_caisse
-        ).select_related('client', 'vendeur__compte').prefetch_related('lignes__article').order_by('-date', '-heure')
-        
-        # Si aucune facture liée à la session, récupérer toutes les factures orphelines (toutes dates confondues) et les lier
-        if factures_jour.count() == 0:
-            # Récupérer toutes les factures orphelines non liées à une session
-            factures_orphelines = FactureVente.objects.filter(
-                agence=agence,
-                session_caisse__isnull=True
-            ).select_related('client', 'vendeur__compte').prefetch_related('lignes__article')
-            
-            # Lier ces factures à la session actuelle
-            factures_orphelines.update(session_caisse=session_caisse)
-            
-            # Récupérer maintenant toutes les factures de la session
-            factures_jour = FactureVente.objects.filter(
-                agence=agence,
-                session_caisse=session_caisse
-            ).select_related('client', 'vendeur__compte').prefetch_related('lignes__article').order_by('-date', '-heure')
-        
-        # Calculer les statistiques
-        nombre_factures = factures_jour.count()
-        total_articles = 0
-        chiffre_affaires = 0.0  # Initialisé comme float pour éviter les problèmes de sérialisation JSON
-        
-        # Déterminer la date du document : utiliser la date la plus récente des factures
-        # ou la date d'aujourd'hui s'il n'y a pas de factures
-        date_document = aujourd_hui
-        if factures_jour.exists():
-            # Récupérer la date la plus récente parmi les factures
-            date_document = factures_jour.first().date
-        
-        # Préparer les données des factures pour le document
-        factures_data = []
-        
-        for facture in factures_jour:
-            chiffre_affaires += float(facture.nette_a_payer or 0)
-            
-            # Préparer les données de cette facture
-            facture_data = {
-                'numero_ticket': facture.numero_ticket,
-                'date': facture.date.strftime('%Y-%m-%d'),
-                'heure': facture.heure.strftime('%H:%M') if facture.heure else '',
-                'client': facture.client.intitule if facture.client else 'Client anonyme',
-                'nette_a_payer': float(facture.nette_a_payer or 0),
-                'articles': []
-            }
-            
-            # Ajouter les articles de cette facture
-            for ligne in facture.lignes.all():
-                total_articles += int(ligne.quantite)
-                facture_data['articles'].append({
-                    'designation': ligne.designation,
-                    'reference': ligne.article.reference_article if ligne.article else '',
-                    'quantite': int(ligne.quantite),
-                    'prix_unitaire': float(ligne.prix_unitaire or 0),
-                    'total': float(ligne.prix_total or 0)
-                })
-            
-            factures_data.append(facture_data)
-        
-        # Vérifier si un document existe déjà pour cette session
-        document_existant = DocumentVente.objects.filter(session_caisse=session_caisse).first()
-        if document_existant:
-            # La caisse a déjà été fermée pour cette session
-            messages.info(request, f'Caisse déjà fermée. Document {document_existant.numero_document} existant.')
-            return JsonResponse({
-                'success': True,
-                'message': f'Caisse déjà fermée. Document {document_existant.numero_document} existant.',
-                'document_id': document_existant.id,
-                'redirect_url': '/caisse/'
-            })
-        
-        # Générer un numéro de document unique avec un compteur incrémental
-        # Utiliser la date du document (date la plus récente des factures)
-        base_numero = f"DOC{date_document.strftime('%Y%m%d')}{session_caisse.id:03d}"
-        numero_document = base_numero
-        compteur = 1
-        
-        # S'assurer que le numéro est unique en ajoutant un suffixe si nécessaire
-        while DocumentVente.objects.filter(numero_document=numero_document).exists():
-            numero_document = f"{base_numero}-{compteur:02d}"
-            compteur += 1
-        
         # Récupérer le nom de la vendeuse depuis le compte connecté
         try:
-            compte_connecte = Compte.objects.get(user=request.user, actif=True)
+            compte_connecte = get_compte_actif(request)
             vendeuse_nom = compte_connecte.nom_complet
         except Compte.DoesNotExist:
             # Fallback sur le compte de la session si le compte connecté n'est pas trouvé
             vendeuse_nom = session_caisse.employe.compte.nom_complet if session_caisse.employe else 'Vendeur'
+
+        # Totaux calculés par agrégats groupés et figés dans le rapport Z de la session
+        document_vente, rapport_z, cree = cloturer_session(session_caisse, vendeuse_nom)
+        if not cree:
+            # La caisse a déjà été fermée pour cette session
+            messages.info(request, f'Caisse déjà fermée. Document {document_vente.numero_document} existant.')
+            return JsonResponse({
+                'success': True,
+                'message': f'Caisse déjà fermée. Document {document_vente.numero_document} existant.',
+                'document_id': document_vente.id,
+                'redirect_url': '/caisse/'
+            })
+        numero_document = document_vente.numero_document
+        logger.info("Caisse fermée : document %s, %s factures, CA %s",
+                    numero_document, rapport_z.nombre_factures, rapport_z.chiffre_affaires)
         
-        # Créer le document de vente
-        # Convertir chiffre_affaires en Decimal pour le modèle
-        import json
-        
-        # S'assurer que toutes les valeurs dans factures_data sont sérialisables en JSON
-        # Cela force la sérialisation et détecte tout problème avec des Decimal
-        try:
-            json.dumps(factures_data)
-            print("DEBUG: factures_data est sérialisable en JSON")
-        except TypeError as e:
-            print(f"ERREUR: Données non sérialisables dans factures_data: {e}")
-            print(f"factures_data = {factures_data}")
-            raise
-        
-        fermeture_heure = timezone.now().time()
-        if factures_jour.exists():
-            reference_facture = factures_jour.first()
-            if reference_facture.heure:
-                fermeture_heure = reference_facture.heure
-        
-        fermeture_datetime = datetime.combine(date_document, fermeture_heure)
-        if timezone.is_naive(fermeture_datetime):
-            fermeture_datetime = timezone.make_aware(
-                fermeture_datetime,
-                timezone.get_current_timezone()
-            )
-        
-        document_vente = DocumentVente.objects.create(
-            numero_document=numero_document,
-            date=date_document,  # Utiliser la date la plus récente des factures (date saisie par l'utilisateur)
-            heure_fermeture=fermeture_datetime,
-            session_caisse=session_caisse,
-            vendeuse_nom=vendeuse_nom,
-            nombre_factures=nombre_factures,
-            total_articles=total_articles,
-            chiffre_affaires=Decimal(str(chiffre_affaires)),
-            factures_data=factures_data,
-            agence=agence
-        )
-        
-        # Fermer la session de caisse
-        session_caisse.statut = 'fermee'
-        session_caisse.date_fermeture = fermeture_datetime
-        session_caisse.save()
-        
-        # Fermer la caisse
-        caisse = session_caisse.caisse
-        caisse.statut = 'fermee'
-        caisse.date_fermeture = fermeture_datetime
-        caisse.save()
-        
-        messages.success(request, f'Caisse fermée avec succès! Document {numero_document} créé.')
+        messages.success(request, f'Caisse fermée avec succès! Document {numero_document} créé.')
         
         # Rediriger vers le dashboard pour voir le changement immédiatement
         return JsonResponse({
@@ -2681,12 +2128,7 @@ def fermer_caisse(request):
     
     except Exception as e:
         # Afficher l'erreur complète dans la console pour le debugging
-        import traceback
-        print("=" * 80)
-        print("ERREUR LORS DE LA FERMETURE DE CAISSE:")
-        print(str(e))
-        print(traceback.format_exc())
-        print("=" * 80)
+        logger.exception("ERREUR LORS DE LA FERMETURE DE CAISSE: %s", e)
         
         # Retourner une erreur JSON claire
         return JsonResponse({
@@ -2711,12 +2153,13 @@ def mettre_en_attente(request):
 
 
     """Mettre une facture en attente"""
-    print("=" * 80)
-    print("🔵 DEBUG METTRE_EN_ATTENTE: Début de la fonction")
-    print(f"🔵 DEBUG: Méthode de requête: {request.method}")
-    print(f"🔵 DEBUG: Données POST: {dict(request.POST)}")
-    print(f"🔵 DEBUG: Session key: {request.session.session_key}")
-    print(f"🔵 DEBUG: Utilisateur: {request.user.username if request.user.is_authenticated else 'Non authentifié'}")
+    logger.debug("=" * 80)
+    logger.debug("🔵 DEBUG METTRE_EN_ATTENTE: Début de la fonction")
+    logger.debug("🔵 DEBUG: Méthode de requête: %s", request.method)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔵 DEBUG: Données POST: %s", dict(request.POST))
+    logger.debug("🔵 DEBUG: Session key: %s", request.session.session_key)
+    logger.debug("🔵 DEBUG: Utilisateur: %s", (request.user.username if request.user.is_authenticated else 'Non authentifié'))
     
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
@@ -2724,34 +2167,32 @@ def mettre_en_attente(request):
     try:
         # Récupérer les données de la facture depuis la requête
         facture_data = request.POST.get('facture_data')
-        print(f"🔵 DEBUG: facture_data reçu (longueur: {len(facture_data) if facture_data else 0}): {facture_data[:200] if facture_data else 'VIDE'}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔵 DEBUG: facture_data reçu (longueur: %s): %s...", (len(facture_data) if facture_data else 0), (facture_data[:200] if facture_data else 'VIDE'))
         
         if not facture_data:
-            print("🔵 DEBUG: [ERREUR] Aucune donnée facture_data trouvée dans POST")
+            logger.error("🔵 DEBUG: [ERREUR] Aucune donnée facture_data trouvée dans POST")
             return JsonResponse({'success': False, 'error': 'Aucune donnée de facture fournie'})
         
         import json
         facture_content = json.loads(facture_data)
-        print(f"🔵 DEBUG: [OK] facture_content parsé avec succès")
-        print(f"🔵 DEBUG: Clés disponibles: {list(facture_content.keys())}")
+        logger.debug("🔵 DEBUG: [OK] facture_content parsé avec succès")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔵 DEBUG: Clés disponibles: %s", list(facture_content.keys()))
         
         lignes = facture_content.get('lignes', [])
-        print(f"🔵 DEBUG: Nombre de lignes: {len(lignes)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔵 DEBUG: Nombre de lignes: %s", len(lignes))
         
         for i, ligne in enumerate(lignes):
-            print(f"🔵 DEBUG: Ligne {i}: article_id={ligne.get('article_id', 'VIDE')}, designation={ligne.get('designation', 'VIDE')}, quantite={ligne.get('quantite', 'VIDE')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔵 DEBUG: Ligne %s: article_id=%s, designation=%s, quantite=%s", i, ligne.get('article_id', 'VIDE'), ligne.get('designation', 'VIDE'), ligne.get('quantite', 'VIDE'))
         
         # Récupérer la session de caisse active (optionnel)
         agence = get_user_agence(request)
-        session_caisse = None
-        
-        if agence:
-            aujourd_hui = timezone.now().date()
-            session_caisse = SessionCaisse.objects.filter(
-                agence=agence,
-                date_ouverture__date=aujourd_hui,
-                statut='ouverte'
-            ).first()
+        if not agence:
+            return JsonResponse({'success': False, 'error': 'Aucune agence trouvée.'})
+        session_caisse = session_ouverte(agence)
         
         # Utiliser la session key comme identifiant unique
         session_key = request.session.session_key
@@ -2765,40 +2206,36 @@ def mettre_en_attente(request):
         for ligne in facture_content.get('lignes', []):
             if ligne.get('article_id'):
                 lignes_a_sauvegarder.append(ligne)
-                print(f"DEBUG: Ligne avec article_id sauvegardée: {ligne.get('designation')} (ID: {ligne.get('article_id')})")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Ligne avec article_id sauvegardée: %s (ID: %s)", ligne.get('designation'), ligne.get('article_id'))
             else:
                 # Inclure quand même la ligne pour la mise en attente
                 lignes_a_sauvegarder.append(ligne)
-                print(f"DEBUG: Ligne sans article_id incluse pour mise en attente: {ligne.get('designation', 'Sans désignation')}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Ligne sans article_id incluse pour mise en attente: %s", ligne.get('designation', 'Sans désignation'))
         
         # Mettre à jour le contenu avec toutes les lignes
         facture_content['lignes'] = lignes_a_sauvegarder
-        print(f"DEBUG: Sauvegarde de {len(lignes_a_sauvegarder)} lignes (avec ou sans article_id)")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sauvegarde de %s lignes (avec ou sans article_id)", len(lignes_a_sauvegarder))
         
         # TOUJOURS créer un nouveau ticket en attente (ne pas utiliser get_or_create)
-        # Chaque mise en attente = 1 nouveau ticket
-        facture_temp = FactureTemporaire.objects.create(
-            session_key=session_key,
-            contenu=facture_content,
-            session_caisse=session_caisse
-        )
-        print(f"🔵 DEBUG: Nouveau ticket en attente {facture_temp.id} créé pour session {session_caisse.id if session_caisse else 'None'}")
+        # Chaque mise en attente = 1 nouveau ticket ; les tickets périmés de l'agence sont purgés
+        facture_temp = garer_ticket(agence, session_caisse, session_key, facture_content)
+        logger.debug("🔵 DEBUG: Nouveau ticket en attente %s créé pour session %s", facture_temp.id, (session_caisse.id if session_caisse else 'None'))
         
-        # Mettre à jour la session Django avec les données de la facture
-        request.session['facture_temporaire'] = facture_content
-        print(f"DEBUG: Session mise à jour avec {len(facture_content.get('lignes', []))} lignes")
+        # Mettre à jour le panier du poste avec les données de la facture
+        panier_courant(request, agence).remplacer(facture_content)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Panier mis à jour avec %s lignes", len(facture_content.get('lignes', [])))
         
-        # Compter UNIQUEMENT les factures en attente de la session courante
-        if session_caisse:
-            tickets_en_attente = FactureTemporaire.objects.filter(session_caisse=session_caisse).count()
-        else:
-            # Si pas de session, compter celles sans session
-            tickets_en_attente = FactureTemporaire.objects.filter(session_caisse__isnull=True).count()
+        # Compter UNIQUEMENT les factures en attente de l'agence pour la session courante
+        nombre_attente = tickets_en_attente(agence, session_caisse).count()
         
         return JsonResponse({
             'success': True,
             'message': 'Facture mise en attente avec succès',
-            'tickets_en_attente': tickets_en_attente,
+            'tickets_en_attente': nombre_attente,
             'facture_id': facture_temp.id
         })
         
@@ -2813,63 +2250,61 @@ def mettre_en_attente(request):
 def rappeler_ticket(request):
 
     """Rappeler une facture en attente"""
-    print("=" * 80)
-    print("🟡 DEBUG RAPPELER_TICKET: Début de la fonction")
-    print(f"🟡 DEBUG: Méthode: {request.method}")
-    print(f"🟡 DEBUG: Utilisateur: {request.user.username if request.user.is_authenticated else 'Non authentifié'}")
+    logger.debug("=" * 80)
+    logger.debug("🟡 DEBUG RAPPELER_TICKET: Début de la fonction")
+    logger.debug("🟡 DEBUG: Méthode: %s", request.method)
+    logger.debug("🟡 DEBUG: Utilisateur: %s", (request.user.username if request.user.is_authenticated else 'Non authentifié'))
     
     if request.method != 'POST':
-        print("🟡 DEBUG: [ERREUR] Méthode non autorisée")
+        logger.error("🟡 DEBUG: [ERREUR] Méthode non autorisée")
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
     
     try:
         session_key = request.session.session_key
-        print(f"🟡 DEBUG: Session key: {session_key}")
+        logger.debug("🟡 DEBUG: Session key: %s", session_key)
         
         if not session_key:
-            print("🟡 DEBUG: [ERREUR] Aucune session active")
+            logger.error("🟡 DEBUG: [ERREUR] Aucune session active")
             return JsonResponse({'success': False, 'error': 'Aucune session active'})
         
-        # Récupérer la facture temporaire la plus récente (toutes sessions confondues)
+        # Récupérer la facture temporaire la plus récente de l'agence pour la session de caisse ouverte
         try:
-            # Rechercher dans toutes les sessions pour éviter les problèmes de session key
-            factures_attente = FactureTemporaire.objects.all().order_by('-date_creation')
-            print(f"🟡 DEBUG: Nombre total de factures temporaires: {factures_attente.count()}")
-            
-            for ft in factures_attente:
-                print(f"🟡 DEBUG: Facture {ft.id} créée le {ft.date_creation} (session: {ft.session_key})")
-            
-            facture_temp = factures_attente.first()
+            agence = get_user_agence(request)
+            facture_temp = tickets_en_attente(agence, session_ouverte(agence)).order_by(
+                '-date_creation', '-id'
+            ).first() if agence else None
             if not facture_temp:
-                print("🟡 DEBUG: [ERREUR] Aucune facture en attente trouvée")
+                logger.error("🟡 DEBUG: [ERREUR] Aucune facture en attente trouvée")
                 return JsonResponse({'success': False, 'error': 'Aucune facture en attente trouvée'})
             
-            print(f"🟡 DEBUG: [OK] Facture temporaire sélectionnée: {facture_temp.id}")
-            print(f"🟡 DEBUG: Date de création: {facture_temp.date_creation}")
-            print(f"🟡 DEBUG: Session de la facture: {facture_temp.session_key}")
-            print(f"🟡 DEBUG: Session actuelle: {session_key}")
+            logger.debug("🟡 DEBUG: [OK] Facture temporaire sélectionnée: %s", facture_temp.id)
+            logger.debug("🟡 DEBUG: Date de création: %s", facture_temp.date_creation)
+            logger.debug("🟡 DEBUG: Session de la facture: %s", facture_temp.session_key)
+            logger.debug("🟡 DEBUG: Session actuelle: %s", session_key)
             
             contenu = facture_temp.contenu
             if isinstance(contenu, dict):
-                print(f"🟡 DEBUG: [OK] Contenu est un dictionnaire")
-                print(f"🟡 DEBUG: Clés du contenu: {list(contenu.keys())}")
+                logger.debug("🟡 DEBUG: [OK] Contenu est un dictionnaire")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🟡 DEBUG: Clés du contenu: %s", list(contenu.keys()))
                 lignes = contenu.get('lignes', [])
-                print(f"🟡 DEBUG: Nombre de lignes dans le contenu: {len(lignes)}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🟡 DEBUG: Nombre de lignes dans le contenu: %s", len(lignes))
                 
                 for i, ligne in enumerate(lignes):
-                    print(f"🟡 DEBUG: Ligne {i}: article_id={ligne.get('article_id', 'VIDE')}, designation={ligne.get('designation', 'VIDE')}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("🟡 DEBUG: Ligne %s: article_id=%s, designation=%s", i, ligne.get('article_id', 'VIDE'), ligne.get('designation', 'VIDE'))
             else:
-                print(f"🟡 DEBUG: [ERREUR] Contenu n'est pas un dictionnaire: {type(contenu)}")
-                print(f"🟡 DEBUG: Contenu brut: {str(contenu)[:200]}...")
+                logger.error("🟡 DEBUG: [ERREUR] Contenu n'est pas un dictionnaire: %s", type(contenu))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🟡 DEBUG: Contenu brut: %s...", str(contenu)[:200])
                 
         except Exception as e:
-            print(f"🟡 DEBUG: [ERREUR] Erreur lors de la récupération: {str(e)}")
-            import traceback
-            print(f"🟡 DEBUG: Traceback: {traceback.format_exc()}")
+            logger.exception("🟡 DEBUG: [ERREUR] Erreur lors de la récupération: %s", str(e))
             return JsonResponse({'success': False, 'error': 'Erreur lors de la récupération de la facture'})
         
         # Retourner les données de la facture
-        print("DEBUG: Envoi de la réponse de succès")
+        logger.debug("Envoi de la réponse de succès")
         import json
         # Convertir le contenu en JSON string si c'est un dictionnaire
         contenu_json = facture_temp.contenu if isinstance(facture_temp.contenu, str) else json.dumps(facture_temp.contenu)
@@ -2880,7 +2315,7 @@ def rappeler_ticket(request):
         
         # IMPORTANT: Supprimer le ticket après l'avoir rappelé
         facture_temp.delete()
-        print(f"🟡 DEBUG: ✅ Ticket {facture_id_supprime} supprimé après rappel")
+        logger.debug("🟡 DEBUG: ✅ Ticket %s supprimé après rappel", facture_id_supprime)
         
         return JsonResponse({
             'success': True,
@@ -2891,62 +2326,28 @@ def rappeler_ticket(request):
         })
         
     except Exception as e:
-        print(f"DEBUG: Erreur lors du rappel: {str(e)}")
-        import traceback
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        logger.exception("Erreur lors du rappel: %s", str(e))
         return JsonResponse({'success': False, 'error': f'Erreur lors du rappel: {str(e)}'})
 
 
 @login_required
 @require_caisse_access
 def lister_factures_attente(request):
-    """Lister toutes les factures en attente pour la session courante"""
+    """Lister les factures en attente de l'agence pour la session courante (par pages, du plus récent)"""
     try:
-        session_key = request.session.session_key
-        if not session_key:
-            return JsonResponse({'success': False, 'error': 'Aucune session active'})
-        
-        # Récupérer toutes les factures en attente pour cette session
-        factures_attente = FactureTemporaire.objects.filter(
-            session_key=session_key
-        ).order_by('-date_creation')
+        agence = get_user_agence(request)
+        if not agence:
+            return JsonResponse({'success': False, 'error': 'Aucune agence trouvée.'})
         
-        factures_data = []
-        for facture in factures_attente:
-            import json
-            try:
-                # facture.contenu est déjà un dictionnaire Python (JSONField)
-                contenu = facture.contenu if isinstance(facture.contenu, dict) else json.loads(facture.contenu)
-                lignes = contenu.get('lignes', [])
-                total = contenu.get('total', 0)
-                rendu = contenu.get('rendu', 0)
-                client = contenu.get('client', '')
-                
-                factures_data.append({
-                    'id': facture.id,
-                    'date_creation': facture.date_creation.strftime('%d/%m/%Y %H:%M'),
-                    'nombre_articles': len(lignes),
-                    'total': total,
-                    'rendu': rendu,
-                    'client': client,
-                    'contenu': json.dumps(contenu)  # Convertir en JSON string pour le frontend
-                })
-            except Exception as e:
-                print(f"DEBUG: Erreur lors du parsing de la facture {facture.id}: {e}")
-                factures_data.append({
-                    'id': facture.id,
-                    'date_creation': facture.date_creation.strftime('%d/%m/%Y %H:%M'),
-                    'nombre_articles': 0,
-                    'total': 0,
-                    'rendu': 0,
-                    'client': '',
-                    'contenu': '{}'
-                })
+        # Résumés lus en colonnes (le contenu JSON n'est pas désérialisé), page suivante par curseur
+        tickets = tickets_en_attente(agence, session_ouverte(agence))
+        factures_data, curseur_suivant = page_resumes(tickets, request.GET.get('curseur'))
         
         return JsonResponse({
             'success': True,
             'factures': factures_data,
-            'nombre_factures': len(factures_data)
+            'nombre_factures': tickets.count(),
+            'curseur_suivant': curseur_suivant,
         })
         
     except Exception as e:
@@ -2965,21 +2366,18 @@ def rappeler_facture_specifique(request):
         if not facture_id:
             return JsonResponse({'success': False, 'error': 'ID de facture manquant'})
         
-        session_key = request.session.session_key
-        if not session_key:
-            return JsonResponse({'success': False, 'error': 'Aucune session active'})
+        agence = get_user_agence(request)
+        if not agence:
+            return JsonResponse({'success': False, 'error': 'Aucune agence trouvée.'})
         
-        # Récupérer la facture spécifique
+        # Récupérer la facture spécifique (dans le périmètre de l'agence)
         try:
-            facture_temp = FactureTemporaire.objects.get(
-                id=facture_id,
-                session_key=session_key
-            )
+            facture_temp = FactureTemporaire.objects.get(id=facture_id, agence=agence)
         except FactureTemporaire.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Facture non trouvée'})
         
-        print(f"DEBUG: Facture spécifique trouvée: {facture_temp.id}")
-        print(f"DEBUG: Contenu: {facture_temp.contenu}")
+        logger.debug("Facture spécifique trouvée: %s", facture_temp.id)
+        logger.debug("Contenu: %s", facture_temp.contenu)
         
         import json
         # Convertir le contenu en JSON string si c'est un dictionnaire
@@ -2994,7 +2392,7 @@ def rappeler_facture_specifique(request):
         })
         
     except Exception as e:
-        print(f"DEBUG: Erreur lors du rappel spécifique: {str(e)}")
+        logger.error("Erreur lors du rappel spécifique: %s", str(e))
         return JsonResponse({'success': False, 'error': f'Erreur lors du rappel: {str(e)}'})
 
 
@@ -3015,24 +2413,22 @@ def supprimer_facture_attente(request):
         if not facture_id:
             return JsonResponse({'success': False, 'error': 'ID de facture manquant'})
         
-        session_key = request.session.session_key
-        if not session_key:
-            return JsonResponse({'success': False, 'error': 'Aucune session active'})
+        agence = get_user_agence(request)
+        if not agence:
+            return JsonResponse({'success': False, 'error': 'Aucune agence trouvée.'})
         
-        # Récupérer et supprimer la facture spécifique
+        # Récupérer et supprimer la facture spécifique (dans le périmètre de l'agence)
         try:
-            facture_temp = FactureTemporaire.objects.get(
-                id=facture_id,
-                session_key=session_key
-            )
+            facture_temp = FactureTemporaire.objects.get(id=facture_id, agence=agence)
             
             # Supprimer la facture
+            session_ticket = facture_temp.session_caisse
             facture_temp.delete()
             
-            print(f"DEBUG: Facture temporaire {facture_id} supprimée avec succès")
+            logger.debug("Facture temporaire %s supprimée avec succès", facture_id)
             
             # Compter le nombre restant de factures en attente
-            tickets_restants = FactureTemporaire.objects.filter(session_key=session_key).count()
+            tickets_restants = tickets_en_attente(agence, session_ticket).count()
             
             return JsonResponse({
                 'success': True,
@@ -3044,7 +2440,7 @@ def supprimer_facture_attente(request):
             return JsonResponse({'success': False, 'error': 'Facture non trouvée'})
         
     except Exception as e:
-        print(f"DEBUG: Erreur lors de la suppression: {str(e)}")
+        logger.error("Erreur lors de la suppression: %s", str(e))
         return JsonResponse({'success': False, 'error': f'Erreur lors de la suppression: {str(e)}'})
 
 
@@ -3082,9 +2478,10 @@ def supprimer_vente(request):
 @require_caisse_access
 def imprimer_facture(request, facture_id=None):
     """Afficher et imprimer une facture depuis le formulaire ou depuis la base"""
-    print(f"[ALERTE] IMPRIMER_FACTURE: {request.user.username}")
-    print(f"[ALERTE] IMPRIMER_FACTURE: Méthode: {request.method}")
-    print(f"[ALERTE] IMPRIMER_FACTURE: GET params: {dict(request.GET)}")
+    logger.debug("[ALERTE] IMPRIMER_FACTURE: %s", request.user.username)
+    logger.debug("[ALERTE] IMPRIMER_FACTURE: Méthode: %s", request.method)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[ALERTE] IMPRIMER_FACTURE: GET params: %s", dict(request.GET))
     
     agence = get_user_agence(request)
     if not agence:
@@ -3093,7 +2490,7 @@ def imprimer_facture(request, facture_id=None):
     
     # Vérifier si des données sont passées en paramètres GET (depuis le JavaScript)
     if request.GET.get('numero_ticket'):
-        print(f"[ALERTE] IMPRIMER_FACTURE: Données reçues depuis JavaScript")
+        logger.debug("[ALERTE] IMPRIMER_FACTURE: Données reçues depuis JavaScript")
         try:
             import json
             
@@ -3113,7 +2510,8 @@ def imprimer_facture(request, facture_id=None):
             articles_json = request.GET.get('articles', '[]')
             articles = json.loads(articles_json)
             
-            print(f"[ALERTE] IMPRIMER_FACTURE: {len(articles)} articles reçus")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[ALERTE] IMPRIMER_FACTURE: %s articles reçus", len(articles))
             
             # Créer les données de la facture avec structure optimisée
             # S'assurer que chaque article a les bonnes clés
@@ -3143,7 +2541,7 @@ def imprimer_facture(request, facture_id=None):
                 'lignes': lignes_formatees
             }
             
-            print(f"[ALERTE] IMPRIMER_FACTURE: Données préparées: {facture_data}")
+            logger.debug("[ALERTE] IMPRIMER_FACTURE: Données préparées: %s", facture_data)
             
             # Rendre le template d'impression professionnel
             return render(request, 'supermarket/caisse/facture_impression.html', {
@@ -3152,19 +2550,19 @@ def imprimer_facture(request, facture_id=None):
             })
             
         except Exception as e:
-            print(f"[ALERTE] IMPRIMER_FACTURE: Erreur traitement GET: {e}")
+            logger.error("[ALERTE] IMPRIMER_FACTURE: Erreur traitement GET: %s", e)
             messages.error(request, f'Erreur lors de la préparation de l\'impression: {e}')
             return redirect('facturation_vente')
     
     # Si pas de paramètres GET, essayer de récupérer depuis la session
-    print(f"[ALERTE] IMPRIMER_FACTURE: Pas de paramètres GET, récupération depuis la session")
+    logger.debug("[ALERTE] IMPRIMER_FACTURE: Pas de paramètres GET, récupération depuis la session")
     
     try:
-        # Récupérer les données de la facture temporaire depuis la session
-        facture_temp = request.session.get('facture_temporaire', {})
+        # Récupérer les données du panier du poste
+        facture_temp = panier_courant(request, agence).en_dict()
         
         if facture_temp and facture_temp.get('lignes'):
-            print(f"[ALERTE] IMPRIMER_FACTURE: Données de session trouvées")
+            logger.debug("[ALERTE] IMPRIMER_FACTURE: Données de session trouvées")
             
             # Calculer les totaux
             total_ht = sum(ligne.get('prix_total', 0) for ligne in facture_temp.get('lignes', []))
@@ -3206,7 +2604,7 @@ def imprimer_facture(request, facture_id=None):
                 'lignes': lignes_formatees
             }
             
-            print(f"[ALERTE] IMPRIMER_FACTURE: Données de session préparées: {facture_data}")
+            logger.debug("[ALERTE] IMPRIMER_FACTURE: Données de session préparées: %s", facture_data)
             
             # Rendre le template d'impression professionnel
             return render(request, 'supermarket/caisse/facture_impression.html', {
@@ -3214,7 +2612,7 @@ def imprimer_facture(request, facture_id=None):
                 'agence': agence
             })
         else:
-            print(f"[ALERTE] IMPRIMER_FACTURE: Aucune donnée de session, création de données de test")
+            logger.debug("[ALERTE] IMPRIMER_FACTURE: Aucune donnée de session, création de données de test")
             
             # Créer des données de test pour l'impression
             from datetime import datetime
@@ -3234,7 +2632,7 @@ def imprimer_facture(request, facture_id=None):
                 'lignes': []
             }
             
-            print(f"[ALERTE] IMPRIMER_FACTURE: Données de test créées: {facture_data}")
+            logger.debug("[ALERTE] IMPRIMER_FACTURE: Données de test créées: %s", facture_data)
             
             # Rendre le template d'impression avec les données de test
             return render(request, 'supermarket/caisse/facture_impression.html', {
@@ -3243,9 +2641,23 @@ def imprimer_facture(request, facture_id=None):
             })
             
     except Exception as e:
-        print(f"[ALERTE] IMPRIMER_FACTURE: Erreur générale: {e}")
+        logger.error("[ALERTE] IMPRIMER_FACTURE: Erreur générale: %s", e)
         messages.error(request, f'Erreur lors de l\'impression: {e}')
         return redirect('facturation_vente')
+
+
+@login_required
+@require_caisse_access
+def ticket_escpos_vente(request, facture_id):
+    """Ticket de caisse d'une facture de vente en octets ESC/POS (?copie=1 pour un duplicata)"""
+    agence = get_user_agence(request)
+    if not agence:
+        return HttpResponse(status=403)
+    ticket = ticket_vente(facture_id, agence, duplicata=request.GET.get('copie') == '1')
+    if ticket is None:
+        raise Http404('Facture non trouvée')
+    return HttpResponse(ticket, content_type='application/octet-stream')
+
 @login_required
 def init_test_data(request):
 
@@ -3305,7 +2717,7 @@ def init_test_data(request):
 
             if created:
 
-                print(f"Article créé: {article.designation}")
+                logger.debug("Article créé: %s", article.designation)
         
         
         
@@ -3339,7 +2751,7 @@ def init_test_data(request):
         
         if created:
 
-            print(f"Session de caisse créée: {session_caisse}")
+            logger.debug("Session de caisse créée: %s", session_caisse)
         
         
         
@@ -3389,7 +2801,7 @@ def init_test_data(request):
 
             if created:
 
-                print(f"Facture créée: {facture.numero_ticket}")
+                logger.debug("Facture créée: %s", facture.numero_ticket)
         
         
         
@@ -3410,31 +2822,18 @@ def update_quantity_temp(request):
             index = int(request.POST.get('index', 0))
             quantite = float(request.POST.get('quantite', 1))
             
-            # Récupérer la facture temporaire de la session
-            facture_temp = request.session.get('facture_temporaire', {'lignes': []})
-            
-            # Vérifier que l'index est valide
-            if 0 <= index < len(facture_temp['lignes']):
-                ligne = facture_temp['lignes'][index]
-                
-                # Mettre à jour la quantité
-                ligne['quantite'] = quantite
-                
-                # Recalculer le prix total
-                ligne['prix_total'] = quantite * ligne['prix_unitaire']
-                
-                # Sauvegarder en session
-                request.session['facture_temporaire'] = facture_temp
-                
-                return JsonResponse({
-                    'success': True,
-                    'prix_total': ligne['prix_total']
-                })
-            else:
+            # Mettre à jour la seule ligne concernée du panier
+            ligne = panier_courant(request, get_user_agence(request)).modifier_quantite(index, quantite)
+            if ligne is None:
                 return JsonResponse({
                     'success': False,
                     'error': 'Index invalide'
                 })
+            
+            return JsonResponse({
+                'success': True,
+                'prix_total': ligne['prix_total']
+            })
                 
         except Exception as e:
             return JsonResponse({
@@ -3445,11 +2844,10 @@ def update_quantity_temp(request):
     return JsonResponse({'success': True})
 
 
-
 @login_required
 @require_caisse_access
 def remove_article_temp(request):
-    """Supprimer un article de la facture temporaire dans la session"""
+    """Supprimer un article du panier du poste"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
     
@@ -3458,36 +2856,18 @@ def remove_article_temp(request):
         if index < 0:
             return JsonResponse({'success': False, 'error': 'Index invalide'})
         
-        # Récupérer la facture temporaire de la session
-        facture_temp = request.session.get('facture_temporaire', {'lignes': []})
-        lignes = facture_temp.get('lignes', [])
-        
-        # Supprimer l'article à l'index spécifié
-        if 0 <= index < len(lignes):
-            lignes.pop(index)
-            facture_temp['lignes'] = lignes
-            
-            # Recalculer les totaux
-            total_ht = sum(ligne.get('prix_total', 0) for ligne in lignes)
-            facture_temp['nette_a_payer'] = total_ht - facture_temp.get('remise', 0)
-            
-            # Mettre à jour la session
-            request.session['facture_temporaire'] = facture_temp
-            request.session.modified = True
-            
-            print(f"DEBUG: Article à l'index {index} supprimé. {len(lignes)} articles restants.")
-            return JsonResponse({'success': True, 'message': 'Article supprimé avec succès'})
-        else:
+        panier = panier_courant(request, get_user_agence(request))
+        if panier.retirer(index) is None:
             return JsonResponse({'success': False, 'error': 'Index hors limites'})
+        
+        logger.debug("Article à l'index %s supprimé.", index)
+        return JsonResponse({'success': True, 'message': 'Article supprimé avec succès'})
             
     except Exception as e:
-        print(f"DEBUG: Erreur lors de la suppression de l'article: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur lors de la suppression de l'article: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 
-
 @login_required
 @require_caisse_access
 def update_montant_regler(request):
@@ -3500,16 +2880,11 @@ def update_montant_regler(request):
 @require_caisse_access
 def clear_facture_temp(request):
 
-    request.session['facture_temporaire'] = {
-
-        'lignes': [], 'type_vente': 'detail', 'remise': 0, 'montant_regler': 0, 'nette_a_payer': 0, 'rendu': 0
-
-    }
+    panier_courant(request, get_user_agence(request)).vider()
 
     return JsonResponse({'success': True})
 
 
-
 @login_required
 @require_caisse_access
 def update_type_vente_temp(request):
@@ -3524,60 +2899,26 @@ def update_type_vente_temp(request):
 
             
             
-            facture_temp = request.session.get('facture_temporaire', {'lignes': []})
+            agence = get_user_agence(request)
+            if not agence:
+                return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
+
+            panier = panier_courant(request, agence)
+            ligne = panier.ligne(index)
+            if ligne is None:
+                return JsonResponse({'success': False, 'error': 'Index invalide'})
 
             
             
-            if 0 <= index < len(facture_temp['lignes']):
-
-                ligne = facture_temp['lignes'][index]
-
-                ligne['type_vente'] = type_vente
-
-                
-                
-                # Récupérer le nouveau prix selon le type de vente
-
-                try:
-                    agence = get_user_agence(request)
-                    if not agence:
-                        return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
-                    
-                    article = Article.objects.get(id=ligne['article_id'], agence=agence)
-
-                    type_vente_obj = TypeVente.objects.filter(article=article, intitule__iexact=type_vente).first()
-
-                    
-                    
-                    if type_vente_obj:
-
-                        nouveau_prix = float(type_vente_obj.prix)
+            # Nouveau prix selon le type de vente (index du catalogue, sans requête)
 
-                    else:
-
-                        nouveau_prix = float(article.prix_vente or 0)
-                    
-                    
-                    
-                    ligne['prix_unitaire'] = nouveau_prix
-
-                    ligne['prix_total'] = nouveau_prix * ligne['quantite']
-
-                    
-                    
-                    request.session['facture_temporaire'] = facture_temp
-
-                    
-                    
-                    return JsonResponse({'success': True})
+            entree = get_index(agence.pk).entrees.get(ligne['article_id'])
+            if entree is None:
+                return JsonResponse({'success': False, 'error': 'Article introuvable'})
 
-                except Exception as e:
-
-                    return JsonResponse({'success': False, 'error': str(e)})
-
-            else:
+            panier.modifier_type_vente(index, type_vente, prix_selon_type(entree, type_vente))
 
-                return JsonResponse({'success': False, 'error': 'Index invalide'})
+            return JsonResponse({'success': True})
                 
                 
                 
@@ -3590,7 +2931,6 @@ def update_type_vente_temp(request):
     return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
 
 
-
 @login_required
 @require_caisse_access
 def generate_ticket_number_api(request):
@@ -3609,7 +2949,7 @@ def generate_ticket_number_api(request):
     
     
     
-    numero_ticket = generate_ticket_number(agence)
+    numero_ticket = apercu_numero_ticket(agence)
 
     
     
@@ -3721,7 +3061,7 @@ def get_article_types(request):
 @require_caisse_access
 def update_all_types_vente_temp(request):
 
-    """Mettre à jour le type de vente global pour tous les articles de la facture temporaire"""
+    """Mettre à jour le type de vente global pour tous les articles du panier"""
 
     if request.method == 'POST':
 
@@ -3729,92 +3069,41 @@ def update_all_types_vente_temp(request):
 
             type_vente_global = request.POST.get('type_vente_global')
 
-
-            
-            
             if not type_vente_global:
 
-
                 return JsonResponse({'success': False, 'error': 'Type de vente non spécifié'})
             
             
             
-            facture_temp = request.session.get('facture_temporaire', {'lignes': []})
-
+            agence = get_user_agence(request)
+            if not agence:
+                return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
 
-            
-            
-            if not facture_temp.get('lignes'):
+            panier = panier_courant(request, agence)
+            if not len(panier):
 
                 return JsonResponse({'success': True, 'message': 'Aucun article dans la facture'})
             
             
             
-            agence = get_user_agence(request)
-            if not agence:
-                return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'})
-            
-            try:
-
-                
-                
-                # Mettre à jour chaque ligne de la facture temporaire
-
-                for ligne in facture_temp['lignes']:
-
-                    ligne['type_vente'] = type_vente_global
-
-                    
-                    
-                    # Récupérer le nouveau prix selon le type de vente
-
-                    article = Article.objects.get(id=ligne['article_id'], agence=agence)
-
-                    type_vente_obj = TypeVente.objects.filter(article=article, intitule__iexact=type_vente_global).first()
-
-                    
-                    
-                    if type_vente_obj:
-
-                        nouveau_prix = float(type_vente_obj.prix)
+            # Prix de chaque article lus dans l'index du catalogue de l'agence
 
-                    else:
-
-                        nouveau_prix = float(article.prix_vente or 0)
-                    
-                    
-                    
-                    ligne['prix_unitaire'] = nouveau_prix
-
-                    ligne['prix_total'] = nouveau_prix * ligne['quantite']
-                
-                
-                
-                # Mettre à jour le type de vente global dans la facture temporaire
-
-                facture_temp['type_vente'] = type_vente_global
-
-
-                
-                
-                request.session['facture_temporaire'] = facture_temp
+            index = get_index(agence.pk)
 
-                
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': f'Type de vente mis à jour vers {type_vente_global} pour tous les articles',
-                    'lignes_updated': len(facture_temp['lignes'])
-                })
-                
+            def prix(article_id):
+                entree = index.entrees.get(article_id)
+                if entree is None:
+                    raise Article.DoesNotExist(f'Article {article_id} introuvable')
+                return prix_selon_type(entree, type_vente_global)
 
-                
-                
-            except Exception as e:
+            lignes = panier.appliquer_type_vente(type_vente_global, prix)
 
-                return JsonResponse({'success': False, 'error': str(e)})
+            return JsonResponse({
+                'success': True,
+                'message': f'Type de vente mis à jour vers {type_vente_global} pour tous les articles',
+                'lignes_updated': len(lignes)
+            })
                 
-
                 
                 
         except Exception as e:
@@ -3826,7 +3115,6 @@ def update_all_types_vente_temp(request):
     return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
 
 
-
 @login_required
 @require_caisse_access
 def get_article_types_vente(request, article_id):
@@ -4105,23 +3393,23 @@ def creer_article(request):
             agence_id = request.POST.get('agence')
             famille_id = request.POST.get('famille')
             # Debug des champs reçus
-            print(f"[SEARCH] DEBUG: Champs reçus:")
-            print(f"[SEARCH] DEBUG: - designation: '{designation}'")
-            print(f"[SEARCH] DEBUG: - prix_achat: '{prix_achat}'")
-            print(f"[SEARCH] DEBUG: - prix_vente: '{prix_vente}'")
-            print(f"[SEARCH] DEBUG: - agence_id: '{agence_id}'")
-            print(f"[SEARCH] DEBUG: - famille_id: '{famille_id}'")
-            print(f"[SEARCH] DEBUG: - unite_vente: '{unite_vente}'")
-            print(f"[SEARCH] DEBUG: - conditionnement: '{conditionnement}'")
+            logger.debug("[SEARCH] DEBUG: Champs reçus:")
+            logger.debug("[SEARCH] DEBUG: - designation: '%s'", designation)
+            logger.debug("[SEARCH] DEBUG: - prix_achat: '%s'", prix_achat)
+            logger.debug("[SEARCH] DEBUG: - prix_vente: '%s'", prix_vente)
+            logger.debug("[SEARCH] DEBUG: - agence_id: '%s'", agence_id)
+            logger.debug("[SEARCH] DEBUG: - famille_id: '%s'", famille_id)
+            logger.debug("[SEARCH] DEBUG: - unite_vente: '%s'", unite_vente)
+            logger.debug("[SEARCH] DEBUG: - conditionnement: '%s'", conditionnement)
             
             # Validation des champs obligatoires
             if not designation or not prix_achat or not prix_vente or not agence_id or not famille_id:
-                print(f"[SEARCH] DEBUG: [ERREUR] Validation échouée - Champs manquants:")
-                if not designation: print("  - designation manquant")
-                if not prix_achat: print("  - prix_achat manquant")
-                if not prix_vente: print("  - prix_vente manquant")
-                if not agence_id: print("  - agence_id manquant")
-                if not famille_id: print("  - famille_id manquant")
+                logger.error("[SEARCH] DEBUG: [ERREUR] Validation échouée - Champs manquants:")
+                if not designation: logger.debug("  - designation manquant")
+                if not prix_achat: logger.debug("  - prix_achat manquant")
+                if not prix_vente: logger.debug("  - prix_vente manquant")
+                if not agence_id: logger.debug("  - agence_id manquant")
+                if not famille_id: logger.debug("  - famille_id manquant")
                 messages.error(request, 'Veuillez remplir tous les champs obligatoires.')
                 return redirect('creer_article')
             
@@ -4134,7 +3422,7 @@ def creer_article(request):
                 return redirect('creer_article')
             
             # Générer automatiquement la référence article
-            print(f"[SEARCH] DEBUG: Génération automatique de la référence...")
+            logger.debug("[SEARCH] DEBUG: Génération automatique de la référence...")
             
             # Récupérer la dernière référence
             last_article = Article.objects.order_by('-id').first()
@@ -4159,7 +3447,7 @@ def creer_article(request):
                 new_number += 1
                 reference_article = f"ART{new_number:03d}"
             
-            print(f"[SEARCH] DEBUG: [OK] Référence générée: {reference_article}")
+            logger.debug("[SEARCH] DEBUG: [OK] Référence générée: %s", reference_article)
             
             # Créer l'article
             # Le suivi de stock est toujours activé automatiquement
@@ -4184,7 +3472,7 @@ def creer_article(request):
             prix_demi_gros = request.POST.get('prix_demi_gros', '').strip()
             prix_detail = request.POST.get('prix_detail', '').strip()
             
-            print(f"[DEBUG] Prix récupérés - Gros: '{prix_gros}', Demi-Gros: '{prix_demi_gros}', Détail: '{prix_detail}'")
+            logger.debug("Prix récupérés - Gros: '%s', Demi-Gros: '%s', Détail: '%s'", prix_gros, prix_demi_gros, prix_detail)
             
             # Créer les types de vente avec les bons prix
             types_vente_data = [
@@ -4199,7 +3487,7 @@ def creer_article(request):
                     intitule=type_vente_info['intitule'],
                     prix=type_vente_info['prix']
                 )
-                print(f"[DEBUG] Type de vente créé: {type_vente_info['intitule']} à {type_vente_info['prix']} FCFA")
+                logger.debug("Type de vente créé: %s à %s FCFA", type_vente_info['intitule'], type_vente_info['prix'])
             
             # Créer un mouvement de stock initial si stock > 0
             if float(stock_actuel) > 0:
@@ -4230,9 +3518,10 @@ def creer_article(request):
     familles = Famille.objects.all()
     
     # Debug des familles disponibles
-    print(f"[SEARCH] DEBUG: Familles disponibles: {familles.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[SEARCH] DEBUG: Familles disponibles: %s", familles.count())
     for famille in familles:
-        print(f"[SEARCH] DEBUG: - Famille: {famille.intitule} (ID: {famille.id})")
+        logger.debug("[SEARCH] DEBUG: - Famille: %s (ID: %s)", famille.intitule, famille.id)
     
     context = {
         'agences': agences,
@@ -4662,7 +3951,7 @@ def dashboard_stock(request):
 
         # Récupérer le nom de l'utilisateur
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except Compte.DoesNotExist:
             nom_utilisateur = request.user.username
@@ -4685,7 +3974,7 @@ def dashboard_stock(request):
         messages.error(request, f'Erreur lors du chargement du dashboard: {str(e)}')
         # Récupérer le nom de l'utilisateur même en cas d'erreur
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except:
             nom_utilisateur = request.user.username if request.user.is_authenticated else "Utilisateur"
@@ -4906,9 +4195,10 @@ def enregistrer_commande(request):
     elif 'commande_source' not in request.session:
         request.session['commande_source'] = 'commandes'  # Par défaut, vient du module commandes
     
-    print(f"[ENREGISTRER COMMANDE] Session récupérée: {len(commande_temp.get('lignes', []))} lignes")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[ENREGISTRER COMMANDE] Session récupérée: %s lignes", len(commande_temp.get('lignes', [])))
     if commande_temp.get('lignes'):
-        print(f"[ENREGISTRER COMMANDE] Lignes: {commande_temp['lignes']}")
+        logger.debug("[ENREGISTRER COMMANDE] Lignes: %s", commande_temp['lignes'])
     
     # Préparer les articles en format JSON pour JavaScript
     import json
@@ -5000,8 +4290,9 @@ def ajouter_article_commande(request):
             request.session['commande_temporaire'] = commande_temp
             request.session.modified = True
             
-            print(f"[AJOUTER ARTICLE] Session mise à jour: {len(commande_temp['lignes'])} lignes")
-            print(f"[AJOUTER ARTICLE] Dernière ligne: {commande_temp['lignes'][-1] if commande_temp['lignes'] else 'Aucune'}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[AJOUTER ARTICLE] Session mise à jour: %s lignes", len(commande_temp['lignes']))
+            logger.debug("[AJOUTER ARTICLE] Dernière ligne: %s", (commande_temp['lignes'][-1] if commande_temp['lignes'] else 'Aucune'))
             
             return JsonResponse({
                 'success': True,
@@ -5127,7 +4418,7 @@ def sauvegarder_commande(request):
             heure_commande_str = request.POST.get('heure')
             etat_commande = request.POST.get('etat_commande', 'en_attente')
             
-            print(f"[DEBUG SAUVEGARDER COMMANDE] date_commande: {date_commande}, heure_commande_str: {heure_commande_str}")
+            logger.debug("[DEBUG SAUVEGARDER COMMANDE] date_commande: %s, heure_commande_str: %s", date_commande, heure_commande_str)
             
             # Convertir la date en objet date si c'est une chaîne
             from datetime import datetime, date as date_class
@@ -5161,17 +4452,17 @@ def sauvegarder_commande(request):
                                 heure_commande_str_clean = heure_commande_str.replace('h', ':')
                                 heure_commande_obj = datetime.strptime(heure_commande_str_clean, '%H:%M').time()
                             except ValueError:
-                                print(f"[WARNING] Impossible de parser l'heure '{heure_commande_str}', utilisation de l'heure actuelle")
+                                logger.warning("Impossible de parser l'heure '%s', utilisation de l'heure actuelle", heure_commande_str)
                                 heure_commande_obj = timezone.now().time()
                 elif hasattr(heure_commande_str, 'time'):
                     heure_commande_obj = heure_commande_str.time() if isinstance(heure_commande_str, datetime) else heure_commande_str
                 else:
                     heure_commande_obj = heure_commande_str
             else:
-                print(f"[WARNING] Aucune heure fournie, utilisation de l'heure actuelle")
+                logger.warning("Aucune heure fournie, utilisation de l'heure actuelle")
                 heure_commande_obj = timezone.now().time()
             
-            print(f"[DEBUG SAUVEGARDER COMMANDE] date_commande_obj: {date_commande_obj}, heure_commande_obj: {heure_commande_obj}")
+            logger.debug("[DEBUG SAUVEGARDER COMMANDE] date_commande_obj: %s, heure_commande_obj: %s", date_commande_obj, heure_commande_obj)
             
             # Calculer les totaux globaux
             quantite_totale = sum(Decimal(str(ligne['quantite'])) for ligne in lignes)
@@ -5279,8 +4570,8 @@ def sauvegarder_commande(request):
                     heure_obj = timezone.now().time()
                 
                 try:
-                    print(f"[DEBUG] AVANT création facture: agence.id_agence={agence.id_agence}, agence.nom_agence={agence.nom_agence}")
-                    print(f"[DEBUG] Commande associée: commande.id={commandes_creees[0].id}, commande.agence.id_agence={commandes_creees[0].agence.id_agence}")
+                    logger.debug("AVANT création facture: agence.id_agence=%s, agence.nom_agence=%s", agence.id_agence, agence.nom_agence)
+                    logger.debug("Commande associée: commande.id=%s, commande.agence.id_agence=%s", commandes_creees[0].id, commandes_creees[0].agence.id_agence)
                     
                     # Calculer le prix total de toutes les commandes du groupe
                     prix_total_facture = sum(Decimal(str(c.prix_total)) for c in commandes_creees)
@@ -5299,13 +4590,11 @@ def sauvegarder_commande(request):
                     # Vérifier après création
                     facture_commande.refresh_from_db()
                     facture_generee = True
-                    print(f"[DEBUG] Facture créée avec succès: ID={facture_commande.id}, Numéro={numero_facture}")
-                    print(f"[DEBUG] Facture agence vérification: facture.agence.id_agence={facture_commande.agence.id_agence}, agence.id_agence={agence.id_agence}")
-                    print(f"[DEBUG] Facture agence nom: facture.agence.nom_agence={facture_commande.agence.nom_agence}")
+                    logger.debug("Facture créée avec succès: ID=%s, Numéro=%s", facture_commande.id, numero_facture)
+                    logger.debug("Facture agence vérification: facture.agence.id_agence=%s, agence.id_agence=%s", facture_commande.agence.id_agence, agence.id_agence)
+                    logger.debug("Facture agence nom: facture.agence.nom_agence=%s", facture_commande.agence.nom_agence)
                 except Exception as e:
-                    print(f"[DEBUG] ERREUR lors de la création de la facture: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("ERREUR lors de la création de la facture: %s", str(e))
                     raise
             
             # Créer une notification pour la commande enregistrée
@@ -5380,18 +4669,19 @@ def search_window_commande(request):
     # Récupérer les articles de l'agence (tous les articles pour le chargement initial)
     articles = Article.objects.filter(agence=agence).order_by('designation')
     
-    print(f"[SEARCH WINDOW COMMANDE] Agence: {agence.nom_agence} (ID: {agence.id_agence}), Articles trouvés: {articles.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[SEARCH WINDOW COMMANDE] Agence: %s (ID: %s), Articles trouvés: %s", agence.nom_agence, agence.id_agence, articles.count())
     
     # Afficher quelques exemples d'articles pour déboguer
     if articles.exists():
-        print(f"[SEARCH WINDOW COMMANDE] Exemples d'articles:")
+        logger.debug("[SEARCH WINDOW COMMANDE] Exemples d'articles:")
         for article in articles[:3]:
-            print(f"  - {article.designation} (ID: {article.id}, Agence: {article.agence.nom_agence})")
+            logger.debug("  - %s (ID: %s, Agence: %s)", article.designation, article.id, article.agence.nom_agence)
     else:
-        print(f"[SEARCH WINDOW COMMANDE] ⚠️ AUCUN ARTICLE TROUVÉ pour l'agence {agence.nom_agence}")
+        logger.warning("[SEARCH WINDOW COMMANDE] ⚠️ AUCUN ARTICLE TROUVÉ pour l'agence %s", agence.nom_agence)
         # Vérifier s'il y a des articles dans d'autres agences
         total_articles = Article.objects.count()
-        print(f"[SEARCH WINDOW COMMANDE] Total articles dans la base: {total_articles}")
+        logger.debug("[SEARCH WINDOW COMMANDE] Total articles dans la base: %s", total_articles)
     
     context = {
         'articles': articles,
@@ -5423,7 +4713,8 @@ def rechercher_articles_commande(request):
                 Q(reference_article__icontains=search_term)
             ).order_by('designation')[:100]
         
-        print(f"[RECHERCHE COMMANDE] Agence: {agence.nom_agence}, Terme: '{search_term}', Articles trouvés: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[RECHERCHE COMMANDE] Agence: %s, Terme: '%s', Articles trouvés: %s", agence.nom_agence, search_term, articles.count())
         
         articles_data = [
             {
@@ -6195,13 +5486,15 @@ def consulter_factures_commande(request):
     
     # Debug: vérifier toutes les factures dans la base AVANT filtrage
     toutes_factures = FactureCommande.objects.all()
-    print(f"[DEBUG] Total factures dans la DB: {toutes_factures.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Total factures dans la DB: %s", toutes_factures.count())
     for f in toutes_factures[:5]:  # Afficher les 5 premières
-        print(f"[DEBUG] Facture ID={f.id}, Numéro={f.numero_facture}, Agence={f.agence.id_agence if f.agence else 'None'}")
+        logger.debug("Facture ID=%s, Numéro=%s, Agence=%s", f.id, f.numero_facture, (f.agence.id_agence if f.agence else 'None'))
     
     # Récupérer toutes les factures de l'agence
     factures = FactureCommande.objects.filter(agence=agence).select_related('commande', 'commande__client', 'agence').order_by('-date')
-    print(f"[DEBUG] Factures filtrées pour agence {agence.id_agence} ({agence.nom_agence}): {factures.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Factures filtrées pour agence %s (%s): %s", agence.id_agence, agence.nom_agence, factures.count())
     
     # Appliquer les filtres
     if search_query:
@@ -6235,7 +5528,8 @@ def consulter_factures_commande(request):
     montant_total = 0
     
     # Debug: vérifier combien de factures sont trouvées
-    print(f"[DEBUG] consulter_factures_commande: {factures.count()} factures trouvées pour l'agence {agence.id_agence}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("consulter_factures_commande: %s factures trouvées pour l'agence %s", factures.count(), agence.id_agence)
     
     for facture in factures:
         montant_facture = 0
@@ -6253,14 +5547,15 @@ def consulter_factures_commande(request):
         else:
             # Si pas de commande associée, essayer de calculer depuis les commandes liées
             # ou utiliser 0
-            print(f"[DEBUG] Facture {facture.id} n'a pas de commande associée")
+            logger.debug("Facture %s n'a pas de commande associée", facture.id)
         
         factures_list.append({
             'facture': facture,
             'montant': montant_facture
         })
     
-    print(f"[DEBUG] consulter_factures_commande: {len(factures_list)} factures dans la liste finale")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("consulter_factures_commande: %s factures dans la liste finale", len(factures_list))
     
     context = {
         'factures': factures_list,
@@ -6523,6 +5818,75 @@ def generer_facture_commande_existante(request, commande_id):
         messages.error(request, 'Commande non trouvée.')
         return redirect('consulter_commandes')
 
+def _donnees_facture_commande(facture_db, agence):
+    """Données d'impression d'une facture de commande (lignes et montants recalculés depuis les commandes du groupe)"""
+    # Récupérer la première commande pour obtenir le client
+    premiere_commande = facture_db.commande
+
+    # Récupérer toutes les commandes du même groupe (utiliser la date/heure actuelles des commandes)
+    # Après modification, les commandes peuvent avoir une nouvelle date/heure
+    commandes_groupe = Commande.objects.filter(
+        client=premiere_commande.client,
+        date=premiere_commande.date,
+        heure=premiere_commande.heure,
+        agence=agence
+    ).select_related('article').order_by('id')
+
+    # Si aucune commande trouvée avec cette date/heure, essayer avec la date/heure de la facture
+    if not commandes_groupe.exists():
+        commandes_groupe = Commande.objects.filter(
+            client=premiere_commande.client,
+            agence=agence
+        ).filter(
+            Q(date=premiere_commande.date, heure=premiere_commande.heure) |
+            Q(date=facture_db.date_facture if hasattr(facture_db, 'date_facture') else facture_db.date)
+        ).select_related('article').order_by('id')
+
+    # Préparer les lignes de facture avec les valeurs actuelles
+    lignes_facture = []
+    prix_total_calcule = Decimal('0')
+
+    for cmd in commandes_groupe:
+        prix_unitaire = cmd.article.prix_vente if hasattr(cmd.article, 'prix_vente') else (cmd.prix_total / cmd.quantite if cmd.quantite > 0 else 0)
+        prix_total_ligne = cmd.prix_total  # Utiliser le prix_total de la commande (déjà calculé)
+
+        lignes_facture.append({
+            'designation': cmd.article.designation,
+            'quantite': float(cmd.quantite),
+            'prix_unitaire': float(prix_unitaire),
+            'prix_total': float(prix_total_ligne),
+        })
+        prix_total_calcule += Decimal(str(prix_total_ligne))
+
+    # Utiliser les valeurs de la facture mise à jour (date_facture, heure)
+    date_facture_obj = facture_db.date_facture if hasattr(facture_db, 'date_facture') and facture_db.date_facture else facture_db.date
+    date_str = date_facture_obj.strftime('%Y-%m-%d') if date_facture_obj else ''
+    date_display = date_facture_obj.strftime('%d/%m/%Y') if date_facture_obj else '--/--/----'
+
+    # Utiliser l'heure de la facture ou de la première commande
+    heure_facture = facture_db.heure if facture_db.heure else premiere_commande.heure
+    heure_str = heure_facture.strftime('%H:%M:%S') if heure_facture else ''
+    heure_display = heure_facture.strftime('%H:%M') if heure_facture else '--:--'
+
+    # Utiliser le prix_total calculé à partir des commandes actuelles ou celui de la facture
+    prix_total_final = float(prix_total_calcule) if prix_total_calcule > 0 else float(facture_db.prix_total)
+    net_a_payer_final = float(facture_db.net_a_payer) if facture_db.net_a_payer else prix_total_final
+
+    return {
+        'numero_facture': facture_db.numero_facture,
+        'date': date_str,  # Chaîne pour compatibilité avec session
+        'date_display': date_display,  # Chaîne formatée pour affichage
+        'date_facture': date_str,  # Chaîne pour compatibilité avec session
+        'heure': heure_str,  # Chaîne pour compatibilité avec session
+        'heure_display': heure_display,  # Chaîne formatée pour affichage
+        'prix_total': prix_total_final,  # Utiliser le prix calculé à partir des commandes actuelles
+        'net_a_payer': net_a_payer_final,
+        'client_nom': premiere_commande.client.intitule,
+        'client_adresse': premiere_commande.client.adresse if hasattr(premiere_commande.client, 'adresse') else '',
+        'client_telephone': premiere_commande.client.telephone if hasattr(premiere_commande.client, 'telephone') else '',
+        'lignes': lignes_facture,
+    }
+
 @login_required
 def imprimer_facture_commande(request, facture_id=None):
     """Vue pour imprimer une facture de commande"""
@@ -6534,74 +5898,7 @@ def imprimer_facture_commande(request, facture_id=None):
     if facture_id:
         try:
             facture_db = FactureCommande.objects.select_related('commande', 'commande__client', 'agence').get(id=facture_id, agence=agence)
-            
-            # Récupérer la première commande pour obtenir le client
-            premiere_commande = facture_db.commande
-            
-            # Récupérer toutes les commandes du même groupe (utiliser la date/heure actuelles des commandes)
-            # Après modification, les commandes peuvent avoir une nouvelle date/heure
-            commandes_groupe = Commande.objects.filter(
-                client=premiere_commande.client,
-                date=premiere_commande.date,
-                heure=premiere_commande.heure,
-                agence=agence
-            ).select_related('article').order_by('id')
-            
-            # Si aucune commande trouvée avec cette date/heure, essayer avec la date/heure de la facture
-            if not commandes_groupe.exists():
-                commandes_groupe = Commande.objects.filter(
-                    client=premiere_commande.client,
-                    agence=agence
-                ).filter(
-                    Q(date=premiere_commande.date, heure=premiere_commande.heure) |
-                    Q(date=facture_db.date_facture if hasattr(facture_db, 'date_facture') else facture_db.date)
-                ).select_related('article').order_by('id')
-            
-            # Préparer les lignes de facture avec les valeurs actuelles
-            lignes_facture = []
-            prix_total_calcule = Decimal('0')
-            
-            for cmd in commandes_groupe:
-                prix_unitaire = cmd.article.prix_vente if hasattr(cmd.article, 'prix_vente') else (cmd.prix_total / cmd.quantite if cmd.quantite > 0 else 0)
-                prix_total_ligne = cmd.prix_total  # Utiliser le prix_total de la commande (déjà calculé)
-                
-                lignes_facture.append({
-                    'designation': cmd.article.designation,
-                    'quantite': float(cmd.quantite),
-                    'prix_unitaire': float(prix_unitaire),
-                    'prix_total': float(prix_total_ligne),
-                })
-                prix_total_calcule += Decimal(str(prix_total_ligne))
-            
-            # Utiliser les valeurs de la facture mise à jour (date_facture, heure)
-            date_facture_obj = facture_db.date_facture if hasattr(facture_db, 'date_facture') and facture_db.date_facture else facture_db.date
-            date_str = date_facture_obj.strftime('%Y-%m-%d') if date_facture_obj else ''
-            date_display = date_facture_obj.strftime('%d/%m/%Y') if date_facture_obj else '--/--/----'
-            
-            # Utiliser l'heure de la facture ou de la première commande
-            heure_facture = facture_db.heure if facture_db.heure else premiere_commande.heure
-            heure_str = heure_facture.strftime('%H:%M:%S') if heure_facture else ''
-            heure_display = heure_facture.strftime('%H:%M') if heure_facture else '--:--'
-            
-            # Utiliser le prix_total calculé à partir des commandes actuelles ou celui de la facture
-            prix_total_final = float(prix_total_calcule) if prix_total_calcule > 0 else float(facture_db.prix_total)
-            net_a_payer_final = float(facture_db.net_a_payer) if facture_db.net_a_payer else prix_total_final
-            
-            facture_data = {
-                'numero_facture': facture_db.numero_facture,
-                'date': date_str,  # Chaîne pour compatibilité avec session
-                'date_display': date_display,  # Chaîne formatée pour affichage
-                'date_facture': date_str,  # Chaîne pour compatibilité avec session
-                'heure': heure_str,  # Chaîne pour compatibilité avec session
-                'heure_display': heure_display,  # Chaîne formatée pour affichage
-                'prix_total': prix_total_final,  # Utiliser le prix calculé à partir des commandes actuelles
-                'net_a_payer': net_a_payer_final,
-                'client_nom': premiere_commande.client.intitule,
-                'client_adresse': premiere_commande.client.adresse if hasattr(premiere_commande.client, 'adresse') else '',
-                'client_telephone': premiere_commande.client.telephone if hasattr(premiere_commande.client, 'telephone') else '',
-                'lignes': lignes_facture,
-            }
-            
+            facture_data = _donnees_facture_commande(facture_db, agence)
         except FactureCommande.DoesNotExist:
             messages.error(request, 'Facture non trouvée.')
             return redirect('consulter_factures_commande')
@@ -6630,75 +5927,7 @@ def imprimer_facture_commande_xprinter(request, facture_id):
     
     try:
         facture_db = FactureCommande.objects.select_related('commande', 'commande__client', 'agence').get(id=facture_id, agence=agence)
-        
-        # Récupérer la première commande pour obtenir le client
-        premiere_commande = facture_db.commande
-        
-        # Récupérer toutes les commandes du même groupe (utiliser la date/heure actuelles des commandes)
-        # Après modification, les commandes peuvent avoir une nouvelle date/heure
-        # On récupère toutes les commandes du même client qui ont la même date/heure que la première commande
-        commandes_groupe = Commande.objects.filter(
-            client=premiere_commande.client,
-            date=premiere_commande.date,
-            heure=premiere_commande.heure,
-            agence=agence
-        ).select_related('article').order_by('id')
-        
-        # Si aucune commande trouvée avec cette date/heure, essayer avec la date/heure de la facture
-        if not commandes_groupe.exists():
-            commandes_groupe = Commande.objects.filter(
-                client=premiere_commande.client,
-                agence=agence
-            ).filter(
-                Q(date=premiere_commande.date, heure=premiere_commande.heure) |
-                Q(date=facture_db.date_facture if hasattr(facture_db, 'date_facture') else facture_db.date)
-            ).select_related('article').order_by('id')
-        
-        # Préparer les lignes de facture avec les valeurs actuelles
-        lignes_facture = []
-        prix_total_calcule = Decimal('0')
-        
-        for cmd in commandes_groupe:
-            prix_unitaire = cmd.article.prix_vente if hasattr(cmd.article, 'prix_vente') else (cmd.prix_total / cmd.quantite if cmd.quantite > 0 else 0)
-            prix_total_ligne = cmd.prix_total  # Utiliser le prix_total de la commande (déjà calculé)
-            
-            lignes_facture.append({
-                'designation': cmd.article.designation,
-                'quantite': float(cmd.quantite),
-                'prix_unitaire': float(prix_unitaire),
-                'prix_total': float(prix_total_ligne),
-            })
-            prix_total_calcule += Decimal(str(prix_total_ligne))
-        
-        # Utiliser les valeurs de la facture mise à jour (date_facture, heure)
-        date_facture_obj = facture_db.date_facture if hasattr(facture_db, 'date_facture') and facture_db.date_facture else facture_db.date
-        date_str = date_facture_obj.strftime('%Y-%m-%d') if date_facture_obj else ''
-        date_display = date_facture_obj.strftime('%d/%m/%Y') if date_facture_obj else '--/--/----'
-        
-        # Utiliser l'heure de la facture ou de la première commande
-        heure_facture = facture_db.heure if facture_db.heure else premiere_commande.heure
-        heure_str = heure_facture.strftime('%H:%M:%S') if heure_facture else ''
-        heure_display = heure_facture.strftime('%H:%M') if heure_facture else '--:--'
-        
-        # Utiliser le prix_total calculé à partir des commandes actuelles ou celui de la facture
-        prix_total_final = float(prix_total_calcule) if prix_total_calcule > 0 else float(facture_db.prix_total)
-        net_a_payer_final = float(facture_db.net_a_payer) if facture_db.net_a_payer else prix_total_final
-        
-        facture_data = {
-            'numero_facture': facture_db.numero_facture,
-            'date': date_str,
-            'date_display': date_display,
-            'date_facture': date_str,
-            'heure': heure_str,
-            'heure_display': heure_display,
-            'prix_total': prix_total_final,  # Utiliser le prix calculé à partir des commandes actuelles
-            'net_a_payer': net_a_payer_final,
-            'client_nom': premiere_commande.client.intitule,
-            'client_adresse': premiere_commande.client.adresse if hasattr(premiere_commande.client, 'adresse') else '',
-            'client_telephone': premiere_commande.client.telephone if hasattr(premiere_commande.client, 'telephone') else '',
-            'lignes': lignes_facture,
-        }
-        
+        facture_data = _donnees_facture_commande(facture_db, agence)
     except FactureCommande.DoesNotExist:
         messages.error(request, 'Facture non trouvée.')
         return redirect('consulter_factures_commande')
@@ -6710,7 +5939,27 @@ def imprimer_facture_commande_xprinter(request, facture_id):
     return render(request, 'supermarket/commandes/facture_impression_commande_xprinter.html', context)
 
 @login_required
-def planification_livraison(request):
+def ticket_escpos_commande(request, facture_id):
+    """Ticket XPrinter d'une facture de commande en octets ESC/POS (?copie=1 pour un duplicata)"""
+    agence = get_user_agence(request)
+    if not agence:
+        return HttpResponse(status=403)
+
+    def donnees():
+        facture_db = FactureCommande.objects.select_related('commande', 'commande__client').filter(
+            id=facture_id, agence=agence
+        ).first()
+        if facture_db is None or facture_db.commande is None:
+            return None
+        return _donnees_facture_commande(facture_db, agence)
+
+    ticket = ticket_commande(facture_id, agence, donnees, duplicata=request.GET.get('copie') == '1')
+    if ticket is None:
+        raise Http404('Facture non trouvée')
+    return HttpResponse(ticket, content_type='application/octet-stream')
+
+@login_required
+def planification_livraison(request):
     """Vue pour afficher la planification des livraisons avec vérification du stock"""
     agence = get_user_agence(request)
     if not agence:
@@ -7680,8 +6929,7 @@ def generer_statistiques_clients(request):
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         error_details = f"Erreur: {str(e)}"
         if hasattr(e, '__class__'):
             error_details += f" (Type: {e.__class__.__name__})"
@@ -8211,8 +7459,7 @@ def export_statistiques_clients_excel(request):
         return response
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur lors de l\'export: {str(e)}'})
 
 @login_required
@@ -8507,9 +7754,10 @@ def suivi_client(request):
         date=date_selectionnee
     ).select_related('client', 'article').order_by('client', 'heure', 'article').distinct()
     
-    print(f"[DEBUG SUIVI_CLIENT] Nombre de commandes trouvées: {commandes.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[DEBUG SUIVI_CLIENT] Nombre de commandes trouvées: %s", commandes.count())
     for cmd in commandes[:5]:  # Afficher les 5 premières pour debug
-        print(f"[DEBUG SUIVI_CLIENT] Commande ID={cmd.id}, Client={cmd.client.intitule}, Date={cmd.date}, Heure={cmd.heure}, Article={cmd.article.designation if cmd.article else 'N/A'}")
+        logger.debug("[DEBUG SUIVI_CLIENT] Commande ID=%s, Client=%s, Date=%s, Heure=%s, Article=%s", cmd.id, cmd.client.intitule, cmd.date, cmd.heure, (cmd.article.designation if cmd.article else 'N/A'))
     
     # Dictionnaire temporaire pour regrouper les commandes par (client_id, date, heure)
     commandes_groupes = {}
@@ -8523,7 +7771,7 @@ def suivi_client(request):
         # Déterminer la plage horaire de la commande
         plage_code = get_plage_from_heure(cmd.heure) if cmd.heure else ''
         if not plage_code and cmd.heure:
-            print(f"[WARNING SUIVI_CLIENT] Aucune plage horaire trouvée pour l'heure {cmd.heure}")
+            logger.debug("[WARNING SUIVI_CLIENT] Aucune plage horaire trouvée pour l'heure %s", cmd.heure)
         
         if plage_code not in commandes_dict[client_id]:
             commandes_dict[client_id][plage_code] = []
@@ -8561,7 +7809,8 @@ def suivi_client(request):
         # Créer une seule entrée avec tous les articles regroupés - un article par ligne
         articles_str = '\n'.join(groupe_data['articles'])
         
-        print(f"[DEBUG SUIVI_CLIENT] Client ID={client_id}, Plage={plage_code}, Heure={groupe_data['heure']}, Articles={len(groupe_data['articles'])}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DEBUG SUIVI_CLIENT] Client ID=%s, Plage=%s, Heure=%s, Articles=%s", client_id, plage_code, groupe_data['heure'], len(groupe_data['articles']))
         
         commandes_dict[client_id][plage_code].append({
             'article': articles_str,
@@ -8838,9 +8087,10 @@ def generer_rapport_acm(request):
                 date__range=[date_debut_obj, date_fin_obj]
             ).select_related('client', 'article').order_by('client', 'date', 'heure')
             
-            print(f"[DEBUG GENERER_RAPPORT_ACM] Nombre de commandes trouvées: {commandes.count()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[DEBUG GENERER_RAPPORT_ACM] Nombre de commandes trouvées: %s", commandes.count())
             for cmd in commandes[:5]:  # Afficher les 5 premières pour debug
-                print(f"[DEBUG GENERER_RAPPORT_ACM] Commande ID={cmd.id}, Client={cmd.client.intitule}, Date={cmd.date}, Heure={cmd.heure}, Article={cmd.article.designation if cmd.article else 'N/A'}")
+                logger.debug("[DEBUG GENERER_RAPPORT_ACM] Commande ID=%s, Client=%s, Date=%s, Heure=%s, Article=%s", cmd.id, cmd.client.intitule, cmd.date, cmd.heure, (cmd.article.designation if cmd.article else 'N/A'))
             
             for cmd in commandes:
                 # Clé pour regrouper par client, date et heure
@@ -9027,7 +8277,8 @@ def export_rapport_acm_excel(request):
             messages.error(request, 'Aucun rapport à exporter. Veuillez générer un rapport d\'abord.')
             return redirect('rapport_acm')
         
-        print(f"[DEBUG EXPORT] Données de session récupérées: {len(rapport_data.get('clients_data', []))} clients")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DEBUG EXPORT] Données de session récupérées: %s clients", len(rapport_data.get('clients_data', [])))
         
         from openpyxl import Workbook
         from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
@@ -9190,7 +8441,8 @@ def export_rapport_acm_excel(request):
         
         # Récupérer les données des clients avec la nouvelle structure
         clients_data = rapport_data.get('clients_data', [])
-        print(f"[DEBUG EXPORT] Nombre de clients à exporter: {len(clients_data)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DEBUG EXPORT] Nombre de clients à exporter: %s", len(clients_data))
         
         # Créer une structure pour l'export avec les plages horaires
         clients_export = []
@@ -9208,7 +8460,8 @@ def export_rapport_acm_excel(request):
                 'total': client_data.get('total', 0),
             })
         
-        print(f"[DEBUG EXPORT] Clients export préparés: {len(clients_export)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DEBUG EXPORT] Clients export préparés: %s", len(clients_export))
         
         # Police pour les cellules de données
         data_font = Font(size=10, name='Calibri')
@@ -9452,14 +8705,12 @@ def export_rapport_acm_excel(request):
                     ws.row_dimensions[row].height = 20  # Hauteur normale Excel
                 else:
                     ws.row_dimensions[row].height = hauteur_ligne_totale
-                print(f"[DEBUG] Ligne {row} - Hauteur définie à {ws.row_dimensions[row].height}px pour {max_lignes_par_plage} lignes max par plage")
+                logger.debug("Ligne %s - Hauteur définie à %spx pour %s lignes max par plage", row, ws.row_dimensions[row].height, max_lignes_par_plage)
                 
                 row += 1
                 
             except Exception as client_error:
-                print(f"[DEBUG EXPORT] Erreur client {client.get('id', 'N/A')}: {str(client_error)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[DEBUG EXPORT] Erreur client %s: %s", client.get('id', 'N/A'), str(client_error))
                 continue
         
         # Ajouter les statistiques par vague
@@ -9775,7 +9026,7 @@ def export_rapport_acm_excel(request):
         # Colonne Total général
         ws.column_dimensions['U'].width = 18
         
-        print(f"[DEBUG] Largeurs de colonnes FORCÉES - Colonnes Commandes (G, J, M, P, S) définies à {commandes_width} (calculé dynamiquement)")
+        logger.debug("Largeurs de colonnes FORCÉES - Colonnes Commandes (G, J, M, P, S) définies à %s (calculé dynamiquement)", commandes_width)
         
         # Réponse HTTP avec le fichier Excel
         from django.http import HttpResponse
@@ -9788,10 +9039,7 @@ def export_rapport_acm_excel(request):
         return response
         
     except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        print(f"[ERREUR EXPORT ACM] {str(e)}")
-        print(f"[TRACEBACK] {error_traceback}")
+        logger.exception("[ERREUR EXPORT ACM] %s", str(e))
         messages.error(request, f'Erreur lors de l\'export: {str(e)}')
         return redirect('rapport_acm')
 
@@ -10636,9 +9884,9 @@ def modifier_article(request, article_id):
                         stock_permanent=float(nouveau_stock * article.prix_achat),
                         commentaire=f"Ajustement manuel via modification d'article par {request.user.username}" + (f" (différence: {difference_stock})" if difference_stock != Decimal('0') else " (vérification)")
                     )
-                    print(f"[STOCK] Ajustement manuel enregistré: {article.designation} {ancien_stock} -> {nouveau_stock}")
+                    logger.debug("[STOCK] Ajustement manuel enregistré: %s %s -> %s", article.designation, ancien_stock, nouveau_stock)
                 except Exception as movement_error:
-                    print(f"[WARNING] Impossible d'enregistrer le mouvement d'ajustement: {movement_error}")
+                    logger.warning("Impossible d'enregistrer le mouvement d'ajustement: %s", movement_error)
             
             # Mettre à jour les types de vente
             prix_gros = request.POST.get('prix_gros')
@@ -10740,10 +9988,10 @@ def detail_article(request, article_id):
             })
         
         # Debug: Vérifier la famille de l'article
-        print(f"[ALERTE] DEBUG Article {article.id}:")
-        print(f"   - Désignation: {article.designation}")
-        print(f"   - Catégorie: {article.categorie}")
-        print(f"   - Intitulé famille: {article.categorie.intitule if article.categorie else 'None'}")
+        logger.debug("[ALERTE] DEBUG Article %s:", article.id)
+        logger.debug("   - Désignation: %s", article.designation)
+        logger.debug("   - Catégorie: %s", article.categorie)
+        logger.debug("   - Intitulé famille: %s", (article.categorie.intitule if article.categorie else 'None'))
         
         context = {
             'article': article,
@@ -10835,8 +10083,9 @@ def creer_facture_achat(request):
     
     if request.method == 'POST':
         try:
-            print("[START] DÉBUT CRÉATION FACTURE D'ACHAT")
-            print(f"[LIST] Données POST reçues: {dict(request.POST)}")
+            logger.debug("[START] DÉBUT CRÉATION FACTURE D'ACHAT")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[LIST] Données POST reçues: %s", dict(request.POST))
             
             # Récupérer les données du formulaire
             numero_fournisseur = request.POST.get('numero_fournisseur')
@@ -10847,26 +10096,26 @@ def creer_facture_achat(request):
             statut = request.POST.get('statut')
             commentaire = request.POST.get('commentaire')
             
-            print(f"[NOTE] Données extraites:")
-            print(f"  - Numéro fournisseur: {numero_fournisseur}")
-            print(f"  - Date achat: {date_achat}")
-            print(f"  - Heure: {heure}")
-            print(f"  - Référence: {reference_achat}")
-            print(f"  - Prix total: {prix_total_global}")
-            print(f"  - Statut: {statut}")
-            print(f"  - Commentaire: {commentaire}")
+            logger.debug("[NOTE] Données extraites:")
+            logger.debug("  - Numéro fournisseur: %s", numero_fournisseur)
+            logger.debug("  - Date achat: %s", date_achat)
+            logger.debug("  - Heure: %s", heure)
+            logger.debug("  - Référence: %s", reference_achat)
+            logger.debug("  - Prix total: %s", prix_total_global)
+            logger.debug("  - Statut: %s", statut)
+            logger.debug("  - Commentaire: %s", commentaire)
             
-            print("[SEARCH] AVANT VALIDATION")
+            logger.debug("[SEARCH] AVANT VALIDATION")
             
             # Validation
             if not all([numero_fournisseur, date_achat, heure, reference_achat, prix_total_global]):
-                print("[ERREUR] VALIDATION ÉCHOUÉE")
+                logger.error("VALIDATION ÉCHOUÉE")
                 messages.error(request, 'Veuillez remplir tous les champs obligatoires.')
                 return redirect('creer_facture_achat')
             
-            print("[OK] VALIDATION RÉUSSIE")
+            logger.debug("VALIDATION RÉUSSIE")
             
-            print("[SEARCH] AVANT CRÉATION FOURNISSEUR")
+            logger.debug("[SEARCH] AVANT CRÉATION FOURNISSEUR")
             
             # Récupérer ou créer le fournisseur
             fournisseur, created = Fournisseur.objects.get_or_create(
@@ -10874,8 +10123,8 @@ def creer_facture_achat(request):
                 defaults={'agence': agence}
             )
             
-            print(f"[OK] FOURNISSEUR: {fournisseur.intitule}")
-            print("[SEARCH] AVANT CRÉATION FACTURE")
+            logger.debug("FOURNISSEUR: %s", fournisseur.intitule)
+            logger.debug("[SEARCH] AVANT CRÉATION FACTURE")
             
             try:
                 # Vérifier si la référence existe déjà
@@ -10883,7 +10132,7 @@ def creer_facture_achat(request):
                     # Générer une référence unique
                     import time
                     reference_achat = f"{reference_achat}_{int(time.time())}"
-                    print(f"[REFRESH] Référence modifiée pour éviter le doublon: {reference_achat}")
+                    logger.debug("[REFRESH] Référence modifiée pour éviter le doublon: %s", reference_achat)
                 
                 # Créer la facture d'achat avec statut temporaire (sera validée après création des lignes)
                 facture = FactureAchat.objects.create(
@@ -10897,33 +10146,32 @@ def creer_facture_achat(request):
                     fournisseur=fournisseur,
                     agence=agence
                 )
-                print(f"[OK] FACTURE CRÉÉE: {facture.id}")
+                logger.debug("FACTURE CRÉÉE: %s", facture.id)
             except Exception as e:
-                print(f"[ERREUR] ERREUR CRÉATION FACTURE: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("ERREUR CRÉATION FACTURE: %s", e)
                 messages.error(request, f'Erreur lors de la création de la facture: {str(e)}')
                 return redirect('creer_facture_achat')
             
-            print("[SEARCH] AVANT TRAITEMENT ARTICLES")
+            logger.debug("[SEARCH] AVANT TRAITEMENT ARTICLES")
             
             # Traiter les articles sélectionnés
             articles_data = request.POST.get('articles_data', '')
-            print(f"[SEARCH] Articles data reçus: {articles_data}")
+            logger.debug("[SEARCH] Articles data reçus: %s", articles_data)
             
             try:
                 if articles_data:
                     import json
                     try:
                         articles = json.loads(articles_data)
-                        print(f"[PACKAGE] Articles à traiter: {len(articles)}")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("[PACKAGE] Articles à traiter: %s", len(articles))
                         
                         for i, article_data in enumerate(articles):
-                            print(f"[NOTE] Traitement article {i+1}: {article_data}")
+                            logger.debug("[NOTE] Traitement article %s: %s", i+1, article_data)
                             
                             # Récupérer l'article
                             article = Article.objects.get(id=article_data['id'])
-                            print(f"[OK] Article trouvé: {article.designation}")
+                            logger.debug("Article trouvé: %s", article.designation)
                             
                             # Convertir les quantités et prix en Decimal pour gérer les décimales correctement
                             quantite_decimale = Decimal(str(article_data['quantite']))
@@ -10940,30 +10188,28 @@ def creer_facture_achat(request):
                                 quantite=quantite_decimale,
                                 prix_total_article=prix_total_decimale
                             )
-                            print(f"[OK] Ligne créée: {ligne.id}")
+                            logger.debug("Ligne créée: %s", ligne.id)
                             
                             # Le stock sera mis à jour automatiquement par le modèle FactureAchat
                             # car la facture est créée avec statut='validee'
-                            print(f"🛒 STOCK ACHAT - Article: {article.designation}")
-                            print(f"🛒 STOCK ACHAT - Quantité: {article_data['quantite']}")
-                            print(f"🛒 STOCK ACHAT - Stock sera mis à jour automatiquement par le modèle")
+                            logger.debug("🛒 STOCK ACHAT - Article: %s", article.designation)
+                            logger.debug("🛒 STOCK ACHAT - Quantité: %s", article_data['quantite'])
+                            logger.debug("🛒 STOCK ACHAT - Stock sera mis à jour automatiquement par le modèle")
                             
                     except (json.JSONDecodeError, Article.DoesNotExist, KeyError) as e:
-                        print(f"[ERREUR] Erreur lors du traitement des articles: {e}")
+                        logger.error("Erreur lors du traitement des articles: %s", e)
                         messages.error(request, f'Erreur lors du traitement des articles: {str(e)}')
                 else:
-                    print("[WARNING] Aucun article sélectionné")
+                    logger.warning("Aucun article sélectionné")
             except Exception as e:
-                print(f"[ERREUR] ERREUR GÉNÉRALE: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("ERREUR GÉNÉRALE: %s", e)
             
             # Valider la facture pour déclencher la mise à jour automatique du stock
-            print("[INFO] Validation de la facture pour déclencher la mise à jour du stock...")
+            logger.debug("Validation de la facture pour déclencher la mise à jour du stock...")
             facture.statut = 'validee'
             facture.save()  # Cela déclenchera automatiquement la mise à jour du stock
             
-            print("[INFO] Stock mis à jour automatiquement par le modèle FactureAchat")
+            logger.debug("Stock mis à jour automatiquement par le modèle FactureAchat")
             
             messages.success(request, f'Facture d\'achat "{reference_achat}" créée avec succès! Stock mis à jour automatiquement.')
             return redirect('creer_facture_achat')
@@ -10988,21 +10234,23 @@ def detail_facture_achat(request, facture_id):
         facture = FactureAchat.objects.get(id=facture_id, agence=agence)
         lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
         
-        print(f"[SEARCH] DÉTAIL FACTURE D'ACHAT")
-        print(f"[LIST] Facture ID: {facture_id}")
-        print(f"[LIST] Facture: {facture.reference_achat}")
-        print(f"[LIST] Agence: {agence.nom_agence}")
-        print(f"[PACKAGE] Nombre de lignes trouvées: {lignes.count()}")
+        logger.debug("[SEARCH] DÉTAIL FACTURE D'ACHAT")
+        logger.debug("[LIST] Facture ID: %s", facture_id)
+        logger.debug("[LIST] Facture: %s", facture.reference_achat)
+        logger.debug("[LIST] Agence: %s", agence.nom_agence)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Nombre de lignes trouvées: %s", lignes.count())
         
         # Debug: vérifier toutes les lignes de facture d'achat
         toutes_lignes = LigneFactureAchat.objects.all()
-        print(f"[CHART] TOTAL LIGNES DANS LA BASE: {toutes_lignes.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] TOTAL LIGNES DANS LA BASE: %s", toutes_lignes.count())
         
         for ligne in toutes_lignes:
-            print(f"  [NOTE] Ligne globale: {ligne.designation} - Facture: {ligne.facture_achat.reference_achat}")
+            logger.debug("  [NOTE] Ligne globale: %s - Facture: %s", ligne.designation, ligne.facture_achat.reference_achat)
         
         for i, ligne in enumerate(lignes):
-            print(f"  [NOTE] Ligne {i+1}: {ligne.designation} - Qty: {ligne.quantite} - Prix: {ligne.prix_unitaire}")
+            logger.debug("  [NOTE] Ligne %s: %s - Qty: %s - Prix: %s", i+1, ligne.designation, ligne.quantite, ligne.prix_unitaire)
         
         context = {
             'facture': facture,
@@ -11010,7 +10258,7 @@ def detail_facture_achat(request, facture_id):
         }
         return render(request, 'supermarket/stock/detail_facture_achat.html', context)
     except FactureAchat.DoesNotExist:
-        print(f"[ERREUR] Facture d'achat {facture_id} non trouvée")
+        logger.error("Facture d'achat %s non trouvée", facture_id)
         messages.error(request, 'Facture d\'achat non trouvée.')
         return redirect('consulter_factures_achat')
 
@@ -11052,7 +10300,7 @@ def modifier_facture_achat(request, facture_id):
             statut_avant = facture.statut
             if statut != statut_avant and statut_avant == 'validee' and statut == 'validee':
                 # Si le statut reste 'validee', on ne change pas le statut pour éviter de déclencher mettre_a_jour_stock()
-                print(f"[DEBUG] Statut inchangé (validee), on ne modifie pas le statut pour éviter mettre_a_jour_stock()")
+                logger.debug("Statut inchangé (validee), on ne modifie pas le statut pour éviter mettre_a_jour_stock()")
                 statut_a_sauvegarder = statut_avant
             else:
                 statut_a_sauvegarder = statut
@@ -11081,23 +10329,26 @@ def modifier_facture_achat(request, facture_id):
                 # Créer un dictionnaire des anciennes quantités par article
                 anciennes_quantites = {}
                 
-                print(f"[DEBUG] Récupération des anciennes lignes: {lignes_existantes.count()} lignes trouvées")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Récupération des anciennes lignes: %s lignes trouvées", lignes_existantes.count())
                 for ligne in lignes_existantes:
                     if ligne.article:
                         article_id = ligne.article.id
                         anciennes_quantites[article_id] = Decimal(str(ligne.quantite))
-                        print(f"  [DEBUG] Ancienne ligne - Article ID: {article_id}, Quantité: {ligne.quantite}")
+                        logger.debug("  Ancienne ligne - Article ID: %s, Quantité: %s", article_id, ligne.quantite)
                 
                 # 2) Supprimer toutes les anciennes lignes
                 LigneFactureAchat.objects.filter(facture_achat=facture).delete()
-                print(f"[DEBUG] Anciennes lignes supprimées")
+                logger.debug("Anciennes lignes supprimées")
                 
                 # 3) Traiter les nouvelles lignes : annuler l'ancienne puis appliquer la nouvelle
                 if articles_data:
                     import json
                     try:
                         articles = json.loads(articles_data)
-                        print(f"[DEBUG] Articles reçus du formulaire: {articles}")
+                        logger.debug("Articles reçus du formulaire: %s", articles)
+                        # Par article : les mises à jour de stock sont faites dans un ordre fixe
+                        articles = sorted(articles, key=lambda a: int(a.get('id') or 0))
                         for a in articles:
                             # Convertir l'ID en entier (peut être string ou int selon le JSON)
                             article_id = int(a.get('id', 0)) if a.get('id') else None
@@ -11107,10 +10358,10 @@ def modifier_facture_achat(request, facture_id):
                             quantite_nouvelle = Decimal(quantite_str)
                             prix_achat_nouveau = Decimal(prix_str)
                             
-                            print(f"[DEBUG] Article ID: {article_id}, Quantité: {quantite_nouvelle}, Prix: {prix_achat_nouveau}")
+                            logger.debug("Article ID: %s, Quantité: %s, Prix: %s", article_id, quantite_nouvelle, prix_achat_nouveau)
                             
                             if not article_id or quantite_nouvelle <= 0:
-                                print(f"[DEBUG] Article ignoré: ID={article_id}, Quantité={quantite_nouvelle}")
+                                logger.debug("Article ignoré: ID=%s, Quantité=%s", article_id, quantite_nouvelle)
                                 continue
                             
                             try:
@@ -11120,48 +10371,28 @@ def modifier_facture_achat(request, facture_id):
                                 messages.error(request, f"Article introuvable (ID: {article_id}).")
                                 continue
                             
-                            # Stock AVANT modification
-                            # IMPORTANT : Le stock actuel contient déjà l'ancienne quantité de la facture
-                            stock_avant_modification = article.stock_actuel
-                            
                             # Quantité de l'ancienne facture
                             quantite_ancienne = anciennes_quantites.get(article_id, Decimal('0'))
                             
                             # Calcul de la différence entre nouvelle et ancienne quantité
-                            difference = quantite_nouvelle - quantite_ancienne
-                            
-                            # DEBUG : Afficher les valeurs pour vérification
-                            print(f"[DEBUG MODIFICATION FACTURE ACHAT]")
-                            print(f"  Article: {article.designation} (ID: {article_id})")
-                            print(f"  Stock avant modification: {stock_avant_modification}")
-                            print(f"  Quantité ancienne (dans facture): {quantite_ancienne}")
-                            print(f"  Quantité nouvelle (dans facture): {quantite_nouvelle}")
-                            print(f"  Différence calculée: {difference} (nouvelle {quantite_nouvelle} - ancienne {quantite_ancienne})")
-                            
-                            # LOGIQUE CORRIGÉE : Calculer le stock final avec la différence
-                            # Le stock actuel contient déjà l'effet de l'ancienne facture
-                            # Pour modifier : stock_final = stock_actuel - ancienne_quantité + nouvelle_quantité
-                            # Ce qui équivaut à : stock_final = stock_actuel + différence
-                            # 
+                            # Le stock actuel contient déjà l'effet de l'ancienne facture :
+                            # stock_final = stock_actuel - ancienne_quantité + nouvelle_quantité = stock_actuel + différence
                             # Exemples :
                             # - Stock = 30, ancienne = 10, nouvelle = 20 → différence = +10 → stock final = 30 + 10 = 40 ✓
                             # - Stock = 30, ancienne = 20, nouvelle = 10 → différence = -10 → stock final = 30 - 10 = 20 ✓
-                            # - Stock = 30, ancienne = 10, nouvelle = 10 → différence = 0 → stock final = 30 + 0 = 30 ✓
-                            
-                            # Calculer le stock final
-                            stock_final = stock_avant_modification + difference
-                            
-                            # S'assurer que le stock ne devient pas négatif
-                            if stock_final < 0:
-                                messages.error(request, f'Stock insuffisant pour l\'article {article.designation}. Stock actuel: {stock_avant_modification}, différence: {difference}')
-                                raise ValueError(f"Stock insuffisant: {stock_avant_modification} + {difference} = {stock_final} < 0")
+                            difference = quantite_nouvelle - quantite_ancienne
                             
-                            # Stock après annulation (pour information, mais on utilise directement la différence)
-                            stock_apres_annulation = stock_avant_modification - quantite_ancienne
+                            # Appliquer la différence en une mise à jour atomique (jamais quantite_nouvelle),
+                            # refusée si le stock deviendrait négatif
+                            try:
+                                stock_avant_modification, stock_final = appliquer_variation(
+                                    article, difference, interdire_negatif=True
+                                )
+                            except StockInsuffisant:
+                                messages.error(request, f'Stock insuffisant pour l\'article {article.designation}. Stock actuel: {article.stock_actuel}, différence: {difference}')
+                                raise
                             
-                            print(f"  Stock avant modification: {stock_avant_modification}")
-                            print(f"  Différence: {difference} (nouvelle {quantite_nouvelle} - ancienne {quantite_ancienne})")
-                            print(f"  Stock final: {stock_final} = {stock_avant_modification} + {difference}")
+                            logger.debug("[MODIFICATION FACTURE ACHAT] %s (ID: %s) : ancienne %s, nouvelle %s, stock %s → %s", article.designation, article_id, quantite_ancienne, quantite_nouvelle, stock_avant_modification, stock_final)
                             
                             # Créer la nouvelle ligne
                             # IMPORTANT : La création de la ligne ne doit PAS déclencher de mise à jour du stock
@@ -11175,33 +10406,7 @@ def modifier_facture_achat(request, facture_id):
                                 quantite=int(quantite_nouvelle),
                                 prix_total_article=float(prix_achat_nouveau * quantite_nouvelle)
                             )
-                            print(f"  ✅ Ligne créée avec quantité: {quantite_nouvelle} (mais le stock sera mis à jour avec différence: {difference})")
-                            
-                            # Mettre à jour le stock avec le nouveau stock calculé
-                            # Le stock final = stock_initial + différence (augmentation ou diminution selon le signe)
-                            # IMPORTANT : On utilise stock_final qui est calculé avec la différence, JAMAIS quantite_nouvelle
-                            ancien_stock_pour_verif = article.stock_actuel
-                            
-                            # VÉRIFICATION CRITIQUE : S'assurer qu'on utilise bien la différence et non quantite_nouvelle
-                            if stock_final != stock_avant_modification + difference:
-                                print(f"[ERREUR] Calcul incorrect du stock final!")
-                                raise ValueError(f"Stock final incorrect: {stock_final} != {stock_avant_modification} + {difference}")
-                            
-                            # Mettre à jour le stock avec le stock final calculé
-                            article.stock_actuel = stock_final
-                            
-                            # Vérification : le stock doit être égal à stock_avant_modification + difference
-                            if abs(article.stock_actuel - (stock_avant_modification + difference)) > Decimal('0.01'):
-                                raise ValueError(f"Stock incorrect: {article.stock_actuel} != {stock_avant_modification} + {difference}")
-                            
-                            print(f"  ✅ Stock mis à jour: {ancien_stock_pour_verif} → {article.stock_actuel}")
-                            print(f"  ✅ Différence appliquée au stock: {article.stock_actuel - ancien_stock_pour_verif} (doit être {difference}, PAS {quantite_nouvelle})")
-                            print(f"  ✅ Vérification: stock_initial ({stock_avant_modification}) + différence ({difference}) = solde ({stock_final})")
-                            
-                            # Vérification finale
-                            if abs((article.stock_actuel - ancien_stock_pour_verif) - difference) > Decimal('0.01'):
-                                print(f"[ERREUR CRITIQUE] La différence appliquée ({article.stock_actuel - ancien_stock_pour_verif}) ne correspond pas à la différence calculée ({difference})!")
-                                raise ValueError(f"Différence incorrecte appliquée au stock!")
+                            logger.info("  ✅ Ligne créée avec quantité: %s (mais le stock sera mis à jour avec différence: %s)", quantite_nouvelle, difference)
                             
                             # La différence a déjà été calculée plus haut pour clarifier la logique
                             
@@ -11226,9 +10431,7 @@ def modifier_facture_achat(request, facture_id):
                                 commentaire = f"Achat - Facture {facture.reference_achat} (modification - quantité inchangée: {quantite_nouvelle})"
                             
                             article.dernier_prix_achat = float(prix_achat_nouveau)
-                            # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                            article.suivi_stock = True
-                            article.save()
+                            article.save(update_fields=['dernier_prix_achat'])
                             
                             # IMPORTANT : Ne pas supprimer les anciens mouvements pour garder la traçabilité complète
                             # Tous les mouvements effectués doivent être conservés pour l'audit
@@ -11254,7 +10457,7 @@ def modifier_facture_achat(request, facture_id):
                                     elif difference < 0 and quantite_mouvement != abs(difference):
                                         raise ValueError(f"ERREUR: quantite_mouvement ({quantite_mouvement}) != abs(difference) ({abs(difference)})")
                                     
-                                    print(f"  [DEBUG] Création mouvement - quantite_mouvement: {quantite_mouvement}, difference: {difference}, quantite_nouvelle: {quantite_nouvelle}")
+                                    logger.debug("  Création mouvement - quantite_mouvement: %s, difference: %s, quantite_nouvelle: %s", quantite_mouvement, difference, quantite_nouvelle)
                                     
                                     MouvementStock.objects.create(
                                         article=article,
@@ -11272,12 +10475,11 @@ def modifier_facture_achat(request, facture_id):
                                         fournisseur=facture.fournisseur,
                                         commentaire=commentaire
                                     )
-                                    print(f"  ✅ Mouvement de stock créé - stock_initial: {stock_avant_modification}, quantite: {quantite_mouvement} (DIFFÉRENCE), solde: {stock_final}")
-                                    print(f"  ✅ Vérification: {stock_avant_modification} + {quantite_mouvement} = {stock_avant_modification + quantite_mouvement} (doit être {stock_final})")
+                                    logger.info("  ✅ Mouvement de stock créé - stock_initial: %s, quantite: %s (DIFFÉRENCE), solde: %s", stock_avant_modification, quantite_mouvement, stock_final)
+                                    logger.info("  ✅ Vérification: %s + %s = %s (doit être %s)", stock_avant_modification, quantite_mouvement, stock_avant_modification + quantite_mouvement, stock_final)
                                 except Exception as e:
-                                    print(f"[WARNING] Erreur création mouvement stock: {e}")
-                                    import traceback
-                                    traceback.print_exc()
+                                    logger.warning("Erreur création mouvement stock: %s", e)
+                                    logger.exception("Erreur inattendue")
                     except json.JSONDecodeError:
                         messages.error(request, 'Format des articles invalide.')
                     except Exception as e:
@@ -11291,8 +10493,8 @@ def modifier_facture_achat(request, facture_id):
             # au lieu de respecter la différence que nous avons calculée manuellement
             # La facture a déjà été mise à jour avec update() plus haut, donc pas besoin de save()
             
-            print(f"[DEBUG] Modification terminée - Stock mis à jour avec la DIFFÉRENCE, pas la quantité totale")
-            print(f"[DEBUG] Ne pas appeler facture.save() pour éviter mettre_a_jour_stock()")
+            logger.debug("Modification terminée - Stock mis à jour avec la DIFFÉRENCE, pas la quantité totale")
+            logger.debug("Ne pas appeler facture.save() pour éviter mettre_a_jour_stock()")
             
             messages.success(request, f'Facture d\'achat "{reference_achat}" modifiée avec succès!')
             # Rediriger vers le détail de la facture pour voir les modifications
@@ -11333,36 +10535,34 @@ def modifier_facture_achat(request, facture_id):
 @login_required
 def supprimer_facture_achat(request, facture_id):
     """Vue pour supprimer une facture d'achat"""
-    print(f"🗑️ SUPPRESSION FACTURE D'ACHAT")
-    print(f"[LIST] Méthode: {request.method}")
-    print(f"[LIST] Facture ID: {facture_id}")
+    logger.debug("🗑️ SUPPRESSION FACTURE D'ACHAT")
+    logger.debug("[LIST] Méthode: %s", request.method)
+    logger.debug("[LIST] Facture ID: %s", facture_id)
     
     if request.method != 'POST':
-        print("[ERREUR] Méthode non autorisée - redirection")
+        logger.error("Méthode non autorisée - redirection")
         messages.error(request, 'Méthode non autorisée.')
         return redirect('consulter_factures_achat')
     
     try:
         agence = get_user_agence(request)
-        print(f"[BUILDING] Agence: {agence}")
+        logger.debug("[BUILDING] Agence: %s", agence)
         
         facture = FactureAchat.objects.get(id=facture_id, agence=agence)
-        print(f"[LIST] Facture trouvée: {facture.reference_achat}")
+        logger.debug("[LIST] Facture trouvée: %s", facture.reference_achat)
         
         # Restocker: retirer les quantités ajoutées par cette facture et créer des mouvements de correction
         try:
-            lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
+            lignes = LigneFactureAchat.objects.filter(facture_achat=facture).select_related('article').order_by(
+                'article_id', 'id'
+            )
             for ligne in lignes:
                 article = ligne.article
                 if not article:
                     continue
-                ancien_stock = getattr(article, 'stock_actuel', 0)
-                # Empêcher les stocks négatifs
-                article.stock_actuel = max(0, ancien_stock - int(ligne.quantite))
-                # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                article.suivi_stock = True
-                article.save()
-                print(f"[STOCK] Reversion achat: {article.designation} {ancien_stock} -> {article.stock_actuel} (-{ligne.quantite})")
+                # Empêcher les stocks négatifs (mise à jour atomique, suivi de stock activé)
+                ancien_stock, _ = appliquer_variation(article, -int(ligne.quantite), plancher_zero=True)
+                logger.debug("[STOCK] Reversion achat: %s %s -> %s (-%s)", article.designation, ancien_stock, article.stock_actuel, ligne.quantite)
                 
                 # Créer un mouvement de correction au lieu de supprimer les mouvements existants
                 try:
@@ -11382,1231 +10582,137 @@ def supprimer_facture_achat(request, facture_id):
                         commentaire=f"Correction - Suppression facture achat {facture.reference_achat}"
                     )
                 except Exception as e:
-                    print(f"[WARNING] Erreur création mouvement correction suppression: {e}")
+                    logger.warning("Erreur création mouvement correction suppression: %s", e)
         except Exception as e:
-            print(f"[WARNING] Echec reversion stock facture achat: {e}")
+            logger.warning("Echec reversion stock facture achat: %s", e)
 
         facture_name = facture.reference_achat
         facture.delete()
-        print(f"[OK] Facture supprimée: {facture_name}")
+        logger.debug("Facture supprimée: %s", facture_name)
         
         messages.success(request, f'Facture d\'achat "{facture_name}" supprimée avec succès!')
     except FactureAchat.DoesNotExist:
-        print(f"[ERREUR] Facture d'achat {facture_id} non trouvée")
+        logger.error("Facture d'achat %s non trouvée", facture_id)
         messages.error(request, 'Facture d\'achat non trouvée.')
     except Exception as e:
-        print(f"[ERREUR] Erreur lors de la suppression: {e}")
+        logger.error("Erreur lors de la suppression: %s", e)
         messages.error(request, f'Erreur lors de la suppression: {str(e)}')
     
     return redirect('consulter_factures_achat')
 
-# ==================== FACTURES DE TRANSFERT ====================
+# ===== RECHERCHE D'ARTICLES POUR STOCK =====
 
 @login_required
-def consulter_factures_transfert(request):
-    """Vue pour consulter les factures de transfert"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        messages.error(request, 'Agence non trouvée.')
-        return redirect('login_stock')
+@require_stock_access
+def search_articles_stock(request):
+    """Vue pour la recherche d'articles dans le module de stock"""
+    search_term = request.GET.get('q', '')
     
-    # Récupérer les paramètres de recherche
-    search_query = request.GET.get('search', '')
-    statut_filter = request.GET.get('statut_filter', '')
-    date_debut = request.GET.get('date_debut', '')
-    date_fin = request.GET.get('date_fin', '')
+    logger.debug("[SEARCH] search_articles_stock: recherche pour '%s'", search_term)
     
-    # Construire la requête de base (factures où l'agence est source ou destination)
-    factures = FactureTransfert.objects.filter(
-        Q(agence_source=agence) | Q(agence_destination=agence)
-    )
+    # Vérifier d'abord s'il y a des articles dans la base de données
+    total_articles = Article.objects.count()
+    logger.debug("[CHART] Total articles dans la base de données: %s", total_articles)
     
-    # Appliquer les filtres
-    if search_query:
-        factures = factures.filter(
-            Q(numero_compte__icontains=search_query) |
-            Q(reference_transfert__icontains=search_query) |
-            Q(lieu_depart__icontains=search_query) |
-            Q(lieu_arrivee__icontains=search_query)
-        )
+    if total_articles == 0:
+        logger.error("Aucun article dans la base de données!")
+        return JsonResponse({'articles': []})
     
-    if statut_filter:
-        factures = factures.filter(statut=statut_filter)
+    agence = get_user_agence(request)
+    logger.debug("[BUILDING] Agence trouvée: %s", agence)
+    logger.debug("[BUILDING] ID de l'agence: %s", (agence.id_agence if agence else 'None'))
+    logger.debug("[BUILDING] Nom de l'agence: %s", (agence.nom_agence if agence else 'None'))
     
-    if date_debut:
-        factures = factures.filter(date_transfert__gte=date_debut)
+    if not agence:
+        logger.error("Aucune agence trouvée")
+        return JsonResponse({'articles': []})
     
-    if date_fin:
-        factures = factures.filter(date_transfert__lte=date_fin)
+    # Test: afficher tous les articles sans filtre d'agence
+    articles_all = Article.objects.all()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[PACKAGE] Tous les articles (toutes agences): %s", articles_all.count())
+    for article in articles_all[:5]:  # Afficher les 5 premiers
+        logger.debug("  - %s (Agence: %s)", article.designation, (article.agence.nom_agence if article.agence else 'None'))
     
-    # Trier par date décroissante
-    factures = factures.order_by('-date_transfert')
+    # Test: afficher les articles de cette agence spécifique
+    articles_agence = Article.objects.filter(agence=agence)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[PACKAGE] Articles de l'agence %s: %s", agence.nom_agence, articles_agence.count())
+    for article in articles_agence[:5]:  # Afficher les 5 premiers
+        logger.debug("  - %s - %s (ID: %s)", article.reference_article, article.designation, article.id)
     
-    # Calculer les statistiques
-    total_factures = FactureTransfert.objects.filter(
-        Q(agence_source=agence) | Q(agence_destination=agence)
-    ).count()
-    factures_en_cours = FactureTransfert.objects.filter(
-        Q(agence_source=agence) | Q(agence_destination=agence),
-        statut='en_cours'
-    ).count()
-    factures_terminees = FactureTransfert.objects.filter(
-        Q(agence_source=agence) | Q(agence_destination=agence),
-        statut='termine'
-    ).count()
-    quantite_totale = FactureTransfert.objects.filter(
-        Q(agence_source=agence) | Q(agence_destination=agence)
-    ).aggregate(
-        total=Sum('quantite')
-    )['total'] or 0
+    articles = []
     
-    # Récupérer les statuts pour le filtre
-    statut_choices = FactureTransfert.STATUT_CHOICES
+    if search_term and len(search_term) >= 1:
+        # Recherche avec filtre d'agence : recherche dans designation ET reference_article
+        from django.db.models import Q
+        articles = Article.objects.filter(
+            agence=agence
+        ).filter(
+            Q(designation__icontains=search_term) | Q(reference_article__icontains=search_term)
+        ).order_by('designation')[:50]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SEARCH] Articles trouvés avec recherche '%s' (agence %s): %s", search_term, agence.nom_agence, articles.count())
+        for article in articles[:10]:  # Afficher les 10 premiers résultats
+            logger.debug("  - %s - %s (ID: %s)", article.reference_article, article.designation, article.id)
+    else:
+        # Afficher tous les articles de l'agence si pas de terme de recherche
+        articles = Article.objects.filter(agence=agence).order_by('designation')[:50]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Tous les articles de l'agence %s: %s", agence.nom_agence, articles.count())
     
-    context = {
-        'factures': factures,
-        'search_query': search_query,
-        'statut_filter': statut_filter,
-        'date_debut': date_debut,
-        'date_fin': date_fin,
-        'statut_choices': statut_choices,
-        'total_factures': total_factures,
-        'factures_en_cours': factures_en_cours,
-        'factures_terminees': factures_terminees,
-        'quantite_totale': quantite_totale,
-    }
-    return render(request, 'supermarket/stock/consulter_factures_transfert.html', context)
+    # Convertir les articles en format JSON
+    articles_data = []
+    for article in articles:
+        articles_data.append({
+            'id': article.id,
+            'designation': article.designation,
+            'prix_achat': float(article.prix_achat) if article.prix_achat else 0.0,
+            'stock': float(article.stock_actuel) if article.stock_actuel else 0.0,
+            'reference_article': article.reference_article or '',
+        })
+        logger.debug("[NOTE] Article ajouté: %s - %s (ID: %s, Agence: %s)", article.reference_article, article.designation, article.id, article.agence.nom_agence)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[CHART] Total articles_data: %s", len(articles_data))
+    return JsonResponse({'articles': articles_data})
+
+def create_test_articles(request):
+    """Vue temporaire pour créer des articles de test"""
+    agence = get_user_agence(request)
+    if not agence:
+        return JsonResponse({'error': 'Aucune agence trouvée'})
+    
+    # Créer quelques articles de test
+    test_articles = [
+        {'designation': 'Ordinateur Portable', 'prix_achat': 500000, 'prix_vente': 600000, 'stock_actuel': 10},
+        {'designation': 'Souris USB', 'prix_achat': 5000, 'prix_vente': 7500, 'stock_actuel': 50},
+        {'designation': 'Clavier Mécanique', 'prix_achat': 15000, 'prix_vente': 20000, 'stock_actuel': 25},
+        {'designation': 'Écran 24 pouces', 'prix_achat': 80000, 'prix_vente': 100000, 'stock_actuel': 15},
+        {'designation': 'Casque Audio', 'prix_achat': 25000, 'prix_vente': 35000, 'stock_actuel': 30},
+    ]
+    
+    created_articles = []
+    for article_data in test_articles:
+        article, created = Article.objects.get_or_create(
+            designation=article_data['designation'],
+            agence=agence,
+            defaults=article_data
+        )
+        if created:
+            created_articles.append(article.designation)
+    
+    return JsonResponse({
+        'message': f'Articles créés: {len(created_articles)}',
+        'articles': created_articles
+    })
+
+# ==================== INVENTAIRE DE STOCK ====================
 
 @login_required
-def creer_facture_transfert(request):
-    """Vue pour créer une nouvelle facture de transfert"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        messages.error(request, 'Agence non trouvée.')
-        return redirect('login_stock')
-    
-    if request.method == 'POST':
-        try:
-            # Récupérer les données du formulaire
-            numero_compte = request.POST.get('numero_compte')
-            date_transfert = request.POST.get('date_transfert')
-            reference_transfert = request.POST.get('reference_transfert')
-            lieu_depart = request.POST.get('lieu_depart')
-            lieu_arrivee = request.POST.get('lieu_arrivee')
-            quantite = request.POST.get('quantite')
-            statut = request.POST.get('statut')
-            employe_expediteur = request.POST.get('employe_expediteur', '').strip()
-            employe_destinataire = request.POST.get('employe_destinataire', '').strip()
-            etat = request.POST.get('etat', 'sortir')
-            
-            # Validation
-            if not all([numero_compte, date_transfert, reference_transfert, lieu_depart, lieu_arrivee, quantite, employe_expediteur]):
-                messages.error(request, 'Veuillez remplir tous les champs obligatoires.')
-                return redirect('creer_facture_transfert')
-            
-            # Rechercher les employés existants par nom
-            expediteur_employe = None
-            destinataire_employe = None
-            
-            # Rechercher l'employé expéditeur
-            try:
-                # Essayer de trouver par nom complet dans le compte
-                expediteur_employe = Employe.objects.filter(
-                    compte__agence=agence,
-                    compte__user__first_name__icontains=employe_expediteur.split()[0] if employe_expediteur.split() else employe_expediteur
-                ).first()
-                
-                # Si pas trouvé, essayer par nom de famille
-                if not expediteur_employe and len(employe_expediteur.split()) > 1:
-                    expediteur_employe = Employe.objects.filter(
-                        compte__agence=agence,
-                        compte__user__last_name__icontains=employe_expediteur.split()[-1]
-                    ).first()
-                
-                # Si toujours pas trouvé, prendre le premier employé de l'agence
-                if not expediteur_employe:
-                    expediteur_employe = Employe.objects.filter(compte__agence=agence).first()
-                    
-            except Exception as e:
-                print(f"Erreur lors de la recherche de l'employé expéditeur: {e}")
-                expediteur_employe = Employe.objects.filter(compte__agence=agence).first()
-            
-            if not expediteur_employe:
-                messages.error(request, 'Aucun employé trouvé dans cette agence.')
-                return redirect('creer_facture_transfert')
-            
-            # Afficher un message informatif sur l'employé trouvé
-            expediteur_nom = f"{expediteur_employe.compte.user.first_name} {expediteur_employe.compte.user.last_name}".strip()
-            messages.info(request, f'Employé expéditeur trouvé: {expediteur_nom}')
-            
-            if destinataire_employe:
-                destinataire_nom = f"{destinataire_employe.compte.user.first_name} {destinataire_employe.compte.user.last_name}".strip()
-                messages.info(request, f'Employé destinataire trouvé: {destinataire_nom}')
-            
-            # Rechercher l'employé destinataire (si fourni)
-            if employe_destinataire:
-                try:
-                    # Essayer de trouver par nom complet dans le compte
-                    destinataire_employe = Employe.objects.filter(
-                        compte__agence=agence,
-                        compte__user__first_name__icontains=employe_destinataire.split()[0] if employe_destinataire.split() else employe_destinataire
-                    ).first()
-                    
-                    # Si pas trouvé, essayer par nom de famille
-                    if not destinataire_employe and len(employe_destinataire.split()) > 1:
-                        destinataire_employe = Employe.objects.filter(
-                            compte__agence=agence,
-                            compte__user__last_name__icontains=employe_destinataire.split()[-1]
-                        ).first()
-                        
-                except Exception as e:
-                    print(f"Erreur lors de la recherche de l'employé destinataire: {e}")
-                    destinataire_employe = None
-            
-            # Vérifier l'unicité de la référence et générer une référence unique si nécessaire
-            reference_finale = reference_transfert
-            if FactureTransfert.objects.filter(reference_transfert=reference_transfert).exists():
-                # Générer une référence unique avec timestamp
-                import time
-                reference_finale = f"{reference_transfert}_{int(time.time())}"
-                print(f"[INFO] Référence modifiée pour éviter le doublon: {reference_finale}")
-            
-            # Créer la facture de transfert
-            facture = FactureTransfert.objects.create(
-                numero_compte=numero_compte,
-                date_transfert=date_transfert,
-                reference_transfert=reference_finale,
-                lieu_depart=lieu_depart,
-                lieu_arrivee=lieu_arrivee,
-                quantite=int(quantite),
-                statut=statut,
-                agence_source=agence,
-                agence_destination=agence,  # Pour l'instant, même agence (à modifier selon les besoins)
-                employe_expediteur=expediteur_employe,
-                employe_destinataire=destinataire_employe,
-                etat=etat
-            )
-            
-            # Traiter les articles sélectionnés
-            articles_data = request.POST.get('articles_data', '')
-            if articles_data:
-                import json
-                try:
-                    articles = json.loads(articles_data)
-                    for article_data in articles:
-                        # Récupérer l'article
-                        article = Article.objects.get(id=article_data['id'])
-                        
-                        # Créer la ligne de facture de transfert
-                        LigneFactureTransfert.objects.create(
-                            facture_transfert=facture,
-                            article=article,
-                            quantite=int(article_data['quantite']),
-                            prix_unitaire=float(article_data['prix_achat']),
-                            valeur_totale=float(article_data['prix_achat']) * int(article_data['quantite'])
-                        )
-                        
-                        # Mettre à jour le stock de l'article selon l'état du transfert
-                        ancien_stock = article.stock_actuel
-                        quantite_transfert = Decimal(str(article_data['quantite']))
-                        
-                        # Normaliser l'état pour éviter les problèmes de casse ou d'espaces
-                        etat_normalise = str(etat).strip().lower() if etat else 'sortir'
-                        
-                        # Si l'état est "entrer", augmenter le stock; si "sortir", diminuer le stock
-                        # IMPORTANT: "entrer" doit TOUJOURS augmenter le stock
-                        if etat_normalise == 'entrer':
-                            article.stock_actuel += quantite_transfert
-                            type_mouvement = 'entree'
-                            action_stock = "augmentation"
-                        else:  # sortir
-                            article.stock_actuel -= quantite_transfert
-                            if article.stock_actuel < 0:
-                                article.stock_actuel = 0
-                            type_mouvement = 'sortie'
-                            action_stock = "diminution"
-                        
-                        # Mettre à jour le dernier prix d'achat avec le prix du transfert
-                        ancien_dernier_prix = article.dernier_prix_achat
-                        nouveau_prix_achat = float(article_data['prix_achat'])
-                        article.dernier_prix_achat = nouveau_prix_achat
-                        # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                        article.suivi_stock = True
-                        article.save()
-                        print(f"[PACKAGE] STOCK TRANSFERT - Article: {article.designation}")
-                        print(f"[PACKAGE] STOCK TRANSFERT - État: {etat} (normalisé: {etat_normalise}), {action_stock} du stock")
-                        print(f"[PACKAGE] STOCK TRANSFERT - Stock mis à jour: {ancien_stock} → {article.stock_actuel}")
-                        print(f"[MONEY] Transfert - Dernier prix d'achat mis à jour: {ancien_dernier_prix} → {nouveau_prix_achat}")
-                        
-                        # [HOT] CRÉER UN MOUVEMENT DE STOCK POUR TRAÇABILITÉ
-                        try:
-                            MouvementStock.objects.create(
-                                article=article,
-                                agence=agence,
-                                type_mouvement=type_mouvement,
-                                date_mouvement=timezone.now(),
-                                numero_piece=facture.reference_transfert,
-                                quantite_stock=article.stock_actuel,
-                                stock_initial=ancien_stock,
-                                solde=article.stock_actuel,
-                                quantite=int(article_data['quantite']),
-                                cout_moyen_pondere=float(article.prix_achat),
-                                stock_permanent=float(article.stock_actuel * article.prix_achat),
-                                commentaire=f"Transfert ({etat}) - Facture {facture.reference_transfert}"
-                            )
-                            print(f"[NOTE] MOUVEMENT STOCK - Transfert ({etat}) enregistré pour {article.designation}")
-                        except Exception as e:
-                            print(f"[WARNING] ERREUR MOUVEMENT STOCK TRANSFERT: {e}")
-                        
-                except (json.JSONDecodeError, Article.DoesNotExist, KeyError) as e:
-                    print(f"Erreur lors du traitement des articles: {e}")
-            
-            messages.success(request, f'Facture de transfert "{reference_transfert}" créée avec succès!')
-            return redirect('creer_facture_transfert')
-            
-        except Exception as e:
-            messages.error(request, f'Erreur lors de la création de la facture: {str(e)}')
-            return redirect('creer_facture_transfert')
-    
-    # GET - Afficher le formulaire
-    statut_choices = FactureTransfert.STATUT_CHOICES
-    
-    context = {
-        'statut_choices': statut_choices,
-    }
-    return render(request, 'supermarket/stock/creer_facture_transfert_nouveau.html', context)
-
-@login_required
-def detail_facture_transfert(request, facture_id):
-    """Vue pour afficher les détails d'une facture de transfert"""
-    try:
-        agence = get_user_agence(request)
-        facture = FactureTransfert.objects.get(id=facture_id, agence_source=agence)
-        lignes = LigneFactureTransfert.objects.filter(facture_transfert=facture)
-        
-        context = {
-            'facture': facture,
-            'lignes': lignes,
-        }
-        return render(request, 'supermarket/stock/detail_facture_transfert.html', context)
-    except FactureTransfert.DoesNotExist:
-        messages.error(request, 'Facture de transfert non trouvée.')
-        return redirect('consulter_factures_transfert')
-
-@login_required
-def modifier_facture_transfert(request, facture_id):
-    """Vue pour modifier une facture de transfert existante"""
-    try:
-        agence = get_user_agence(request)
-        facture = FactureTransfert.objects.get(id=facture_id, agence_source=agence)
-    except FactureTransfert.DoesNotExist:
-        messages.error(request, 'Facture de transfert non trouvée.')
-        return redirect('consulter_factures_transfert')
-    
-    if request.method == 'POST':
-        try:
-            # Récupérer les données du formulaire
-            numero_compte = request.POST.get('numero_compte')
-            date_transfert = request.POST.get('date_transfert')
-            reference_transfert = request.POST.get('reference_transfert')
-            lieu_depart = request.POST.get('lieu_depart')
-            lieu_arrivee = request.POST.get('lieu_arrivee')
-            quantite = request.POST.get('quantite')
-            statut = request.POST.get('statut')
-            employe_expediteur = request.POST.get('employe_expediteur', '').strip()
-            employe_destinataire = request.POST.get('employe_destinataire', '').strip()
-            etat = request.POST.get('etat', 'sortir')
-            
-            articles_data_raw = request.POST.get('articles_data')
-            
-            # Validation
-            if not all([numero_compte, date_transfert, reference_transfert, lieu_depart, lieu_arrivee, quantite]):
-                messages.error(request, 'Veuillez remplir tous les champs obligatoires.')
-                return redirect('modifier_facture_transfert', facture_id=facture_id)
-            
-            if not articles_data_raw:
-                messages.error(request, 'Veuillez sélectionner au moins un article.')
-                return redirect('modifier_facture_transfert', facture_id=facture_id)
-            
-            try:
-                articles_payload = json.loads(articles_data_raw)
-            except json.JSONDecodeError:
-                messages.error(request, 'Format des articles invalide.')
-                return redirect('modifier_facture_transfert', facture_id=facture_id)
-            
-            if not articles_payload:
-                messages.error(request, 'Veuillez sélectionner au moins un article.')
-                return redirect('modifier_facture_transfert', facture_id=facture_id)
-            
-            # Récupérer l'ancien état pour gérer le stock
-            ancien_etat = facture.etat
-            ancien_etat_normalise = str(ancien_etat).strip().lower() if ancien_etat else 'sortir'
-            etat_normalise = str(etat).strip().lower() if etat else 'sortir'
-            if ancien_etat_normalise == 'sortie':
-                ancien_etat_normalise = 'sortir'
-            if etat_normalise == 'sortie':
-                etat_normalise = 'sortir'
-            if ancien_etat_normalise == 'sortie':
-                ancien_etat_normalise = 'sortir'
-            if etat_normalise == 'sortie':
-                etat_normalise = 'sortir'
-            
-            # Nouvelle logique : Calculer la différence et l'appliquer directement
-            # Prendre en compte l'état (entrer/sortir) et la différence de quantité
-            # Ajouter un flag pour empêcher la mise à jour automatique du stock
-            request.session['modification_en_cours'] = True
-            with transaction.atomic():
-                # 1) Récupérer les anciennes lignes et créer un dictionnaire
-                lignes_existantes = LigneFactureTransfert.objects.select_related('article').filter(facture_transfert=facture)
-                anciennes_quantites = {}
-                for ligne in lignes_existantes:
-                    if ligne.article:
-                        anciennes_quantites[ligne.article.id] = Decimal(str(ligne.quantite))
-                
-                # 2) Supprimer toutes les anciennes lignes
-                LigneFactureTransfert.objects.filter(facture_transfert=facture).delete()
-                
-                # 3) Mettre à jour la facture de transfert
-                facture.numero_compte = numero_compte
-                facture.date_transfert = date_transfert
-                facture.reference_transfert = reference_transfert
-                facture.lieu_depart = lieu_depart
-                facture.lieu_arrivee = lieu_arrivee
-                facture.statut = statut
-                facture.etat = etat
-                
-                total_quantite = Decimal('0')
-                
-                # 4) Traiter les nouvelles lignes avec la logique de différence
-                for article_data in articles_payload:
-                    article_id = article_data.get('id')
-                    quantite_nouvelle = Decimal(str(article_data.get('quantite', 0)))
-                    prix_achat_ligne = Decimal(str(article_data.get('prix_achat', 0)))
-                    
-                    if not article_id or quantite_nouvelle <= 0:
-                        continue
-                    
-                    try:
-                        article = Article.objects.get(id=article_id)
-                        article.refresh_from_db()
-                    except Article.DoesNotExist:
-                        messages.error(request, f"Article introuvable (ID: {article_id}).")
-                        raise
-                    
-                    # Vérifier le stock si c'est une sortie
-                    if etat_normalise == 'sortir' and article.stock_actuel < quantite_nouvelle:
-                        messages.error(request, f"Stock insuffisant pour l'article {article.designation}.")
-                        raise ValueError("Stock insuffisant")
-                    
-                    # Créer la nouvelle ligne
-                    LigneFactureTransfert.objects.create(
-                        facture_transfert=facture,
-                        article=article,
-                        quantite=int(quantite_nouvelle),
-                        prix_unitaire=prix_achat_ligne,
-                        valeur_totale=quantite_nouvelle * prix_achat_ligne
-                    )
-                    
-                    # Stock AVANT modification
-                    # IMPORTANT : Le stock actuel contient déjà l'ancienne quantité de la facture
-                    stock_avant_modification = article.stock_actuel
-                    
-                    # Quantité de l'ancienne facture
-                    quantite_ancienne = anciennes_quantites.get(article_id, Decimal('0'))
-                    
-                    # Calcul de la différence entre nouvelle et ancienne quantité
-                    difference = quantite_nouvelle - quantite_ancienne
-                    
-                    # LOGIQUE SIMPLIFIÉE (comme facture achat) : Calculer le stock final avec la différence
-                    # Le stock actuel contient déjà l'effet de l'ancienne facture
-                    # Pour modifier selon l'état :
-                    # - Si état = "entrer" : stock_final = stock_actuel + différence (comme facture achat)
-                    # - Si état = "sortir" : stock_final = stock_actuel - différence
-                    # 
-                    # Si l'état a changé, il faut d'abord annuler l'ancien effet puis appliquer le nouveau
-                    etat_a_change = (ancien_etat_normalise != etat_normalise)
-                    
-                    if etat_a_change:
-                        # L'état a changé : annuler l'ancien effet puis appliquer le nouveau
-                        if ancien_etat_normalise == 'entrer':
-                            # Annuler l'entrée : soustraire l'ancienne quantité
-                            stock_apres_annulation = stock_avant_modification - quantite_ancienne
-                        else:  # ancien = 'sortir'
-                            # Annuler la sortie : ajouter l'ancienne quantité
-                            stock_apres_annulation = stock_avant_modification + quantite_ancienne
-                        
-                        # Appliquer le nouvel effet
-                        if etat_normalise == 'entrer':
-                            stock_final = stock_apres_annulation + quantite_nouvelle
-                        else:  # nouveau = 'sortir'
-                            stock_final = max(Decimal('0'), stock_apres_annulation - quantite_nouvelle)
-                    else:
-                        # L'état n'a pas changé : utiliser directement la différence
-                        if etat_normalise == 'entrer':
-                            # État "entrer" : augmente le stock (comme facture achat)
-                            stock_final = stock_avant_modification + difference
-                        else:  # 'sortir'
-                            # État "sortir" : diminue le stock
-                            stock_final = max(Decimal('0'), stock_avant_modification - difference)
-                    
-                    # S'assurer que le stock ne devient pas négatif
-                    if stock_final < 0:
-                        messages.error(request, f'Stock insuffisant pour l\'article {article.designation}. Stock actuel: {stock_avant_modification}, différence: {difference}')
-                        raise ValueError(f"Stock insuffisant: {stock_avant_modification} + {difference} = {stock_final} < 0")
-                    
-                    # Mettre à jour le stock avec le stock final calculé
-                    article.stock_actuel = stock_final
-                    article.save()
-                    
-                    # Déterminer le type de mouvement et le commentaire selon la différence
-                    if etat_normalise == 'entrer':
-                        # État "entrer" : augmente le stock
-                        if difference > 0:
-                            type_mouvement = 'entree'
-                            quantite_mouvement = difference
-                            commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - augmentation: {quantite_ancienne} → {quantite_nouvelle}, +{difference})"
-                        elif difference < 0:
-                            type_mouvement = 'sortie'
-                            quantite_mouvement = abs(difference)
-                            commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - diminution: {quantite_ancienne} → {quantite_nouvelle}, -{abs(difference)})"
-                        else:
-                            type_mouvement = None
-                            quantite_mouvement = Decimal('0')
-                            commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - quantité inchangée: {quantite_nouvelle})"
-                    else:
-                        # État "sortir" : diminue le stock
-                        if difference > 0:
-                            type_mouvement = 'sortie'
-                            quantite_mouvement = difference
-                            commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - augmentation: {quantite_ancienne} → {quantite_nouvelle}, -{difference})"
-                        elif difference < 0:
-                            type_mouvement = 'entree'
-                            quantite_mouvement = abs(difference)
-                            commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - diminution: {quantite_ancienne} → {quantite_nouvelle}, +{abs(difference)})"
-                        else:
-                            type_mouvement = None
-                            quantite_mouvement = Decimal('0')
-                            commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - quantité inchangée: {quantite_nouvelle})"
-                    
-                    article.dernier_prix_achat = prix_achat_ligne
-                    # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                    article.suivi_stock = True
-                    
-                    total_quantite += quantite_nouvelle
-                    
-                    # Créer un mouvement de stock pour refléter le changement
-                    if quantite_mouvement > 0 and type_mouvement:
-                        try:
-                            MouvementStock.objects.create(
-                                article=article,
-                                agence=agence,
-                                type_mouvement=type_mouvement,
-                                date_mouvement=timezone.now(),
-                                numero_piece=facture.reference_transfert,
-                                quantite_stock=article.stock_actuel,
-                                stock_initial=stock_avant_modification,
-                                solde=article.stock_actuel,
-                                quantite=quantite_mouvement,
-                                cout_moyen_pondere=float(article.prix_achat),
-                                stock_permanent=float(article.stock_actuel * article.prix_achat),
-                                facture_transfert=facture,
-                                commentaire=commentaire
-                            )
-                        except Exception as e:
-                            print(f"[WARNING] ERREUR MOUVEMENT STOCK TRANSFERT MODIFICATION: {e}")
-                
-                facture.quantite = int(total_quantite)
-                facture.save()
-            
-            # Retirer le flag de modification en cours
-            request.session.pop('modification_en_cours', None)
-            
-            messages.success(request, f'Facture de transfert "{reference_transfert}" modifiée avec succès!')
-            return redirect('consulter_factures_transfert')
-            
-        except Exception as e:
-            # Retirer le flag en cas d'erreur
-            request.session.pop('modification_en_cours', None)
-            messages.error(request, f'Erreur lors de la modification de la facture: {str(e)}')
-            return redirect('modifier_facture_transfert', facture_id=facture_id)
-    
-    # GET - Afficher le formulaire pré-rempli
-    statut_choices = FactureTransfert.STATUT_CHOICES
-    lignes = LigneFactureTransfert.objects.select_related('article').filter(facture_transfert=facture)
-    
-    initial_articles = []
-    for ligne in lignes:
-        if ligne.article:
-            initial_articles.append({
-                'id': ligne.article.id,
-                'designation': ligne.article.designation,
-                'reference_article': ligne.article.reference_article,
-                'stock_actuel': float(ligne.article.stock_actuel),
-                'prix_achat': float(ligne.prix_unitaire),
-                'quantite': ligne.quantite
-            })
-    
-    etat_actuel = (facture.etat or 'sortir').strip().lower()
-    if etat_actuel == 'sortie':
-        etat_actuel = 'sortir'
-    
-    context = {
-        'facture': facture,
-        'statut_choices': statut_choices,
-        'initial_articles_json': json.dumps(initial_articles),
-        'etat_actuel': etat_actuel,
-    }
-    return render(request, 'supermarket/stock/modifier_facture_transfert.html', context)
-
-@login_required
-def supprimer_facture_transfert(request, facture_id):
-    """Vue pour supprimer une facture de transfert"""
-    if request.method != 'POST':
-        messages.error(request, 'Méthode non autorisée.')
-        return redirect('consulter_factures_transfert')
-    
-    try:
-        agence = get_user_agence(request)
-        facture = FactureTransfert.objects.select_related('agence_source').get(id=facture_id, agence_source=agence)
-        facture_name = facture.reference_transfert
-        etat_normalise = (facture.etat or 'sortir').strip().lower()
-        
-        with transaction.atomic():
-            # NE PLUS SUPPRIMER LES MOUVEMENTS - Créer des mouvements de correction à la place
-            lignes = LigneFactureTransfert.objects.select_related('article').filter(facture_transfert=facture)
-            
-            for ligne in lignes:
-                article = ligne.article
-                if not article:
-                    continue
-                
-                quantite = Decimal(str(ligne.quantite))
-                ancien_stock = article.stock_actuel
-                
-                if etat_normalise == 'entrer':
-                    # La facture avait augmenté le stock, on revient en arrière
-                    article.stock_actuel = max(Decimal('0'), article.stock_actuel - quantite)
-                    commentaire = f"Correction - Suppression facture transfert {facture.reference_transfert} - retrait stock"
-                else:
-                    # La facture avait diminué le stock, on le restaure
-                    article.stock_actuel += quantite
-                    commentaire = f"Correction - Suppression facture transfert {facture.reference_transfert} - restauration stock"
-                
-                # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                article.suivi_stock = True
-                article.save()
-                
-                # Créer un mouvement de correction (les mouvements originaux sont conservés pour traçabilité)
-                try:
-                    MouvementStock.objects.create(
-                        article=article,
-                        agence=agence,
-                        type_mouvement='ajustement',
-                        date_mouvement=timezone.now(),
-                        numero_piece=f"SUPP-{facture.reference_transfert}",
-                        quantite_stock=article.stock_actuel,
-                        stock_initial=ancien_stock,
-                        solde=article.stock_actuel,
-                        quantite=quantite,
-                        cout_moyen_pondere=float(article.prix_achat),
-                        stock_permanent=float(article.stock_actuel * article.prix_achat),
-                        commentaire=commentaire,
-                        facture_transfert=facture
-                    )
-                except Exception as mouvement_error:
-                    print(f"[WARNING] Erreur enregistrement mouvement correction suppression transfert: {mouvement_error}")
-            
-            facture.delete()
-        
-        messages.success(request, f'Facture de transfert "{facture_name}" supprimée avec succès!')
-    except FactureTransfert.DoesNotExist:
-        messages.error(request, 'Facture de transfert non trouvée.')
-    except Exception as e:
-        messages.error(request, f'Erreur lors de la suppression: {str(e)}')
-    
-    return redirect('consulter_factures_transfert')
-# ===== RECHERCHE D'ARTICLES POUR STOCK =====
-
-@login_required
-@require_stock_access
-def search_articles_stock(request):
-    """Vue pour la recherche d'articles dans le module de stock"""
-    search_term = request.GET.get('q', '')
-    
-    print(f"[SEARCH] search_articles_stock: recherche pour '{search_term}'")
-    
-    # Vérifier d'abord s'il y a des articles dans la base de données
-    total_articles = Article.objects.count()
-    print(f"[CHART] Total articles dans la base de données: {total_articles}")
-    
-    if total_articles == 0:
-        print("[ERREUR] Aucun article dans la base de données!")
-        return JsonResponse({'articles': []})
-    
-    agence = get_user_agence(request)
-    print(f"[BUILDING] Agence trouvée: {agence}")
-    print(f"[BUILDING] ID de l'agence: {agence.id_agence if agence else 'None'}")
-    print(f"[BUILDING] Nom de l'agence: {agence.nom_agence if agence else 'None'}")
-    
-    if not agence:
-        print("[ERREUR] Aucune agence trouvée")
-        return JsonResponse({'articles': []})
-    
-    # Test: afficher tous les articles sans filtre d'agence
-    articles_all = Article.objects.all()
-    print(f"[PACKAGE] Tous les articles (toutes agences): {articles_all.count()}")
-    for article in articles_all[:5]:  # Afficher les 5 premiers
-        print(f"  - {article.designation} (Agence: {article.agence.nom_agence if article.agence else 'None'})")
-    
-    # Test: afficher les articles de cette agence spécifique
-    articles_agence = Article.objects.filter(agence=agence)
-    print(f"[PACKAGE] Articles de l'agence {agence.nom_agence}: {articles_agence.count()}")
-    for article in articles_agence[:5]:  # Afficher les 5 premiers
-        print(f"  - {article.reference_article} - {article.designation} (ID: {article.id})")
-    
-    articles = []
-    
-    if search_term and len(search_term) >= 1:
-        # Recherche avec filtre d'agence : recherche dans designation ET reference_article
-        from django.db.models import Q
-        articles = Article.objects.filter(
-            agence=agence
-        ).filter(
-            Q(designation__icontains=search_term) | Q(reference_article__icontains=search_term)
-        ).order_by('designation')[:50]
-        print(f"[SEARCH] Articles trouvés avec recherche '{search_term}' (agence {agence.nom_agence}): {articles.count()}")
-        for article in articles[:10]:  # Afficher les 10 premiers résultats
-            print(f"  - {article.reference_article} - {article.designation} (ID: {article.id})")
-    else:
-        # Afficher tous les articles de l'agence si pas de terme de recherche
-        articles = Article.objects.filter(agence=agence).order_by('designation')[:50]
-        print(f"[PACKAGE] Tous les articles de l'agence {agence.nom_agence}: {articles.count()}")
-    
-    # Convertir les articles en format JSON
-    articles_data = []
-    for article in articles:
-        articles_data.append({
-            'id': article.id,
-            'designation': article.designation,
-            'prix_achat': float(article.prix_achat) if article.prix_achat else 0.0,
-            'stock': float(article.stock_actuel) if article.stock_actuel else 0.0,
-            'reference_article': article.reference_article or '',
-        })
-        print(f"[NOTE] Article ajouté: {article.reference_article} - {article.designation} (ID: {article.id}, Agence: {article.agence.nom_agence})")
-    
-    print(f"[CHART] Total articles_data: {len(articles_data)}")
-    return JsonResponse({'articles': articles_data})
-
-def create_test_articles(request):
-    """Vue temporaire pour créer des articles de test"""
-    agence = get_user_agence(request)
-    if not agence:
-        return JsonResponse({'error': 'Aucune agence trouvée'})
-    
-    # Créer quelques articles de test
-    test_articles = [
-        {'designation': 'Ordinateur Portable', 'prix_achat': 500000, 'prix_vente': 600000, 'stock_actuel': 10},
-        {'designation': 'Souris USB', 'prix_achat': 5000, 'prix_vente': 7500, 'stock_actuel': 50},
-        {'designation': 'Clavier Mécanique', 'prix_achat': 15000, 'prix_vente': 20000, 'stock_actuel': 25},
-        {'designation': 'Écran 24 pouces', 'prix_achat': 80000, 'prix_vente': 100000, 'stock_actuel': 15},
-        {'designation': 'Casque Audio', 'prix_achat': 25000, 'prix_vente': 35000, 'stock_actuel': 30},
-    ]
-    
-    created_articles = []
-    for article_data in test_articles:
-        article, created = Article.objects.get_or_create(
-            designation=article_data['designation'],
-            agence=agence,
-            defaults=article_data
-        )
-        if created:
-            created_articles.append(article.designation)
-    
-    return JsonResponse({
-        'message': f'Articles créés: {len(created_articles)}',
-        'articles': created_articles
-    })
-
-# ==================== INVENTAIRE DE STOCK ====================
-
-@login_required
-@require_stock_access
-def inventaire_stock(request):
-    """Vue pour la page d'inventaire de stock"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        messages.error(request, 'Agence non trouvée.')
-        return redirect('login_stock')
-    
-    # Récupérer les articles de l'agence
-    articles = Article.objects.filter(agence=agence).order_by('designation')
-    
-    # Récupérer les familles pour le filtre
-    familles = Famille.objects.all()
-    
-    # Statistiques du stock
-    total_articles = articles.count()
-    total_quantite = articles.aggregate(total=Sum('stock_actuel'))['total'] or 0
-    valeur_totale_stock = articles.aggregate(
-        total=Sum(F('stock_actuel') * F('prix_achat'))
-    )['total'] or 0
-    
-    context = {
-        'agence': agence,
-        'articles': articles,
-        'familles': familles,
-        'total_articles': total_articles,
-        'total_quantite': total_quantite,
-        'valeur_totale_stock': valeur_totale_stock,
-    }
-    
-    return render(request, 'supermarket/stock/inventaire_stock.html', context)
-
-@login_required
-def generer_inventaire(request):
-    """Vue pour générer l'inventaire selon les critères sélectionnés"""
-    if request.method != 'POST':
-        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
-    
-    try:
-        agence = get_user_agence(request)
-    except:
-        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
-    
-    try:
-        # Récupérer les paramètres
-        date_debut = request.POST.get('date_debut')
-        date_fin = request.POST.get('date_fin')
-        famille_id = request.POST.get('famille')
-        selection_articles = request.POST.get('selection_articles', 'tous')  # 'tous' ou 'selectionnes'
-        articles_selectionnes = request.POST.getlist('articles_selectionnes[]')
-        
-        print(f"[SEARCH] PARAMÈTRES INVENTAIRE:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Famille: {famille_id}")
-        print(f"  - Sélection: {selection_articles}")
-        print(f"  - Articles sélectionnés: {articles_selectionnes}")
-        
-        # Filtrer les articles selon les critères
-        articles_query = Article.objects.filter(agence=agence)
-        
-        # Filtre par famille
-        if famille_id and famille_id != '':
-            articles_query = articles_query.filter(categorie_id=famille_id)
-        
-        # Filtre par sélection d'articles
-        if selection_articles == 'selectionnes' and articles_selectionnes:
-            articles_query = articles_query.filter(id__in=articles_selectionnes)
-        
-        articles = articles_query.order_by('designation')
-        
-        print(f"[PACKAGE] ARTICLES FILTRÉS: {articles.count()}")
-        
-        # Créer l'inventaire
-        numero_inventaire = f"INV-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
-        
-        # Récupérer l'employé responsable
-        employe = Employe.objects.filter(compte__agence=agence).first()
-        
-        inventaire = InventaireStock.objects.create(
-            numero_inventaire=numero_inventaire,
-            date_debut=timezone.now(),
-            statut='en_cours',
-            agence=agence,
-            responsable=employe,
-            commentaire=f"Inventaire généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}"
-        )
-        
-        # Créer les lignes d'inventaire
-        total_quantite = 0
-        total_valeur = 0
-        
-        for article in articles:
-            valeur = float(article.stock_actuel) * float(article.prix_achat)
-            
-            LigneInventaireStock.objects.create(
-                inventaire=inventaire,
-                reference_article=article.reference_article,
-                designation=article.designation,
-                quantite_stock=article.stock_actuel,
-                prix_unitaire=article.prix_achat,
-                valeur=valeur,
-                conditionnement=article.conditionnement,
-                article=article
-            )
-            
-            total_quantite += article.stock_actuel
-            total_valeur += valeur
-        
-        # Marquer l'inventaire comme terminé
-        inventaire.date_fin = timezone.now()
-        inventaire.statut = 'termine'
-        inventaire.save()
-        
-        print(f"[OK] INVENTAIRE CRÉÉ: {numero_inventaire}")
-        print(f"[CHART] TOTAUX: {total_quantite} articles, {total_valeur} FCFA")
-        
-        return JsonResponse({
-            'success': True,
-            'inventaire_id': inventaire.id,
-            'numero_inventaire': numero_inventaire,
-            'total_articles': articles.count(),
-            'total_quantite': total_quantite,
-            'total_valeur': total_valeur
-        })
-        
-    except Exception as e:
-        print(f"[ERREUR] ERREUR GÉNÉRATION INVENTAIRE: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)})
-
-@login_required
-def export_inventaire_excel(request):
-    """Vue pour exporter l'inventaire en format Excel"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
-    
-    try:
-        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
-        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
-        
-        if not inventaire_id:
-            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
-        
-        # Récupérer l'inventaire
-        try:
-            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
-        except InventaireStock.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
-        
-        # Récupérer les lignes d'inventaire
-        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
-        
-        # Créer le fichier Excel
-        try:
-            import openpyxl
-            from openpyxl.styles import Font, Alignment, PatternFill
-        except ImportError:
-            print("[ERREUR] Module openpyxl non disponible, utilisation du format CSV")
-            return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
-        
-        from django.http import HttpResponse
-        
-        # Créer un nouveau classeur
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = f"Inventaire {inventaire.numero_inventaire}"
-        
-        # Style du titre
-        title_font = Font(bold=True, size=16)
-        title_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Écrire le titre "Inventaire" avec la date du jour
-        date_du_jour = timezone.now().strftime('%d/%m/%Y')
-        title_cell = ws.cell(row=1, column=1, value=f"Inventaire - {date_du_jour}")
-        title_cell.font = title_font
-        title_cell.alignment = title_alignment
-        
-        # Fusionner les cellules pour le titre (sur toutes les colonnes)
-        from openpyxl.utils import get_column_letter
-        ws.merge_cells(f'A1:{get_column_letter(6)}1')
-        
-        # Ligne vide
-        ws.row_dimensions[2].height = 5
-        
-        # En-têtes
-        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité en Stock', 'Prix Unitaire (FCFA)', 'Valeur Totale (FCFA)']
-        
-        # Style des en-têtes
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Écrire les en-têtes (décalés à la ligne 3)
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Écrire les données (décalées à partir de la ligne 4)
-        total_quantite = 0
-        total_valeur = 0
-        
-        for idx, ligne in enumerate(lignes):
-            row_num = 4 + idx  # Commencer à la ligne 4 (après titre ligne 1, ligne vide ligne 2, en-têtes ligne 3)
-            ws.cell(row=row_num, column=1, value=ligne.reference_article)
-            ws.cell(row=row_num, column=2, value=ligne.designation)
-            ws.cell(row=row_num, column=3, value=ligne.conditionnement)
-            ws.cell(row=row_num, column=4, value=ligne.quantite_stock)
-            ws.cell(row=row_num, column=5, value=float(ligne.prix_unitaire))
-            ws.cell(row=row_num, column=6, value=float(ligne.valeur))
-            
-            total_quantite += ligne.quantite_stock
-            total_valeur += float(ligne.valeur)
-        
-        # Ligne des totaux (décalée de 2 lignes supplémentaires)
-        total_row = 4 + len(lignes) + 2  # Ligne de données + 1 ligne vide + ligne totaux
-        ws.cell(row=total_row, column=3, value="TOTAL GÉNÉRAL:").font = Font(bold=True)
-        ws.cell(row=total_row, column=4, value=total_quantite).font = Font(bold=True)
-        ws.cell(row=total_row, column=6, value=total_valeur).font = Font(bold=True)
-        
-        # Ajuster la largeur des colonnes
-        column_widths = [15, 40, 15, 15, 18, 18]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
-        
-        # Créer la réponse HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Sauvegarder le classeur dans la réponse
-        wb.save(response)
-        
-        print(f"[CHART] EXPORT EXCEL - Inventaire {inventaire.numero_inventaire}")
-        print(f"[CHART] EXPORT EXCEL - {len(lignes)} articles exportés")
-        print(f"[CHART] EXPORT EXCEL - Total: {total_quantite} articles, {total_valeur} FCFA")
-        
-        return response
-        
-    except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)})
-
-@login_required
-def export_inventaire_pdf(request):
-    """Vue pour exporter l'inventaire en format PDF"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
-    
-    try:
-        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
-        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
-        
-        if not inventaire_id:
-            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
-        
-        # Récupérer l'inventaire
-        try:
-            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
-        except InventaireStock.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
-        
-        # Récupérer les lignes d'inventaire
-        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
-        
-        # Créer le PDF
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib import colors
-            from reportlab.lib.units import cm
-        except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
-            return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
-        
-        from django.http import HttpResponse
-        
-        # Créer la réponse HTTP
-        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Créer le document PDF
-        doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm)
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1  # Centre
-        )
-        
-        # Titre
-        title = Paragraph(f"INVENTAIRE DE STOCK - {inventaire.numero_inventaire}", title_style)
-        elements.append(title)
-        
-        # Informations de l'inventaire
-        info_data = [
-            ['Date de génération:', inventaire.date_debut.strftime('%d/%m/%Y à %H:%M')],
-            ['Agence:', agence.nom_agence],
-            ['Responsable:', inventaire.responsable.compte.nom_complet if inventaire.responsable else 'Non spécifié'],
-        ]
-        
-        info_table = Table(info_data, colWidths=[4*cm, 8*cm])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ]))
-        
-        elements.append(info_table)
-        elements.append(Spacer(1, 20))
-        
-        # Tableau des articles
-        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité', 'Prix Unitaire', 'Valeur']
-        
-        # Données du tableau
-        data = [headers]
-        total_quantite = 0
-        total_valeur = 0
-        
-        for ligne in lignes:
-            row = [
-                ligne.reference_article,
-                ligne.designation,
-                ligne.conditionnement,
-                str(ligne.quantite_stock),
-                f"{float(ligne.prix_unitaire):,.0f}",
-                f"{float(ligne.valeur):,.0f}"
-            ]
-            data.append(row)
-            total_quantite += ligne.quantite_stock
-            total_valeur += float(ligne.valeur)
-        
-        # Ligne des totaux
-        data.append(['', '', 'TOTAL GÉNÉRAL:', str(total_quantite), '', f"{total_valeur:,.0f}"])
-        
-        # Créer le tableau
-        table = Table(data, colWidths=[2*cm, 6*cm, 2.5*cm, 2*cm, 2.5*cm, 2.5*cm])
-        table.setStyle(TableStyle([
-            # En-têtes
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            
-            # Données
-            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-            ('FONTSIZE', (0, 1), (-1, -2), 9),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            
-            # Ligne des totaux
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 10),
-        ]))
-        
-        elements.append(table)
-        
-        # Construire le PDF
-        doc.build(elements)
-        
-        print(f"📄 EXPORT PDF - Inventaire {inventaire.numero_inventaire}")
-        print(f"📄 EXPORT PDF - {len(lignes)} articles exportés")
-        print(f"📄 EXPORT PDF - Total: {total_quantite} articles, {total_valeur} FCFA")
-        
-        return response
-        
-    except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)})
-
-@login_required
-def export_inventaire_csv(request):
-    """Vue pour exporter l'inventaire en format CSV (alternative si Excel n'est pas disponible)"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
-    
-    try:
-        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
-        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
-        
-        if not inventaire_id:
-            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
-        
-        # Récupérer l'inventaire
-        try:
-            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
-        except InventaireStock.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
-        
-        # Récupérer les lignes d'inventaire
-        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
-        
-        # Créer le fichier CSV
-        import csv
-        from django.http import HttpResponse
-        
-        # Créer la réponse HTTP
-        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Ajouter BOM pour Excel (UTF-8)
-        response.write('\ufeff')
-        
-        # Créer le writer CSV
-        writer = csv.writer(response, delimiter=';')
-        
-        # En-têtes
-        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité en Stock', 'Prix Unitaire (FCFA)', 'Valeur Totale (FCFA)']
-        writer.writerow(headers)
-        
-        # Données
-        total_quantite = 0
-        total_valeur = 0
-        
-        for ligne in lignes:
-            row = [
-                ligne.reference_article,
-                ligne.designation,
-                ligne.conditionnement,
-                ligne.quantite_stock,
-                float(ligne.prix_unitaire),
-                float(ligne.valeur)
-            ]
-            writer.writerow(row)
-            total_quantite += ligne.quantite_stock
-            total_valeur += float(ligne.valeur)
-        
-        # Ligne des totaux
-        writer.writerow([])  # Ligne vide
-        writer.writerow(['', '', 'TOTAL GÉNÉRAL:', total_quantite, '', total_valeur])
-        
-        print(f"[CHART] EXPORT CSV - Inventaire {inventaire.numero_inventaire}")
-        print(f"[CHART] EXPORT CSV - {len(lignes)} articles exportés")
-        print(f"[CHART] EXPORT CSV - Total: {total_quantite} articles, {total_valeur} FCFA")
-        
-        return response
-        
-    except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)})
-
-# ==================== STATISTIQUES DE VENTE ====================
-
-@login_required
-def statistiques_vente(request):
-    """Vue pour la page des statistiques de vente"""
+@require_stock_access
+def inventaire_stock(request):
+    """Vue pour la page d'inventaire de stock"""
     try:
         agence = get_user_agence(request)
     except:
@@ -12619,233 +10725,153 @@ def statistiques_vente(request):
     # Récupérer les familles pour le filtre
     familles = Famille.objects.all()
     
-    # Statistiques générales
+    # Statistiques du stock
     total_articles = articles.count()
-    
-    # Calculer les statistiques de vente des 30 derniers jours
-    date_debut = timezone.now().date() - timezone.timedelta(days=30)
-    
-    # Récupérer les ventes des 30 derniers jours
-    ventes_recentes = LigneFactureVente.objects.filter(
-        facture_vente__agence=agence,
-        facture_vente__date__gte=date_debut
-    ).select_related('article', 'facture_vente')
-    
-    # Calculer le chiffre d'affaires total
-    chiffre_affaires_total = float(ventes_recentes.aggregate(
-        total=Sum(F('quantite') * F('prix_unitaire'))
-    )['total'] or 0)
-    
-    # Calculer la marge totale
-    marge_totale = Decimal('0')
-    for vente in ventes_recentes:
-        prix_achat = Decimal(str(vente.article.prix_achat))
-        prix_vente = Decimal(str(vente.prix_unitaire))
-        marge_unitaire = prix_vente - prix_achat
-        marge_totale += marge_unitaire * Decimal(str(vente.quantite))
+    total_quantite = articles.aggregate(total=Sum('stock_actuel'))['total'] or 0
+    valeur_totale_stock = articles.aggregate(
+        total=Sum(F('stock_actuel') * F('prix_achat'))
+    )['total'] or 0
     
     context = {
         'agence': agence,
         'articles': articles,
         'familles': familles,
         'total_articles': total_articles,
-        'chiffre_affaires_total': chiffre_affaires_total,
-        'marge_totale': float(marge_totale),
-        'pourcentage_marge_global': (float(marge_totale) / float(chiffre_affaires_total) * 100) if chiffre_affaires_total > 0 else 0,
+        'total_quantite': total_quantite,
+        'valeur_totale_stock': valeur_totale_stock,
     }
     
-    return render(request, 'supermarket/stock/statistiques_vente.html', context)
+    return render(request, 'supermarket/stock/inventaire_stock.html', context)
 
 @login_required
-def generer_statistiques_vente(request):
-    """Vue pour générer les statistiques de vente selon les critères sélectionnés"""
-    print("[START] DÉBUT GENERER_STATISTIQUES_VENTE")
-    
+def generer_inventaire(request):
+    """Vue pour générer l'inventaire selon les critères sélectionnés"""
     if request.method != 'POST':
-        print("[ERREUR] Méthode non POST")
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
     
     try:
         agence = get_user_agence(request)
-        print(f"[SEARCH] Agence récupérée: {agence}")
-    except Exception as e:
-        print(f"[ERREUR] Erreur get_user_agence: {e}")
-        return JsonResponse({'success': False, 'error': f'Agence non trouvée: {str(e)}'})
+    except:
+        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[SEARCH] Début du traitement des paramètres")
         # Récupérer les paramètres
         date_debut = request.POST.get('date_debut')
         date_fin = request.POST.get('date_fin')
         famille_id = request.POST.get('famille')
-        selection_articles = request.POST.get('selection_articles', 'tous')
+        selection_articles = request.POST.get('selection_articles', 'tous')  # 'tous' ou 'selectionnes'
         articles_selectionnes = request.POST.getlist('articles_selectionnes[]')
         
-        # Vérification des paramètres obligatoires
-        if not date_debut or not date_fin:
-            return JsonResponse({'success': False, 'error': 'Les dates de début et de fin sont obligatoires'})
-        
-        print(f"[CHART] PARAMÈTRES STATISTIQUES:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Famille: {famille_id}")
-        print(f"  - Sélection: {selection_articles}")
-        print(f"  - Articles sélectionnés: {articles_selectionnes}")
-        
-        # Convertir les dates
-        try:
-            from datetime import datetime
-            date_debut_obj = datetime.strptime(date_debut, '%Y-%m-%d').date()
-            date_fin_obj = datetime.strptime(date_fin, '%Y-%m-%d').date()
-        except ValueError as e:
-            return JsonResponse({'success': False, 'error': f'Format de date invalide: {str(e)}'})
+        logger.debug("[SEARCH] PARAMÈTRES INVENTAIRE:")
+        logger.debug("  - Date début: %s", date_debut)
+        logger.debug("  - Date fin: %s", date_fin)
+        logger.debug("  - Famille: %s", famille_id)
+        logger.debug("  - Sélection: %s", selection_articles)
+        logger.debug("  - Articles sélectionnés: %s", articles_selectionnes)
         
         # Filtrer les articles selon les critères
-        print(f"[SEARCH] Filtrage des articles pour agence: {agence}")
         articles_query = Article.objects.filter(agence=agence)
-        print(f"[SEARCH] Articles de base: {articles_query.count()}")
         
         # Filtre par famille
         if famille_id and famille_id != '':
-            print(f"[SEARCH] Filtrage par famille: {famille_id}")
             articles_query = articles_query.filter(categorie_id=famille_id)
-            print(f"[SEARCH] Articles après filtre famille: {articles_query.count()}")
         
         # Filtre par sélection d'articles
         if selection_articles == 'selectionnes' and articles_selectionnes:
-            print(f"[SEARCH] Filtrage par sélection: {articles_selectionnes}")
             articles_query = articles_query.filter(id__in=articles_selectionnes)
-            print(f"[SEARCH] Articles après filtre sélection: {articles_query.count()}")
         
         articles = articles_query.order_by('designation')
-        print(f"[PACKAGE] ARTICLES FILTRÉS: {articles.count()}")
         
-        # Récupérer les ventes pour la période
-        ventes = LigneFactureVente.objects.filter(
-            facture_vente__agence=agence,
-            facture_vente__date__gte=date_debut_obj,
-            facture_vente__date__lte=date_fin_obj,
-            article__in=articles
-        ).select_related('article', 'facture_vente')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] ARTICLES FILTRÉS: %s", articles.count())
         
-        # Calculer les statistiques par article
-        statistiques_articles = []
-        chiffre_affaires_total = 0.0
-        marge_totale = 0.0
-        quantite_totale_vendue = 0.0
+        # Créer l'inventaire
+        numero_inventaire = f"INV-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
+        
+        # Récupérer l'employé responsable
+        employe = Employe.objects.filter(compte__agence=agence).first()
+        
+        inventaire = InventaireStock.objects.create(
+            numero_inventaire=numero_inventaire,
+            date_debut=timezone.now(),
+            statut='en_cours',
+            agence=agence,
+            responsable=employe,
+            commentaire=f"Inventaire généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}"
+        )
+        
+        # Créer les lignes d'inventaire
+        total_quantite = 0
+        total_valeur = 0
         
         for article in articles:
-            # Récupérer les ventes de cet article
-            ventes_article = ventes.filter(article=article)
+            valeur = float(article.stock_actuel) * float(article.prix_achat)
             
-            # Calculer les totaux pour cet article
-            quantite_vendue = float(ventes_article.aggregate(total=Sum('quantite'))['total'] or 0)
-            chiffre_affaires_article = float(ventes_article.aggregate(
-                total=Sum(F('quantite') * F('prix_unitaire'))
-            )['total'] or 0)
-            
-            # Calculer la marge
-            prix_achat = Decimal(str(article.prix_achat))
-            marge_unitaire = Decimal('0')
-            marge_article = Decimal('0')
-            
-            if quantite_vendue > 0:
-                prix_vente_moyen = Decimal(str(chiffre_affaires_article)) / Decimal(str(quantite_vendue))
-                marge_unitaire = prix_vente_moyen - prix_achat
-                marge_article = marge_unitaire * Decimal(str(quantite_vendue))
-            
-            # Calculer le pourcentage de marge
-            if chiffre_affaires_article > 0:
-                pourcentage_marge = (marge_article / Decimal(str(chiffre_affaires_article)) * Decimal('100'))
-            else:
-                pourcentage_marge = Decimal('0')
+            LigneInventaireStock.objects.create(
+                inventaire=inventaire,
+                reference_article=article.reference_article,
+                designation=article.designation,
+                quantite_stock=article.stock_actuel,
+                prix_unitaire=article.prix_achat,
+                valeur=valeur,
+                conditionnement=article.conditionnement,
+                article=article
+            )
             
-            if quantite_vendue > 0:  # Ne garder que les articles vendus
-                statistiques_articles.append({
-                    'reference_article': article.reference_article,
-                    'designation': article.designation,
-                    'quantite_vendue': float(quantite_vendue),
-                    'chiffre_affaires': float(chiffre_affaires_article),
-                    'marge_profit': float(marge_article),
-                    'pourcentage_marge': float(pourcentage_marge),
-                })
-                
-                chiffre_affaires_total += float(chiffre_affaires_article)
-                marge_totale += float(marge_article)
-                quantite_totale_vendue += float(quantite_vendue)
-        
-        # Calculer le pourcentage de marge global
-        if chiffre_affaires_total > 0:
-            pourcentage_marge_global = (marge_totale / float(chiffre_affaires_total) * 100)
-        else:
-            pourcentage_marge_global = 0
+            total_quantite += article.stock_actuel
+            total_valeur += valeur
         
-        print(f"[CHART] STATISTIQUES GÉNÉRÉES:")
-        print(f"  - Articles vendus: {len(statistiques_articles)}")
-        print(f"  - Quantité totale vendue: {quantite_totale_vendue}")
-        print(f"  - Chiffre d'affaires total: {chiffre_affaires_total}")
-        print(f"  - Marge totale: {marge_totale}")
-        print(f"  - Pourcentage marge global: {pourcentage_marge_global:.2f}%")
+        # Marquer l'inventaire comme terminé
+        inventaire.date_fin = timezone.now()
+        inventaire.statut = 'termine'
+        inventaire.save()
         
-        # Stocker les statistiques dans la session pour l'export (conversion en types sérialisables)
-        request.session['statistiques_vente'] = {
-            'date_debut': str(date_debut),
-            'date_fin': str(date_fin),
-            'statistiques_articles': statistiques_articles,  # Déjà converties en float
-            'chiffre_affaires_total': float(chiffre_affaires_total),
-            'marge_totale': float(marge_totale),
-            'quantite_totale_vendue': int(quantite_totale_vendue),
-            'pourcentage_marge_global': float(pourcentage_marge_global),
-        }
+        logger.debug("INVENTAIRE CRÉÉ: %s", numero_inventaire)
+        logger.debug("[CHART] TOTAUX: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return JsonResponse({
             'success': True,
-            'total_articles': len(statistiques_articles),
-            'quantite_totale_vendue': int(quantite_totale_vendue),
-            'chiffre_affaires_total': float(chiffre_affaires_total),
-            'marge_totale': float(marge_totale),
-            'pourcentage_marge_global': float(pourcentage_marge_global),
-            'statistiques_articles': statistiques_articles  # Ajouter les données détaillées
+            'inventaire_id': inventaire.id,
+            'numero_inventaire': numero_inventaire,
+            'total_articles': articles.count(),
+            'total_quantite': total_quantite,
+            'total_valeur': total_valeur
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR GÉNÉRATION STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
-        error_details = f"Erreur: {str(e)}"
-        if hasattr(e, '__class__'):
-            error_details += f" (Type: {e.__class__.__name__})"
-        return JsonResponse({'success': False, 'error': error_details})
+        logger.exception("ERREUR GÉNÉRATION INVENTAIRE: %s", e)
+        return JsonResponse({'success': False, 'error': str(e)})
+
 @login_required
-def export_statistiques_excel(request):
-    """Vue pour exporter les statistiques de vente en Excel"""
+def export_inventaire_excel(request):
+    """Vue pour exporter l'inventaire en format Excel"""
     try:
         agence = get_user_agence(request)
     except:
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
+        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
         
-        if not statistiques_data:
-            return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
+        if not inventaire_id:
+            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
         
-        # Récupérer les données
-        date_debut = statistiques_data['date_debut']
-        date_fin = statistiques_data['date_fin']
-        statistiques_articles = statistiques_data['statistiques_articles']
-        chiffre_affaires_total = statistiques_data['chiffre_affaires_total']
-        marge_totale = statistiques_data['marge_totale']
-        quantite_totale_vendue = statistiques_data['quantite_totale_vendue']
-        pourcentage_marge_global = statistiques_data['pourcentage_marge_global']
+        # Récupérer l'inventaire
+        try:
+            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
+        except InventaireStock.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
+        
+        # Récupérer les lignes d'inventaire
+        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
         
         # Créer le fichier Excel
         try:
             import openpyxl
             from openpyxl.styles import Font, Alignment, PatternFill
         except ImportError:
-            print("[ERREUR] Module openpyxl non disponible, utilisation du format CSV")
+            logger.error("Module openpyxl non disponible, utilisation du format CSV")
             return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
         
         from django.http import HttpResponse
@@ -12853,107 +10879,111 @@ def export_statistiques_excel(request):
         # Créer un nouveau classeur
         wb = openpyxl.Workbook()
         ws = wb.active
-        ws.title = f"Statistiques Vente {date_debut} - {date_fin}"
+        ws.title = f"Inventaire {inventaire.numero_inventaire}"
+        
+        # Style du titre
+        title_font = Font(bold=True, size=16)
+        title_alignment = Alignment(horizontal="center", vertical="center")
+        
+        # Écrire le titre "Inventaire" avec la date du jour
+        date_du_jour = timezone.now().strftime('%d/%m/%Y')
+        title_cell = ws.cell(row=1, column=1, value=f"Inventaire - {date_du_jour}")
+        title_cell.font = title_font
+        title_cell.alignment = title_alignment
+        
+        # Fusionner les cellules pour le titre (sur toutes les colonnes)
+        from openpyxl.utils import get_column_letter
+        ws.merge_cells(f'A1:{get_column_letter(6)}1')
+        
+        # Ligne vide
+        ws.row_dimensions[2].height = 5
+        
+        # En-têtes
+        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité en Stock', 'Prix Unitaire (FCFA)', 'Valeur Totale (FCFA)']
         
         # Style des en-têtes
         header_font = Font(bold=True, color="FFFFFF")
         header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
         header_alignment = Alignment(horizontal="center", vertical="center")
         
-        # En-tête du document
-        ws.merge_cells('A1:F1')
-        ws['A1'] = f"STATISTIQUES DE VENTE - {agence.nom_agence}"
-        ws['A1'].font = Font(bold=True, size=16)
-        ws['A1'].alignment = Alignment(horizontal="center")
-        
-        ws.merge_cells('A2:F2')
-        ws['A2'] = f"Période: du {date_debut} au {date_fin}"
-        ws['A2'].font = Font(size=12)
-        ws['A2'].alignment = Alignment(horizontal="center")
-        
-        # En-têtes des colonnes
-        headers = ['Référence', 'Désignation', 'Quantité Vendue', 'Chiffre d\'Affaires (FCFA)', 'Marge Profit (FCFA)', 'Pourcentage Marge (%)']
+        # Écrire les en-têtes (décalés à la ligne 3)
         for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col, value=header)
+            cell = ws.cell(row=3, column=col, value=header)
             cell.font = header_font
             cell.fill = header_fill
             cell.alignment = header_alignment
         
-        # Données
-        row = 5
-        for stat in statistiques_articles:
-            ws.cell(row=row, column=1, value=stat['reference_article'])
-            ws.cell(row=row, column=2, value=stat['designation'])
-            ws.cell(row=row, column=3, value=stat['quantite_vendue'])
-            ws.cell(row=row, column=4, value=float(stat['chiffre_affaires']))
-            ws.cell(row=row, column=5, value=float(stat['marge_profit']))
-            ws.cell(row=row, column=6, value=float(stat['pourcentage_marge']))
-            row += 1
+        # Écrire les données (décalées à partir de la ligne 4)
+        total_quantite = 0
+        total_valeur = 0
+        
+        for idx, ligne in enumerate(lignes):
+            row_num = 4 + idx  # Commencer à la ligne 4 (après titre ligne 1, ligne vide ligne 2, en-têtes ligne 3)
+            ws.cell(row=row_num, column=1, value=ligne.reference_article)
+            ws.cell(row=row_num, column=2, value=ligne.designation)
+            ws.cell(row=row_num, column=3, value=ligne.conditionnement)
+            ws.cell(row=row_num, column=4, value=ligne.quantite_stock)
+            ws.cell(row=row_num, column=5, value=float(ligne.prix_unitaire))
+            ws.cell(row=row_num, column=6, value=float(ligne.valeur))
+            
+            total_quantite += ligne.quantite_stock
+            total_valeur += float(ligne.valeur)
         
-        # Ligne des totaux
-        row += 1
-        ws.cell(row=row, column=1, value="TOTAL GÉNÉRAL").font = Font(bold=True)
-        ws.cell(row=row, column=2, value="").font = Font(bold=True)
-        ws.cell(row=row, column=3, value=quantite_totale_vendue).font = Font(bold=True)
-        ws.cell(row=row, column=4, value=float(chiffre_affaires_total)).font = Font(bold=True)
-        ws.cell(row=row, column=5, value=float(marge_totale)).font = Font(bold=True)
-        ws.cell(row=row, column=6, value=float(pourcentage_marge_global)).font = Font(bold=True)
+        # Ligne des totaux (décalée de 2 lignes supplémentaires)
+        total_row = 4 + len(lignes) + 2  # Ligne de données + 1 ligne vide + ligne totaux
+        ws.cell(row=total_row, column=3, value="TOTAL GÉNÉRAL:").font = Font(bold=True)
+        ws.cell(row=total_row, column=4, value=total_quantite).font = Font(bold=True)
+        ws.cell(row=total_row, column=6, value=total_valeur).font = Font(bold=True)
         
         # Ajuster la largeur des colonnes
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 40
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 20
-        ws.column_dimensions['E'].width = 20
-        ws.column_dimensions['F'].width = 18
+        column_widths = [15, 40, 15, 15, 18, 18]
+        for i, width in enumerate(column_widths, 1):
+            ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
         
         # Créer la réponse HTTP
-        filename = f"Statistiques_Vente_{date_debut}_{date_fin}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response = HttpResponse(
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
-        # Sauvegarder le fichier dans la réponse
-        from io import BytesIO
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        response.write(buffer.getvalue())
+        # Sauvegarder le classeur dans la réponse
+        wb.save(response)
         
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("[CHART] EXPORT EXCEL - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT EXCEL - %s articles exportés", len(lignes))
+        logger.debug("[CHART] EXPORT EXCEL - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT EXCEL: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
-def export_statistiques_pdf(request):
-    """Vue pour exporter les statistiques de vente en PDF"""
+def export_inventaire_pdf(request):
+    """Vue pour exporter l'inventaire en format PDF"""
     try:
         agence = get_user_agence(request)
     except:
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
+        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
         
-        if not statistiques_data:
-            return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
+        if not inventaire_id:
+            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
         
-        # Récupérer les données
-        date_debut = statistiques_data['date_debut']
-        date_fin = statistiques_data['date_fin']
-        statistiques_articles = statistiques_data['statistiques_articles']
-        chiffre_affaires_total = statistiques_data['chiffre_affaires_total']
-        marge_totale = statistiques_data['marge_totale']
-        quantite_totale_vendue = statistiques_data['quantite_totale_vendue']
-        pourcentage_marge_global = statistiques_data['pourcentage_marge_global']
+        # Récupérer l'inventaire
+        try:
+            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
+        except InventaireStock.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
+        
+        # Récupérer les lignes d'inventaire
+        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
         
         # Créer le PDF
         try:
@@ -12963,18 +10993,19 @@ def export_statistiques_pdf(request):
             from reportlab.lib import colors
             from reportlab.lib.units import cm
         except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
+            logger.error("Module reportlab non disponible")
             return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
         
         from django.http import HttpResponse
         
         # Créer la réponse HTTP
-        filename = f"Statistiques_Vente_{date_debut}_{date_fin}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
         # Créer le document PDF
-        doc = SimpleDocTemplate(response, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
+        doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm)
+        elements = []
         
         # Styles
         styles = getSampleStyleSheet()
@@ -12983,61 +11014,75 @@ def export_statistiques_pdf(request):
             parent=styles['Heading1'],
             fontSize=16,
             spaceAfter=30,
-            alignment=1,
-            textColor=colors.darkblue
+            alignment=1  # Centre
         )
         
-        # Éléments du document
-        elements = []
-        
         # Titre
-        title = Paragraph(f"STATISTIQUES DE VENTE - {agence.nom_agence}", title_style)
+        title = Paragraph(f"INVENTAIRE DE STOCK - {inventaire.numero_inventaire}", title_style)
         elements.append(title)
         
-        # Informations de la période
-        period_text = f"<b>Période:</b> du {date_debut} au {date_fin}"
-        period_para = Paragraph(period_text, styles['Normal'])
-        elements.append(period_para)
+        # Informations de l'inventaire
+        info_data = [
+            ['Date de génération:', inventaire.date_debut.strftime('%d/%m/%Y à %H:%M')],
+            ['Agence:', agence.nom_agence],
+            ['Responsable:', inventaire.responsable.compte.nom_complet if inventaire.responsable else 'Non spécifié'],
+        ]
+        
+        info_table = Table(info_data, colWidths=[4*cm, 8*cm])
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ]))
+        
+        elements.append(info_table)
         elements.append(Spacer(1, 20))
         
+        # Tableau des articles
+        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité', 'Prix Unitaire', 'Valeur']
+        
         # Données du tableau
-        data = [['Référence', 'Désignation', 'Qté Vendue', 'Chiffre d\'Affaires', 'Marge Profit', 'Marge %']]
+        data = [headers]
+        total_quantite = 0
+        total_valeur = 0
         
-        for stat in statistiques_articles:
-            data.append([
-                stat['reference_article'],
-                stat['designation'][:30] + '...' if len(stat['designation']) > 30 else stat['designation'],
-                str(stat['quantite_vendue']),
-                f"{float(stat['chiffre_affaires']):,.0f} FCFA",
-                f"{float(stat['marge_profit']):,.0f} FCFA",
-                f"{float(stat['pourcentage_marge']):.1f}%"
-            ])
+        for ligne in lignes:
+            row = [
+                ligne.reference_article,
+                ligne.designation,
+                ligne.conditionnement,
+                str(ligne.quantite_stock),
+                f"{float(ligne.prix_unitaire):,.0f}",
+                f"{float(ligne.valeur):,.0f}"
+            ]
+            data.append(row)
+            total_quantite += ligne.quantite_stock
+            total_valeur += float(ligne.valeur)
         
         # Ligne des totaux
-        data.append([
-            'TOTAL GÉNÉRAL',
-            '',
-            str(quantite_totale_vendue),
-            f"{float(chiffre_affaires_total):,.0f} FCFA",
-            f"{float(marge_totale):,.0f} FCFA",
-            f"{float(pourcentage_marge_global):.1f}%"
-        ])
+        data.append(['', '', 'TOTAL GÉNÉRAL:', str(total_quantite), '', f"{total_valeur:,.0f}"])
         
         # Créer le tableau
-        table = Table(data, colWidths=[2*cm, 6*cm, 2*cm, 3*cm, 3*cm, 2*cm])
-        
-        # Style du tableau
+        table = Table(data, colWidths=[2*cm, 6*cm, 2.5*cm, 2*cm, 2.5*cm, 2.5*cm])
         table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+            # En-têtes
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
             ('FONTSIZE', (0, 0), (-1, 0), 10),
             ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            
+            # Données
             ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+            ('FONTSIZE', (0, 1), (-1, -2), 9),
             ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightblue),
+            
+            # Ligne des totaux
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
             ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), 10),
         ]))
         
         elements.append(table)
@@ -13045,48 +11090,47 @@ def export_statistiques_pdf(request):
         # Construire le PDF
         doc.build(elements)
         
-        print(f"📄 EXPORT PDF STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"📄 EXPORT PDF STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"📄 EXPORT PDF STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("📄 EXPORT PDF - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📄 EXPORT PDF - %s articles exportés", len(lignes))
+        logger.debug("📄 EXPORT PDF - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT PDF: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
-def export_statistiques_csv(request):
-    """Vue pour exporter les statistiques de vente en CSV"""
+def export_inventaire_csv(request):
+    """Vue pour exporter l'inventaire en format CSV (alternative si Excel n'est pas disponible)"""
     try:
         agence = get_user_agence(request)
     except:
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Récupérer l'ID de l'inventaire depuis la session ou les paramètres
+        inventaire_id = request.GET.get('inventaire_id') or request.session.get('last_inventaire_id')
         
-        if not statistiques_data:
-            return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
+        if not inventaire_id:
+            return JsonResponse({'success': False, 'error': 'Aucun inventaire spécifié'})
         
-        # Récupérer les données
-        date_debut = statistiques_data['date_debut']
-        date_fin = statistiques_data['date_fin']
-        statistiques_articles = statistiques_data['statistiques_articles']
-        chiffre_affaires_total = statistiques_data['chiffre_affaires_total']
-        marge_totale = statistiques_data['marge_totale']
-        quantite_totale_vendue = statistiques_data['quantite_totale_vendue']
-        pourcentage_marge_global = statistiques_data['pourcentage_marge_global']
+        # Récupérer l'inventaire
+        try:
+            inventaire = InventaireStock.objects.get(id=inventaire_id, agence=agence)
+        except InventaireStock.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Inventaire non trouvé'})
+        
+        # Récupérer les lignes d'inventaire
+        lignes = LigneInventaireStock.objects.filter(inventaire=inventaire).order_by('designation')
         
         # Créer le fichier CSV
         import csv
         from django.http import HttpResponse
         
         # Créer la réponse HTTP
-        filename = f"Statistiques_Vente_{date_debut}_{date_fin}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        filename = f"Inventaire_{inventaire.numero_inventaire}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
         response = HttpResponse(content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
@@ -13097,70 +11141,39 @@ def export_statistiques_csv(request):
         writer = csv.writer(response, delimiter=';')
         
         # En-têtes
-        headers = ['Référence', 'Désignation', 'Quantité Vendue', 'Chiffre d\'Affaires (FCFA)', 'Marge Profit (FCFA)', 'Pourcentage Marge (%)']
+        headers = ['Référence', 'Désignation', 'Conditionnement', 'Quantité en Stock', 'Prix Unitaire (FCFA)', 'Valeur Totale (FCFA)']
         writer.writerow(headers)
         
         # Données
-        for stat in statistiques_articles:
+        total_quantite = 0
+        total_valeur = 0
+        
+        for ligne in lignes:
             row = [
-                stat['reference_article'],
-                stat['designation'],
-                stat['quantite_vendue'],
-                float(stat['chiffre_affaires']),
-                float(stat['marge_profit']),
-                float(stat['pourcentage_marge'])
+                ligne.reference_article,
+                ligne.designation,
+                ligne.conditionnement,
+                ligne.quantite_stock,
+                float(ligne.prix_unitaire),
+                float(ligne.valeur)
             ]
             writer.writerow(row)
+            total_quantite += ligne.quantite_stock
+            total_valeur += float(ligne.valeur)
         
         # Ligne des totaux
         writer.writerow([])  # Ligne vide
-        writer.writerow(['TOTAL GÉNÉRAL', '', quantite_totale_vendue, chiffre_affaires_total, marge_totale, pourcentage_marge_global])
+        writer.writerow(['', '', 'TOTAL GÉNÉRAL:', total_quantite, '', total_valeur])
         
-        print(f"[CHART] EXPORT CSV STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"[CHART] EXPORT CSV STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"[CHART] EXPORT CSV STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("[CHART] EXPORT CSV - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT CSV - %s articles exportés", len(lignes))
+        logger.debug("[CHART] EXPORT CSV - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)})
-
-@login_required
-def test_statistiques(request):
-    """Vue de test pour diagnostiquer les problèmes"""
-    try:
-        print("🧪 TEST STATISTIQUES - Début")
-        
-        # Test 1: Récupération de l'agence
-        agence = get_user_agence(request)
-        print(f"🧪 TEST - Agence récupérée: {agence}")
-        
-        # Test 2: Vérification des imports
-        print("🧪 TEST - Import Decimal OK")
-        
-        # Test 3: Vérification des modèles
-        articles_count = Article.objects.filter(agence=agence).count()
-        print(f"🧪 TEST - Articles trouvés: {articles_count}")
-        
-        # Test 4: Vérification des ventes
-        ventes_count = LigneFactureVente.objects.filter(facture_vente__agence=agence).count()
-        print(f"🧪 TEST - Ventes trouvées: {ventes_count}")
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Tests réussis',
-            'agence': str(agence),
-            'articles_count': articles_count,
-            'ventes_count': ventes_count
-        })
-        
-    except Exception as e:
-        print(f"🧪 TEST - Erreur: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT CSV: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 # ==================== MOUVEMENTS DE STOCK ====================
@@ -13235,11 +11248,11 @@ def consulter_mouvements_stock(request):
         article_ids = request.POST.getlist('articles')  # Récupérer tous les articles sélectionnés
         type_mouvement = request.POST.get('type_mouvement', '')
         
-        print(f"[CHART] PARAMÈTRES MOUVEMENTS:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Articles: {article_ids}")
-        print(f"  - Type mouvement: {type_mouvement}")
+        logger.debug("[CHART] PARAMÈTRES MOUVEMENTS:")
+        logger.debug("  - Date début: %s", date_debut)
+        logger.debug("  - Date fin: %s", date_fin)
+        logger.debug("  - Articles: %s", article_ids)
+        logger.debug("  - Type mouvement: %s", type_mouvement)
         
         # Vérification des paramètres obligatoires
         if not date_debut or not date_fin:
@@ -13279,19 +11292,21 @@ def consulter_mouvements_stock(request):
         
         mouvements = mouvements_query
         
-        print(f"[PACKAGE] MOUVEMENTS FILTRÉS: {mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] MOUVEMENTS FILTRÉS: %s", mouvements.count())
         
         # Debug: Afficher quelques mouvements pour vérifier
         if mouvements.count() > 0:
-            print("[LIST] PREMIERS MOUVEMENTS TROUVÉS:")
+            logger.debug("[LIST] PREMIERS MOUVEMENTS TROUVÉS:")
             for i, mvt in enumerate(mouvements[:3]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement}")
+                logger.debug("  %s. %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement)
         else:
-            print("[ERREUR] AUCUN MOUVEMENT TROUVÉ - Vérifions les mouvements existants:")
+            logger.error("AUCUN MOUVEMENT TROUVÉ - Vérifions les mouvements existants:")
             tous_mouvements = MouvementStock.objects.filter(agence=agence, article__in=articles)
-            print(f"[CHART] Total mouvements pour ces articles: {tous_mouvements.count()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[CHART] Total mouvements pour ces articles: %s", tous_mouvements.count())
             for i, mvt in enumerate(tous_mouvements[:3]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement}")
+                logger.debug("  %s. %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement)
         
         # Calculer les statistiques
         total_mouvements = mouvements.count()
@@ -13316,7 +11331,7 @@ def consulter_mouvements_stock(request):
                 tiers = f"Fournisseur: {mouvement.facture_achat.fournisseur.intitule if mouvement.facture_achat.fournisseur else 'N/A'}"
             
             # Debug pour vérifier les données d'article
-            print(f"[SEARCH] DEBUG ARTICLE: {mouvement.article.reference_article} - {mouvement.article.designation}")
+            logger.debug("[SEARCH] DEBUG ARTICLE: %s - %s", mouvement.article.reference_article, mouvement.article.designation)
             
             mouvements_data.append({
                 'date_mouvement': mouvement.date_mouvement.strftime('%Y-%m-%d %H:%M'),
@@ -13335,11 +11350,11 @@ def consulter_mouvements_stock(request):
                 'commentaire': mouvement.commentaire or '',
             })
         
-        print(f"[CHART] MOUVEMENTS GÉNÉRÉS:")
-        print(f"  - Total mouvements: {total_mouvements}")
-        print(f"  - Entrées: {mouvements_entree}")
-        print(f"  - Sorties: {mouvements_sortie}")
-        print(f"  - Valeur stock permanent: {valeur_stock_permanent}")
+        logger.debug("[CHART] MOUVEMENTS GÉNÉRÉS:")
+        logger.debug("  - Total mouvements: %s", total_mouvements)
+        logger.debug("  - Entrées: %s", mouvements_entree)
+        logger.debug("  - Sorties: %s", mouvements_sortie)
+        logger.debug("  - Valeur stock permanent: %s", valeur_stock_permanent)
         
         # Stocker les mouvements dans la session pour l'export (sans Decimal)
         session_payload = {
@@ -13360,10 +11375,11 @@ def consulter_mouvements_stock(request):
         try:
             json.dumps(clean_payload)
         except TypeError as json_error:
-            print(f"[ERROR] JSON serialization issue dans mouvements_stock: {json_error}")
+            logger.error("[ERROR] JSON serialization issue dans mouvements_stock: %s", json_error)
             for idx, mouvement in enumerate(clean_payload.get('mouvements_data', [])):
                 for key, value in mouvement.items():
-                    print(f"    mouvement[{idx}].{key} -> {type(value)} = {value}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("    mouvement[%s].%s -> %s = %s", idx, key, type(value), value)
             raise
         request.session['mouvements_stock'] = clean_payload
         
@@ -13392,9 +11408,7 @@ def consulter_mouvements_stock(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR CONSULTATION MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR CONSULTATION MOUVEMENTS: %s", e)
         error_details = f"Erreur: {str(e)}"
         if hasattr(e, '__class__'):
             error_details += f" (Type: {e.__class__.__name__})"
@@ -13431,7 +11445,7 @@ def export_mouvements_excel(request):
             import openpyxl
             from openpyxl.styles import Font, Alignment, PatternFill
         except ImportError:
-            print("[ERREUR] Module openpyxl non disponible")
+            logger.error("Module openpyxl non disponible")
             return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
         
         from django.http import HttpResponse
@@ -13608,17 +11622,16 @@ def export_mouvements_excel(request):
         buffer.seek(0)
         response.write(buffer.getvalue())
         
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Article: {article_reference}")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Articles groupés: {len(articles_tries)}")
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Articles groupés: %s", len(articles_tries))
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT EXCEL MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 @login_required
 def export_mouvements_pdf(request):
@@ -13654,7 +11667,7 @@ def export_mouvements_pdf(request):
             from reportlab.lib import colors
             from reportlab.lib.units import cm
         except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
+            logger.error("Module reportlab non disponible")
             return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
         
         from django.http import HttpResponse
@@ -13740,16 +11753,14 @@ def export_mouvements_pdf(request):
         # Construire le PDF
         doc.build(elements)
         
-        print(f"📄 EXPORT PDF MOUVEMENTS - Article: {article_reference}")
-        print(f"📄 EXPORT PDF MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"📄 EXPORT PDF MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT PDF MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -13815,16 +11826,14 @@ def export_mouvements_csv(request):
         writer.writerow([])  # Ligne vide
         writer.writerow(['TOTAL GÉNÉRAL', f'Entrées: {mouvements_entree}, Sorties: {mouvements_sortie}', f'{total_mouvements} mouvements', '', '', '', valeur_stock_permanent, ''])
         
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - Article: {article_reference}")
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT CSV MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -13836,25 +11845,27 @@ def creer_mouvements_retroactifs(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[REFRESH] CRÉATION MOUVEMENTS RÉTROACTIFS (VERSION SIMPLIFIÉE)...")
-        print(f"[TARGET] Agence utilisée: {agence.nom_agence}")
+        logger.debug("[REFRESH] CRÉATION MOUVEMENTS RÉTROACTIFS (VERSION SIMPLIFIÉE)...")
+        logger.debug("[TARGET] Agence utilisée: %s", agence.nom_agence)
         
         mouvements_crees = 0
         
         # 1. Créer des mouvements pour les factures de vente
         factures_vente = FactureVente.objects.filter(agence=agence)
-        print(f"[CHART] Factures de vente: {factures_vente.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Factures de vente: %s", factures_vente.count())
         
         for facture in factures_vente:
             lignes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"[SEARCH] Facture {facture.numero_ticket}: {lignes.count()} lignes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[SEARCH] Facture %s: %s lignes", facture.numero_ticket, lignes.count())
             
             for ligne in lignes:
-                print(f"  [PACKAGE] Article: {ligne.article.designation}, Quantité: {ligne.quantite}")
+                logger.debug("  [PACKAGE] Article: %s, Quantité: %s", ligne.article.designation, ligne.quantite)
                 
                 # Vérifier si le mouvement existe déjà
                 mouvement_existe = MouvementStock.objects.filter(facture_vente=facture, article=ligne.article).exists()
-                print(f"  [SEARCH] Mouvement existe déjà: {mouvement_existe}")
+                logger.debug("  [SEARCH] Mouvement existe déjà: %s", mouvement_existe)
                 
                 if not mouvement_existe:
                     try:
@@ -13884,23 +11895,25 @@ def creer_mouvements_retroactifs(request):
                             commentaire=f"Vente - {facture.numero_ticket}"
                         )
                         mouvements_crees += 1
-                        print(f"[OK] Vente: {ligne.article.designation} - {facture.numero_ticket}")
+                        logger.debug("Vente: %s - %s", ligne.article.designation, facture.numero_ticket)
                     except Exception as e:
-                        print(f"[ERREUR] Erreur vente {facture.numero_ticket}: {e}")
+                        logger.error("Erreur vente %s: %s", facture.numero_ticket, e)
         
         # 2. Créer des mouvements pour les factures d'achat
         factures_achat = FactureAchat.objects.filter(agence=agence)
-        print(f"[CHART] Factures d'achat: {factures_achat.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Factures d'achat: %s", factures_achat.count())
         
         for facture in factures_achat:
             lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
-            print(f"[SEARCH] Facture achat {facture.reference_achat}: {lignes.count()} lignes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[SEARCH] Facture achat %s: %s lignes", facture.reference_achat, lignes.count())
             
             for ligne in lignes:
-                print(f"  [PACKAGE] Article: {ligne.article.designation}, Quantité: {ligne.quantite}")
+                logger.debug("  [PACKAGE] Article: %s, Quantité: %s", ligne.article.designation, ligne.quantite)
                 
                 mouvement_existe = MouvementStock.objects.filter(facture_achat=facture, article=ligne.article).exists()
-                print(f"  [SEARCH] Mouvement existe déjà: {mouvement_existe}")
+                logger.debug("  [SEARCH] Mouvement existe déjà: %s", mouvement_existe)
                 
                 if not mouvement_existe:
                     try:
@@ -13923,13 +11936,13 @@ def creer_mouvements_retroactifs(request):
                             commentaire=f"Achat - {facture.reference_achat}"
                         )
                         mouvements_crees += 1
-                        print(f"[OK] Achat: {ligne.article.designation} - {facture.reference_achat}")
+                        logger.debug("Achat: %s - %s", ligne.article.designation, facture.reference_achat)
                     except Exception as e:
-                        print(f"[ERREUR] Erreur achat {facture.reference_achat}: {e}")
+                        logger.error("Erreur achat %s: %s", facture.reference_achat, e)
         
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements créés, Total: {total_mouvements}")
+        logger.info("TERMINÉ - %s mouvements créés, Total: %s", mouvements_crees, total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -13939,9 +11952,7 @@ def creer_mouvements_retroactifs(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -14003,23 +12014,24 @@ def forcer_mouvements(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[HOT] CRÉATION FORCÉE DE MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
+        logger.debug("[HOT] CRÉATION FORCÉE DE MOUVEMENTS...")
+        logger.debug("[TARGET] Agence: %s", agence.nom_agence)
         
         mouvements_crees = 0
         
         # Supprimer tous les mouvements existants d'abord
         anciens_mouvements = MouvementStock.objects.filter(agence=agence).count()
         MouvementStock.objects.filter(agence=agence).delete()
-        print(f"🗑️ {anciens_mouvements} anciens mouvements supprimés")
+        logger.debug("🗑️ %s anciens mouvements supprimés", anciens_mouvements)
         
         # Test de création d'un mouvement simple
         articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles trouvés: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles trouvés: %s", articles.count())
         
         if articles.exists():
             article_test = articles.first()
-            print(f"🧪 Test avec article: {article_test.designation}")
+            logger.debug("🧪 Test avec article: %s", article_test.designation)
             
             try:
                 from django.utils import timezone
@@ -14038,28 +12050,28 @@ def forcer_mouvements(request):
                     stock_permanent=float(article_test.stock_actuel * article_test.prix_achat),
                     commentaire='Test de création'
                 )
-                print(f"[OK] MOUVEMENT TEST CRÉÉ AVEC SUCCÈS: ID {mouvement_test.id}")
+                logger.debug("MOUVEMENT TEST CRÉÉ AVEC SUCCÈS: ID %s", mouvement_test.id)
                 mouvements_crees += 1
                 
                 # Supprimer le test
                 mouvement_test.delete()
-                print(f"🗑️ Mouvement test supprimé")
+                logger.debug("🗑️ Mouvement test supprimé")
                 
             except Exception as e:
-                print(f"[ERREUR] ERREUR LORS DU TEST: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("ERREUR LORS DU TEST: %s", e)
                 return JsonResponse({'success': False, 'error': f'Erreur lors du test de création: {str(e)}'})
         
-        print(f"[OK] Test terminé, création des vrais mouvements...")
+        logger.debug("Test terminé, création des vrais mouvements...")
         
         # Créer des mouvements pour les factures de vente (version simplifiée)
         factures_vente = FactureVente.objects.filter(agence=agence)
-        print(f"[CHART] Factures de vente: {factures_vente.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Factures de vente: %s", factures_vente.count())
         
         for facture in factures_vente:
             lignes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"  [SEARCH] {facture.numero_ticket}: {lignes.count()} lignes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  [SEARCH] %s: %s lignes", facture.numero_ticket, lignes.count())
             
             for ligne in lignes:
                 try:
@@ -14082,17 +12094,19 @@ def forcer_mouvements(request):
                         commentaire=f"Vente - {facture.numero_ticket}"
                     )
                     mouvements_crees += 1
-                    print(f"    [OK] {ligne.article.designation}")
+                    logger.debug("    [OK] %s", ligne.article.designation)
                 except Exception as e:
-                    print(f"    [ERREUR] Erreur: {e}")
+                    logger.error("    [ERREUR] Erreur: %s", e)
         
         # Créer des mouvements pour les factures d'achat (version simplifiée)
         factures_achat = FactureAchat.objects.filter(agence=agence)
-        print(f"[CHART] Factures d'achat: {factures_achat.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Factures d'achat: %s", factures_achat.count())
         
         for facture in factures_achat:
             lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
-            print(f"  [SEARCH] {facture.reference_achat}: {lignes.count()} lignes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  [SEARCH] %s: %s lignes", facture.reference_achat, lignes.count())
             
             for ligne in lignes:
                 try:
@@ -14116,13 +12130,13 @@ def forcer_mouvements(request):
                         commentaire=f"Achat - {facture.reference_achat}"
                     )
                     mouvements_crees += 1
-                    print(f"    [OK] {ligne.article.designation}")
+                    logger.debug("    [OK] %s", ligne.article.designation)
                 except Exception as e:
-                    print(f"    [ERREUR] Erreur: {e}")
+                    logger.error("    [ERREUR] Erreur: %s", e)
         
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements créés, Total: {total_mouvements}")
+        logger.info("TERMINÉ - %s mouvements créés, Total: %s", mouvements_crees, total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -14132,9 +12146,7 @@ def forcer_mouvements(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -14146,21 +12158,22 @@ def test_mouvement_simple(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("🧪 TEST SIMPLE DE CRÉATION DE MOUVEMENT...")
+        logger.debug("🧪 TEST SIMPLE DE CRÉATION DE MOUVEMENT...")
         
         # Vérifier les articles
         articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles: %s", articles.count())
         
         if not articles.exists():
             return JsonResponse({'success': False, 'error': 'Aucun article trouvé dans cette agence'})
         
         article = articles.first()
-        print(f"[PACKAGE] Article test: {article.designation}")
+        logger.debug("[PACKAGE] Article test: %s", article.designation)
         
         # Vérifier les champs obligatoires
-        print(f"[PACKAGE] Stock actuel: {article.stock_actuel}")
-        print(f"[PACKAGE] Prix achat: {article.prix_achat}")
+        logger.debug("[PACKAGE] Stock actuel: %s", article.stock_actuel)
+        logger.debug("[PACKAGE] Prix achat: %s", article.prix_achat)
         
         # Créer un mouvement simple
         from django.utils import timezone
@@ -14180,11 +12193,11 @@ def test_mouvement_simple(request):
             commentaire='Test simple'
         )
         
-        print(f"[OK] MOUVEMENT CRÉÉ: ID {mouvement.id}")
+        logger.debug("MOUVEMENT CRÉÉ: ID %s", mouvement.id)
         
         # Vérifier qu'il existe
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
-        print(f"[CHART] Total mouvements: {total_mouvements}")
+        logger.debug("[CHART] Total mouvements: %s", total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -14194,9 +12207,7 @@ def test_mouvement_simple(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR TEST: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR TEST: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -14208,14 +12219,15 @@ def creer_mouvements_manuels(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[TOOL] CRÉATION MANUELLE DE MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
+        logger.debug("[TOOL] CRÉATION MANUELLE DE MOUVEMENTS...")
+        logger.debug("[TARGET] Agence: %s", agence.nom_agence)
         
         mouvements_crees = 0
         
         # Récupérer tous les articles
         articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles trouvés: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles trouvés: %s", articles.count())
         
         if not articles.exists():
             return JsonResponse({'success': False, 'error': 'Aucun article trouvé'})
@@ -14240,14 +12252,14 @@ def creer_mouvements_manuels(request):
                     commentaire=f'Création manuelle - {article.designation}'
                 )
                 mouvements_crees += 1
-                print(f"[OK] {article.designation}")
+                logger.debug("%s", article.designation)
                 
             except Exception as e:
-                print(f"[ERREUR] Erreur pour {article.designation}: {e}")
+                logger.error("Erreur pour %s: %s", article.designation, e)
         
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements manuels créés, Total: {total_mouvements}")
+        logger.info("TERMINÉ - %s mouvements manuels créés, Total: %s", mouvements_crees, total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -14257,9 +12269,7 @@ def creer_mouvements_manuels(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -14271,28 +12281,31 @@ def test_consultation_mouvements(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[SEARCH] TEST CONSULTATION MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
+        logger.debug("[SEARCH] TEST CONSULTATION MOUVEMENTS...")
+        logger.debug("[TARGET] Agence: %s", agence.nom_agence)
         
         # Vérifier tous les mouvements de l'agence
         tous_mouvements = MouvementStock.objects.filter(agence=agence)
-        print(f"[CHART] Total mouvements dans l'agence: {tous_mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Total mouvements dans l'agence: %s", tous_mouvements.count())
         
         if tous_mouvements.count() > 0:
-            print("[LIST] PREMIERS MOUVEMENTS:")
+            logger.debug("[LIST] PREMIERS MOUVEMENTS:")
             for i, mvt in enumerate(tous_mouvements[:5]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement} - {mvt.numero_piece}")
+                logger.debug("  %s. %s - %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement, mvt.numero_piece)
         
         # Vérifier les articles avec mouvements
         articles_avec_mouvements = Article.objects.filter(
             agence=agence,
             mouvementstock__isnull=False
         ).distinct()
-        print(f"[PACKAGE] Articles avec mouvements: {articles_avec_mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles avec mouvements: %s", articles_avec_mouvements.count())
         
         for article in articles_avec_mouvements[:3]:
             mouvements_article = MouvementStock.objects.filter(agence=agence, article=article)
-            print(f"  - {article.designation}: {mouvements_article.count()} mouvements")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  - %s: %s mouvements", article.designation, mouvements_article.count())
         
         return JsonResponse({
             'success': True,
@@ -14302,9 +12315,7 @@ def test_consultation_mouvements(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -14320,9 +12331,10 @@ def get_mouvements_session(request):
         mouvements_data = request.session.get('mouvements_data', [])
         article_info = request.session.get('article_info', {})
         
-        print(f"[CHART] RÉCUPÉRATION SESSION:")
-        print(f"  - Mouvements en session: {len(mouvements_data)}")
-        print(f"  - Article info: {article_info}")
+        logger.debug("[CHART] RÉCUPÉRATION SESSION:")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  - Mouvements en session: %s", len(mouvements_data))
+        logger.debug("  - Article info: %s", article_info)
         
         return JsonResponse({
             'success': True,
@@ -14331,9 +12343,7 @@ def get_mouvements_session(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 # ===== GESTION DES COMPTES UTILISATEURS =====
@@ -14607,16 +12617,21 @@ def reinitialiser_mot_de_passe(request, compte_id):
 def debug_session(request):
     """Debug simple pour voir le contenu de la session"""
     try:
-        print("[SEARCH] DEBUG SESSION:")
-        print(f"  - Clés de session: {list(request.session.keys())}")
+        logger.debug("[SEARCH] DEBUG SESSION:")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  - Clés de session: %s", list(request.session.keys()))
         
         mouvements_stock = request.session.get('mouvements_stock', {})
-        print(f"  - mouvements_stock: {list(mouvements_stock.keys()) if mouvements_stock else 'Aucun'}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  - mouvements_stock: %s", (list(mouvements_stock.keys()) if mouvements_stock else 'Aucun'))
         
         if mouvements_stock:
-            print(f"  - mouvements_data count: {len(mouvements_stock.get('mouvements_data', []))}")
-            print(f"  - article_reference: {mouvements_stock.get('article_reference', 'N/A')}")
-            print(f"  - article_designation: {mouvements_stock.get('article_designation', 'N/A')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  - mouvements_data count: %s", len(mouvements_stock.get('mouvements_data', [])))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  - article_reference: %s", mouvements_stock.get('article_reference', 'N/A'))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  - article_designation: %s", mouvements_stock.get('article_designation', 'N/A'))
         
         return JsonResponse({
             'success': True,
@@ -14626,7 +12641,7 @@ def debug_session(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
+        logger.error("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 @login_required
 @require_stock_access
@@ -14639,16 +12654,13 @@ def dashboard_stock(request):
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
             return redirect('logout_stock')
 
-        # Calculer les KPIs
+        # Calculer les KPIs (badges lus dans l'ensemble d'alerte tenu à jour, voir alertes_stock.py)
+        from .alertes_stock import articles_en_alerte, compter
         total_articles = Article.objects.filter(agence=agence).count()
-        articles_stock_faible = Article.objects.filter(
-            agence=agence,
-            stock_actuel__lte=10
-        ).count()
-        articles_rupture = Article.objects.filter(
-            agence=agence,
-            stock_actuel__lte=0
-        ).count()
+        en_alerte = articles_en_alerte(agence)
+        totaux_alertes = compter(en_alerte)
+        articles_stock_faible = totaux_alertes['total']
+        articles_rupture = totaux_alertes['ruptures']
         
         # Valeur totale du stock
         articles_avec_prix = Article.objects.filter(
@@ -14672,14 +12684,11 @@ def dashboard_stock(request):
         articles_populaires = Article.objects.filter(agence=agence).order_by('-stock_actuel')[:5]
         
         # Alertes de stock
-        alertes_stock = Article.objects.filter(
-            agence=agence,
-            stock_actuel__lte=5
-        ).order_by('stock_actuel')[:5]
+        alertes_stock = en_alerte.order_by('stock_actuel')[:5]
 
         # Récupérer le nom de l'utilisateur
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except Compte.DoesNotExist:
             nom_utilisateur = request.user.username
@@ -14702,7 +12711,7 @@ def dashboard_stock(request):
         messages.error(request, f'Erreur lors du chargement du dashboard: {str(e)}')
         # Récupérer le nom de l'utilisateur même en cas d'erreur
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except:
             nom_utilisateur = request.user.username if request.user.is_authenticated else "Utilisateur"
@@ -15599,9 +13608,9 @@ def modifier_article(request, article_id):
                         stock_permanent=float(nouveau_stock * article.prix_achat),
                         commentaire=f"Ajustement manuel via modification d'article par {request.user.username}" + (f" (différence: {difference_stock})" if difference_stock != Decimal('0') else " (vérification)")
                     )
-                    print(f"[STOCK] Ajustement manuel enregistré: {article.designation} {ancien_stock} -> {nouveau_stock}")
+                    logger.debug("[STOCK] Ajustement manuel enregistré: %s %s -> %s", article.designation, ancien_stock, nouveau_stock)
                 except Exception as movement_error:
-                    print(f"[WARNING] Impossible d'enregistrer le mouvement d'ajustement: {movement_error}")
+                    logger.warning("Impossible d'enregistrer le mouvement d'ajustement: %s", movement_error)
             
             # Mettre à jour les types de vente
             prix_gros = request.POST.get('prix_gros')
@@ -15704,10 +13713,10 @@ def detail_article(request, article_id):
             })
         
         # Debug: Vérifier la famille de l'article
-        print(f"[ALERTE] DEBUG Article {article.id}:")
-        print(f"   - Désignation: {article.designation}")
-        print(f"   - Catégorie: {article.categorie}")
-        print(f"   - Intitulé famille: {article.categorie.intitule if article.categorie else 'None'}")
+        logger.debug("[ALERTE] DEBUG Article %s:", article.id)
+        logger.debug("   - Désignation: %s", article.designation)
+        logger.debug("   - Catégorie: %s", article.categorie)
+        logger.debug("   - Intitulé famille: %s", (article.categorie.intitule if article.categorie else 'None'))
         
         context = {
             'article': article,
@@ -15917,7 +13926,7 @@ def creer_facture_transfert(request):
                     expediteur_employe = Employe.objects.filter(compte__agence=agence).first()
                     
             except Exception as e:
-                print(f"Erreur lors de la recherche de l'employé expéditeur: {e}")
+                logger.error("Erreur lors de la recherche de l'employé expéditeur: %s", e)
                 expediteur_employe = Employe.objects.filter(compte__agence=agence).first()
             
             if not expediteur_employe:
@@ -15949,7 +13958,7 @@ def creer_facture_transfert(request):
                         ).first()
                         
                 except Exception as e:
-                    print(f"Erreur lors de la recherche de l'employé destinataire: {e}")
+                    logger.error("Erreur lors de la recherche de l'employé destinataire: %s", e)
                     destinataire_employe = None
             
             # Vérifier l'unicité de la référence et générer une référence unique si nécessaire
@@ -15958,97 +13967,51 @@ def creer_facture_transfert(request):
                 # Générer une référence unique avec timestamp
                 import time
                 reference_finale = f"{reference_transfert}_{int(time.time())}"
-                print(f"[INFO] Référence modifiée pour éviter le doublon: {reference_finale}")
-            
-            # Créer la facture de transfert
-            facture = FactureTransfert.objects.create(
-                numero_compte=numero_compte,
-                date_transfert=date_transfert,
-                reference_transfert=reference_finale,
-                lieu_depart=lieu_depart,
-                lieu_arrivee=lieu_arrivee,
-                quantite=int(quantite),
-                statut=statut,
-                agence_source=agence,
-                agence_destination=agence,  # Pour l'instant, même agence (à modifier selon les besoins)
-                employe_expediteur=expediteur_employe,
-                employe_destinataire=destinataire_employe,
-                etat=etat
-            )
-            
-            # Traiter les articles sélectionnés
+                logger.debug("Référence modifiée pour éviter le doublon: %s", reference_finale)
+            
+            # Agence destination : une autre agence rend le transfert à deux côtés (sortie source, entrée destination)
+            agence_destination = agence
+            agence_destination_id = request.POST.get('agence_destination', '').strip()
+            if agence_destination_id and str(agence_destination_id) != str(agence.id_agence):
+                agence_destination = Agence.objects.filter(id_agence=agence_destination_id).first()
+                if not agence_destination:
+                    messages.error(request, 'Agence destination introuvable.')
+                    return redirect('creer_facture_transfert')
+            
+            # Lignes du transfert (articles sélectionnés)
             articles_data = request.POST.get('articles_data', '')
-            if articles_data:
-                import json
-                try:
-                    articles = json.loads(articles_data)
-                    for article_data in articles:
-                        # Récupérer l'article
-                        article = Article.objects.get(id=article_data['id'])
-                        
-                        # Créer la ligne de facture de transfert
-                        LigneFactureTransfert.objects.create(
-                            facture_transfert=facture,
-                            article=article,
-                            quantite=int(article_data['quantite']),
-                            prix_unitaire=float(article_data['prix_achat']),
-                            valeur_totale=float(article_data['prix_achat']) * int(article_data['quantite'])
-                        )
-                        
-                        # Mettre à jour le stock de l'article selon l'état du transfert
-                        ancien_stock = article.stock_actuel
-                        quantite_transfert = Decimal(str(article_data['quantite']))
-                        
-                        # Normaliser l'état pour éviter les problèmes de casse ou d'espaces
-                        etat_normalise = str(etat).strip().lower() if etat else 'sortir'
-                        
-                        # Si l'état est "entrer", augmenter le stock; si "sortir", diminuer le stock
-                        # IMPORTANT: "entrer" doit TOUJOURS augmenter le stock
-                        if etat_normalise == 'entrer':
-                            article.stock_actuel += quantite_transfert
-                            type_mouvement = 'entree'
-                            action_stock = "augmentation"
-                        else:  # sortir
-                            article.stock_actuel -= quantite_transfert
-                            if article.stock_actuel < 0:
-                                article.stock_actuel = 0
-                            type_mouvement = 'sortie'
-                            action_stock = "diminution"
-                        
-                        # Mettre à jour le dernier prix d'achat avec le prix du transfert
-                        ancien_dernier_prix = article.dernier_prix_achat
-                        nouveau_prix_achat = float(article_data['prix_achat'])
-                        article.dernier_prix_achat = nouveau_prix_achat
-                        # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                        article.suivi_stock = True
-                        article.save()
-                        print(f"[PACKAGE] STOCK TRANSFERT - Article: {article.designation}")
-                        print(f"[PACKAGE] STOCK TRANSFERT - État: {etat} (normalisé: {etat_normalise}), {action_stock} du stock")
-                        print(f"[PACKAGE] STOCK TRANSFERT - Stock mis à jour: {ancien_stock} → {article.stock_actuel}")
-                        print(f"[MONEY] Transfert - Dernier prix d'achat mis à jour: {ancien_dernier_prix} → {nouveau_prix_achat}")
-                        
-                        # [HOT] CRÉER UN MOUVEMENT DE STOCK POUR TRAÇABILITÉ
-                        try:
-                            MouvementStock.objects.create(
-                                article=article,
-                                agence=agence,
-                                type_mouvement=type_mouvement,
-                                date_mouvement=timezone.now(),
-                                numero_piece=facture.reference_transfert,
-                                quantite_stock=article.stock_actuel,
-                                stock_initial=ancien_stock,
-                                solde=article.stock_actuel,
-                                quantite=int(article_data['quantite']),
-                                cout_moyen_pondere=float(article.prix_achat),
-                                stock_permanent=float(article.stock_actuel * article.prix_achat),
-                                commentaire=f"Transfert ({etat}) - Facture {facture.reference_transfert}"
-                            )
-                            print(f"[NOTE] MOUVEMENT STOCK - Transfert ({etat}) enregistré pour {article.designation}")
-                        except Exception as e:
-                            print(f"[WARNING] ERREUR MOUVEMENT STOCK TRANSFERT: {e}")
-                        
-                except (json.JSONDecodeError, Article.DoesNotExist, KeyError) as e:
-                    print(f"Erreur lors du traitement des articles: {e}")
+            from .transfert_stock import creer_transfert, lire_lignes
+            try:
+                lignes = lire_lignes(json.loads(articles_data)) if articles_data else {}
+            except (json.JSONDecodeError, TypeError, ValueError, AttributeError) as e:
+                logger.error("Erreur lors du traitement des articles: %s", e)
+                messages.error(request, 'Format des articles invalide.')
+                return redirect('creer_facture_transfert')
+            
+            # Facture, lignes, stocks des deux côtés et mouvements dans une seule transaction
+            try:
+                with transaction.atomic():
+                    facture = FactureTransfert.objects.create(
+                        numero_compte=numero_compte,
+                        date_transfert=date_transfert,
+                        reference_transfert=reference_finale,
+                        lieu_depart=lieu_depart,
+                        lieu_arrivee=lieu_arrivee,
+                        quantite=int(quantite),
+                        statut=statut,
+                        agence_source=agence,
+                        agence_destination=agence_destination,
+                        employe_expediteur=expediteur_employe,
+                        employe_destinataire=destinataire_employe,
+                        etat=etat
+                    )
+                    if lignes:
+                        creer_transfert(facture, lignes)
+            except StockInsuffisant as e:
+                article = Article.objects.filter(id=e.article_id).only('designation').first()
+                designation = article.designation if article else e.article_id
+                messages.error(request, f'Stock insuffisant pour l\'article {designation} (sortie de {e.quantite}).')
+                return redirect('creer_facture_transfert')
             
             messages.success(request, f'Facture de transfert "{reference_transfert}" créée avec succès!')
             return redirect('creer_facture_transfert')
@@ -16062,6 +14025,7 @@ def creer_facture_transfert(request):
     
     context = {
         'statut_choices': statut_choices,
+        'agences_destination': Agence.objects.exclude(id_agence=agence.id_agence).order_by('nom_agence'),
     }
     return render(request, 'supermarket/stock/creer_facture_transfert_nouveau.html', context)
 
@@ -16127,195 +14091,34 @@ def modifier_facture_transfert(request, facture_id):
                 messages.error(request, 'Veuillez sélectionner au moins un article.')
                 return redirect('modifier_facture_transfert', facture_id=facture_id)
             
-            # Récupérer l'ancien état pour gérer le stock
-            ancien_etat = facture.etat
-            ancien_etat_normalise = str(ancien_etat).strip().lower() if ancien_etat else 'sortir'
-            etat_normalise = str(etat).strip().lower() if etat else 'sortir'
+            # Seule la différence entre l'ancienne et la nouvelle version est appliquée au stock
+            from .transfert_stock import lire_lignes, modifier_transfert
+            lignes = lire_lignes(articles_payload)
+            if not lignes:
+                messages.error(request, 'Veuillez sélectionner au moins un article.')
+                return redirect('modifier_facture_transfert', facture_id=facture_id)
             
-            # Nouvelle logique : Calculer la différence et l'appliquer directement
-            # Prendre en compte l'état (entrer/sortir) et la différence de quantité
-            # Ajouter un flag pour empêcher la mise à jour automatique du stock
-            request.session['modification_en_cours'] = True
-            with transaction.atomic():
-                    # 1) Récupérer les anciennes lignes et créer un dictionnaire
-                    lignes_existantes = LigneFactureTransfert.objects.select_related('article').filter(facture_transfert=facture)
-                    anciennes_quantites = {}
-                    for ligne in lignes_existantes:
-                        if ligne.article:
-                            anciennes_quantites[ligne.article.id] = Decimal(str(ligne.quantite))
-                    
-                    # 2) Supprimer toutes les anciennes lignes
-                    LigneFactureTransfert.objects.filter(facture_transfert=facture).delete()
-                    
-                    # 3) Mettre à jour la facture de transfert
+            try:
+                with transaction.atomic():
                     facture.numero_compte = numero_compte
                     facture.date_transfert = date_transfert
                     facture.reference_transfert = reference_transfert
                     facture.lieu_depart = lieu_depart
                     facture.lieu_arrivee = lieu_arrivee
                     facture.statut = statut
-                    facture.etat = etat
-                    
-                    total_quantite = Decimal('0')
-                    
-                    # 4) Traiter les nouvelles lignes avec la logique de différence
-                    for article_data in articles_payload:
-                        article_id = article_data.get('id')
-                        quantite_nouvelle = Decimal(str(article_data.get('quantite', 0)))
-                        prix_achat_ligne = Decimal(str(article_data.get('prix_achat', 0)))
-                        
-                        if not article_id or quantite_nouvelle <= 0:
-                            continue
-                        
-                        try:
-                            article = Article.objects.get(id=article_id)
-                            article.refresh_from_db()
-                        except Article.DoesNotExist:
-                            messages.error(request, f"Article introuvable (ID: {article_id}).")
-                            raise
-                        
-                        # Vérifier le stock si c'est une sortie
-                        if etat_normalise == 'sortir' and article.stock_actuel < quantite_nouvelle:
-                            messages.error(request, f"Stock insuffisant pour l'article {article.designation}.")
-                            raise ValueError("Stock insuffisant")
-                        
-                        # Créer la nouvelle ligne
-                        LigneFactureTransfert.objects.create(
-                            facture_transfert=facture,
-                            article=article,
-                            quantite=int(quantite_nouvelle),
-                            prix_unitaire=prix_achat_ligne,
-                            valeur_totale=quantite_nouvelle * prix_achat_ligne
-                        )
-                        
-                        # Calculer la différence et l'effet sur le stock
-                        quantite_ancienne = anciennes_quantites.get(article_id, Decimal('0'))
-                        difference = quantite_nouvelle - quantite_ancienne
-                        
-                        # Stock avant modification (ce stock contient déjà l'effet de l'ancienne facture)
-                        stock_avant_modification = article.stock_actuel
-                        
-                        # LOGIQUE CORRIGÉE : Le stock actuel contient déjà l'effet de l'ancienne facture
-                        # Pour modifier : il faut annuler l'effet de l'ancienne facture, puis appliquer le nouvel effet
-                        # Ce qui équivaut à : stock_final = stock_actuel - effet_ancien + effet_nouveau
-                        
-                        # Vérifier si l'état a changé
-                        etat_a_change = (ancien_etat_normalise != etat_normalise)
-                        
-                        # Calculer le stock final selon l'état
-                        if etat_normalise == 'entrer':
-                            # État "entrer" : augmente le stock
-                            # Le stock actuel contient déjà l'effet de l'ancienne facture
-                            # Si ancien état était "entrer" : stock_actuel = stock_initial + ancienne_quantité
-                            #   -> stock_final = stock_actuel - ancienne_quantité + nouvelle_quantité = stock_actuel + différence
-                            # Si ancien état était "sortir" : stock_actuel = stock_initial - ancienne_quantité
-                            #   -> stock_final = stock_actuel + ancienne_quantité + nouvelle_quantité = stock_actuel + ancienne_quantité + nouvelle_quantité
-                            if etat_a_change and ancien_etat_normalise == 'sortir':
-                                # L'état a changé de "sortir" à "entrer"
-                                # Il faut remettre l'ancienne quantité (qui avait été soustraite) et ajouter la nouvelle
-                                stock_final = stock_avant_modification + quantite_ancienne + quantite_nouvelle
-                            else:
-                                # L'état n'a pas changé ou était déjà "entrer"
-                                # stock_final = stock_actuel + différence
-                                stock_final = stock_avant_modification + difference
-                            
-                            # S'assurer que le stock ne devient pas négatif
-                            if stock_final < 0:
-                                messages.error(request, f'Stock insuffisant pour l\'article {article.designation}. Stock actuel: {stock_avant_modification}, différence: {difference}')
-                                raise ValueError(f"Stock insuffisant: {stock_avant_modification} + {difference} = {stock_final} < 0")
-                            
-                            article.stock_actuel = stock_final
-                            
-                            # Déterminer le type de mouvement et le commentaire selon la différence
-                            if difference > 0:
-                                type_mouvement = 'entree'
-                                quantite_mouvement = difference if not etat_a_change else quantite_nouvelle
-                                commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - augmentation: {quantite_ancienne} → {quantite_nouvelle}, +{difference})"
-                            elif difference < 0:
-                                type_mouvement = 'sortie'
-                                quantite_mouvement = abs(difference) if not etat_a_change else quantite_ancienne
-                                commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - diminution: {quantite_ancienne} → {quantite_nouvelle}, -{abs(difference)})"
-                            else:
-                                type_mouvement = None
-                                quantite_mouvement = Decimal('0')
-                                commentaire = f"Transfert entrer - Facture {facture.reference_transfert} (modification - quantité inchangée: {quantite_nouvelle})"
-                        else:
-                            # État "sortir" : diminue le stock
-                            # Le stock actuel contient déjà l'effet de l'ancienne facture
-                            # Si ancien état était "sortir" : stock_actuel = stock_initial - ancienne_quantité
-                            #   -> stock_final = stock_actuel + ancienne_quantité - nouvelle_quantité = stock_actuel - différence
-                            # Si ancien état était "entrer" : stock_actuel = stock_initial + ancienne_quantité
-                            #   -> stock_final = stock_actuel - ancienne_quantité - nouvelle_quantité = stock_actuel - ancienne_quantité - nouvelle_quantité
-                            if etat_a_change and ancien_etat_normalise == 'entrer':
-                                # L'état a changé de "entrer" à "sortir"
-                                # Il faut retirer l'ancienne quantité (qui avait été ajoutée) et soustraire la nouvelle
-                                stock_final = max(Decimal('0'), stock_avant_modification - quantite_ancienne - quantite_nouvelle)
-                            else:
-                                # L'état n'a pas changé ou était déjà "sortir"
-                                # stock_final = stock_actuel - différence
-                                stock_final = max(Decimal('0'), stock_avant_modification - difference)
-                            
-                            # Vérifier le stock avant d'appliquer
-                            if stock_final < 0:
-                                messages.error(request, f'Stock insuffisant pour l\'article {article.designation}. Stock actuel: {stock_avant_modification}, différence: {difference}')
-                                raise ValueError(f"Stock insuffisant: {stock_avant_modification} - {difference} = {stock_final} < 0")
-                            
-                            article.stock_actuel = stock_final
-                            
-                            # Déterminer le type de mouvement et le commentaire selon la différence
-                            if difference > 0:
-                                type_mouvement = 'sortie'
-                                quantite_mouvement = difference if not etat_a_change else quantite_nouvelle
-                                commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - augmentation: {quantite_ancienne} → {quantite_nouvelle}, -{difference})"
-                            elif difference < 0:
-                                type_mouvement = 'entree'
-                                quantite_mouvement = abs(difference) if not etat_a_change else quantite_ancienne
-                                commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - diminution: {quantite_ancienne} → {quantite_nouvelle}, +{abs(difference)})"
-                            else:
-                                type_mouvement = None
-                                quantite_mouvement = Decimal('0')
-                                commentaire = f"Transfert sortir - Facture {facture.reference_transfert} (modification - quantité inchangée: {quantite_nouvelle})"
-                        
-                        article.dernier_prix_achat = prix_achat_ligne
-                        # Le suivi de stock est toujours activé automatiquement lors de toute modification du stock
-                        article.suivi_stock = True
-                        article.save()
-                        
-                        total_quantite += quantite_nouvelle
-                        
-                        # Créer un mouvement de stock pour refléter le changement
-                        if quantite_mouvement > 0 and type_mouvement:
-                            try:
-                                MouvementStock.objects.create(
-                                    article=article,
-                                    agence=agence,
-                                    type_mouvement=type_mouvement,
-                                    date_mouvement=timezone.now(),
-                                    numero_piece=facture.reference_transfert,
-                                    quantite_stock=article.stock_actuel,
-                                    stock_initial=stock_avant_modification,
-                                    solde=article.stock_actuel,
-                                    quantite=quantite_mouvement,
-                                    cout_moyen_pondere=float(article.prix_achat),
-                                    stock_permanent=float(article.stock_actuel * article.prix_achat),
-                                    facture_transfert=facture,
-                                    commentaire=commentaire
-                                )
-                            except Exception as e:
-                                print(f"[WARNING] ERREUR MOUVEMENT STOCK TRANSFERT MODIFICATION: {e}")
-                    
-                    facture.quantite = int(total_quantite)
+                    modifier_transfert(facture, lignes, etat)
+                    facture.quantite = int(sum(q for q, _ in lignes.values()))
                     facture.save()
-            
-            # Retirer le flag de modification en cours
-            request.session.pop('modification_en_cours', None)
+            except StockInsuffisant as e:
+                article = Article.objects.filter(id=e.article_id).only('designation').first()
+                designation = article.designation if article else e.article_id
+                messages.error(request, f'Stock insuffisant pour l\'article {designation} (sortie de {e.quantite}).')
+                return redirect('modifier_facture_transfert', facture_id=facture_id)
             
             messages.success(request, f'Facture de transfert "{reference_transfert}" modifiée avec succès!')
             return redirect('consulter_factures_transfert')
             
         except Exception as e:
-            # Retirer le flag en cas d'erreur
-            request.session.pop('modification_en_cours', None)
             messages.error(request, f'Erreur lors de la modification de la facture: {str(e)}')
             return redirect('modifier_facture_transfert', facture_id=facture_id)
     
@@ -16358,54 +14161,19 @@ def supprimer_facture_transfert(request, facture_id):
         agence = get_user_agence(request)
         facture = FactureTransfert.objects.select_related('agence_source').get(id=facture_id, agence_source=agence)
         facture_name = facture.reference_transfert
-        etat_normalise = (facture.etat or 'sortir').strip().lower()
         
-        with transaction.atomic():
-            # NE PLUS SUPPRIMER LES MOUVEMENTS - Créer des mouvements de correction à la place
-            lignes = LigneFactureTransfert.objects.select_related('article').filter(facture_transfert=facture)
-            
-            for ligne in lignes:
-                article = ligne.article
-                if not article:
-                    continue
-                
-                quantite = Decimal(str(ligne.quantite))
-                ancien_stock = article.stock_actuel
-                
-                if etat_normalise == 'entrer':
-                    article.stock_actuel = max(Decimal('0'), article.stock_actuel - quantite)
-                    commentaire = f"Correction - Suppression facture transfert {facture.reference_transfert} - retrait stock"
-                else:
-                    article.stock_actuel += quantite
-                    commentaire = f"Correction - Suppression facture transfert {facture.reference_transfert} - restauration stock"
-                
-                article.save()
-                
-                # Créer un mouvement de correction (les mouvements originaux sont conservés pour traçabilité)
-                try:
-                    MouvementStock.objects.create(
-                        article=article,
-                        agence=agence,
-                        type_mouvement='ajustement',
-                        date_mouvement=timezone.now(),
-                        numero_piece=f"SUPP-{facture.reference_transfert}",
-                        quantite_stock=article.stock_actuel,
-                        stock_initial=ancien_stock,
-                        solde=article.stock_actuel,
-                        quantite=quantite,
-                        cout_moyen_pondere=float(article.prix_achat),
-                        stock_permanent=float(article.stock_actuel * article.prix_achat),
-                        commentaire=commentaire,
-                        facture_transfert=facture
-                    )
-                except Exception as mouvement_error:
-                    print(f"[WARNING] Erreur enregistrement mouvement correction suppression transfert: {mouvement_error}")
-            
-            facture.delete()
+        # Effet inverse sur les deux côtés (mouvements d'ajustement SUPP-<référence>), puis suppression
+        from .transfert_stock import supprimer_transfert
+        supprimer_transfert(facture)
         
         messages.success(request, f'Facture de transfert "{facture_name}" supprimée avec succès!')
     except FactureTransfert.DoesNotExist:
         messages.error(request, 'Facture de transfert non trouvée.')
+    except StockInsuffisant as e:
+        article = Article.objects.filter(id=e.article_id).only('designation').first()
+        designation = article.designation if article else e.article_id
+        messages.error(request, f'Suppression impossible : stock insuffisant pour l\'article {designation} '
+                                f'(sortie de {e.quantite}).')
     except Exception as e:
         messages.error(request, f'Erreur lors de la suppression: {str(e)}')
     
@@ -16419,36 +14187,38 @@ def search_articles_stock(request):
     """Vue pour la recherche d'articles dans le module de stock"""
     search_term = request.GET.get('q', '')
     
-    print(f"[SEARCH] search_articles_stock: recherche pour '{search_term}'")
+    logger.debug("[SEARCH] search_articles_stock: recherche pour '%s'", search_term)
     
     # Vérifier d'abord s'il y a des articles dans la base de données
     total_articles = Article.objects.count()
-    print(f"[CHART] Total articles dans la base de données: {total_articles}")
+    logger.debug("[CHART] Total articles dans la base de données: %s", total_articles)
     
     if total_articles == 0:
-        print("[ERREUR] Aucun article dans la base de données!")
+        logger.error("Aucun article dans la base de données!")
         return JsonResponse({'articles': []})
     
     agence = get_user_agence(request)
-    print(f"[BUILDING] Agence trouvée: {agence}")
-    print(f"[BUILDING] ID de l'agence: {agence.id_agence if agence else 'None'}")
-    print(f"[BUILDING] Nom de l'agence: {agence.nom_agence if agence else 'None'}")
+    logger.debug("[BUILDING] Agence trouvée: %s", agence)
+    logger.debug("[BUILDING] ID de l'agence: %s", (agence.id_agence if agence else 'None'))
+    logger.debug("[BUILDING] Nom de l'agence: %s", (agence.nom_agence if agence else 'None'))
     
     if not agence:
-        print("[ERREUR] Aucune agence trouvée")
+        logger.error("Aucune agence trouvée")
         return JsonResponse({'articles': []})
     
     # Test: afficher tous les articles sans filtre d'agence
     articles_all = Article.objects.all()
-    print(f"[PACKAGE] Tous les articles (toutes agences): {articles_all.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[PACKAGE] Tous les articles (toutes agences): %s", articles_all.count())
     for article in articles_all[:5]:  # Afficher les 5 premiers
-        print(f"  - {article.designation} (Agence: {article.agence.nom_agence if article.agence else 'None'})")
+        logger.debug("  - %s (Agence: %s)", article.designation, (article.agence.nom_agence if article.agence else 'None'))
     
     # Test: afficher les articles de cette agence spécifique
     articles_agence = Article.objects.filter(agence=agence)
-    print(f"[PACKAGE] Articles de l'agence {agence.nom_agence}: {articles_agence.count()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[PACKAGE] Articles de l'agence %s: %s", agence.nom_agence, articles_agence.count())
     for article in articles_agence[:5]:  # Afficher les 5 premiers
-        print(f"  - {article.reference_article} - {article.designation} (ID: {article.id})")
+        logger.debug("  - %s - %s (ID: %s)", article.reference_article, article.designation, article.id)
     
     articles = []
     
@@ -16460,13 +14230,15 @@ def search_articles_stock(request):
         ).filter(
             Q(designation__icontains=search_term) | Q(reference_article__icontains=search_term)
         ).order_by('designation')[:50]
-        print(f"[SEARCH] Articles trouvés avec recherche '{search_term}' (agence {agence.nom_agence}): {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SEARCH] Articles trouvés avec recherche '%s' (agence %s): %s", search_term, agence.nom_agence, articles.count())
         for article in articles[:10]:  # Afficher les 10 premiers résultats
-            print(f"  - {article.reference_article} - {article.designation} (ID: {article.id})")
+            logger.debug("  - %s - %s (ID: %s)", article.reference_article, article.designation, article.id)
     else:
         # Afficher tous les articles de l'agence si pas de terme de recherche
         articles = Article.objects.filter(agence=agence).order_by('designation')[:50]
-        print(f"[PACKAGE] Tous les articles de l'agence {agence.nom_agence}: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Tous les articles de l'agence %s: %s", agence.nom_agence, articles.count())
     
     # Convertir les articles en format JSON
     articles_data = []
@@ -16478,9 +14250,10 @@ def search_articles_stock(request):
             'stock': float(article.stock_actuel) if article.stock_actuel else 0.0,
             'reference_article': article.reference_article or '',
         })
-        print(f"[NOTE] Article ajouté: {article.reference_article} - {article.designation} (ID: {article.id}, Agence: {article.agence.nom_agence})")
+        logger.debug("[NOTE] Article ajouté: %s - %s (ID: %s, Agence: %s)", article.reference_article, article.designation, article.id, article.agence.nom_agence)
     
-    print(f"[CHART] Total articles_data: {len(articles_data)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[CHART] Total articles_data: %s", len(articles_data))
     return JsonResponse({'articles': articles_data})
 
 def create_test_articles(request):
@@ -16567,12 +14340,12 @@ def generer_inventaire(request):
         selection_articles = request.POST.get('selection_articles', 'tous')  # 'tous' ou 'selectionnes'
         articles_selectionnes = request.POST.getlist('articles_selectionnes[]')
         
-        print(f"[SEARCH] PARAMÈTRES INVENTAIRE:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Famille: {famille_id}")
-        print(f"  - Sélection: {selection_articles}")
-        print(f"  - Articles sélectionnés: {articles_selectionnes}")
+        logger.debug("[SEARCH] PARAMÈTRES INVENTAIRE:")
+        logger.debug("  - Date début: %s", date_debut)
+        logger.debug("  - Date fin: %s", date_fin)
+        logger.debug("  - Famille: %s", famille_id)
+        logger.debug("  - Sélection: %s", selection_articles)
+        logger.debug("  - Articles sélectionnés: %s", articles_selectionnes)
         
         # Filtrer les articles selon les critères
         articles_query = Article.objects.filter(agence=agence)
@@ -16587,7 +14360,8 @@ def generer_inventaire(request):
         
         articles = articles_query.order_by('designation')
         
-        print(f"[PACKAGE] ARTICLES FILTRÉS: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] ARTICLES FILTRÉS: %s", articles.count())
         
         # Créer l'inventaire
         numero_inventaire = f"INV-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
@@ -16604,49 +14378,75 @@ def generer_inventaire(request):
             commentaire=f"Inventaire généré le {timezone.now().strftime('%d/%m/%Y à %H:%M')}"
         )
         
-        # Créer les lignes d'inventaire
-        total_quantite = 0
-        total_valeur = 0
-        
-        for article in articles:
-            valeur = float(article.stock_actuel) * float(article.prix_achat)
-            
-            LigneInventaireStock.objects.create(
-                inventaire=inventaire,
-                reference_article=article.reference_article,
-                designation=article.designation,
-                quantite_stock=article.stock_actuel,
-                prix_unitaire=article.prix_achat,
-                valeur=valeur,
-                conditionnement=article.conditionnement,
-                article=article
-            )
-            
-            total_quantite += article.stock_actuel
-            total_valeur += valeur
+        # Créer les lignes d'inventaire (bulk_create par lots, voir comptage_inventaire.py)
+        from .comptage_inventaire import creer_lignes
+        total_articles, total_quantite, total_valeur = creer_lignes(inventaire, articles)
         
         # Marquer l'inventaire comme terminé
         inventaire.date_fin = timezone.now()
         inventaire.statut = 'termine'
         inventaire.save()
         
-        print(f"[OK] INVENTAIRE CRÉÉ: {numero_inventaire}")
-        print(f"[CHART] TOTAUX: {total_quantite} articles, {total_valeur} FCFA")
+        logger.debug("INVENTAIRE CRÉÉ: %s", numero_inventaire)
+        logger.debug("[CHART] TOTAUX: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return JsonResponse({
             'success': True,
             'inventaire_id': inventaire.id,
             'numero_inventaire': numero_inventaire,
-            'total_articles': articles.count(),
-            'total_quantite': total_quantite,
-            'total_valeur': total_valeur
+            'total_articles': total_articles,
+            'total_quantite': float(total_quantite),
+            'total_valeur': float(total_valeur)
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR GÉNÉRATION INVENTAIRE: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR GÉNÉRATION INVENTAIRE: %s", e)
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@login_required
+def importer_comptage_inventaire(request):
+    """Importer les quantités comptées (CSV ou XLSX, par référence article) : inventaire, écarts et stock en une transaction"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
+    
+    agence = get_user_agence(request)
+    if not agence:
+        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
+    
+    fichier = request.FILES.get('fichier')
+    if not fichier:
+        return JsonResponse({'success': False, 'error': 'Aucun fichier de comptage reçu'})
+    
+    from .comptage_inventaire import ComptageInvalide, importer_comptage, lire_comptage
+    try:
+        comptes = lire_comptage(fichier)
+    except ComptageInvalide as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    responsable = (
+        Employe.objects.filter(compte__user=request.user).first()
+        or Employe.objects.filter(compte__agence=agence).first()
+    )
+    if responsable is None:
+        return JsonResponse({'success': False, 'error': 'Aucun employé responsable pour cette agence'})
+    
+    try:
+        resultat = importer_comptage(agence, comptes, responsable)
+    except Exception as e:
+        logger.exception("IMPORT COMPTAGE INVENTAIRE: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
+    
+    inventaire = resultat['inventaire']
+    return JsonResponse({
+        'success': True,
+        'inventaire_id': inventaire.id,
+        'numero_inventaire': inventaire.numero_inventaire,
+        'total_articles': resultat['lignes'],
+        'ecarts': resultat['ecarts'],
+        'valeur_ecarts': float(resultat['valeur_ecarts']),
+        'references_inconnues': resultat['inconnues'][:100],
+        'nombre_references_inconnues': len(resultat['inconnues']),
+    })
 
 @login_required
 def export_inventaire_excel(request):
@@ -16677,7 +14477,7 @@ def export_inventaire_excel(request):
             import openpyxl
             from openpyxl.styles import Font, Alignment, PatternFill
         except ImportError:
-            print("[ERREUR] Module openpyxl non disponible, utilisation du format CSV")
+            logger.error("Module openpyxl non disponible, utilisation du format CSV")
             return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
         
         from django.http import HttpResponse
@@ -16756,16 +14556,15 @@ def export_inventaire_excel(request):
         # Sauvegarder le classeur dans la réponse
         wb.save(response)
         
-        print(f"[CHART] EXPORT EXCEL - Inventaire {inventaire.numero_inventaire}")
-        print(f"[CHART] EXPORT EXCEL - {len(lignes)} articles exportés")
-        print(f"[CHART] EXPORT EXCEL - Total: {total_quantite} articles, {total_valeur} FCFA")
+        logger.debug("[CHART] EXPORT EXCEL - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT EXCEL - %s articles exportés", len(lignes))
+        logger.debug("[CHART] EXPORT EXCEL - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT EXCEL: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -16800,7 +14599,7 @@ def export_inventaire_pdf(request):
             from reportlab.lib import colors
             from reportlab.lib.units import cm
         except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
+            logger.error("Module reportlab non disponible")
             return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
         
         from django.http import HttpResponse
@@ -16897,16 +14696,15 @@ def export_inventaire_pdf(request):
         # Construire le PDF
         doc.build(elements)
         
-        print(f"📄 EXPORT PDF - Inventaire {inventaire.numero_inventaire}")
-        print(f"📄 EXPORT PDF - {len(lignes)} articles exportés")
-        print(f"📄 EXPORT PDF - Total: {total_quantite} articles, {total_valeur} FCFA")
+        logger.debug("📄 EXPORT PDF - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📄 EXPORT PDF - %s articles exportés", len(lignes))
+        logger.debug("📄 EXPORT PDF - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT PDF: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -16973,16 +14771,15 @@ def export_inventaire_csv(request):
         writer.writerow([])  # Ligne vide
         writer.writerow(['', '', 'TOTAL GÉNÉRAL:', total_quantite, '', total_valeur])
         
-        print(f"[CHART] EXPORT CSV - Inventaire {inventaire.numero_inventaire}")
-        print(f"[CHART] EXPORT CSV - {len(lignes)} articles exportés")
-        print(f"[CHART] EXPORT CSV - Total: {total_quantite} articles, {total_valeur} FCFA")
+        logger.debug("[CHART] EXPORT CSV - Inventaire %s", inventaire.numero_inventaire)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT CSV - %s articles exportés", len(lignes))
+        logger.debug("[CHART] EXPORT CSV - Total: %s articles, %s FCFA", total_quantite, total_valeur)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT CSV: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 # ==================== STATISTIQUES DE VENTE ====================
@@ -17008,33 +14805,19 @@ def statistiques_vente(request):
     # Calculer les statistiques de vente des 30 derniers jours
     date_debut = timezone.now().date() - timezone.timedelta(days=30)
     
-    # Récupérer les ventes des 30 derniers jours
-    ventes_recentes = LigneFactureVente.objects.filter(
-        facture_vente__agence=agence,
-        facture_vente__date__gte=date_debut
-    ).select_related('article', 'facture_vente')
-    
-    # Calculer le chiffre d'affaires total
-    chiffre_affaires_total = float(ventes_recentes.aggregate(
-        total=Sum(F('quantite') * F('prix_unitaire'))
-    )['total'] or 0)
-    
-    # Calculer la marge totale
-    marge_totale = Decimal('0')
-    for vente in ventes_recentes:
-        prix_achat = Decimal(str(vente.article.prix_achat))
-        prix_vente = Decimal(str(vente.prix_unitaire))
-        marge_unitaire = prix_vente - prix_achat
-        marge_totale += marge_unitaire * Decimal(str(vente.quantite))
+    # Chiffre d'affaires et marge des 30 derniers jours : statistiques par période rafraîchies puis une lecture
+    from .statistiques_vente import rafraichir, totaux_periode
+    rafraichir(agence)
+    totaux = totaux_periode(agence, date_debut, timezone.now().date())
     
     context = {
         'agence': agence,
         'articles': articles,
         'familles': familles,
         'total_articles': total_articles,
-        'chiffre_affaires_total': chiffre_affaires_total,
-        'marge_totale': float(marge_totale),
-        'pourcentage_marge_global': (float(marge_totale) / float(chiffre_affaires_total) * 100) if chiffre_affaires_total > 0 else 0,
+        'chiffre_affaires_total': totaux['chiffre_affaires_total'],
+        'marge_totale': totaux['marge_totale'],
+        'pourcentage_marge_global': totaux['pourcentage_marge_global'],
     }
     
     return render(request, 'supermarket/stock/statistiques_vente.html', context)
@@ -17042,21 +14825,21 @@ def statistiques_vente(request):
 @login_required
 def generer_statistiques_vente(request):
     """Vue pour générer les statistiques de vente selon les critères sélectionnés"""
-    print("[START] DÉBUT GENERER_STATISTIQUES_VENTE")
+    logger.debug("[START] DÉBUT GENERER_STATISTIQUES_VENTE")
     
     if request.method != 'POST':
-        print("[ERREUR] Méthode non POST")
+        logger.error("Méthode non POST")
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'})
     
     try:
         agence = get_user_agence(request)
-        print(f"[SEARCH] Agence récupérée: {agence}")
+        logger.debug("[SEARCH] Agence récupérée: %s", agence)
     except Exception as e:
-        print(f"[ERREUR] Erreur get_user_agence: {e}")
+        logger.error("Erreur get_user_agence: %s", e)
         return JsonResponse({'success': False, 'error': f'Agence non trouvée: {str(e)}'})
     
     try:
-        print("[SEARCH] Début du traitement des paramètres")
+        logger.debug("[SEARCH] Début du traitement des paramètres")
         # Récupérer les paramètres
         date_debut = request.POST.get('date_debut')
         date_fin = request.POST.get('date_fin')
@@ -17068,12 +14851,12 @@ def generer_statistiques_vente(request):
         if not date_debut or not date_fin:
             return JsonResponse({'success': False, 'error': 'Les dates de début et de fin sont obligatoires'})
         
-        print(f"[CHART] PARAMÈTRES STATISTIQUES:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Famille: {famille_id}")
-        print(f"  - Sélection: {selection_articles}")
-        print(f"  - Articles sélectionnés: {articles_selectionnes}")
+        logger.debug("[CHART] PARAMÈTRES STATISTIQUES:")
+        logger.debug("  - Date début: %s", date_debut)
+        logger.debug("  - Date fin: %s", date_fin)
+        logger.debug("  - Famille: %s", famille_id)
+        logger.debug("  - Sélection: %s", selection_articles)
+        logger.debug("  - Articles sélectionnés: %s", articles_selectionnes)
         
         # Convertir les dates
         try:
@@ -17083,103 +14866,32 @@ def generer_statistiques_vente(request):
         except ValueError as e:
             return JsonResponse({'success': False, 'error': f'Format de date invalide: {str(e)}'})
         
-        # Filtrer les articles selon les critères
-        print(f"[SEARCH] Filtrage des articles pour agence: {agence}")
-        articles_query = Article.objects.filter(agence=agence)
-        print(f"[SEARCH] Articles de base: {articles_query.count()}")
-        
-        # Filtre par famille
-        if famille_id and famille_id != '':
-            print(f"[SEARCH] Filtrage par famille: {famille_id}")
-            articles_query = articles_query.filter(categorie_id=famille_id)
-            print(f"[SEARCH] Articles après filtre famille: {articles_query.count()}")
-        
-        # Filtre par sélection d'articles
-        if selection_articles == 'selectionnes' and articles_selectionnes:
-            print(f"[SEARCH] Filtrage par sélection: {articles_selectionnes}")
-            articles_query = articles_query.filter(id__in=articles_selectionnes)
-            print(f"[SEARCH] Articles après filtre sélection: {articles_query.count()}")
-        
-        articles = articles_query.order_by('designation')
-        print(f"[PACKAGE] ARTICLES FILTRÉS: {articles.count()}")
-        
-        # Récupérer les ventes pour la période
-        ventes = LigneFactureVente.objects.filter(
-            facture_vente__agence=agence,
-            facture_vente__date__gte=date_debut_obj,
-            facture_vente__date__lte=date_fin_obj,
-            article__in=articles
-        ).select_related('article', 'facture_vente')
-        
-        # Calculer les statistiques par article
-        statistiques_articles = []
-        chiffre_affaires_total = 0.0
-        marge_totale = 0.0
-        quantite_totale_vendue = 0.0
-        
-        for article in articles:
-            # Récupérer les ventes de cet article
-            ventes_article = ventes.filter(article=article)
-            
-            # Calculer les totaux pour cet article
-            quantite_vendue = float(ventes_article.aggregate(total=Sum('quantite'))['total'] or 0)
-            chiffre_affaires_article = float(ventes_article.aggregate(
-                total=Sum(F('quantite') * F('prix_unitaire'))
-            )['total'] or 0)
-            
-            # Calculer la marge
-            prix_achat = Decimal(str(article.prix_achat))
-            marge_unitaire = Decimal('0')
-            marge_article = Decimal('0')
-            
-            if quantite_vendue > 0:
-                prix_vente_moyen = Decimal(str(chiffre_affaires_article)) / Decimal(str(quantite_vendue))
-                marge_unitaire = prix_vente_moyen - prix_achat
-                marge_article = marge_unitaire * Decimal(str(quantite_vendue))
-            
-            # Calculer le pourcentage de marge
-            if chiffre_affaires_article > 0:
-                pourcentage_marge = (marge_article / Decimal(str(chiffre_affaires_article)) * Decimal('100'))
-            else:
-                pourcentage_marge = Decimal('0')
-            
-            if quantite_vendue > 0:  # Ne garder que les articles vendus
-                statistiques_articles.append({
-                    'reference_article': article.reference_article,
-                    'designation': article.designation,
-                    'quantite_vendue': float(quantite_vendue),
-                    'chiffre_affaires': float(chiffre_affaires_article),
-                    'marge_profit': float(marge_article),
-                    'pourcentage_marge': float(pourcentage_marge),
-                })
-                
-                chiffre_affaires_total += float(chiffre_affaires_article)
-                marge_totale += float(marge_article)
-                quantite_totale_vendue += float(quantite_vendue)
-        
-        # Calculer le pourcentage de marge global
-        if chiffre_affaires_total > 0:
-            pourcentage_marge_global = (marge_totale / float(chiffre_affaires_total) * 100)
-        else:
-            pourcentage_marge_global = 0
-        
-        print(f"[CHART] STATISTIQUES GÉNÉRÉES:")
-        print(f"  - Articles vendus: {len(statistiques_articles)}")
-        print(f"  - Quantité totale vendue: {quantite_totale_vendue}")
-        print(f"  - Chiffre d'affaires total: {chiffre_affaires_total}")
-        print(f"  - Marge totale: {marge_totale}")
-        print(f"  - Pourcentage marge global: {pourcentage_marge_global:.2f}%")
-        
-        # Stocker les statistiques dans la session pour l'export (conversion en types sérialisables)
-        request.session['statistiques_vente'] = {
-            'date_debut': str(date_debut),
-            'date_fin': str(date_fin),
-            'statistiques_articles': statistiques_articles,  # Déjà converties en float
-            'chiffre_affaires_total': float(chiffre_affaires_total),
-            'marge_totale': float(marge_totale),
-            'quantite_totale_vendue': int(quantite_totale_vendue),
-            'pourcentage_marge_global': float(pourcentage_marge_global),
+        # Quantité, chiffre d'affaires et marge par article : lus dans les statistiques par période
+        # (rafraîchies depuis les ventes journalières), sans relire les lignes de facture
+        from .statistiques_vente import rapport
+        criteres = {
+            'date_debut': date_debut_obj.isoformat(),
+            'date_fin': date_fin_obj.isoformat(),
+            'famille': famille_id or None,
+            'articles': articles_selectionnes if selection_articles == 'selectionnes' else None,
         }
+        statistiques = rapport(agence, criteres)
+        statistiques_articles = statistiques['statistiques_articles']
+        quantite_totale_vendue = statistiques['quantite_totale_vendue']
+        chiffre_affaires_total = statistiques['chiffre_affaires_total']
+        marge_totale = statistiques['marge_totale']
+        pourcentage_marge_global = statistiques['pourcentage_marge_global']
+        
+        logger.debug("[CHART] STATISTIQUES GÉNÉRÉES:")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  - Articles vendus: %s", len(statistiques_articles))
+        logger.debug("  - Quantité totale vendue: %s", quantite_totale_vendue)
+        logger.debug("  - Chiffre d'affaires total: %s", chiffre_affaires_total)
+        logger.debug("  - Marge totale: %s", marge_totale)
+        logger.debug("  - Pourcentage marge global: %.2f%%", pourcentage_marge_global)
+        
+        # Garder les critères en session : les exports relisent les statistiques par période
+        request.session['statistiques_vente'] = criteres
         
         return JsonResponse({
             'success': True,
@@ -17192,9 +14904,7 @@ def generer_statistiques_vente(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR GÉNÉRATION STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR GÉNÉRATION STATISTIQUES: %s", e)
         error_details = f"Erreur: {str(e)}"
         if hasattr(e, '__class__'):
             error_details += f" (Type: {e.__class__.__name__})"
@@ -17208,8 +14918,9 @@ def export_statistiques_excel(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Relire les statistiques par période d'après les critères gardés en session
+        from .statistiques_vente import rapport
+        statistiques_data = rapport(agence, request.session.get('statistiques_vente'))
         
         if not statistiques_data:
             return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
@@ -17228,7 +14939,7 @@ def export_statistiques_excel(request):
             import openpyxl
             from openpyxl.styles import Font, Alignment, PatternFill
         except ImportError:
-            print("[ERREUR] Module openpyxl non disponible, utilisation du format CSV")
+            logger.error("Module openpyxl non disponible, utilisation du format CSV")
             return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
         
         from django.http import HttpResponse
@@ -17302,16 +15013,15 @@ def export_statistiques_excel(request):
         buffer.seek(0)
         response.write(buffer.getvalue())
         
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"[CHART] EXPORT EXCEL STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("[CHART] EXPORT EXCEL STATISTIQUES - Période: %s à %s", date_debut, date_fin)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT EXCEL STATISTIQUES - %s articles", len(statistiques_articles))
+        logger.debug("[CHART] EXPORT EXCEL STATISTIQUES - Total: %s vendus, %s FCFA", quantite_totale_vendue, chiffre_affaires_total)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT EXCEL STATISTIQUES: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -17323,8 +15033,9 @@ def export_statistiques_pdf(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Relire les statistiques par période d'après les critères gardés en session
+        from .statistiques_vente import rapport
+        statistiques_data = rapport(agence, request.session.get('statistiques_vente'))
         
         if not statistiques_data:
             return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
@@ -17346,7 +15057,7 @@ def export_statistiques_pdf(request):
             from reportlab.lib import colors
             from reportlab.lib.units import cm
         except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
+            logger.error("Module reportlab non disponible")
             return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
         
         from django.http import HttpResponse
@@ -17428,16 +15139,15 @@ def export_statistiques_pdf(request):
         # Construire le PDF
         doc.build(elements)
         
-        print(f"📄 EXPORT PDF STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"📄 EXPORT PDF STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"📄 EXPORT PDF STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("📄 EXPORT PDF STATISTIQUES - Période: %s à %s", date_debut, date_fin)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📄 EXPORT PDF STATISTIQUES - %s articles", len(statistiques_articles))
+        logger.debug("📄 EXPORT PDF STATISTIQUES - Total: %s vendus, %s FCFA", quantite_totale_vendue, chiffre_affaires_total)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT PDF STATISTIQUES: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -17449,8 +15159,9 @@ def export_statistiques_csv(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        # Récupérer les statistiques depuis la session
-        statistiques_data = request.session.get('statistiques_vente')
+        # Relire les statistiques par période d'après les critères gardés en session
+        from .statistiques_vente import rapport
+        statistiques_data = rapport(agence, request.session.get('statistiques_vente'))
         
         if not statistiques_data:
             return JsonResponse({'success': False, 'error': 'Aucune statistique générée'})
@@ -17499,38 +15210,37 @@ def export_statistiques_csv(request):
         writer.writerow([])  # Ligne vide
         writer.writerow(['TOTAL GÉNÉRAL', '', quantite_totale_vendue, chiffre_affaires_total, marge_totale, pourcentage_marge_global])
         
-        print(f"[CHART] EXPORT CSV STATISTIQUES - Période: {date_debut} à {date_fin}")
-        print(f"[CHART] EXPORT CSV STATISTIQUES - {len(statistiques_articles)} articles")
-        print(f"[CHART] EXPORT CSV STATISTIQUES - Total: {quantite_totale_vendue} vendus, {chiffre_affaires_total} FCFA")
+        logger.debug("[CHART] EXPORT CSV STATISTIQUES - Période: %s à %s", date_debut, date_fin)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT CSV STATISTIQUES - %s articles", len(statistiques_articles))
+        logger.debug("[CHART] EXPORT CSV STATISTIQUES - Total: %s vendus, %s FCFA", quantite_totale_vendue, chiffre_affaires_total)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV STATISTIQUES: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT CSV STATISTIQUES: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
 def test_statistiques(request):
     """Vue de test pour diagnostiquer les problèmes"""
     try:
-        print("🧪 TEST STATISTIQUES - Début")
+        logger.debug("🧪 TEST STATISTIQUES - Début")
         
         # Test 1: Récupération de l'agence
         agence = get_user_agence(request)
-        print(f"🧪 TEST - Agence récupérée: {agence}")
+        logger.debug("🧪 TEST - Agence récupérée: %s", agence)
         
         # Test 2: Vérification des imports
-        print("🧪 TEST - Import Decimal OK")
+        logger.debug("🧪 TEST - Import Decimal OK")
         
         # Test 3: Vérification des modèles
         articles_count = Article.objects.filter(agence=agence).count()
-        print(f"🧪 TEST - Articles trouvés: {articles_count}")
+        logger.debug("🧪 TEST - Articles trouvés: %s", articles_count)
         
         # Test 4: Vérification des ventes
         ventes_count = LigneFactureVente.objects.filter(facture_vente__agence=agence).count()
-        print(f"🧪 TEST - Ventes trouvées: {ventes_count}")
+        logger.debug("🧪 TEST - Ventes trouvées: %s", ventes_count)
         
         return JsonResponse({
             'success': True,
@@ -17541,9 +15251,7 @@ def test_statistiques(request):
         })
         
     except Exception as e:
-        print(f"🧪 TEST - Erreur: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("🧪 TEST - Erreur: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 # ==================== MOUVEMENTS DE STOCK ====================
@@ -17618,11 +15326,11 @@ def consulter_mouvements_stock(request):
         article_ids = request.POST.getlist('articles')  # Récupérer tous les articles sélectionnés
         type_mouvement = request.POST.get('type_mouvement', '')
         
-        print(f"[CHART] PARAMÈTRES MOUVEMENTS:")
-        print(f"  - Date début: {date_debut}")
-        print(f"  - Date fin: {date_fin}")
-        print(f"  - Articles: {article_ids}")
-        print(f"  - Type mouvement: {type_mouvement}")
+        logger.debug("[CHART] PARAMÈTRES MOUVEMENTS:")
+        logger.debug("  - Date début: %s", date_debut)
+        logger.debug("  - Date fin: %s", date_fin)
+        logger.debug("  - Articles: %s", article_ids)
+        logger.debug("  - Type mouvement: %s", type_mouvement)
         
         # Vérification des paramètres obligatoires
         if not date_debut or not date_fin:
@@ -17662,19 +15370,21 @@ def consulter_mouvements_stock(request):
         
         mouvements = mouvements_query
         
-        print(f"[PACKAGE] MOUVEMENTS FILTRÉS: {mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] MOUVEMENTS FILTRÉS: %s", mouvements.count())
         
         # Debug: Afficher quelques mouvements pour vérifier
         if mouvements.count() > 0:
-            print("[LIST] PREMIERS MOUVEMENTS TROUVÉS:")
+            logger.debug("[LIST] PREMIERS MOUVEMENTS TROUVÉS:")
             for i, mvt in enumerate(mouvements[:3]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement}")
+                logger.debug("  %s. %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement)
         else:
-            print("[ERREUR] AUCUN MOUVEMENT TROUVÉ - Vérifions les mouvements existants:")
+            logger.error("AUCUN MOUVEMENT TROUVÉ - Vérifions les mouvements existants:")
             tous_mouvements = MouvementStock.objects.filter(agence=agence, article__in=articles)
-            print(f"[CHART] Total mouvements pour ces articles: {tous_mouvements.count()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[CHART] Total mouvements pour ces articles: %s", tous_mouvements.count())
             for i, mvt in enumerate(tous_mouvements[:3]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement}")
+                logger.debug("  %s. %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement)
         
         # Calculer les statistiques
         total_mouvements = mouvements.count()
@@ -17715,11 +15425,11 @@ def consulter_mouvements_stock(request):
                 'commentaire': mouvement.commentaire or '',
             })
         
-        print(f"[CHART] MOUVEMENTS GÉNÉRÉS:")
-        print(f"  - Total mouvements: {total_mouvements}")
-        print(f"  - Entrées: {mouvements_entree}")
-        print(f"  - Sorties: {mouvements_sortie}")
-        print(f"  - Valeur stock permanent: {valeur_stock_permanent}")
+        logger.debug("[CHART] MOUVEMENTS GÉNÉRÉS:")
+        logger.debug("  - Total mouvements: %s", total_mouvements)
+        logger.debug("  - Entrées: %s", mouvements_entree)
+        logger.debug("  - Sorties: %s", mouvements_sortie)
+        logger.debug("  - Valeur stock permanent: %s", valeur_stock_permanent)
         
         # Stocker les mouvements dans la session pour l'export (sans Decimal)
         session_payload = {
@@ -17743,10 +15453,11 @@ def consulter_mouvements_stock(request):
         try:
             json.dumps(clean_payload)
         except TypeError as json_error:
-            print(f"[ERROR] JSON serialization issue dans mouvements_stock: {json_error}")
+            logger.error("[ERROR] JSON serialization issue dans mouvements_stock: %s", json_error)
             for idx, mouvement in enumerate(clean_payload.get('mouvements_data', [])):
                 for key, value in mouvement.items():
-                    print(f"    mouvement[{idx}].{key} -> {type(value)} = {value}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("    mouvement[%s].%s -> %s = %s", idx, key, type(value), value)
             raise
 
         request.session['mouvements_stock'] = clean_payload
@@ -17776,9 +15487,7 @@ def consulter_mouvements_stock(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR CONSULTATION MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR CONSULTATION MOUVEMENTS: %s", e)
         error_details = f"Erreur: {str(e)}"
         if hasattr(e, '__class__'):
             error_details += f" (Type: {e.__class__.__name__})"
@@ -17815,7 +15524,7 @@ def export_mouvements_excel(request):
             import openpyxl
             from openpyxl.styles import Font, Alignment, PatternFill
         except ImportError:
-            print("[ERREUR] Module openpyxl non disponible")
+            logger.error("Module openpyxl non disponible")
             return JsonResponse({'success': False, 'error': 'Module openpyxl non installé. Veuillez installer openpyxl pour l\'export Excel.'})
         
         from django.http import HttpResponse
@@ -17992,17 +15701,16 @@ def export_mouvements_excel(request):
         buffer.seek(0)
         response.write(buffer.getvalue())
         
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Article: {article_reference}")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
-        print(f"[CHART] EXPORT EXCEL MOUVEMENTS - Articles groupés: {len(articles_tries)}")
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] EXPORT EXCEL MOUVEMENTS - Articles groupés: %s", len(articles_tries))
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT EXCEL MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT EXCEL MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 @login_required
 def export_mouvements_pdf(request):
@@ -18038,7 +15746,7 @@ def export_mouvements_pdf(request):
             from reportlab.lib import colors
             from reportlab.lib.units import cm
         except ImportError:
-            print("[ERREUR] Module reportlab non disponible")
+            logger.error("Module reportlab non disponible")
             return JsonResponse({'success': False, 'error': 'Module reportlab non installé. Veuillez installer reportlab pour l\'export PDF.'})
         
         from django.http import HttpResponse
@@ -18124,16 +15832,14 @@ def export_mouvements_pdf(request):
         # Construire le PDF
         doc.build(elements)
         
-        print(f"📄 EXPORT PDF MOUVEMENTS - Article: {article_reference}")
-        print(f"📄 EXPORT PDF MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"📄 EXPORT PDF MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("📄 EXPORT PDF MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT PDF MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT PDF MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -18199,131 +15905,48 @@ def export_mouvements_csv(request):
         writer.writerow([])  # Ligne vide
         writer.writerow(['TOTAL GÉNÉRAL', f'Entrées: {mouvements_entree}, Sorties: {mouvements_sortie}', f'{total_mouvements} mouvements', '', '', '', valeur_stock_permanent, ''])
         
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - Article: {article_reference}")
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - {total_mouvements} mouvements")
-        print(f"[CHART] EXPORT CSV MOUVEMENTS - Valeur stock permanent: {valeur_stock_permanent} FCFA")
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - Article: %s", article_reference)
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - %s mouvements", total_mouvements)
+        logger.debug("[CHART] EXPORT CSV MOUVEMENTS - Valeur stock permanent: %s FCFA", valeur_stock_permanent)
         
         return response
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR EXPORT CSV MOUVEMENTS: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR EXPORT CSV MOUVEMENTS: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
 def creer_mouvements_retroactifs(request):
-    """Vue simplifiée pour créer des mouvements de stock rétroactifs"""
-    try:
-        agence = get_user_agence(request)
-    except:
-        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
-    
+    """Reconstruire les mouvements de stock de l'agence à partir de ses pièces (registre_stock.py)"""
     try:
-        print("[REFRESH] CRÉATION MOUVEMENTS RÉTROACTIFS (VERSION SIMPLIFIÉE)...")
-        print(f"[TARGET] Agence utilisée: {agence.nom_agence}")
-        
-        mouvements_crees = 0
-        
-        # 1. Créer des mouvements pour les factures de vente
-        factures_vente = FactureVente.objects.filter(agence=agence)
-        print(f"[CHART] Factures de vente: {factures_vente.count()}")
-        
-        for facture in factures_vente:
-            lignes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"[SEARCH] Facture {facture.numero_ticket}: {lignes.count()} lignes")
-            
-            for ligne in lignes:
-                print(f"  [PACKAGE] Article: {ligne.article.designation}, Quantité: {ligne.quantite}")
-                
-                # Vérifier si le mouvement existe déjà
-                mouvement_existe = MouvementStock.objects.filter(facture_vente=facture, article=ligne.article).exists()
-                print(f"  [SEARCH] Mouvement existe déjà: {mouvement_existe}")
-                
-                if not mouvement_existe:
-                    try:
-                        from datetime import datetime
-                        from django.utils import timezone
-                        
-                        # Utiliser timezone.now() pour la date
-                        date_mouvement = timezone.now()
-                        
-                        MouvementStock.objects.create(
-                            article=ligne.article,
-                            agence=agence,
-                            type_mouvement='sortie',
-                            date_mouvement=date_mouvement,
-                            numero_piece=facture.numero_ticket,
-                            quantite_stock=ligne.article.stock_actuel,
-                            stock_initial=ligne.article.stock_actuel + ligne.quantite,
-                            solde=ligne.article.stock_actuel,
-                            quantite=ligne.quantite,
-                            cout_moyen_pondere=float(ligne.prix_unitaire),
-                            stock_permanent=float(ligne.article.stock_actuel * ligne.prix_unitaire),
-                            facture_vente=facture,
-                            commentaire=f"Vente - {facture.numero_ticket}"
-                        )
-                        mouvements_crees += 1
-                        print(f"[OK] Vente: {ligne.article.designation} - {facture.numero_ticket}")
-                    except Exception as e:
-                        print(f"[ERREUR] Erreur vente {facture.numero_ticket}: {e}")
-        
-        # 2. Créer des mouvements pour les factures d'achat
-        factures_achat = FactureAchat.objects.filter(agence=agence)
-        print(f"[CHART] Factures d'achat: {factures_achat.count()}")
+        agence = get_user_agence(request)
+    except:
+        return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
+    
+    try:
+        from supermarket.registre_stock import premier_jour, reconstruire_registre
         
-        for facture in factures_achat:
-            lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
-            print(f"[SEARCH] Facture achat {facture.reference_achat}: {lignes.count()} lignes")
-            
-            for ligne in lignes:
-                print(f"  [PACKAGE] Article: {ligne.article.designation}, Quantité: {ligne.quantite}")
-                
-                mouvement_existe = MouvementStock.objects.filter(facture_achat=facture, article=ligne.article).exists()
-                print(f"  [SEARCH] Mouvement existe déjà: {mouvement_existe}")
-                
-                if not mouvement_existe:
-                    try:
-                        from django.utils import timezone
-                        
-                        MouvementStock.objects.create(
-                            article=ligne.article,
-                            agence=agence,
-                            type_mouvement='entree',
-                            date_mouvement=timezone.now(),
-                            numero_piece=facture.reference_achat,
-                            quantite_stock=ligne.article.stock_actuel,
-                            stock_initial=ligne.article.stock_actuel - ligne.quantite,
-                            solde=ligne.article.stock_actuel,
-                            quantite=ligne.quantite,
-                            cout_moyen_pondere=float(ligne.prix_unitaire),
-                            stock_permanent=float(ligne.article.stock_actuel * ligne.prix_unitaire),
-                            facture_achat=facture,
-                            fournisseur=facture.fournisseur,
-                            commentaire=f"Achat - {facture.reference_achat}"
-                        )
-                        mouvements_crees += 1
-                        print(f"[OK] Achat: {ligne.article.designation} - {facture.reference_achat}")
-                    except Exception as e:
-                        print(f"[ERREUR] Erreur achat {facture.reference_achat}: {e}")
+        debut = premier_jour(agence)
+        if debut is None:
+            return JsonResponse({'success': False, 'error': 'Aucune vente ni aucun achat pour cette agence'})
         
+        resultat = reconstruire_registre(agence, debut, timezone.localdate())
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements créés, Total: {total_mouvements}")
+        logger.info("Registre reconstruit - %s mouvements créés, Total: %s", resultat['crees'], total_mouvements)
         
         return JsonResponse({
             'success': True,
-            'message': f'{mouvements_crees} mouvements créés! Total: {total_mouvements}',
+            'message': f"{resultat['crees']} mouvements recalculés ({resultat['supprimes']} remplacés)! Total: {total_mouvements}",
             'total_mouvements': total_mouvements,
-            'nouveaux_mouvements': mouvements_crees
+            'nouveaux_mouvements': resultat['crees']
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
+
 @login_required
 def diagnostic_mouvements(request):
     """Vue de diagnostic pour les mouvements de stock"""
@@ -18333,6 +15956,8 @@ def diagnostic_mouvements(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
+        from django.db.models import Count
+        
         # Compter les données
         articles_count = Article.objects.filter(agence=agence).count()
         factures_vente_count = FactureVente.objects.filter(agence=agence).count()
@@ -18342,21 +15967,19 @@ def diagnostic_mouvements(request):
         
         # Détails des factures
         factures_vente_details = []
-        for facture in FactureVente.objects.filter(agence=agence)[:5]:
-            lignes_count = LigneFactureVente.objects.filter(facture_vente=facture).count()
+        for facture in FactureVente.objects.filter(agence=agence).annotate(nombre_lignes=Count('lignes'))[:5]:
             factures_vente_details.append({
                 'numero': facture.numero_ticket,
                 'date': str(facture.date),
-                'lignes': lignes_count
+                'lignes': facture.nombre_lignes
             })
         
         factures_achat_details = []
-        for facture in FactureAchat.objects.filter(agence=agence)[:5]:
-            lignes_count = LigneFactureAchat.objects.filter(facture_achat=facture).count()
+        for facture in FactureAchat.objects.filter(agence=agence).annotate(nombre_lignes=Count('lignes'))[:5]:
             factures_achat_details.append({
                 'numero': facture.reference_achat,
                 'date': str(facture.date_achat),
-                'lignes': lignes_count
+                'lignes': facture.nombre_lignes
             })
         
         return JsonResponse({
@@ -18376,147 +15999,37 @@ def diagnostic_mouvements(request):
 
 @login_required
 def forcer_mouvements(request):
-    """Vue pour forcer la création de mouvements même s'ils existent déjà"""
+    """Vue pour forcer la reconstruction complète des mouvements de l'agence"""
     try:
         agence = get_user_agence(request)
     except:
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[HOT] CRÉATION FORCÉE DE MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
-        
-        mouvements_crees = 0
-        
-        # Supprimer tous les mouvements existants d'abord
-        anciens_mouvements = MouvementStock.objects.filter(agence=agence).count()
-        MouvementStock.objects.filter(agence=agence).delete()
-        print(f"🗑️ {anciens_mouvements} anciens mouvements supprimés")
-        
-        # Test de création d'un mouvement simple
-        articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles trouvés: {articles.count()}")
-        
-        if articles.exists():
-            article_test = articles.first()
-            print(f"🧪 Test avec article: {article_test.designation}")
-            
-            try:
-                from django.utils import timezone
-                
-                mouvement_test = MouvementStock.objects.create(
-                    article=article_test,
-                    agence=agence,
-                    type_mouvement='entree',
-                    date_mouvement=timezone.now(),
-                    numero_piece='TEST-001',
-                    quantite_stock=article_test.stock_actuel,
-                    stock_initial=0,
-                    solde=article_test.stock_actuel,
-                    quantite=1,
-                    cout_moyen_pondere=float(article_test.prix_achat),
-                    stock_permanent=float(article_test.stock_actuel * article_test.prix_achat),
-                    commentaire='Test de création'
-                )
-                print(f"[OK] MOUVEMENT TEST CRÉÉ AVEC SUCCÈS: ID {mouvement_test.id}")
-                mouvements_crees += 1
-                
-                # Supprimer le test
-                mouvement_test.delete()
-                print(f"🗑️ Mouvement test supprimé")
-                
-            except Exception as e:
-                print(f"[ERREUR] ERREUR LORS DU TEST: {e}")
-                import traceback
-                traceback.print_exc()
-                return JsonResponse({'success': False, 'error': f'Erreur lors du test de création: {str(e)}'})
-        
-        print(f"[OK] Test terminé, création des vrais mouvements...")
-        
-        # Créer des mouvements pour les factures de vente (version simplifiée)
-        factures_vente = FactureVente.objects.filter(agence=agence)
-        print(f"[CHART] Factures de vente: {factures_vente.count()}")
-        
-        for facture in factures_vente:
-            lignes = LigneFactureVente.objects.filter(facture_vente=facture)
-            print(f"  [SEARCH] {facture.numero_ticket}: {lignes.count()} lignes")
-            
-            for ligne in lignes:
-                try:
-                    from django.utils import timezone
-                    
-                    # Utiliser la même logique simple que le test qui fonctionne
-                    MouvementStock.objects.create(
-                        article=ligne.article,
-                        agence=agence,
-                        type_mouvement='sortie',
-                        date_mouvement=timezone.now(),
-                        numero_piece=facture.numero_ticket,
-                        quantite_stock=ligne.article.stock_actuel,
-                        stock_initial=0,  # Simplifié
-                        solde=ligne.article.stock_actuel,
-                        quantite=ligne.quantite,
-                        cout_moyen_pondere=float(ligne.prix_unitaire),
-                        stock_permanent=float(ligne.article.stock_actuel * ligne.prix_unitaire),
-                        facture_vente=facture,
-                        commentaire=f"Vente - {facture.numero_ticket}"
-                    )
-                    mouvements_crees += 1
-                    print(f"    [OK] {ligne.article.designation}")
-                except Exception as e:
-                    print(f"    [ERREUR] Erreur: {e}")
-        
-        # Créer des mouvements pour les factures d'achat (version simplifiée)
-        factures_achat = FactureAchat.objects.filter(agence=agence)
-        print(f"[CHART] Factures d'achat: {factures_achat.count()}")
+        from supermarket.registre_stock import premier_jour, reconstruire_registre
         
-        for facture in factures_achat:
-            lignes = LigneFactureAchat.objects.filter(facture_achat=facture)
-            print(f"  [SEARCH] {facture.reference_achat}: {lignes.count()} lignes")
-            
-            for ligne in lignes:
-                try:
-                    from django.utils import timezone
-                    
-                    # Utiliser la même logique simple que le test qui fonctionne
-                    MouvementStock.objects.create(
-                        article=ligne.article,
-                        agence=agence,
-                        type_mouvement='entree',
-                        date_mouvement=timezone.now(),
-                        numero_piece=facture.reference_achat,
-                        quantite_stock=ligne.article.stock_actuel,
-                        stock_initial=0,  # Simplifié
-                        solde=ligne.article.stock_actuel,
-                        quantite=ligne.quantite,
-                        cout_moyen_pondere=float(ligne.prix_unitaire),
-                        stock_permanent=float(ligne.article.stock_actuel * ligne.prix_unitaire),
-                        facture_achat=facture,
-                        fournisseur=facture.fournisseur,
-                        commentaire=f"Achat - {facture.reference_achat}"
-                    )
-                    mouvements_crees += 1
-                    print(f"    [OK] {ligne.article.designation}")
-                except Exception as e:
-                    print(f"    [ERREUR] Erreur: {e}")
+        debut = premier_jour(agence)
+        if debut is None:
+            return JsonResponse({'success': False, 'error': 'Aucune vente ni aucun achat pour cette agence'})
         
+        # Les mouvements des pièces sont remplacés, les autres gardés avec des soldes recalculés
+        resultat = reconstruire_registre(agence, debut, timezone.localdate())
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements créés, Total: {total_mouvements}")
+        logger.info("TERMINÉ - %s mouvements créés, Total: %s", resultat['crees'], total_mouvements)
         
         return JsonResponse({
             'success': True,
-            'message': f'FORCÉ: {mouvements_crees} mouvements créés! Total: {total_mouvements}',
+            'message': f"FORCÉ: {resultat['crees']} mouvements créés! Total: {total_mouvements}",
             'total_mouvements': total_mouvements,
-            'nouveaux_mouvements': mouvements_crees
+            'nouveaux_mouvements': resultat['crees']
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
+
 @login_required
 def test_mouvement_simple(request):
     """Test simple de création d'un mouvement"""
@@ -18526,21 +16039,22 @@ def test_mouvement_simple(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("🧪 TEST SIMPLE DE CRÉATION DE MOUVEMENT...")
+        logger.debug("🧪 TEST SIMPLE DE CRÉATION DE MOUVEMENT...")
         
         # Vérifier les articles
         articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles: %s", articles.count())
         
         if not articles.exists():
             return JsonResponse({'success': False, 'error': 'Aucun article trouvé dans cette agence'})
         
         article = articles.first()
-        print(f"[PACKAGE] Article test: {article.designation}")
+        logger.debug("[PACKAGE] Article test: %s", article.designation)
         
         # Vérifier les champs obligatoires
-        print(f"[PACKAGE] Stock actuel: {article.stock_actuel}")
-        print(f"[PACKAGE] Prix achat: {article.prix_achat}")
+        logger.debug("[PACKAGE] Stock actuel: %s", article.stock_actuel)
+        logger.debug("[PACKAGE] Prix achat: %s", article.prix_achat)
         
         # Créer un mouvement simple
         from django.utils import timezone
@@ -18560,11 +16074,11 @@ def test_mouvement_simple(request):
             commentaire='Test simple'
         )
         
-        print(f"[OK] MOUVEMENT CRÉÉ: ID {mouvement.id}")
+        logger.debug("MOUVEMENT CRÉÉ: ID %s", mouvement.id)
         
         # Vérifier qu'il existe
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
-        print(f"[CHART] Total mouvements: {total_mouvements}")
+        logger.debug("[CHART] Total mouvements: %s", total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -18574,9 +16088,7 @@ def test_mouvement_simple(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR TEST: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR TEST: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -18588,14 +16100,15 @@ def creer_mouvements_manuels(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[TOOL] CRÉATION MANUELLE DE MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
+        logger.debug("[TOOL] CRÉATION MANUELLE DE MOUVEMENTS...")
+        logger.debug("[TARGET] Agence: %s", agence.nom_agence)
         
         mouvements_crees = 0
         
         # Récupérer tous les articles
         articles = Article.objects.filter(agence=agence)
-        print(f"[PACKAGE] Articles trouvés: {articles.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles trouvés: %s", articles.count())
         
         if not articles.exists():
             return JsonResponse({'success': False, 'error': 'Aucun article trouvé'})
@@ -18620,14 +16133,14 @@ def creer_mouvements_manuels(request):
                     commentaire=f'Création manuelle - {article.designation}'
                 )
                 mouvements_crees += 1
-                print(f"[OK] {article.designation}")
+                logger.debug("%s", article.designation)
                 
             except Exception as e:
-                print(f"[ERREUR] Erreur pour {article.designation}: {e}")
+                logger.error("Erreur pour %s: %s", article.designation, e)
         
         total_mouvements = MouvementStock.objects.filter(agence=agence).count()
         
-        print(f"[SUCCESS] TERMINÉ - {mouvements_crees} mouvements manuels créés, Total: {total_mouvements}")
+        logger.info("TERMINÉ - %s mouvements manuels créés, Total: %s", mouvements_crees, total_mouvements)
         
         return JsonResponse({
             'success': True,
@@ -18637,9 +16150,7 @@ def creer_mouvements_manuels(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -18651,28 +16162,31 @@ def test_consultation_mouvements(request):
         return JsonResponse({'success': False, 'error': 'Agence non trouvée'})
     
     try:
-        print("[SEARCH] TEST CONSULTATION MOUVEMENTS...")
-        print(f"[TARGET] Agence: {agence.nom_agence}")
+        logger.debug("[SEARCH] TEST CONSULTATION MOUVEMENTS...")
+        logger.debug("[TARGET] Agence: %s", agence.nom_agence)
         
         # Vérifier tous les mouvements de l'agence
         tous_mouvements = MouvementStock.objects.filter(agence=agence)
-        print(f"[CHART] Total mouvements dans l'agence: {tous_mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[CHART] Total mouvements dans l'agence: %s", tous_mouvements.count())
         
         if tous_mouvements.count() > 0:
-            print("[LIST] PREMIERS MOUVEMENTS:")
+            logger.debug("[LIST] PREMIERS MOUVEMENTS:")
             for i, mvt in enumerate(tous_mouvements[:5]):
-                print(f"  {i+1}. {mvt.date_mouvement} - {mvt.article.designation} - {mvt.type_mouvement} - {mvt.numero_piece}")
+                logger.debug("  %s. %s - %s - %s - %s", i+1, mvt.date_mouvement, mvt.article.designation, mvt.type_mouvement, mvt.numero_piece)
         
         # Vérifier les articles avec mouvements
         articles_avec_mouvements = Article.objects.filter(
             agence=agence,
             mouvementstock__isnull=False
         ).distinct()
-        print(f"[PACKAGE] Articles avec mouvements: {articles_avec_mouvements.count()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PACKAGE] Articles avec mouvements: %s", articles_avec_mouvements.count())
         
         for article in articles_avec_mouvements[:3]:
             mouvements_article = MouvementStock.objects.filter(agence=agence, article=article)
-            print(f"  - {article.designation}: {mouvements_article.count()} mouvements")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  - %s: %s mouvements", article.designation, mouvements_article.count())
         
         return JsonResponse({
             'success': True,
@@ -18682,9 +16196,7 @@ def test_consultation_mouvements(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -18700,9 +16212,10 @@ def get_mouvements_session(request):
         mouvements_data = request.session.get('mouvements_data', [])
         article_info = request.session.get('article_info', {})
         
-        print(f"[CHART] RÉCUPÉRATION SESSION:")
-        print(f"  - Mouvements en session: {len(mouvements_data)}")
-        print(f"  - Article info: {article_info}")
+        logger.debug("[CHART] RÉCUPÉRATION SESSION:")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  - Mouvements en session: %s", len(mouvements_data))
+        logger.debug("  - Article info: %s", article_info)
         
         return JsonResponse({
             'success': True,
@@ -18711,9 +16224,7 @@ def get_mouvements_session(request):
         })
         
     except Exception as e:
-        print(f"[ERREUR] ERREUR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERREUR: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
 
 # ===== GESTION DES COMPTES UTILISATEURS =====
@@ -19571,7 +17082,7 @@ def check_comptable_access(request):
         return None, HttpResponseRedirect(f'{login_url}?next={request.path}')
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         if compte.type_compte not in ['analyste_financiere', 'admin']:
             messages.error(request, 'Accès refusé. Ce module est réservé aux analystes financières et administrateurs.')
             return None, redirect('index')
@@ -19591,125 +17102,58 @@ def dashboard_financier(request):
         messages.error(request, 'Votre compte n\'est pas correctement lié à une agence.')
         return redirect('login_financier')
     
-    # Calculer les statistiques financières pour TOUTES les agences
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Count, Avg, F
-    
-    # Période : 30 derniers jours
-    date_debut = timezone.now().date() - timedelta(days=30)
-    
-    # Chiffre d'affaires (ventes) - TOUTES LES AGENCES
-    ca_total = FactureVente.objects.filter(
-        date__gte=date_debut
-    ).aggregate(total=Sum('nette_a_payer'))['total'] or Decimal('0')
-    
-    # Dépenses (module Dépense) - TOUTES LES AGENCES
-    # Convertir date_debut en datetime pour le filtre
-    from datetime import time as time_class
-    date_debut_dt = datetime.combine(date_debut, time_class.min)
-    depenses_total = Depense.objects.filter(
-        date__gte=date_debut_dt
-    ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-    
-    # Calculer la marge totale (somme de toutes les marges de toutes les agences) - TOUTES LES AGENCES
-    # Optimisation : Calcul direct en base de données avec agrégation au lieu de boucle Python
-    # La marge = (Prix de vente - Prix d'achat) × Quantité pour chaque ligne de vente
-    from django.db.models import ExpressionWrapper, DecimalField
-    
-    # Calculer la marge totale directement en SQL pour toutes les agences
-    marge_totale_result = LigneFactureVente.objects.filter(
-        facture_vente__date__gte=date_debut,
-        article__isnull=False
-    ).aggregate(
-        total_marge=Sum(
-            ExpressionWrapper(
-                (F('prix_unitaire') - F('article__prix_achat')) * F('quantite'),
-                output_field=DecimalField(max_digits=15, decimal_places=2)
-            )
-        )
-    )['total_marge'] or Decimal('0')
-    
-    marge_totale = Decimal(str(marge_totale_result))
-    
+    # Statistiques financières des 30 derniers jours pour TOUTES les agences.
+    # Les jours terminés sont relus dans ResultatJournalier (figés au premier
+    # calcul) : seul le jour en cours est recalculé à chaque chargement.
+    from datetime import timedelta
+    from django.db.models import Sum
+    from .models import VenteJournaliere
+    from .resultat_journalier import par_jour
+
+    date_fin_evolution = timezone.localdate()
+    date_debut = date_fin_evolution - timedelta(days=30)
+    jours = par_jour(date_debut, date_fin_evolution)
+
+    ca_total = sum((v['chiffre_affaires'] for v in jours.values()), Decimal('0'))
+    depenses_total = sum((v['depenses'] for v in jours.values()), Decimal('0'))
+    # Marge = chiffre d'affaires - coût des ventes (CMUP de sortie), d'après les ventes journalières
+    marge_totale = sum((v['marge'] for v in jours.values()), Decimal('0'))
+    nb_ventes = sum(v['nombre_ventes'] for v in jours.values())
+    nb_depenses = sum(v['nombre_depenses'] for v in jours.values())
+
     # Résultat net (Bénéfice) = Marge - Dépenses
-    # La marge est le bénéfice brut, donc Résultat = Marge - Dépenses
     resultat_net = marge_totale - depenses_total
-    
-    # Statistiques supplémentaires - TOUTES LES AGENCES
-    nb_ventes = FactureVente.objects.filter(date__gte=date_debut).count()
-    nb_depenses = Depense.objects.filter(date__gte=date_debut_dt).count()
-    
+
     # CA moyen par vente
     ca_moyen = ca_total / nb_ventes if nb_ventes > 0 else Decimal('0')
-    
-    # Évolution sur 30 derniers jours (pour graphique) - TOUTES LES AGENCES
-    # Optimisation : Utiliser des agrégations groupées au lieu de boucles avec requêtes individuelles
-    date_fin_evolution = timezone.now().date()
-    date_debut_evolution = date_fin_evolution - timedelta(days=30)
-    
-    # Récupérer le CA groupé par date (une seule requête SQL)
-    ca_par_date = FactureVente.objects.filter(
-        date__range=[date_debut_evolution, date_fin_evolution]
-    ).values('date').annotate(
-        total_ca=Sum('nette_a_payer')
-    ).order_by('date')
-    
-    # Récupérer les dépenses groupées par date (une seule requête SQL)
-    depenses_par_date = Depense.objects.filter(
-        date__gte=datetime.combine(date_debut_evolution, time_class.min),
-        date__lte=datetime.combine(date_fin_evolution, time_class.max)
-    ).extra(
-        select={'date_only': "DATE(date)"}
-    ).values('date_only').annotate(
-        total_depenses=Sum('montant')
-    ).order_by('date_only')
-    
-    # Récupérer les marges groupées par date (une seule requête SQL)
-    marges_par_date = LigneFactureVente.objects.filter(
-        facture_vente__date__range=[date_debut_evolution, date_fin_evolution],
-        article__isnull=False
-    ).values('facture_vente__date').annotate(
-        total_marge=Sum(
-            ExpressionWrapper(
-                (F('prix_unitaire') - F('article__prix_achat')) * F('quantite'),
-                output_field=DecimalField(max_digits=15, decimal_places=2)
-            )
-        )
-    ).order_by('facture_vente__date')
-    
-    # Créer des dictionnaires pour accès rapide
-    ca_dict = {str(item['date']): float(item['total_ca'] or 0) for item in ca_par_date}
-    depenses_dict = {str(item['date_only']): float(item['total_depenses'] or 0) for item in depenses_par_date}
-    marges_dict = {str(item['facture_vente__date']): float(item['total_marge'] or 0) for item in marges_par_date}
-    
-    # Construire les listes pour les 30 derniers jours
+
+    # Évolution sur les 30 derniers jours (pour graphique)
     evolution_ca = []
     evolution_depenses = []
     evolution_resultat = []
     labels_jours = []
-    
+
     for i in range(30, 0, -1):
         date_jour = date_fin_evolution - timedelta(days=i)
-        date_jour_str = str(date_jour)
         labels_jours.append(date_jour.strftime('%d/%m'))
-        
-        ca_jour = ca_dict.get(date_jour_str, 0.0)
-        dep_jour = depenses_dict.get(date_jour_str, 0.0)
-        marge_jour = marges_dict.get(date_jour_str, 0.0)
-        resultat_jour = marge_jour - dep_jour
-        
-        evolution_ca.append(ca_jour)
-        evolution_depenses.append(dep_jour)
-        evolution_resultat.append(resultat_jour)
-    
-    # Top 5 articles les plus vendus - TOUTES LES AGENCES
-    top_articles = LigneFactureVente.objects.filter(
-        facture_vente__date__gte=date_debut
+        valeurs = jours.get(date_jour)
+        if valeurs is None:
+            evolution_ca.append(0.0)
+            evolution_depenses.append(0.0)
+            evolution_resultat.append(0.0)
+            continue
+        evolution_ca.append(float(valeurs['chiffre_affaires']))
+        evolution_depenses.append(float(valeurs['depenses']))
+        evolution_resultat.append(float(valeurs['marge'] - valeurs['depenses']))
+
+    # Top 5 articles les plus vendus - TOUTES LES AGENCES (ventes journalières)
+    top_articles = VenteJournaliere.objects.filter(
+        jour__gte=date_debut, nombre_lignes__gt=0
     ).values('article__designation').annotate(
-        total_vente=Sum(F('quantite') * F('prix_unitaire')),
+        total_vente=Sum('chiffre_affaires'),
         quantite_totale=Sum('quantite')
     ).order_by('-total_vente')[:5]
-    
+
     context = {
         'agence': agence,
         'compte': compte,
@@ -19803,7 +17247,7 @@ def generer_etat_tresorerie(request):
         return JsonResponse({'success': False, 'error': 'Non authentifié. Veuillez vous reconnecter.'}, status=401)
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         if compte.type_compte not in ['analyste_financiere', 'comptable', 'assistant_comptable', 'admin']:
             return JsonResponse({'success': False, 'error': 'Accès refusé.'}, status=403)
     except Compte.DoesNotExist:
@@ -19842,6 +17286,10 @@ def generer_etat_tresorerie(request):
             'total_disponible': Decimal('0')
         }
         
+        # CA du DERNIER JOUR de la période (date_fin) de toutes les agences : une lecture des ventes journalières
+        from .ventes_journalieres import totaux_par_agence
+        ventes_date_fin = totaux_par_agence(date_fin, date_fin, agences)
+        
         for agence in agences:
             # Récupérer la dernière trésorerie de cette agence dans la période
             # On prend le dernier jour de la période pour chaque agence
@@ -19850,13 +17298,8 @@ def generer_etat_tresorerie(request):
                 date__lte=date_fin
             ).order_by('-date').first()
             
-            # Calculer le CA pour cette agence du DERNIER JOUR de la période (date_fin)
-            # et non le cumulé sur toute la période
-            ventes_jour = LigneFactureVente.objects.filter(
-                facture_vente__agence=agence,
-                facture_vente__date=date_fin
-            )
-            ca_agence = ventes_jour.aggregate(total=Sum(F('quantite') * F('prix_unitaire')))['total'] or Decimal('0')
+            # CA de cette agence du DERNIER JOUR de la période (date_fin), et non le cumulé sur toute la période
+            ca_agence = ventes_date_fin.get(agence.pk, {}).get('chiffre_affaires', Decimal('0'))
             
             # Variables pour stocker les valeurs Decimal avant conversion en float
             banque_val = Decimal('0')
@@ -19931,8 +17374,7 @@ def generer_etat_tresorerie(request):
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur: {str(e)}'})
 
 def export_etat_tresorerie_excel(request):
@@ -20039,8 +17481,7 @@ def export_etat_tresorerie_excel(request):
         return response
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur export: {str(e)}'})
 
 def etat_resultat(request):
@@ -20071,7 +17512,7 @@ def generer_etat_depense(request):
         return JsonResponse({'success': False, 'error': 'Non authentifié. Veuillez vous reconnecter.'}, status=401)
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         if compte.type_compte not in ['analyste_financiere', 'admin']:
             return JsonResponse({'success': False, 'error': 'Accès refusé. Ce module est réservé aux analystes financières et administrateurs.'}, status=403)
     except Compte.DoesNotExist:
@@ -20091,79 +17532,85 @@ def generer_etat_depense(request):
         date_debut = datetime.strptime(date_debut_str, '%Y-%m-%d').date()
         date_fin = datetime.strptime(date_fin_str, '%Y-%m-%d').date()
         
-        # Récupérer toutes les agences
-        agences = Agence.objects.all().order_by('nom_agence')
-        
+        from datetime import timedelta
+        from .compte_resultat import PRECEDENT, depenses as depenses_agences, variation
+        from .resultat_journalier import debut_du_jour
+
+        # Toutes les dépenses de la période en une requête (agences et bénéficiaires joints),
+        # totaux du mois précédent par agence en une requête groupée
+        depenses = Depense.objects.filter(
+            date__gte=debut_du_jour(date_debut), date__lt=debut_du_jour(date_fin + timedelta(days=1))
+        ).select_related('agence', 'beneficiaire').order_by('agence__nom_agence', 'agence_id', 'date')
+        precedents = depenses_agences(date_debut, date_fin)
+
         # Dépenses par agence
         depenses_par_agence = {}
+        totaux_agences = {}
         total_general = Decimal('0')
-        
-        for agence in agences:
-            # Convertir les dates en datetime pour le filtre (start et end de la journée)
-            from datetime import time as time_class
-            date_debut_dt = datetime.combine(date_debut, time_class.min)
-            date_fin_dt = datetime.combine(date_fin, time_class.max)
-            
-            # Récupérer les dépenses de cette agence pour la période
-            depenses_agence = Depense.objects.filter(
-                agence=agence,
-                date__range=[date_debut_dt, date_fin_dt]
-            ).order_by('date')
-            
-            # Préparer les données des dépenses
-            liste_depenses = []
-            total_agence = Decimal('0')
-            
-            for depense in depenses_agence:
-                # Sérialiser la date en string ISO pour JSON
-                if depense.date:
-                    # Convertir datetime avec timezone en datetime naive puis en string
-                    if hasattr(depense.date, 'replace'):
-                        date_naive = depense.date.replace(tzinfo=None)
-                        date_str = date_naive.strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        date_str = str(depense.date)
+
+        for depense in depenses:
+            # Sérialiser la date en string ISO pour JSON
+            if depense.date:
+                # Convertir datetime avec timezone en datetime naive puis en string
+                if hasattr(depense.date, 'replace'):
+                    date_naive = depense.date.replace(tzinfo=None)
+                    date_str = date_naive.strftime('%Y-%m-%d %H:%M:%S')
                 else:
-                    date_str = None
-                    
-                # Récupérer le nom du bénéficiaire comme dans le module comptabilité
-                nom_beneficiaire = depense.beneficiaire.nom_complet if depense.beneficiaire else "Non assigné"
-                    
-                liste_depenses.append({
-                    'date': date_str,
-                    'libelle': depense.libelle,
-                    'montant': float(depense.montant),
-                    'beneficiaire': nom_beneficiaire,
-                })
-                total_agence += depense.montant
-            
-            if liste_depenses:
+                    date_str = str(depense.date)
+            else:
+                date_str = None
+
+            # Récupérer le nom du bénéficiaire comme dans le module comptabilité
+            nom_beneficiaire = depense.beneficiaire.nom_complet if depense.beneficiaire else "Non assigné"
+
+            agence = depense.agence
+            if agence.id_agence not in depenses_par_agence:
                 depenses_par_agence[agence.id_agence] = {
                     'nom_agence': agence.nom_agence,
-                    'depenses': liste_depenses,
-                    'total': float(total_agence),
+                    'depenses': [],
+                    'total': 0.0,
                 }
-                total_general += total_agence
-        
+                totaux_agences[agence.id_agence] = Decimal('0')
+            depenses_par_agence[agence.id_agence]['depenses'].append({
+                'date': date_str,
+                'libelle': depense.libelle,
+                'montant': float(depense.montant),
+                'beneficiaire': nom_beneficiaire,
+            })
+            totaux_agences[agence.id_agence] += depense.montant
+            total_general += depense.montant
+
+        # Comparaison avec le même intervalle du mois précédent ; le total précédent
+        # compte aussi les agences sans dépense sur la période
+        for agence_id, total_agence in totaux_agences.items():
+            precedent = precedents.get(agence_id, {}).get(PRECEDENT, {}).get('depenses', Decimal('0'))
+            depenses_par_agence[agence_id]['total'] = float(total_agence)
+            depenses_par_agence[agence_id]['total_precedent'] = float(precedent)
+            depenses_par_agence[agence_id]['evolution'] = variation(total_agence, precedent)
+        total_precedent_general = sum(
+            (Decimal(periodes[PRECEDENT]['depenses']) for periodes in precedents.values()), Decimal('0')
+        )
+
         # Stocker dans la session pour l'export
         request.session['etat_depense'] = {
             'date_debut': str(date_debut),
             'date_fin': str(date_fin),
             'depenses_par_agence': depenses_par_agence,
             'total_general': float(total_general),
+            'total_precedent_general': float(total_precedent_general),
         }
         
         return JsonResponse({
             'success': True,
             'depenses_par_agence': depenses_par_agence,
             'total_general': float(total_general),
+            'total_precedent_general': float(total_precedent_general),
             'date_debut': str(date_debut),
             'date_fin': str(date_fin),
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur: {str(e)}'})
 
 def export_etat_depense_excel(request):
@@ -20297,8 +17744,7 @@ def export_etat_depense_excel(request):
         return response
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur export: {str(e)}'})
 
 def generer_etat_resultat(request):
@@ -20308,7 +17754,7 @@ def generer_etat_resultat(request):
         return JsonResponse({'success': False, 'error': 'Non authentifié. Veuillez vous reconnecter.'}, status=401)
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         if compte.type_compte not in ['comptable', 'admin']:
             return JsonResponse({'success': False, 'error': 'Accès refusé. Ce module est réservé aux comptables.'}, status=403)
     except Compte.DoesNotExist:
@@ -20324,74 +17770,66 @@ def generer_etat_resultat(request):
         if not date_debut_str or not date_fin_str:
             return JsonResponse({'success': False, 'error': 'Les dates sont obligatoires'})
         
-        from datetime import datetime, time
-        from django.db.models import ExpressionWrapper, DecimalField
+        from datetime import datetime
+        from .compte_resultat import COURANT, PRECEDENT, periode_precedente, resultats, variation, vide
         date_debut = datetime.strptime(date_debut_str, '%Y-%m-%d').date()
         date_fin = datetime.strptime(date_fin_str, '%Y-%m-%d').date()
-        
+
         # Récupérer toutes les agences sauf "Agence Principale" et "Super Market Principal"
         agences = Agence.objects.exclude(
             nom_agence__in=['Agence Principale', 'Super Market Principal']
         ).order_by('nom_agence')
-        
+
+        # Compte de résultat de toutes les agences, période et mois précédent :
+        # une requête groupée par table source, quel que soit le nombre d'agences.
+        # Marge = chiffre d'affaires des lignes - coût des ventes au CMUP de sortie (ventes journalières)
+        comptes = resultats(date_debut, date_fin, agences)
+        date_debut_precedent, date_fin_precedent = periode_precedente(date_debut, date_fin)
+
         # Résultats par agence
         resultats_par_agence = {}
-        total_ca_general = Decimal('0')
-        total_depenses_general = Decimal('0')
-        total_marge_general = Decimal('0')
-        total_resultat_general = Decimal('0')
-        
-        # Convertir les dates en datetime pour les filtres
-        date_debut_dt = datetime.combine(date_debut, time.min)
-        date_fin_dt = datetime.combine(date_fin, time.max)
-        
+        totaux = {COURANT: vide(), PRECEDENT: vide()}
+
         for agence in agences:
-            # Chiffre d'affaires de l'agence (ventes)
-            ca_agence = FactureVente.objects.filter(
-                agence=agence,
-                date__range=[date_debut, date_fin]
-            ).aggregate(total=Sum('nette_a_payer'))['total'] or Decimal('0')
-            
-            # Dépenses de l'agence
-            depenses_agence = Depense.objects.filter(
-                agence=agence,
-                date__range=[date_debut_dt, date_fin_dt]
-            ).aggregate(total=Sum('montant'))['total'] or Decimal('0')
-            
-            # Marge (Bénéfice brut) de l'agence
-            # Calculer la marge directement en SQL pour cette agence
-            marge_agence_result = LigneFactureVente.objects.filter(
-                facture_vente__agence=agence,
-                facture_vente__date__range=[date_debut, date_fin],
-                article__isnull=False
-            ).aggregate(
-                total_marge=Sum(
-                    ExpressionWrapper(
-                        (F('prix_unitaire') - F('article__prix_achat')) * F('quantite'),
-                        output_field=DecimalField(max_digits=15, decimal_places=2)
-                    )
-                )
-            )['total_marge'] or Decimal('0')
-            
-            marge_agence = Decimal(str(marge_agence_result))
-            
-            # Résultat = Bénéfice (Marge) - Dépenses
-            resultat_agence = marge_agence - depenses_agence
-            
+            compte_agence = comptes.get(agence.id_agence, {})
+            courant = compte_agence.get(COURANT, vide())
+            precedent = compte_agence.get(PRECEDENT, vide())
+
             # Stocker les résultats même si tout est à zéro (pour afficher toutes les agences)
             resultats_par_agence[agence.id_agence] = {
                 'nom_agence': agence.nom_agence,
-                'ca': float(ca_agence),
-                'depenses': float(depenses_agence),
-                'marge': float(marge_agence),
-                'resultat': float(resultat_agence),
+                'ca': float(courant['chiffre_affaires']),
+                'cout_ventes': float(courant['cout_ventes']),
+                'depenses': float(courant['depenses']),
+                'marge': float(courant['marge']),
+                'resultat': float(courant['resultat']),
+                'ca_precedent': float(precedent['chiffre_affaires']),
+                'depenses_precedent': float(precedent['depenses']),
+                'marge_precedent': float(precedent['marge']),
+                'resultat_precedent': float(precedent['resultat']),
+                'evolution_ca': variation(courant['chiffre_affaires'], precedent['chiffre_affaires']),
+                'evolution_resultat': variation(courant['resultat'], precedent['resultat']),
             }
-            
-            total_ca_general += ca_agence
-            total_depenses_general += depenses_agence
-            total_marge_general += marge_agence
-            total_resultat_general += resultat_agence
-        
+
+            for periode, valeurs in ((COURANT, courant), (PRECEDENT, precedent)):
+                for champ in ('chiffre_affaires', 'cout_ventes', 'depenses', 'marge', 'resultat'):
+                    totaux[periode][champ] += valeurs[champ]
+
+        total_ca_general = totaux[COURANT]['chiffre_affaires']
+        total_depenses_general = totaux[COURANT]['depenses']
+        total_marge_general = totaux[COURANT]['marge']
+        total_resultat_general = totaux[COURANT]['resultat']
+        comparaison = {
+            'date_debut_precedent': str(date_debut_precedent),
+            'date_fin_precedent': str(date_fin_precedent),
+            'total_cout_ventes': float(totaux[COURANT]['cout_ventes']),
+            'total_ca_precedent': float(totaux[PRECEDENT]['chiffre_affaires']),
+            'total_depenses_precedent': float(totaux[PRECEDENT]['depenses']),
+            'total_marge_precedent': float(totaux[PRECEDENT]['marge']),
+            'total_resultat_precedent': float(totaux[PRECEDENT]['resultat']),
+            'evolution_resultat': variation(total_resultat_general, totaux[PRECEDENT]['resultat']),
+        }
+
         # Stocker dans la session pour l'export
         request.session['etat_resultat'] = {
             'date_debut': str(date_debut),
@@ -20401,6 +17839,7 @@ def generer_etat_resultat(request):
             'total_depenses': float(total_depenses_general),
             'total_marge': float(total_marge_general),
             'total_resultat': float(total_resultat_general),
+            **comparaison,
         }
         
         return JsonResponse({
@@ -20410,13 +17849,13 @@ def generer_etat_resultat(request):
             'total_depenses': float(total_depenses_general),
             'total_marge': float(total_marge_general),
             'total_resultat': float(total_resultat_general),
+            **comparaison,
             'date_debut': str(date_debut),
             'date_fin': str(date_fin),
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur: {str(e)}'})
 
 def export_etat_resultat_excel(request):
@@ -20566,8 +18005,7 @@ def export_etat_resultat_excel(request):
         return response
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': f'Erreur export: {str(e)}'})
 # Dans views.py
 
@@ -20594,12 +18032,16 @@ def generer_suivi_statistique(request):
     }
     
     try:
-        from supermarket.models import LigneFactureVente, MargePersonnalisee
+        from supermarket.models import MargePersonnalisee, VenteJournaliere
         
-        # 1. Récupérer les ventes (Filtre direct sur la date)
-        ventes = LigneFactureVente.objects.filter(
-            facture_vente__date__range=[date_debut, date_fin]
-        ).select_related('article', 'facture_vente__agence')
+        # 1. Récupérer les ventes journalières de la période (une ligne par agence, article et jour)
+        ventes = list(VenteJournaliere.objects.filter(
+            jour__range=[date_debut, date_fin], nombre_lignes__gt=0
+        ).order_by('agence_id', 'jour', 'article__designation').values_list(
+            'agence_id', 'article_id', 'jour', 'quantite', 'chiffre_affaires', 'cout'
+        ))
+        articles_vendus = Article.objects.in_bulk({v[1] for v in ventes})
+        agences_vente = Agence.objects.in_bulk({v[0] for v in ventes})
         
         stats_data = {}
         
@@ -20618,11 +18060,7 @@ def generer_suivi_statistique(request):
             # Stocker par ID
             if m.article_id not in configs_marges:
                 configs_marges[m.article_id] = m
-                print(f"[DEBUG] Config chargée: Article ID {m.article_id} - {m.article.reference_article if m.article else 'N/A'} "
-                      f"({m.article.designation if m.article else 'N/A'}) - "
-                      f"Mauvaise: {m.mauvaise_min}%-{m.mauvaise_max}%, "
-                      f"Bonne: {m.bonne_min}%-{m.bonne_max}%, "
-                      f"Très bonne: {m.tres_bonne_min}%-{m.tres_bonne_max}%")
+                logger.debug("Config chargée: Article ID %s - %s (%s) - Mauvaise: %s%%-%s%%, Bonne: %s%%-%s%%, Très bonne: %s%%-%s%%", m.article_id, (m.article.reference_article if m.article else 'N/A'), (m.article.designation if m.article else 'N/A'), m.mauvaise_min, m.mauvaise_max, m.bonne_min, m.bonne_max, m.tres_bonne_min, m.tres_bonne_max)
             
             # Stocker aussi par référence d'article (normalisée) pour recherche alternative
             if m.article and m.article.reference_article:
@@ -20641,23 +18079,22 @@ def generer_suivi_statistique(request):
                 if designation_normalisee not in configs_marges_by_designation:
                     configs_marges_by_designation[designation_normalisee] = m
         
-        print(f"[DEBUG] Total configs chargées: {len(configs_marges)} (par ID), {len(configs_marges_by_ref)} (par référence), {len(configs_marges_by_designation)} (par désignation)")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Total configs chargées: %s (par ID), %s (par référence), %s (par désignation)", len(configs_marges), len(configs_marges_by_ref), len(configs_marges_by_designation))
 
-        for vente in ventes:
-            agence_pk = str(vente.facture_vente.agence.pk) # Str pour compatibilité JSON
-            nom_agence = vente.facture_vente.agence.nom_agence
+        for agence_id, article_id, date_obj, quantite, chiffre_affaires, cout_ventes in ventes:
+            agence_pk = str(agence_id) # Str pour compatibilité JSON
+            nom_agence = agences_vente[agence_id].nom_agence
             
             # Gestion date
-            date_obj = vente.facture_vente.date
             date_vente = date_obj.strftime('%Y-%m-%d') if hasattr(date_obj, 'strftime') else str(date_obj)
             
-            article = vente.article
+            article = articles_vendus[article_id]
             
-            # --- CALCULS FINANCIERS (Comme statistique_vente) ---
-            qte = float(vente.quantite)
-            ca = qte * float(vente.prix_unitaire)
-            prix_achat = float(article.prix_achat or 0)
-            cout = qte * prix_achat
+            # --- CALCULS FINANCIERS (coût des ventes au CMUP de sortie) ---
+            qte = float(quantite)
+            ca = float(chiffre_affaires)
+            cout = float(cout_ventes)
             marge_valeur = ca - cout
             
             # % Marge
@@ -20677,7 +18114,7 @@ def generer_suivi_statistique(request):
                 ref_normalisee = article.reference_article.strip().upper()
                 config = configs_marges_by_ref.get(ref_normalisee)
             if config:
-                    print(f"[DEBUG] Config trouvée par référence '{ref_normalisee}' pour article ID {article_id} ({article.reference_article})")
+                    logger.debug("Config trouvée par référence '%s' pour article ID %s (%s)", ref_normalisee, article_id, article.reference_article)
             
             # 3. Si toujours pas trouvé, chercher par désignation normalisée (pour gérer les variations de nom)
             if not config and article.designation:
@@ -20688,10 +18125,11 @@ def generer_suivi_statistique(request):
                 
                 config = configs_marges_by_designation.get(designation_normalisee)
                 if config:
-                    print(f"[DEBUG] Config trouvée par désignation '{designation_normalisee}' pour article ID {article_id} ({article.reference_article})")
+                    logger.debug("Config trouvée par désignation '%s' pour article ID %s (%s)", designation_normalisee, article_id, article.reference_article)
                 else:
                     # Debug: Afficher toutes les désignations disponibles pour comparaison
-                    print(f"[DEBUG] Recherche désignation '{designation_normalisee}' - Désignations disponibles: {list(configs_marges_by_designation.keys())}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Recherche désignation '%s' - Désignations disponibles: %s", designation_normalisee, list(configs_marges_by_designation.keys()))
                     # Essayer une recherche partielle (contient) pour gérer les petites variations
                     for desig_key, marge_config in configs_marges_by_designation.items():
                         # Comparer en enlevant tous les espaces pour une comparaison plus flexible
@@ -20701,7 +18139,7 @@ def generer_suivi_statistique(request):
                            (len(desig_sans_espaces) > 10 and desig_sans_espaces in key_sans_espaces) or \
                            (len(key_sans_espaces) > 10 and key_sans_espaces in desig_sans_espaces):
                             config = marge_config
-                            print(f"[DEBUG] Config trouvée par recherche flexible: '{designation_normalisee}' correspond à '{desig_key}'")
+                            logger.debug("Config trouvée par recherche flexible: '%s' correspond à '%s'", designation_normalisee, desig_key)
                             break
             
             # Utiliser la configuration personnalisée si trouvée et active, sinon utiliser les valeurs par défaut
@@ -20713,10 +18151,7 @@ def generer_suivi_statistique(request):
                     'tb_min': float(config.tres_bonne_min), 'tb_max': float(config.tres_bonne_max)
                 }
                 is_default = False
-                print(f"[DEBUG] Config personnalisée utilisée pour {article.reference_article}: "
-                      f"Mauvaise={limits['m_min']}-{limits['m_max']}%, "
-                      f"Bonne={limits['b_min']}-{limits['b_max']}%, "
-                      f"Très bonne={limits['tb_min']}-{limits['tb_max']}%")
+                logger.debug("Config personnalisée utilisée pour %s: Mauvaise=%s-%s%%, Bonne=%s-%s%%, Très bonne=%s-%s%%", article.reference_article, limits['m_min'], limits['m_max'], limits['b_min'], limits['b_max'], limits['tb_min'], limits['tb_max'])
             else:
                 # Utiliser les valeurs par défaut définies dans DEFAULT_CONFIG
                 limits = {
@@ -20726,9 +18161,9 @@ def generer_suivi_statistique(request):
                 }
                 is_default = True
                 if not config:
-                    print(f"[DEBUG] Aucune config trouvée pour {article.reference_article} (ID: {article_id}), utilisation des valeurs par défaut")
+                    logger.debug("Aucune config trouvée pour %s (ID: %s), utilisation des valeurs par défaut", article.reference_article, article_id)
                 else:
-                    print(f"[DEBUG] Config trouvée mais inactive pour {article.reference_article}")
+                    logger.debug("Config trouvée mais inactive pour %s", article.reference_article)
 
             # Choix catégorie
             categorie_key = 'tres_mauvaise' # Repli
@@ -20747,8 +18182,7 @@ def generer_suivi_statistique(request):
                 elif marge_pct > limits['tb_max']: 
                     categorie_key = 'bonne'
             
-            print(f"[DEBUG] Article {article.reference_article}: Marge={marge_pct:.2f}% -> Catégorie: {categorie_key} "
-                  f"(Limites: M={limits['m_min']}-{limits['m_max']}, B={limits['b_min']}-{limits['b_max']}, TB={limits['tb_min']}-{limits['tb_max']})")
+            logger.debug("Article %s: Marge=%.2f%% -> Catégorie: %s (Limites: M=%s-%s, B=%s-%s, TB=%s-%s)", article.reference_article, marge_pct, categorie_key, limits['m_min'], limits['m_max'], limits['b_min'], limits['b_max'], limits['tb_min'], limits['tb_max'])
 
             # --- CONSTRUCTION STRUCTURE ---
             if agence_pk not in stats_data:
@@ -20799,8 +18233,7 @@ def generer_suivi_statistique(request):
         return JsonResponse({'success': True, 'statistiques': stats_data, 'date_debut': date_debut, 'date_fin': date_fin})
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return JsonResponse({'success': False, 'error': str(e)})
 
 
@@ -21355,7 +18788,7 @@ def dashboard_comptabiliter(request):
 
         # 6. Récupérer le nom de l'utilisateur
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except:
             nom_utilisateur = request.user.username
@@ -21511,7 +18944,7 @@ def consulter_depenses(request):
         if not agence: return redirect('dashboard_comptabiliter')
         
         try:
-            compte = Compte.objects.get(user=request.user, actif=True)
+            compte = get_compte_actif(request)
             nom_utilisateur = compte.nom_complet
         except:
             nom_utilisateur = request.user.username
@@ -21631,13 +19064,10 @@ def suivi_chiffre_affaire(request):
         try:
             montant_previsionnel = request.POST.get('montant_previsionnel', 500000)
 
-            # Calcul du CA du jour via les factures
-            ventes_jour = LigneFactureVente.objects.filter(
-                facture_vente__agence=agence,
-                facture_vente__date=date_a_afficher
-            )
-            calcul_ca = ventes_jour.aggregate(total=Sum(F('quantite') * F('prix_unitaire')))['total'] or 0
-            montant_realise = Decimal(calcul_ca)
+            # Calcul du CA du jour via les ventes journalières
+            from .ventes_journalieres import totaux_par_agence
+            totaux = totaux_par_agence(date_a_afficher, date_a_afficher, [agence]).get(agence.pk)
+            montant_realise = totaux['chiffre_affaires'] if totaux else Decimal('0')
 
             # Enregistrement avec liaison AGENCE
             ChiffreAffaire.objects.update_or_create(
@@ -21651,7 +19081,7 @@ def suivi_chiffre_affaire(request):
             messages.success(request, "Mise à jour effectuée.")
 
         except Exception as e:
-            print(f"ERREUR POST: {e}") 
+            logger.error("ERREUR POST: %s", e) 
             messages.error(request, f"Erreur : {e}")
 
     # 3. RÉCUPÉRATION DES DONNÉES (Pour l'historique et l'Excel)
@@ -21997,16 +19427,15 @@ def suivi_tresorerie(request):
             # Rediriger vers la page sans le paramètre edit pour revenir en mode visualisation
             return redirect(reverse('suivi_tresorerie'))
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Erreur inattendue")
             messages.error(request, f"Erreur lors de l'enregistrement: {str(e)}")
             # En cas d'erreur, rester sur la page pour afficher le message
 
     # Debug : vérifier les valeurs initiales
-    print(f"DEBUG - Valeurs initiales: {valeurs_initiales}")
-    print(f"DEBUG - Treso existe: {treso is not None}")
+    logger.debug("DEBUG - Valeurs initiales: %s", valeurs_initiales)
+    logger.debug("DEBUG - Treso existe: %s", treso is not None)
     if treso:
-        print(f"DEBUG - Treso banque_initial: {treso.banque_initial}")
+        logger.debug("DEBUG - Treso banque_initial: %s", treso.banque_initial)
     
     # Calculer le total global pour l'affichage
     total_global = sum(valeurs_initiales.values())
@@ -22271,7 +19700,7 @@ def logout_achats(request):
 def dashboard_achats(request):
     """Dashboard principal du module Gestion Achats"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -22379,7 +19808,7 @@ def generer_bon_commande(request):
     """
     try:
         # 1. Vérifications Administratives
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -22571,8 +20000,7 @@ def generer_bon_commande(request):
                 return redirect('consulter_bons_commande')
                 
             except Exception as e:
-                import traceback
-                traceback.print_exc()
+                logger.exception("Erreur inattendue")
                 messages.error(request, f'Erreur lors de la création : {str(e)}')
         
         # 5. Rendu du Template (GET)
@@ -22617,7 +20045,7 @@ def get_fournisseur_ajax(request, fournisseur_id):
 def consulter_bons_commande(request):
     """Consulter tous les bons de commande (Mise à jour filtres)"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence: return redirect('logout_achats')
         
@@ -22803,15 +20231,14 @@ def export_commandes_achats_excel(request):
         return response
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Erreur inattendue")
         return HttpResponse(f"Erreur Export: {str(e)}")
 
 @login_required
 def modifier_bon_commande(request, commande_id):
     """Modifier un bon de commande existant"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -22988,7 +20415,7 @@ def modifier_bon_commande(request, commande_id):
 def supprimer_bon_commande(request, commande_id):
     """Supprimer un bon de commande"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -23011,7 +20438,7 @@ def supprimer_bon_commande(request, commande_id):
 def voir_bon_commande(request, commande_id):
     """Voir un bon de commande"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -23110,7 +20537,7 @@ def generer_bon_commande_pdf(request, commande_id):
                         self.drawImage(logo_path, logo_x, logo_y_bottom, 
                                          width=logo_width, height=logo_height, preserveAspectRatio=True)
                     except Exception as e:
-                        print(f"[PDF] Erreur logo en-tête: {e}")
+                        logger.error("[PDF] Erreur logo en-tête: %s", e)
                         # Dessiner un rectangle pour indiquer l'espace du logo même s'il n'y a pas de logo
                         self.setStrokeColor(colors.grey)
                         self.setFillColor(colors.HexColor('#f0f0f0'))
@@ -23429,7 +20856,7 @@ def generer_bon_commande_pdf(request, commande_id):
 def etat_livraison(request):
     """Afficher l'état de toutes les livraisons planifiées"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -23546,7 +20973,7 @@ def etat_livraison(request):
 def etat_inventaire(request):
     """Vue pour l'état des inventaires - Toutes les agences"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')
@@ -23573,7 +21000,7 @@ def generer_etat_inventaire(request):
         return JsonResponse({'success': False, 'error': 'Non authentifié. Veuillez vous reconnecter.'}, status=401)
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
     except Compte.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Votre compte n\'est pas configuré correctement.'}, status=403)
     
@@ -23582,7 +21009,8 @@ def generer_etat_inventaire(request):
     
     try:
         from supermarket.models import Article
-        from django.db.models import Sum, Q
+        from supermarket.stock_journalier import figer, lire_periode
+        from collections import defaultdict
         from datetime import datetime, timedelta
         
         date_debut_str = request.POST.get('date_debut')
@@ -23595,9 +21023,9 @@ def generer_etat_inventaire(request):
         date_fin = datetime.strptime(date_fin_str, '%Y-%m-%d').date()
         
         # Récupérer toutes les agences sauf "Super Market Principal" et "Agence Principale"
-        agences = Agence.objects.exclude(
+        agences = list(Agence.objects.exclude(
             nom_agence__in=['Super Market Principal', 'Agence Principale']
-        ).order_by('nom_agence')
+        ).order_by('nom_agence'))
         
         # Données par agence et par jour
         inventaires_data = {}
@@ -23609,43 +21037,32 @@ def generer_etat_inventaire(request):
             jours_periode.append(current_date)
             current_date += timedelta(days=1)
         
-        from supermarket.models import MouvementStock
-        from django.utils import timezone
+        # Articles de toutes les agences en une requête
+        articles_par_agence = defaultdict(list)
+        for article in Article.objects.filter(
+            agence__in=agences
+        ).select_related('categorie').order_by('reference_article', 'designation'):
+            articles_par_agence[article.agence_id].append(article)
+        
+        # Stocks de clôture figés : seuls les jours terminés manquants sont calculés,
+        # puis toute la période est lue en une seule requête
+        for agence in agences:
+            figer(agence, date_debut, date_fin)
+        stocks_jours = lire_periode(agences, date_debut, date_fin)
         
         for agence in agences:
-            # Pour chaque jour de la période, calculer l'état du stock à cette date
             jours_data = {}
-            
-            # Récupérer tous les articles de cette agence une seule fois
-            articles = Article.objects.filter(
-                agence=agence
-            ).select_related('categorie').order_by('reference_article', 'designation')
+            articles = articles_par_agence[agence.id_agence]
             
             for jour in jours_periode:
-                # Pour chaque jour, calculer le stock de chaque article à cette date
-                # en utilisant le dernier mouvement avant ou à cette date
-                date_jour_debut = timezone.make_aware(datetime.combine(jour, datetime.min.time()))
-                date_jour_fin = timezone.make_aware(datetime.combine(jour, datetime.max.time()))
+                # Jour non figé (aujourd'hui ou à venir) ou article créé depuis : stock actuel
+                stocks = stocks_jours.get((agence.id_agence, jour), {})
                 
                 lignes_jour = []
                 valeur_totale_jour = 0
                 
                 for article in articles:
-                    # Trouver le dernier mouvement de stock pour cet article avant ou à cette date
-                    dernier_mouvement = MouvementStock.objects.filter(
-                        article=article,
-                        agence=agence,
-                        date_mouvement__lte=date_jour_fin
-                    ).order_by('-date_mouvement').first()
-                    
-                    # Si un mouvement existe, utiliser le stock après ce mouvement (quantite_stock ou solde)
-                    # Sinon, utiliser le stock actuel (pour les articles sans historique)
-                    if dernier_mouvement:
-                        quantite = float(dernier_mouvement.quantite_stock or dernier_mouvement.solde or 0)
-                    else:
-                        # Si pas de mouvement historique, utiliser le stock actuel
-                        quantite = float(article.stock_actuel or 0)
-                    
+                    quantite = float(stocks.get(article.id, article.stock_actuel) or 0)
                     prix_unitaire = float(article.prix_achat or 0)
                     valeur = quantite * prix_unitaire
                     valeur_totale_jour += valeur
@@ -23706,7 +21123,7 @@ def export_etat_inventaire_excel(request):
         return JsonResponse({'success': False, 'error': 'Non authentifié'}, status=401)
     
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
     except Compte.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Compte non trouvé'}, status=403)
     
@@ -23941,7 +21358,7 @@ def logout_commercial(request):
 def dashboard_commercial(request):
     """Dashboard principal du module Gestion Commerciale"""
     try:
-        compte = Compte.objects.get(user=request.user, actif=True)
+        compte = get_compte_actif(request)
         agence = get_user_agence(request)
         if not agence:
             messages.error(request, 'Votre compte n\'est pas configuré correctement.')